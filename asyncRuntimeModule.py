@@ -0,0 +1,271 @@
+from asyncio import (
+    new_event_loop as imNewEventLoop,
+    set_event_loop as imSetEventLoop,
+    run_coroutine_threadsafe as imRunCoroutine,
+    sleep as imAsyncDelay,
+    Event as imAsyncEvent,
+    CancelledError as imCancelledError,
+    gather as imGatherTasks,
+    wrap_future as imWrapFuture
+)
+
+from concurrent.futures import (
+    ThreadPoolExecutor as imThreadPool,
+    Future as imFuture
+)
+from functools import partial as imPartial
+from clockSyncModule import CLOCK_UNAVAILABLE
+from threading import (
+    Thread as imThread,
+    Event as imEvent
+)
+
+class AsyncRuntimeModule():
+    '''Async Runtime Module
+        Runs the network side of the player on one asyncio event loop in its own thread:
+        IP detection, manifest polling, the push subscription, clock synchronization, the
+        play log upload and the media downloads of the prefetcher are tasks of that loop,
+        so a stalled server or a long download never holds up the thread that decides
+        what to play
+
+        The blocking calls of NetworkModule (requests) and FileManagerModule (pooled
+        downloads) are awaited in a small executor, the loop owns their timing, pausing
+        and cancellation. Results go back to the playback side through p_onDone callbacks,
+        which should only hand over (e.g. SchedulerModule.postEvent) and return
+
+    @Usage: (On a project)
+        import asyncRuntimeModule
+
+        g_AsyncRuntimeModule = asyncRuntimeModule.AsyncRuntimeModule()
+        g_AsyncRuntimeModule.c_networkModule = g_NetworkModule
+        g_AsyncRuntimeModule.c_prefetchModule = g_PrefetchModule    ##optional
+        g_AsyncRuntimeModule.c_clockSyncModule = g_ClockSyncModule  ##optional
+        g_AsyncRuntimeModule.c_playLogModule = g_PlayLogModule  ##optional
+        g_AsyncRuntimeModule.start()    ##starts IP detection, polling, the push subscription and the prefetcher
+
+        g_AsyncRuntimeModule.pause()    ##polling, downloads and uploads stop after their current step, e.g. while the media directory is cleaned
+        g_AsyncRuntimeModule.resume()
+
+        ##Any other blocking call can be run as a task of the loop
+        g_AsyncRuntimeModule.runInBackground(g_FileManagerModule.removeStalePartials, g_mediaDir,
+                                             p_onDone = lambda p_result: print('Stale partial downloads removed'))
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+
+        self.c_networkModule = None
+        self.c_prefetchModule = None
+        self.c_clockSyncModule = None
+        self.c_playLogModule = None
+        self.c_ipCheckDelay = 30    ##seconds between checks of the local IP address
+        self.c_maxBlockingWorkers = 4   ##threads for the blocking calls awaited by the tasks
+
+        self.c_loop = None
+        self.c_thread = None
+        self.c_executor = None
+        self.c_tasks = []
+        self.c_isRunning = False
+        self.__c_resumedEvent = None    ##asyncio.Event of the loop, cleared while paused
+        self.__c_isPaused = False   ##kept for __c_resumedEvent, pause may come before start
+
+        self.c_lastError = ''
+
+    def start(self):
+        '''Starts the event loop thread and the network tasks'''
+        m_isStarted = imEvent()
+        self.c_executor = imThreadPool(max_workers = self.c_maxBlockingWorkers)
+        self.c_loop = imNewEventLoop()
+        self.c_isRunning = True
+        self.c_thread = imThread(target = self.__runLoop, args = (m_isStarted,), daemon = True)
+        self.c_thread.start()
+        m_isStarted.wait()
+
+        imRunCoroutine(self.__startTasks(), self.c_loop).result()
+        print('Async runtime started')
+
+    def stop(self):
+        '''Cancels the tasks and stops the event loop thread'''
+        if not self.c_isRunning: return
+        self.c_isRunning = False
+        if self.c_networkModule != None: self.c_networkModule.c_isPersistentCheckingEnabled = False
+        if self.c_prefetchModule != None: self.c_prefetchModule.c_fileManagerModule.c_downloadManager.c_isStopped = True
+        imRunCoroutine(self.__cancelTasks(), self.c_loop).result()
+        self.c_loop.call_soon_threadsafe(self.c_loop.stop)
+        self.c_thread.join()
+        ##The running calls end on their own (request timeouts, a stopped download keeps its
+        ##partial file), the queued ones are not started so the exit is not held up
+        self.c_executor.shutdown(wait = False, cancel_futures = True)
+        print('Async runtime stopped')
+
+    def pause(self):
+        '''Pauses the tasks of the loop but the push subscription after their current step, safe to call from any thread and before start'''
+        self.__c_isPaused = True
+        if self.c_networkModule != None: self.c_networkModule.c_isCheckingPaused = True
+        if self.c_isRunning: self.c_loop.call_soon_threadsafe(self.__applyPause)
+
+    def resume(self):
+        '''Resumes the paused tasks, safe to call from any thread'''
+        self.__c_isPaused = False
+        if self.c_networkModule != None: self.c_networkModule.c_isCheckingPaused = False
+        if self.c_isRunning: self.c_loop.call_soon_threadsafe(self.__applyPause)
+
+    def runInBackground(self, p_function, *p_args, p_onDone=None):
+        '''Runs a blocking function as a task of the loop, returns right away
+            @Params
+                p_function -> the blocking function, e.g. FileManagerModule.syncMedia
+                p_args -> its arguments
+                p_onDone -> called with the result on the loop thread once it is done, optional
+            @Return
+                concurrent.futures.Future of the result'''
+        return imRunCoroutine(self.__runAndReport(p_function, p_args, p_onDone), self.c_loop)
+
+    def __runLoop(self, p_isStarted):
+        '''(Private method)Body of the event loop thread'''
+        imSetEventLoop(self.c_loop)
+        self.__c_resumedEvent = imAsyncEvent()
+        self.__applyPause()
+        self.c_loop.call_soon(p_isStarted.set)
+        self.c_loop.run_forever()
+        self.c_loop.close()
+
+    def __applyPause(self):
+        '''(Private method)Brings __c_resumedEvent to the paused state, runs on the loop thread'''
+        if self.__c_isPaused: self.__c_resumedEvent.clear()
+        else: self.__c_resumedEvent.set()
+
+    async def __startTasks(self):
+        '''(Private method)Creates the network tasks on the loop'''
+        if self.c_prefetchModule != None:
+            self.c_tasks.append(self.c_loop.create_task(self.__prefetchMedia()))
+        if (self.c_clockSyncModule != None) and (self.c_clockSyncModule.c_timeUrl != None):
+            self.c_tasks.append(self.c_loop.create_task(self.__synchronizeClock()))
+        if (self.c_playLogModule != None) and (self.c_playLogModule.c_uploadUrl != None):
+            self.c_tasks.append(self.c_loop.create_task(self.__uploadPlayLog()))
+        if self.c_networkModule == None: return
+        self.c_networkModule.c_isPersistentCheckingEnabled = True
+        self.c_tasks.append(self.c_loop.create_task(self.__detectIP()))
+        self.c_tasks.append(self.c_loop.create_task(self.__pollManifest()))
+        if self.c_networkModule.c_pushUrl != None:
+            self.c_tasks.append(self.c_loop.create_task(self.__subscribePush()))
+
+    async def __cancelTasks(self):
+        '''(Private method)Cancels the tasks and lets them end before the loop is stopped'''
+        for t_task in self.c_tasks: t_task.cancel()
+        await imGatherTasks(*self.c_tasks, return_exceptions = True)
+        self.c_tasks = []
+
+    async def __blocking(self, p_function, *p_args):
+        '''(Private method)Awaits a blocking call in the executor'''
+        return await self.c_loop.run_in_executor(self.c_executor, imPartial(p_function, *p_args))
+
+    async def __blockingInDaemon(self, p_function, *p_args):
+        '''(Private method)Awaits a blocking call on a daemon thread of its own, for a call that
+            can block until its read timeout (the push stream) and must not hold up the exit'''
+        m_future = imFuture()
+        def m_run():
+            try: m_future.set_result(p_function(*p_args))
+            except Exception as e: m_future.set_exception(e)
+        imThread(target = m_run, daemon = True).start()
+        return await imWrapFuture(m_future)
+
+    async def __runAndReport(self, p_function, p_args, p_onDone):
+        '''(Private method)Task of runInBackground'''
+        m_errProcessName = self.__class__.__name__ + '-runInBackground ->'
+        m_result = None
+        try:
+            m_result = await self.__blocking(p_function, *p_args)
+        except Exception as e:
+            self.c_lastError = 'Error in the background task %s: %s%s' % (p_function.__name__, m_errProcessName, str(e.args))
+        if p_onDone != None: p_onDone(m_result)
+        return m_result
+
+    async def __detectIP(self):
+        '''(Private method)Task that keeps c_currentIP of the network module up to date'''
+        try:
+            while self.c_isRunning:
+                await self.__c_resumedEvent.wait()
+                await self.__blocking(self.c_networkModule.fetchCurrentIP)
+                await imAsyncDelay(self.c_ipCheckDelay if self.c_networkModule.c_currentIP != None else 1)
+        except imCancelledError:
+            pass
+
+    async def __pollManifest(self):
+        '''(Private method)Task that polls the server json with the backoff of the network module,
+            only once in a while when the push subscription is connected'''
+        m_network = self.c_networkModule
+        try:
+            while self.c_isRunning:
+                await self.__c_resumedEvent.wait()
+                if m_network.c_currentIP == None:
+                    await imAsyncDelay(.5)
+                    continue
+                await self.__blocking(m_network.fetchJsonFromServer)
+
+                m_delay = m_network.c_pushSafetyPollDelay if m_network.c_isPushConnected else m_network.getNextDelay()
+                while (m_delay > 0) and self.c_isRunning:
+                    ##Wake up early if the push subscription drops so polling takes over right away
+                    await imAsyncDelay(min(m_delay, 1))
+                    m_delay -= 1
+                    if m_network.c_pushUrl and not m_network.c_isPushConnected: m_delay = min(m_delay, m_network.getNextDelay())
+        except imCancelledError:
+            pass
+
+    async def __subscribePush(self):
+        '''(Private method)Task that keeps the push subscription of the network module open'''
+        m_network = self.c_networkModule
+        try:
+            while self.c_isRunning:
+                m_eventCount = m_network.c_pushEventCount
+                await self.__blockingInDaemon(m_network.subscribeToPush)
+                await imAsyncDelay(m_network.getPushRetryDelay(m_network.c_pushEventCount != m_eventCount))
+        except imCancelledError:
+            pass
+
+    async def __prefetchMedia(self):
+        '''(Private method)Task that downloads the missing media, the soonest needed first'''
+        m_prefetch = self.c_prefetchModule
+        try:
+            while self.c_isRunning:
+                await self.__c_resumedEvent.wait()
+                m_prefetch.c_wakeEvent.clear()
+                if await self.__blocking(m_prefetch.prefetchNext): continue
+
+                ##Nothing missing or the server failed, wait for a new json or the idle delay
+                m_delay = m_prefetch.c_idleDelay
+                while (m_delay > 0) and self.c_isRunning and (not m_prefetch.c_wakeEvent.is_set()):
+                    await imAsyncDelay(min(m_delay, 1))
+                    m_delay -= 1
+        except imCancelledError:
+            pass
+
+    async def __synchronizeClock(self):
+        '''(Private method)Task that keeps the clock offset of the clock sync module up to date'''
+        m_clockSync = self.c_clockSyncModule
+        try:
+            while self.c_isRunning:
+                await self.__c_resumedEvent.wait()
+                await self.__blocking(m_clockSync.synchronize)
+                if m_clockSync.getStatus() == CLOCK_UNAVAILABLE:
+                    ##The schedule keeps the minutes of serverDateTime
+                    print('The server has no time endpoint at %s, the clock is not synchronized' % m_clockSync.c_timeUrl)
+                    break
+                await imAsyncDelay(m_clockSync.getNextDelay())
+        except imCancelledError:
+            pass
+
+    async def __uploadPlayLog(self):
+        '''(Private method)Task that uploads the airings of the play log, paced and backed off by the play log'''
+        m_playLog = self.c_playLogModule
+        try:
+            while self.c_isRunning:
+                await self.__c_resumedEvent.wait()
+                await self.__blocking(m_playLog.uploadPending)
+                await imAsyncDelay(m_playLog.getNextDelay())
+        except imCancelledError:
+            pass
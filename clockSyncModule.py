@@ -0,0 +1,180 @@
+from math import ceil as imCeil
+from datetime import timedelta as imTimeDelta
+from time import (
+    time as imTime,
+    sleep as imDelay
+)
+
+##Status of the synchronization, see ClockSyncModule.getStatus
+CLOCK_PENDING = 'pending'   ##no burst went through yet
+CLOCK_SYNCED = 'synced'
+CLOCK_FAILING = 'failing'   ##the last bursts failed, retried with a growing delay
+CLOCK_UNAVAILABLE = 'unavailable'   ##the server has no time endpoint, not asked anymore
+
+class ClockSyncModule():
+    '''Clock Sync Module
+        Estimates how far the local clock is from the server clock the way NTP does, so
+        the screens of a store or a video wall switch their schedules at the same instant
+        instead of up to a minute apart (serverDateTime only has minutes)
+
+        Every exchange with the time endpoint of the server (c_timeUrl, answers
+        {"receive" : t1, "transmit" : t2} in epoch seconds) gives four timestamps:
+
+            t0 -> request sent, local clock       t1 -> request received, server clock
+            t3 -> answer received, local clock    t2 -> answer sent, server clock
+
+            offset = ((t1 - t0) + (t2 - t3)) / 2      delay = (t3 - t0) - (t2 - t1)
+
+        A burst of c_burstSize exchanges keeps the one with the shortest round trip, it
+        is the least skewed by queueing on one direction. Bursts are smoothed into
+        c_offset with c_smoothing, a difference bigger than c_stepThreshold (the clock
+        of the Pi was set, or the first burst) replaces the offset at once
+
+        A burst that failed is retried after c_retryDelay, doubled on every failure in a
+        row up to c_maxRetryDelay (getNextDelay). A server that answers 404 (or 410) to
+        c_maxMissingAnswers bursts in a row has no time endpoint, the status becomes
+        CLOCK_UNAVAILABLE and the caller stops asking
+
+        With the offset, a group of players starts the same media at the same server
+        instant: each one takes getSyncStartTime, pre-rolls the media and calls waitUntil
+
+    @Usage: (On a project)
+        import clockSyncModule
+
+        g_ClockSyncModule = clockSyncModule.ClockSyncModule()
+        g_ClockSyncModule.c_timeUrl = 'http://192.168.1.19:8080/time'
+        g_ClockSyncModule.c_offsetListener = g_FileManagerModule.setTimeOffset
+        g_ClockSyncModule.synchronize()   ##every getNextDelay() seconds until getStatus() is CLOCK_UNAVAILABLE, e.g. by AsyncRuntimeModule
+
+        g_ClockSyncModule.waitUntil(g_ClockSyncModule.getSyncStartTime(5))
+        g_MediaPanelModule.switchMediaList(m_mediaList)
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+
+        self.c_timeUrl = None
+        self.c_burstSize = 8
+        self.c_burstInterval = .05  ##seconds between the exchanges of a burst
+        self.c_maxDelay = 1 ##exchanges with a longer round trip are not used
+        self.c_smoothing = .3   ##weight of a new burst in the offset
+        self.c_stepThreshold = .5   ##seconds of difference that replace the offset instead of smoothing it
+        self.c_syncInterval = 64    ##seconds between bursts once synchronized
+        self.c_retryDelay = 5   ##seconds before the first retry of a failed burst, doubles on every failure
+        self.c_maxRetryDelay = 900
+        self.c_maxMissingAnswers = 3    ##bursts answered 404 in a row after which the endpoint counts as missing
+        self.c_requestTimeout = 5
+        self.c_localClock = imTime  ##the clock being corrected, replaceable to simulate players
+        self.c_offsetListener = None    ##called with the offset in seconds after every burst
+        self.c_stepListener = None  ##called with the offset in seconds when it was replaced instead of smoothed
+
+        self.c_offset = None    ##seconds to add to the local clock to get the server clock
+        self.c_delay = None ##round trip of the exchange the last burst used
+        self.c_jitter = 0   ##smoothed difference of the bursts from the offset
+        self.c_syncCount = 0
+        self.c_stepCount = 0
+        self.c_failures = 0 ##bursts failed in a row
+        self.c_missingCount = 0 ##bursts answered 404 in a row
+        self.c_lastStatusCode = None    ##http status of the last exchange, None if there was no answer
+        self.c_session = None
+
+        self.c_lastError = ''
+
+    def exchange(self):
+        '''One request to the time endpoint
+            @Return
+                (offset, delay) in seconds, None if it failed'''
+        m_errProcessName = self.__class__.__name__ + '-exchange ->'
+        try:
+            if self.c_session == None:
+                ##Imported on the first exchange, see NetworkModule
+                from requests import Session as imSession
+                self.c_session = imSession()
+            self.c_lastStatusCode = None
+            m_sentAt = self.c_localClock()
+            m_response = self.c_session.get(self.c_timeUrl, timeout = self.c_requestTimeout)
+            m_receivedAt = self.c_localClock()
+            self.c_lastStatusCode = m_response.status_code
+            m_response.raise_for_status()
+            m_times = m_response.json()
+            m_serverReceived, m_serverSent = float(m_times['receive']), float(m_times['transmit'])
+            return (((m_serverReceived - m_sentAt) + (m_serverSent - m_receivedAt)) / 2,
+                    (m_receivedAt - m_sentAt) - (m_serverSent - m_serverReceived))
+        except Exception as e:
+            self.c_lastError = 'Error in the time exchange: %s%s' % (m_errProcessName, str(e.args))
+            if self.c_session != None: self.c_session.close()
+            self.c_session = None
+            return None
+
+    def synchronize(self):
+        '''Runs a burst of exchanges and updates the offset
+            @Return
+                the offset in seconds, None if no exchange of the burst was usable'''
+        m_samples = []
+        for t_index in range(self.c_burstSize):
+            t_sample = self.exchange()
+            ##The rest of the burst would get the same answer
+            if self.c_lastStatusCode in (404, 410): break
+            if (t_sample != None) and (t_sample[1] <= self.c_maxDelay): m_samples.append(t_sample)
+            if t_index < self.c_burstSize - 1: imDelay(self.c_burstInterval)
+        if not m_samples:
+            self.c_failures += 1
+            self.c_missingCount = self.c_missingCount + 1 if self.c_lastStatusCode in (404, 410) else 0
+            return None
+        self.c_failures = 0
+        self.c_missingCount = 0
+
+        m_offset, self.c_delay = min(m_samples, key = lambda t_sample: t_sample[1])
+        m_isStep = (self.c_offset == None) or (abs(m_offset - self.c_offset) > self.c_stepThreshold)
+        if m_isStep:
+            self.c_offset = m_offset
+            self.c_jitter = 0
+            self.c_stepCount += 1
+        else:
+            self.c_jitter += self.c_smoothing * (abs(m_offset - self.c_offset) - self.c_jitter)
+            self.c_offset += self.c_smoothing * (m_offset - self.c_offset)
+        self.c_syncCount += 1
+
+        if self.c_offsetListener != None: self.c_offsetListener(self.c_offset)
+        if m_isStep and (self.c_stepListener != None): self.c_stepListener(self.c_offset)
+        return self.c_offset
+
+    def getNextDelay(self):
+        '''Seconds until the next burst, longer on every failure in a row'''
+        if self.c_failures: return min(self.c_retryDelay * 2 ** (self.c_failures - 1), self.c_maxRetryDelay)
+        return self.c_syncInterval
+
+    def getStatus(self):
+        '''Returns CLOCK_PENDING, CLOCK_SYNCED, CLOCK_FAILING or CLOCK_UNAVAILABLE'''
+        if self.c_missingCount >= self.c_maxMissingAnswers: return CLOCK_UNAVAILABLE
+        if self.c_failures: return CLOCK_FAILING
+        return CLOCK_SYNCED if self.c_offset != None else CLOCK_PENDING
+
+    def getServerTime(self):
+        '''Epoch seconds on the server clock, the local clock until the first burst'''
+        return self.c_localClock() + (self.c_offset or 0)
+
+    def getTimeDeviation(self):
+        '''The offset as the timedelta FileManagerModule.c_timeDeviation is'''
+        return imTimeDelta(seconds = self.c_offset or 0)
+
+    def getSyncStartTime(self, p_quantum, p_lead=1):
+        '''Server instant for a synchronized start, the first multiple of p_quantum seconds at
+            least p_lead seconds away, so players that ask within the same p_quantum window
+            pick the same instant without talking to each other'''
+        return imCeil((self.getServerTime() + p_lead) / float(p_quantum)) * p_quantum
+
+    def waitUntil(self, p_serverTime):
+        '''Sleeps until the server clock reaches p_serverTime, the last milliseconds in short
+            sleeps so the wake up is not late by a whole timer slack
+            @Return
+                seconds it woke up late'''
+        while True:
+            m_remaining = p_serverTime - self.getServerTime()
+            if m_remaining <= 0: return -m_remaining
+            imDelay(m_remaining - .002 if m_remaining > .004 else .0002)
@@ -0,0 +1,369 @@
+from os import (
+    path as imPath,
+    remove as imDelete,
+    replace as imReplaceFile,
+    fsync as imFlushToDisk
+)
+
+from re import match as imRegExMatch
+from hashlib import (
+    new as imNewHash,
+    algorithms_available as imHashAlgorithms
+)
+from base64 import b64decode as imBase64Decode
+from time import sleep as imDelay
+
+from http.client import (
+    HTTPConnection as imHTTPConnection,
+    HTTPSConnection as imHTTPSConnection,
+    HTTPException as imHTTPException
+)
+
+from urllib.parse import (
+    urlsplit as imSplitUrl,
+    quote as imEscapeUrl
+)
+
+from threading import (
+    local as imThreadLocal,
+    Lock as imLock
+)
+
+from concurrent.futures import ThreadPoolExecutor as imThreadPool
+from timeit import default_timer as imTimer
+
+PARTIAL_DOWNLOAD_SUFFIX = '.part'
+##ETag or Last-Modified of the version a partial file was started from, sent as If-Range on resume
+VALIDATOR_SUFFIX = '.validator' + PARTIAL_DOWNLOAD_SUFFIX
+
+##Length of a hex digest -> hash algorithm, for checksums given without an algorithm
+CHECKSUM_ALGORITHMS = {32 : 'md5', 40 : 'sha1', 64 : 'sha256'}
+
+class DownloadVerificationError(Exception):
+    '''The downloaded file does not match the expected length or checksum'''
+
+class DownloadRefusedError(IOError):
+    '''The server does not have the file, retrying will not help'''
+
+class DownloadManagerModule():
+    '''Download Manager Module
+        Downloads media files from the server with a bounded pool of worker threads,
+        each worker keeps its own keep-alive connection to the download url so a
+        playlist does not open a new connection for every file. The pool lives as
+        long as the module, the next batch (or the single file of the prefetcher)
+        goes over the connections of the last one
+
+        Files are streamed in chunks to a partial file beside the target. A dropped
+        transfer keeps the partial file and continues with an HTTP Range request, the
+        result is checked against the expected length and checksum and only then
+        moved in place, so a file under its final name is always complete
+
+        The validator (strong ETag or Last-Modified) of the response that started the
+        partial file is kept beside it and sent as If-Range, a file that changed on
+        the server in the meantime comes back whole (200) and the transfer starts over
+
+        With c_peerShareModule the first attempt fetches what it can from the players
+        of the same store (PeerShareModule), the server only sends the rest. A file
+        from the peers that fails verification is downloaded again from the server
+
+    @Usage: (On a project)
+        import downloadManagerModule
+
+        g_DownloadManagerModule = downloadManagerModule.DownloadManagerModule()
+        g_DownloadManagerModule.c_downloadUrl = 'http://192.168.1.19:8080/download?file='
+        g_DownloadManagerModule.c_maxWorkers = 4
+        g_DownloadManagerModule.downloadFiles('/home/pi/media files/', ['rpi1.mp4', 'rpi2.mp4'])
+        print(g_DownloadManagerModule.c_totalBytes, g_DownloadManagerModule.getAggregateRate())
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+
+        self.c_downloadUrl = None
+        self.c_maxWorkers = 4   ##concurrency limit, also the number of open connections
+        self.c_chunkSize = 64 * 1024
+        self.c_timeout = 30
+        self.c_maxRetries = 5   ##attempts after the first one, each resumes where the last one stopped
+        self.c_retryDelay = 1   ##seconds before the first retry, doubles on every retry
+        self.c_peerShareModule = None   ##PeerShareModule asked before the server, None to only use the server
+        self.c_isStopped = False    ##set when the player exits, transfers end after their current chunk
+
+        ##One connection per worker thread, reused across files and batches
+        self.__c_threadLocal = imThreadLocal()
+        self.__c_pool = None
+        self.__c_poolSize = None
+        self.__c_statsLock = imLock()
+
+        ##Throughput of the last downloadFiles call
+        self.c_fileStats = []   ##dicts of fileName, bytes, seconds
+        self.c_totalBytes = 0
+        self.c_totalSeconds = 0
+        self.c_failedFiles = []
+
+        ##Totals since the module was created
+        self.c_downloadedBytes = 0
+        self.c_downloadedFileCount = 0
+        self.c_failedFileCount = 0
+
+        self.c_lastError = ''
+
+    def downloadFile(self, p_mediaDir, p_mediaFile, p_expectedSize=None, p_checksum=None):
+        '''Downloads a single file into the media directory, through a partial file
+            that is moved in place once complete and verified
+            @Params
+                p_mediaDir -> directory where the file will be saved
+                p_mediaFile -> file name to download
+                p_expectedSize -> size in bytes given by the server json, optional
+                p_checksum -> "algorithm:hexdigest" or a bare md5/sha1/sha256 hex digest, optional
+            @Return
+                (bytes, seconds) -> bytes transferred by this call (a resumed file counts only the rest)
+                None -> if the download failed, see c_lastError'''
+
+        m_errProcessName = self.__class__.__name__ + '-downloadFile ->'
+        m_partialFile = p_mediaDir + p_mediaFile + PARTIAL_DOWNLOAD_SUFFIX
+        m_validatorFile = p_mediaDir + p_mediaFile + VALIDATOR_SUFFIX
+        m_started = imTimer()
+        m_bytes = 0
+
+        for t_attempt in range(self.c_maxRetries + 1):
+            if t_attempt: imDelay(self.c_retryDelay * 2 ** (t_attempt - 1))
+            if self.c_isStopped: break
+            try:
+                m_totalSize, m_digest = None, None
+                if (t_attempt == 0) and (self.c_peerShareModule != None):
+                    m_received, m_totalSize = self.c_peerShareModule.fetchToPartial(p_mediaFile, m_partialFile, p_expectedSize, p_checksum)
+                    m_bytes += m_received
+                if m_totalSize == None:
+                    m_received, m_totalSize, m_digest = self.__transferToPartial(p_mediaFile, m_partialFile, m_validatorFile)
+                    m_bytes += m_received
+                self.__verifyPartial(m_partialFile, m_totalSize, p_expectedSize, p_checksum or m_digest)
+                imReplaceFile(m_partialFile, p_mediaDir + p_mediaFile)
+                if imPath.exists(m_validatorFile): imDelete(m_validatorFile)
+                return m_bytes, imTimer() - m_started
+
+            except DownloadVerificationError as e:
+                ##Bad content can not be resumed, start over from zero
+                self.c_lastError = 'Downloaded file %s failed verification: %s%s' % (p_mediaFile, m_errProcessName, str(e.args))
+                if imPath.exists(m_partialFile): imDelete(m_partialFile)
+                if imPath.exists(m_validatorFile): imDelete(m_validatorFile)
+            except DownloadRefusedError as e:
+                self.c_lastError = 'Error in downloading the file %s: %s%s' % (p_mediaFile, m_errProcessName, str(e.args))
+                break
+            except Exception as e:
+                ##Keep the partial file, the next attempt continues from where this one stopped
+                self.c_lastError = 'Error in downloading the file %s: %s%s' % (p_mediaFile, m_errProcessName, str(e.args))
+                self.__closeConnection()
+
+        return None
+
+    def __transferToPartial(self, p_mediaFile, p_partialFile, p_validatorFile):
+        '''(Private method)Appends the rest of the file to the partial file, only if the
+            server still has the version the partial file was started from
+            @Return
+                (bytes received, total size or None, server digest or None)'''
+
+        m_offset = imPath.getsize(p_partialFile) if imPath.exists(p_partialFile) else 0
+        m_headers = {}
+        if m_offset:
+            m_headers['Range'] = 'bytes=%d-' % m_offset
+            ##Without a validator (partial file from the peers, or a server that sends none) the
+            ##range is asked as is, a mixed file is then caught by the length and checksum
+            if imPath.exists(p_validatorFile):
+                with open(p_validatorFile, 'r') as t_validatorFile: m_headers['If-Range'] = t_validatorFile.read().strip()
+        m_response = self.__request(self.c_downloadUrl + imEscapeUrl(p_mediaFile), m_headers)
+
+        if m_response.status == 416:
+            ##Nothing left after the offset, the partial file is already whole (or too long)
+            m_response.read()
+            return 0, self.__getTotalSize(m_response, m_offset), self.__getDigest(m_response)
+        if m_response.status == 200:
+            m_offset = 0    ##server ignored the range or the file changed (If-Range), start over
+        elif m_response.status != 206:
+            m_response.read()
+            if m_response.status in (403, 404, 410): raise DownloadRefusedError('Server answered %d %s' % (m_response.status, m_response.reason))
+            raise IOError('Server answered %d %s' % (m_response.status, m_response.reason))
+        elif not (m_response.getheader('Content-Range') or '').startswith('bytes %d-' % m_offset):
+            m_response.read()
+            raise IOError('Server resumed at the wrong offset: %s' % m_response.getheader('Content-Range'))
+
+        self.__saveValidator(m_response, p_validatorFile)
+        m_received = 0
+        with open(p_partialFile, 'r+b' if m_offset else 'wb') as t_file:
+            t_file.seek(m_offset)
+            t_file.truncate()
+            while True:
+                ##A stopped transfer keeps its partial file to be resumed on the next start
+                if self.c_isStopped: raise IOError('Download stopped')
+                t_chunk = m_response.read(self.c_chunkSize)
+                if not t_chunk: break
+                t_file.write(t_chunk)
+                m_received += len(t_chunk)
+            t_file.flush()
+            imFlushToDisk(t_file.fileno())
+        return m_received, self.__getTotalSize(m_response, m_offset), self.__getDigest(m_response)
+
+    def __saveValidator(self, p_response, p_validatorFile):
+        '''(Private method)Keeps the strong ETag, or else the Last-Modified date, of the response
+            for the If-Range of the next resume, weak ETags can not be used in If-Range'''
+        m_validator = p_response.getheader('ETag')
+        if (m_validator == None) or m_validator.startswith('W/'): m_validator = p_response.getheader('Last-Modified')
+        if m_validator != None:
+            with open(p_validatorFile, 'w') as t_validatorFile: t_validatorFile.write(m_validator)
+        elif imPath.exists(p_validatorFile):
+            imDelete(p_validatorFile)
+
+    def __verifyPartial(self, p_partialFile, p_totalSize, p_expectedSize, p_checksum):
+        '''(Private method)Raises IOError if the partial file is still short, DownloadVerificationError
+            if it does not match the announced length or the checksum, a checksum of an algorithm
+            hashlib does not have (or of variable length) leaves only the length verified'''
+        m_size = imPath.getsize(p_partialFile)
+        for t_size in (p_totalSize, p_expectedSize):
+            if (t_size == None) or (int(t_size) == m_size): continue
+            if m_size < int(t_size): raise IOError('Transfer ended at %d of %d bytes' % (m_size, int(t_size)))
+            raise DownloadVerificationError('File is %d bytes, expected %d' % (m_size, int(t_size)))
+
+        if not p_checksum: return
+        if ':' in p_checksum: m_algorithm, m_expectedDigest = p_checksum.split(':', 1)
+        else: m_algorithm, m_expectedDigest = CHECKSUM_ALGORITHMS.get(len(p_checksum), 'md5'), p_checksum
+        m_algorithm = m_algorithm.replace('-', '').lower()
+        if (m_algorithm not in imHashAlgorithms) or m_algorithm.startswith('shake'):
+            ##Retrying would not make it known, the length checked above is all that can be verified
+            self.c_lastError = 'Checksum algorithm %s is not supported, only the size of the file was verified' % m_algorithm
+            return
+        m_hash = imNewHash(m_algorithm)
+        with open(p_partialFile, 'rb') as t_file:
+            for t_chunk in iter(lambda: t_file.read(self.c_chunkSize), b''): m_hash.update(t_chunk)
+        if m_hash.hexdigest() != m_expectedDigest.lower():
+            raise DownloadVerificationError('%s checksum mismatch' % m_algorithm)
+
+    def __getTotalSize(self, p_response, p_offset):
+        '''(Private method)Full size of the file from Content-Range, or from Content-Length of a whole response'''
+        m_contentRange = imRegExMatch(r'bytes (?:\d+-\d+|\*)/(\d+)', p_response.getheader('Content-Range') or '')
+        if m_contentRange: return int(m_contentRange.group(1))
+        if (p_response.status == 200) and (p_response.getheader('Content-Length') != None):
+            return int(p_response.getheader('Content-Length'))
+        return None
+
+    def __getDigest(self, p_response):
+        '''(Private method)Checksum announced by the server in a "Digest: sha-256=<base64>" header'''
+        for t_digest in (p_response.getheader('Digest') or '').split(','):
+            t_algorithm, t_separator, t_value = t_digest.strip().partition('=')
+            if t_separator and t_algorithm.lower() in ('sha-256', 'sha-1', 'md5'):
+                return '%s:%s' % (t_algorithm.replace('-', '').lower(), imBase64Decode(t_value).hex())
+        return None
+
+    def downloadFiles(self, p_mediaDir, p_mediaFiles, p_mediaInfo=None):
+        '''Downloads a list of files with at most c_maxWorkers at a time
+            @Params
+                p_mediaDir -> directory where the files will be saved
+                p_mediaFiles -> list of file names to download
+                p_mediaInfo -> file name -> media dict of the server json, for its size and checksum
+            @Return
+                list of the file names that failed'''
+
+        if p_mediaInfo == None: p_mediaInfo = {}
+        self.c_fileStats = []
+        self.c_failedFiles = []
+        self.c_totalBytes = 0
+        m_started = imTimer()
+
+        m_results = self.__getPool().map(lambda t_file: self.__downloadAndRecord(p_mediaDir, t_file, p_mediaInfo.get(t_file, {})), p_mediaFiles)
+        for t_mediaFile, t_result in zip(p_mediaFiles, m_results):
+            if t_result == None: self.c_failedFiles.append(t_mediaFile)
+
+        self.c_totalSeconds = imTimer() - m_started
+        self.c_downloadedBytes += self.c_totalBytes
+        self.c_downloadedFileCount += len(self.c_fileStats)
+        self.c_failedFileCount += len(self.c_failedFiles)
+        print('\tDownloaded %d files, %s in %.1fs (%s/s)' % (len(self.c_fileStats), self.formatSize(self.c_totalBytes),
+                                                         self.c_totalSeconds, self.formatSize(self.getAggregateRate())))
+        return self.c_failedFiles
+
+    def getRemoteSize(self, p_mediaFile):
+        '''Size of a file on the server, from the Content-Length of a HEAD request
+            @Return
+                number of bytes, None if the server did not tell'''
+        m_errProcessName = self.__class__.__name__ + '-getRemoteSize ->'
+        try:
+            m_response = self.__request(self.c_downloadUrl + imEscapeUrl(p_mediaFile), p_method = 'HEAD')
+            m_response.read()
+            if (m_response.status != 200) or (m_response.getheader('Content-Length') == None): return None
+            return int(m_response.getheader('Content-Length'))
+        except Exception as e:
+            self.c_lastError = 'Error in asking the size of %s: %s%s' % (p_mediaFile, m_errProcessName, str(e.args))
+            self.__closeConnection()
+            return None
+
+    def getAggregateRate(self):
+        '''Bytes per second of the last downloadFiles call'''
+        if self.c_totalSeconds <= 0: return 0
+        return self.c_totalBytes / self.c_totalSeconds
+
+    def formatSize(self, p_bytes):
+        '''Human readable size of a number of bytes'''
+        for t_unit in ['B', 'KB', 'MB']:
+            if p_bytes < 1024: return '%.1f%s' % (p_bytes, t_unit)
+            p_bytes /= 1024.0
+        return '%.1fGB' % p_bytes
+
+    def __downloadAndRecord(self, p_mediaDir, p_mediaFile, p_media):
+        '''(Private method)Worker of downloadFiles, keeps the per file stats'''
+        m_result = self.downloadFile(p_mediaDir, p_mediaFile, p_media.get('size'), p_media.get('checksum'))
+        if m_result == None:
+            print('\tError downloading %s: %s' % (p_mediaFile, self.c_lastError))
+            return None
+
+        m_bytes, m_seconds = m_result
+        with self.__c_statsLock:
+            self.c_fileStats.append({'fileName' : p_mediaFile, 'bytes' : m_bytes, 'seconds' : m_seconds})
+            self.c_totalBytes += m_bytes
+        print('\tDone downloading %s, %s in %.1fs (%s/s)' % (p_mediaFile, self.formatSize(m_bytes), m_seconds,
+                                                         self.formatSize(m_bytes / m_seconds if m_seconds > 0 else 0)))
+        return m_result
+
+    def __request(self, p_url, p_headers=None, p_method='GET'):
+        '''(Private method)Sends a request (GET by default) on the connection of the current thread,
+            reconnects once if the server had closed the kept alive connection'''
+        m_url = imSplitUrl(p_url)
+        m_path = m_url.path + ('?' + m_url.query if m_url.query else '')
+        for t_attempt in range(2):
+            m_connection = self.__getConnection(m_url)
+            try:
+                m_connection.request(p_method, m_path, headers = p_headers or {})
+                return m_connection.getresponse()
+            except (OSError, imHTTPException):
+                self.__closeConnection()
+                if t_attempt: raise
+
+    def __getPool(self):
+        '''(Private method)Worker pool of downloadFiles, made again only when c_maxWorkers changed,
+            the connections of the old pool go with its workers'''
+        if (self.__c_pool != None) and (self.__c_poolSize != max(1, self.c_maxWorkers)):
+            self.__c_pool.shutdown(wait = False)
+            self.__c_pool = None
+        if self.__c_pool == None:
+            self.__c_poolSize = max(1, self.c_maxWorkers)
+            self.__c_pool = imThreadPool(max_workers = self.__c_poolSize, thread_name_prefix = 'download')
+        return self.__c_pool
+
+    def __getConnection(self, p_url):
+        '''(Private method)Connection of the current worker thread to the host of p_url'''
+        m_key = (p_url.scheme, p_url.netloc)
+        if getattr(self.__c_threadLocal, 'key', None) != m_key:
+            self.__closeConnection()
+            if p_url.scheme == 'https': self.__c_threadLocal.connection = imHTTPSConnection(p_url.netloc, timeout = self.c_timeout)
+            else: self.__c_threadLocal.connection = imHTTPConnection(p_url.netloc, timeout = self.c_timeout)
+            self.__c_threadLocal.key = m_key
+        return self.__c_threadLocal.connection
+
+    def __closeConnection(self):
+        '''(Private method)Drops the connection of the current thread'''
+        if getattr(self.__c_threadLocal, 'connection', None) != None:
+            self.__c_threadLocal.connection.close()
+        self.__c_threadLocal.connection = None
+        self.__c_threadLocal.key = None
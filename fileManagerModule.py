@@ -1,257 +1,481 @@
-from os import (
-    path as imPath,
-    popen as imShell,
-    remove as imDelete,
-    getcwd as imGetCurrentDir,
-    listdir as imListFile,
-    makedirs as imMakeDirs
-)
-
-from re import sub as imRegEx
-
-from json import (
-    load as imJsonLoad,
-    dump as imSaveJson
-)
-
-from datetime import (
-    datetime as imDatetime,
-    timedelta as imTimeDelta
-)
-
-from urllib.request import (
-    urlretrieve as imDownload,
-    quote as imEscapeUrl
-)
-
-class FileManagerModule():
-    '''File Manager Module
-        Module that anages the media files, loads the system configurations 
-        and caches theserver instructions incase the media player goes offline
-        
-    @Usage: (On a project)
-        import fileManagerModule
-        
-        g_sysSettingsDir = '/home/pi/Desktop/Python files/python classes/System Config.ini' ##main configuration settings
-        g_cachedJsonDir = '/home/pi/Desktop/Python files/python classes/cachedSched.json' ##where the cached json will be stored
-        g_mediaDir = '/home/pi/Desktop/' #Where the downloaded media files will be stored
-        g_downloadUrl = 'http://192.168.1.19:8080/download?file='
-        
-        ##fabricate a json to manage
-        g_mediaFiles = {'mediaFiles' : [{"fileName":"Big Buck Bunny.mp4","startTime":"13:00","endTime":"14:00"},
-                        {"fileName":"rpi1.mp4","startTime":"11:00","endTime":"12:00"},
-                        {"fileName":"rpi2.mp4","startTime":None,"endTime":None},
-                        {"fileName":"rpi3.mp4","startTime":None,"endTime":None},
-                        {"fileName":"Cloudytime.mp4","startTime":"15:00","endTime":"15:30"},
-                        {"fileName":"City and Streets.mp4","startTime":None,"endTime":None}
-                        ]}
-        
-        g_FileManagerModule = fileManagerModule.FileManagerModule()
-        g_FileManagerModule.c_cachedJson = g_mediaFiles
-        g_FileManagerModule.c_sysSettingsFile = g_sysSettingsDir
-        g_FileManagerModule.c_cachedJsonFile = g_cachedJsonDir
-        g_FileManagerModule.arrangeMediaList()
-        g_FileManagerModule.c_downloadUrl = g_downloadUrl
-        
-    @Variable / Method prefixes:
-        im -> Imported method
-        c_ -> Class variable
-        m_ -> Method variable
-        t_ -> temporary variable
-        __ -> methods to be used only by the class
-    '''
-    def __init__(self):
-        
-        ##Containers for file directories
-        self.c_sysSettingsFile = None
-        self.c_cachedJsonFile = None
-        self.c_downloadUrl = None
-
-        ##Media files containers
-        self.c_mediaWithSched = []
-        self.c_mediaWithoutSched = []
-        self.c_scheduledToPlayNow = None
-        
-        ##Containers for the json data
-        self.c_cachedJson = {}  ##stored json, this will always be updated when server json has updated
-        self.c_sysSettings = {}
-
-        self.c_serverTime = None
-        self.c_timeDeviation = None
-
-        self.c_lastError = ''
-
-    def getCachedJson(self):
-        '''Retrieves the contents of the json file'''
-        
-        m_errProcessName = self.__class__.__name__ + '-getCachedJson ->'
-        
-        try:
-            ##Incase no json directory was assigned yet
-            if self.c_cachedJsonFile == None: self.c_cachedJsonFile = imGetCurrentDir() + '/configurations/cachedSched.json'
-            
-            with open(self.c_cachedJsonFile, 'r') as t_jsonFile:
-                self.c_cachedJson = imJsonLoad(t_jsonFile)
-            return self.c_cachedJson
-        
-        except Exception as e:
-            self.c_lastError = 'Error in retrieving the stored Json: %s%s' % (m_errProcessName, str(e.args))
-            return {}
-
-    def getSysSettings(self):
-        '''Retrieves the contents of the json file'''
-        
-        m_errProcessName = self.__class__.__name__ + '-getSysSettings ->'
-        
-        try:
-            ##Incase no json directory was assigned yet, create default directory
-            if self.c_sysSettingsFile == None: self.c_sysSettingsFile = imGetCurrentDir() + '/configurations/systemSetting.json'
-            
-            with open(self.c_sysSettingsFile, 'r') as t_settingsFile:
-                self.c_sysSettingsFile = imJsonLoad(t_settingsFile)
-            return self.c_sysSettings
-
-        except Exception as e:
-            self.c_lastError = 'Error in retrieving the system settings: %s%s' % (m_errProcessName, str(e.args))
-            return {}
-    
-    def arrangeMediaList(self, p_mediaDir):
-        '''Segregates the list of media files taken from the server response
-            fills up the list of media that doesn't have schedule and media that has.
-            Also adds the media directory to the media filenames upon segregation
-            @Params
-                p_mediaDir -> the media directory that is to be added to the filename of the unscheduled media'''
-        
-        for t_media in self.c_cachedJson['mediaFiles']:
-            
-            m_mediaWithoutSched = t_media.copy()
-            if 'fileName' in t_media: m_mediaWithoutSched['fileName'] = p_mediaDir + t_media['fileName']
-            
-            if (t_media['startTime'] == None) or (not t_media['startTime'].strip()):
-                ##Media without schedule are treated differently they need directory in their file name
-                self.c_mediaWithoutSched.append(p_mediaDir + t_media['fileName'])
-            else:
-                self.c_mediaWithSched.append(t_media)
-
-    def isThereScheduledToPlayNow(self):
-        '''Checks if there is a media supposed to play in the current time that this method was called
-            @Return
-                True -> If a media scheduled to play was found, also sets the scheduled media
-                False -> If no media was to play yet'''
-        m_errProcessName = self.__class__.__name__ + '-isThereScheduledToPlayNow ->'
-        try:
-            ##periodically calculate the current server time before checking for new media
-            self.c_serverTime = (imDatetime.now() + self.c_timeDeviation).time()
-            for t_media in self.c_mediaWithSched:
-                if ( (imDatetime.strptime(t_media['startTime'],'%H:%M').time() <= self.c_serverTime) and
-                         ( imDatetime.strptime(t_media['endTime'],'%H:%M').time() >= self.c_serverTime) ):
-                    self.c_scheduledToPlayNow = t_media['fileName']
-                    return True
-                
-            return False
-        except Exception as e:
-            self.c_lastError = 'Error in checking the scheduled medias: %s%s' % (m_errProcessName, str(e.args))
-            return False
-
-    def calcTimeDeviation(self):
-        '''Calculates the difference between the server and the client time'''
-        
-        m_errProcessName = self.__class__.__name__ + '-calcTimeDeviation ->'
-        try:
-            self.c_timeDeviation = imDatetime.strptime(self.c_cachedJson['serverDateTime'], '%Y-%m-%d %H:%M') - imDatetime.now()
-            self.c_serverTime = (imDatetime.now() + self.c_timeDeviation).time()
-        except Exception as e:
-            self.c_lastError = 'Unable to calculate time difference between server and client: %s%s' % (m_errProcessName, str(e.args))
-
-    def saveJson(self):
-        '''Dumps the newly acquired json file from server to a file so even when the server is offline
-            the program still have a copy of the instructions'''
-        
-        m_errProcessName = self.__class__.__name__ + '-saveJson ->'
-        try:
-            if self.c_cachedJsonFile == None: self.c_cachedJsonFile = imGetCurrentDir() + '/configurations/cachedJson.json'
-            with open(self.c_cachedJsonFile, 'w+') as t_jsonFile:
-                imSaveJson(self.c_cachedJson, t_jsonFile)
-        except Exception as e:
-            self.c_lastError = 'Error in saving json: %s%s' % ( m_errProcessName, str(e.args) )
-            
-    def getLocalStorageSize(self):
-        '''Calculates the remaining space in the local storage
-            @Returns
-                0 -> if given directory is invalid or theres an error in procedure
-                number in KB, MB or GB -> if successfully queried'''
-        
-        m_errProcessName = self.__class__.__name__ + '-getLocalStorageSize ->'
-        try:
-            m_probeCommand = imShell('df -h /' ).read().strip().split('\n')
-            if len(m_probeCommand) == 1:
-                self.c_lastError = 'There must be an error with the root director to check: %s%s' % (m_errProcessName, str(e.args))
-                return 0
-            return imRegEx(' +',' ', m_probeCommand[1]).split(' ')[3]
-        except Exception as e:
-            self.c_lastError = 'Error in parsing the available storage size: %s%s' % (m_probeCommand, str(e.args))
-            return 0
-
-    def downloadMedia(self, p_mediaDir, p_mediaFile):
-        '''Checks if the file already exist, download if not
-            @Params
-                p_mediaDir -> Directory which the file will be searched and saved into
-                p_mediaFile -> File to be download'''
-        
-        m_errProcessName = self.__class__.__name__ + '-downloadMedia ->'
-        
-        ##NEEDS overwriting condition
-        try:
-            if self.getLocalStorageSize() == 0:
-                self.c_lastError = 'Error in downloading! Local storage might be full! %s' % m_errProcessName
-                print(self.c_lastError)
-                return
-            if not imPath.exists(p_mediaDir + p_mediaFile):
-                print('\tDone downloading %s' % p_mediaFile)
-                imDownload(self.c_downloadUrl + imEscapeUrl(p_mediaFile), p_mediaDir + p_mediaFile)
-                
-            else:
-                print('\tSkipping %s, file already exist' % p_mediaFile)
-        except Exception as e:
-            self.c_lastError = 'Error in downloading the file %s: %s%s' % (p_mediaFile, m_errProcessName, str(e.args))
-            if str(e.args) == '()': print('Error downloading %s file might not be available in the server' % p_mediaFile)
-
-    def downloadListOfMedia(self, p_mediaDir, p_mediaListType=0):
-        '''Downloads all the media listed in cached json
-            @Params:
-                p_mediaDir -> Directory which the file will be searched and saved into
-                p_mediaListType -> list of media files that will be downloaded:
-                                    0 - ALL
-                                    1 - Media list that has schedule
-                                    2 - Media list that has no schedule'''
-        
-        if p_mediaListType == 0: m_mediaList = self.c_cachedJson['mediaFiles']
-        elif p_mediaListType == 1: m_mediaList = self.c_mediaWithSched.copy()
-        else: m_mediaList = self.c_mediaWithoutSched.copy()
-        
-        for t_media in m_mediaList:
-            self.downloadMedia(p_mediaDir, t_media['fileName'])
-        print('Download list accommodated')
-            
-    def deleteAllMedia(self, p_mediaDir):
-        '''Deletes the medias that are not in the list of medias to be played
-            @Params
-                p_mediaDir -> directory where the media files was located'''
-
-        print('Deleting all previously used medias')
-        m_targetFiles = imListFile(p_mediaDir)
-        for t_mediaFile in m_targetFiles: self.deleteMedia(p_mediaDir, t_mediaFile)
-        print('Obsolete medias deleted')
-        
-    def deleteMedia(self, p_mediaDir, p_fileName):
-        '''Deletes a specified target file
-            @Params
-                p_mediaDir -> directory where the media files was located
-                p_fileName -> the target filename'''
-        
-        m_errProcessName = self.__class__.__name__ + '-deleteMedia ->'
-        try:
-            print('Deleting %s%s' % (p_mediaDir, p_fileName))
-            if ( imPath.exists(p_mediaDir + p_fileName) ): imDelete(p_mediaDir + p_fileName)
-        except Exception as e:
-            self.c_lastError = 'Error in deleting file: %s%s' % ( m_errProcessName, str(e.args) )
+from os import (
+    path as imPath,
+    remove as imDelete,
+    getcwd as imGetCurrentDir,
+    listdir as imListFile,
+    makedirs as imMakeDirs
+)
+
+from json import load as imJsonLoad
+
+from datetime import (
+    datetime as imDatetime,
+    timedelta as imTimeDelta
+)
+
+from scheduleIndexModule import ScheduleIndexModule as imScheduleIndex
+from mediaCacheModule import MediaCacheModule as imMediaCache
+from manifestStoreModule import (
+    ManifestStoreModule as imManifestStore,
+    DOWNLOAD_DOWNLOADING,
+    DOWNLOAD_COMPLETE,
+    DOWNLOAD_FAILED
+)
+from downloadManagerModule import (
+    DownloadManagerModule as imDownloadManager,
+    PARTIAL_DOWNLOAD_SUFFIX,
+    VALIDATOR_SUFFIX
+)
+
+##Optional keys of a media entry in the server json that tell two versions of a file apart
+MEDIA_IDENTITY_KEYS = ('size', 'etag', 'checksum')
+
+class FileManagerModule():
+    '''File Manager Module
+        Module that anages the media files, loads the system configurations 
+        and caches theserver instructions incase the media player goes offline
+        
+    @Usage: (On a project)
+        import fileManagerModule
+        
+        g_sysSettingsDir = '/home/pi/Desktop/Python files/python classes/System Config.ini' ##main configuration settings
+        g_cachedJsonDir = '/home/pi/Desktop/Python files/python classes/cachedSched.json' ##where the cached json will be stored
+        g_mediaDir = '/home/pi/Desktop/' #Where the downloaded media files will be stored
+        g_downloadUrl = 'http://192.168.1.19:8080/download?file='
+        
+        ##fabricate a json to manage
+        g_mediaFiles = {'mediaFiles' : [{"fileName":"Big Buck Bunny.mp4","startTime":"13:00","endTime":"14:00"},
+                        {"fileName":"rpi1.mp4","startTime":"11:00","endTime":"12:00"},
+                        {"fileName":"rpi2.mp4","startTime":None,"endTime":None},
+                        {"fileName":"rpi3.mp4","startTime":None,"endTime":None},
+                        {"fileName":"Cloudytime.mp4","startTime":"15:00","endTime":"15:30"},
+                        {"fileName":"City and Streets.mp4","startTime":None,"endTime":None}
+                        ]}
+        
+        g_FileManagerModule = fileManagerModule.FileManagerModule()
+        g_FileManagerModule.c_cachedJson = g_mediaFiles
+        g_FileManagerModule.c_sysSettingsFile = g_sysSettingsDir
+        g_FileManagerModule.c_cachedJsonFile = g_cachedJsonDir
+        g_FileManagerModule.arrangeMediaList()
+        g_FileManagerModule.c_downloadUrl = g_downloadUrl
+        
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+        
+        ##Containers for file directories
+        self.c_sysSettingsFile = None
+        self.c_cachedJsonFile = None    ##json file of older versions, imported into the manifest store once
+        self.c_downloadUrl = None
+        self.c_maxDownloadWorkers = 4   ##number of files downloaded at the same time
+        self.c_downloadManager = imDownloadManager()
+        self.c_mediaCache = imMediaCache() ##keeps the media directory within its byte budget
+        self.c_manifestStore = imManifestStore()    ##versions of the server json and the download states
+        self.c_transcodeModule = None   ##see TranscodeModule, the downloaded videos are handed to it when set
+        self.c_metadataIndex = None ##see MetadataIndexModule, the downloaded media are indexed by it when set
+        self.c_mediaCache.c_forgetListener = self.__forgetMedia
+        self.c_mediaCache.c_derivedBytesGetter = self.__getDerivedBytes
+
+        ##Media files containers
+        self.c_mediaWithSched = []
+        self.c_mediaWithoutSched = []
+        self.c_scheduledToPlayNow = None
+        self.c_scheduleIndex = imScheduleIndex()    ##compiled from c_mediaWithSched on every arrangeMediaList
+        
+        ##Containers for the json data
+        self.c_cachedJson = {}  ##stored json, this will always be updated when server json has updated
+        self.c_sysSettings = {}
+
+        self.c_serverTime = None
+        self.c_timeDeviation = None
+
+        self.c_lastError = ''
+
+    def getCachedJson(self):
+        '''Retrieves the current version of the server json from the manifest store, the
+            json file of an older version of the player is imported on the first start'''
+        
+        m_errProcessName = self.__class__.__name__ + '-getCachedJson ->'
+        
+        try:
+            if not self.openManifestStore(): raise IOError(self.c_manifestStore.c_lastError)
+            if (self.c_manifestStore.c_currentVersion == None) and (self.c_cachedJsonFile != None) and imPath.isfile(self.c_cachedJsonFile):
+                with open(self.c_cachedJsonFile, 'r') as t_jsonFile: self.c_manifestStore.saveManifest(imJsonLoad(t_jsonFile))
+            
+            self.c_cachedJson = self.c_manifestStore.loadManifest()
+            return self.c_cachedJson
+        
+        except Exception as e:
+            self.c_lastError = 'Error in retrieving the stored Json: %s%s' % (m_errProcessName, str(e.args))
+            return {}
+
+    def openManifestStore(self):
+        '''Opens the manifest store, in the configurations directory if no file was assigned'''
+        ##Incase no store file was assigned yet
+        if self.c_manifestStore.c_storeFile == None: self.c_manifestStore.c_storeFile = imGetCurrentDir() + '/configurations/manifestStore.db'
+        return self.c_manifestStore.open()
+
+    def isManifestChanged(self, p_json):
+        '''Checks if a server json has other instructions than the stored one, without
+            comparing the whole json (see ManifestStoreModule.getDigest)'''
+        return self.c_manifestStore.isChanged(p_json)
+
+    def getSysSettings(self):
+        '''Retrieves the contents of the json file'''
+        
+        m_errProcessName = self.__class__.__name__ + '-getSysSettings ->'
+        
+        try:
+            ##Incase no json directory was assigned yet, create default directory
+            if self.c_sysSettingsFile == None: self.c_sysSettingsFile = imGetCurrentDir() + '/configurations/systemSetting.json'
+            
+            with open(self.c_sysSettingsFile, 'r') as t_settingsFile:
+                self.c_sysSettingsFile = imJsonLoad(t_settingsFile)
+            return self.c_sysSettings
+
+        except Exception as e:
+            self.c_lastError = 'Error in retrieving the system settings: %s%s' % (m_errProcessName, str(e.args))
+            return {}
+    
+    def arrangeMediaList(self, p_mediaDir):
+        '''Segregates the list of media files taken from the server response
+            fills up the list of media that doesn't have schedule and media that has.
+            Also adds the media directory to the media filenames upon segregation and
+            compiles the schedule index used by isThereScheduledToPlayNow
+            @Params
+                p_mediaDir -> the media directory that is to be added to the filename of the unscheduled media'''
+        
+        ##Start from empty lists so a new manifest does not pile up on the old one
+        self.c_mediaWithSched = []
+        self.c_mediaWithoutSched = []
+        for t_media in self.c_cachedJson['mediaFiles']:
+            
+            m_mediaWithoutSched = t_media.copy()
+            if 'fileName' in t_media: m_mediaWithoutSched['fileName'] = p_mediaDir + t_media['fileName']
+            
+            if (t_media['startTime'] == None) or (not t_media['startTime'].strip()):
+                ##Media without schedule are treated differently they need directory in their file name
+                self.c_mediaWithoutSched.append(p_mediaDir + t_media['fileName'])
+            else:
+                self.c_mediaWithSched.append(t_media)
+
+        self.c_scheduleIndex.compileSchedule(self.c_mediaWithSched)
+
+    def isThereScheduledToPlayNow(self):
+        '''Checks if there is a media supposed to play in the current time that this method was called
+            @Return
+                True -> If a media scheduled to play was found, also sets the scheduled media
+                False -> If no media was to play yet'''
+        m_errProcessName = self.__class__.__name__ + '-isThereScheduledToPlayNow ->'
+        try:
+            ##periodically calculate the current server time before checking for new media
+            self.c_serverTime = (imDatetime.now() + self.c_timeDeviation).time()
+            m_media = self.c_scheduleIndex.getMediaAt(self.c_serverTime)
+            if m_media != None:
+                self.c_scheduledToPlayNow = m_media['fileName']
+                return True
+                
+            return False
+        except Exception as e:
+            self.c_lastError = 'Error in checking the scheduled medias: %s%s' % (m_errProcessName, str(e.args))
+            return False
+
+    def getSecondsToNextTransition(self):
+        '''Number of seconds until the scheduled media changes, measured in server time
+            @Return
+                number of seconds -> until a scheduled media starts or ends
+                None -> if there is no schedule or the time deviation is not known yet'''
+        m_errProcessName = self.__class__.__name__ + '-getSecondsToNextTransition ->'
+        try:
+            return self.c_scheduleIndex.getSecondsToNextTransition((imDatetime.now() + self.c_timeDeviation).time())
+        except Exception as e:
+            self.c_lastError = 'Error in checking the next schedule transition: %s%s' % (m_errProcessName, str(e.args))
+            return None
+
+    def getUpcomingScheduledMedia(self):
+        '''File name of the media scheduled right after the next transition, so it can be pre-rolled
+            @Return
+                file name -> of the scheduled media that starts at the next transition
+                None -> if the next transition ends the schedule or there is no schedule'''
+        m_errProcessName = self.__class__.__name__ + '-getUpcomingScheduledMedia ->'
+        try:
+            m_seconds = self.getSecondsToNextTransition()
+            if m_seconds == None: return None
+            ##A millisecond past the transition is already in the next segment
+            m_time = (imDatetime.now() + self.c_timeDeviation + imTimeDelta(seconds = m_seconds + .001)).time()
+            m_media = self.c_scheduleIndex.getMediaAt(m_time)
+            return m_media['fileName'] if m_media != None else None
+        except Exception as e:
+            self.c_lastError = 'Error in checking the upcoming scheduled media: %s%s' % (m_errProcessName, str(e.args))
+            return None
+
+    def __forgetMedia(self, p_fileName):
+        '''(Private method)A media left the media cache, its metadata and its encoded copy go with it'''
+        if self.c_metadataIndex != None: self.c_metadataIndex.removeMedia(p_fileName)
+        if self.c_transcodeModule != None: self.c_transcodeModule.removeMedia(p_fileName)
+
+    def __getDerivedBytes(self):
+        '''(Private method)Bytes of the encoded copies, they take their share of the media cache budget'''
+        return self.c_transcodeModule.getOutputBytes() if self.c_transcodeModule != None else 0
+
+    def getMediaDuration(self, p_fileName):
+        '''Seconds of a stored media from the metadata index, None if it is not known'''
+        if self.c_metadataIndex == None: return None
+        return self.c_metadataIndex.getDuration(p_fileName)
+
+    def calcTimeDeviation(self, p_json=None):
+        '''Calculates the difference between the server and the client time
+            @Params
+                p_json -> server json to take the serverDateTime from, the cached json if None'''
+        
+        m_errProcessName = self.__class__.__name__ + '-calcTimeDeviation ->'
+        try:
+            if p_json == None: p_json = self.c_cachedJson
+            self.c_timeDeviation = imDatetime.strptime(p_json['serverDateTime'], '%Y-%m-%d %H:%M') - imDatetime.now()
+            self.c_serverTime = (imDatetime.now() + self.c_timeDeviation).time()
+        except Exception as e:
+            self.c_lastError = 'Unable to calculate time difference between server and client: %s%s' % (m_errProcessName, str(e.args))
+
+    def setTimeOffset(self, p_seconds):
+        '''Listener of ClockSyncModule, the measured offset replaces the one of serverDateTime
+            @Params
+                p_seconds -> seconds to add to the local clock to get the server clock'''
+        self.c_timeDeviation = imTimeDelta(seconds = p_seconds)
+        self.c_serverTime = (imDatetime.now() + self.c_timeDeviation).time()
+
+    def saveJson(self):
+        '''Stores the newly acquired json from server as a new version in the manifest store so
+            even when the server is offline the program still have a copy of the instructions,
+            a power cut leaves the last good version
+            @Return
+                True -> if the json was different from the stored one'''
+        
+        m_errProcessName = self.__class__.__name__ + '-saveJson ->'
+        try:
+            if not self.openManifestStore(): raise IOError(self.c_manifestStore.c_lastError)
+            return self.c_manifestStore.saveManifest(self.c_cachedJson)
+        except Exception as e:
+            self.c_lastError = 'Error in saving json: %s%s' % ( m_errProcessName, str(e.args) )
+            return False
+            
+    def getLocalStorageSize(self):
+        '''Calculates the remaining space in the storage holding the media directory
+            @Returns
+                0 -> if given directory is invalid or theres an error in procedure
+                number of bytes -> if successfully queried'''
+        
+        m_errProcessName = self.__class__.__name__ + '-getLocalStorageSize ->'
+        try:
+            return self.c_mediaCache.getFreeBytes()
+        except Exception as e:
+            self.c_lastError = 'Error in getting the available storage size: %s%s' % (m_errProcessName, str(e.args))
+            return 0
+
+    def downloadMedia(self, p_mediaDir, p_mediaFile, p_isOverwrite=False):
+        '''Checks if the file already exist, download if not
+            The file is downloaded beside the target and moved in place once complete
+            so a media that is playing is never overwritten while it plays
+            @Params
+                p_mediaDir -> Directory which the file will be searched and saved into
+                p_mediaFile -> File to be download
+                p_isOverwrite -> download even if the file already exist'''
+        self.downloadMediaFiles(p_mediaDir, [p_mediaFile], p_isOverwrite)
+
+    def downloadMediaFiles(self, p_mediaDir, p_mediaFiles, p_isOverwrite=False):
+        '''Downloads a batch of files with the pooled download manager, reserves the
+            space in the media cache once for the whole batch
+            @Params
+                p_mediaDir -> Directory which the files will be searched and saved into
+                p_mediaFiles -> list of file names to download
+                p_isOverwrite -> download even if a file already exist
+            @Return
+                list of the file names that failed'''
+        
+        m_errProcessName = self.__class__.__name__ + '-downloadMediaFiles ->'
+        
+        m_mediaInfo = self.getMediaInfo()
+        m_mediaFiles = []
+        for t_mediaFile in p_mediaFiles:
+            if (t_mediaFile in m_mediaFiles): continue
+            if p_isOverwrite or not self.isMediaComplete(p_mediaDir, m_mediaInfo.get(t_mediaFile, {'fileName' : t_mediaFile})):
+                m_mediaFiles.append(t_mediaFile)
+                self.c_mediaCache.c_missCount += 1
+            else:
+                print('\tSkipping %s, file already exist' % t_mediaFile)
+                self.c_mediaCache.c_hitCount += 1
+        if not m_mediaFiles: return []
+        
+        self.c_downloadManager.c_downloadUrl = self.c_downloadUrl
+        self.c_downloadManager.c_maxWorkers = self.c_maxDownloadWorkers
+        
+        ##Files of the current json are never evicted to make room, older campaigns are
+        m_protectedFiles = list(m_mediaInfo) + m_mediaFiles
+        m_neededBytes = 0
+        for t_mediaFile in m_mediaFiles:
+            t_size = m_mediaInfo.get(t_mediaFile, {}).get('size')
+            ##The server json does not always give the size, the server is asked so the space is reserved anyway
+            if not t_size: t_size = self.c_downloadManager.getRemoteSize(t_mediaFile)
+            m_neededBytes += int(t_size or 0)
+        if not self.c_mediaCache.reserveSpace(m_neededBytes, m_protectedFiles):
+            self.c_lastError = 'Error in downloading! Local storage might be full! %s' % m_errProcessName
+            print(self.c_lastError)
+            return m_mediaFiles
+        
+        m_identities = dict((t_mediaFile, self.getMediaIdentity(m_mediaInfo.get(t_mediaFile, {'fileName' : t_mediaFile})))
+                            for t_mediaFile in m_mediaFiles)
+        self.__recordDownloadStates([(t_mediaFile, m_identities[t_mediaFile], DOWNLOAD_DOWNLOADING, None, None) for t_mediaFile in m_mediaFiles])
+        m_failedFiles = self.c_downloadManager.downloadFiles(p_mediaDir, m_mediaFiles, m_mediaInfo)
+        m_states = []
+        for t_mediaFile in m_mediaFiles:
+            if t_mediaFile in m_failedFiles:
+                m_states.append((t_mediaFile, m_identities[t_mediaFile], DOWNLOAD_FAILED, None, self.c_downloadManager.c_lastError))
+                continue
+            self.c_mediaCache.addMedia(t_mediaFile, m_identities[t_mediaFile])
+            m_states.append((t_mediaFile, m_identities[t_mediaFile], DOWNLOAD_COMPLETE, imPath.getsize(p_mediaDir + t_mediaFile), None))
+            if self.c_transcodeModule != None: self.c_transcodeModule.submit(p_mediaDir + t_mediaFile)
+            if self.c_metadataIndex != None: self.c_metadataIndex.submit(p_mediaDir + t_mediaFile, m_mediaInfo.get(t_mediaFile, {}).get('checksum'))
+        self.__recordDownloadStates(m_states)
+        ##A size that was not known (or was wrong) may have taken the cache over its budget, evicts again with the real sizes
+        if not self.c_mediaCache.reserveSpace(0, m_protectedFiles):
+            self.c_lastError = 'Media cache over its budget after downloading: %s%s' % (m_errProcessName, self.c_mediaCache.c_lastError)
+            print(self.c_lastError)
+        if m_failedFiles:
+            self.c_lastError = 'Error in downloading the files %s: %s%s' % (', '.join(m_failedFiles), m_errProcessName, self.c_downloadManager.c_lastError)
+        return m_failedFiles
+
+    def __recordDownloadStates(self, p_states):
+        '''(Private method)Download states go to the manifest store when it is open, see ManifestStoreModule.setDownloadStates'''
+        if self.c_manifestStore.c_connection != None: self.c_manifestStore.setDownloadStates(p_states)
+
+    def downloadListOfMedia(self, p_mediaDir, p_mediaListType=0):
+        '''Downloads all the media listed in cached json
+            @Params:
+                p_mediaDir -> Directory which the file will be searched and saved into
+                p_mediaListType -> list of media files that will be downloaded:
+                                    0 - ALL
+                                    1 - Media list that has schedule
+                                    2 - Media list that has no schedule'''
+        
+        if p_mediaListType == 0: m_mediaList = [t_media['fileName'] for t_media in self.c_cachedJson['mediaFiles']]
+        elif p_mediaListType == 1: m_mediaList = [t_media['fileName'] for t_media in self.c_mediaWithSched]
+        else: m_mediaList = [imPath.basename(t_mediaFile) for t_mediaFile in self.c_mediaWithoutSched]
+        
+        self.downloadMediaFiles(p_mediaDir, m_mediaList)
+        print('Download list accommodated')
+            
+    def getMediaInfo(self):
+        '''Media dicts of c_cachedJson by file name, the first entry of a file wins'''
+        m_mediaInfo = {}
+        for t_media in self.c_cachedJson.get('mediaFiles', []): m_mediaInfo.setdefault(t_media['fileName'], t_media)
+        return m_mediaInfo
+
+    def isMediaComplete(self, p_mediaDir, p_media):
+        '''Checks if a media is on disk, is not a cached copy of another version of the
+            file and has the size the server json gives if it gives one
+            @Params
+                p_mediaDir -> directory where the media files are located
+                p_media -> media dict from the server json'''
+        m_filePath = p_mediaDir + p_media['fileName']
+        if not imPath.isfile(m_filePath): return False
+        if self.c_mediaCache.hasOtherVersion(p_media['fileName'], self.getMediaIdentity(p_media)): return False
+        if p_media.get('size') == None: return True
+        return imPath.getsize(m_filePath) == int(p_media['size'])
+
+    def getMediaIdentity(self, p_media):
+        '''Identity of a media entry, the file name plus whatever the server gave to tell
+            the content apart (size, etag, checksum)
+            @Params
+                p_media -> media dict from the server json'''
+        return (p_media['fileName'],) + tuple(p_media.get(t_key) for t_key in MEDIA_IDENTITY_KEYS)
+
+    def diffManifest(self, p_oldJson, p_newJson):
+        '''Compares the media files of two server json by file name and content identity
+            @Params
+                p_oldJson -> the previously applied server json
+                p_newJson -> the new server json
+            @Return
+                dict with lists of file names -> 'added', 'changed', 'removed' and 'unchanged' '''
+        
+        m_oldIdentities = {}
+        m_newIdentities = {}
+        ##A file can be listed more than once (e.g. on two schedules), the first entry decides
+        for t_media in p_oldJson.get('mediaFiles', []): m_oldIdentities.setdefault(t_media['fileName'], self.getMediaIdentity(t_media))
+        for t_media in p_newJson.get('mediaFiles', []): m_newIdentities.setdefault(t_media['fileName'], self.getMediaIdentity(t_media))
+
+        m_diff = {'added' : [], 'changed' : [], 'removed' : [], 'unchanged' : []}
+        for t_fileName, t_identity in m_newIdentities.items():
+            if t_fileName not in m_oldIdentities: m_diff['added'].append(t_fileName)
+            elif m_oldIdentities[t_fileName] != t_identity: m_diff['changed'].append(t_fileName)
+            else: m_diff['unchanged'].append(t_fileName)
+        m_diff['removed'] = [t_fileName for t_fileName in m_oldIdentities if t_fileName not in m_newIdentities]
+        return m_diff
+
+    def syncMedia(self, p_mediaDir, p_oldJson):
+        '''Brings the media directory from the old server json to the one in c_cachedJson,
+            downloads only the added and changed files, media that did not change are left
+            alone and can keep playing. Files that are not referenced anymore stay in the
+            media cache until their space is needed, so a returning campaign is not downloaded again
+            @Params
+                p_mediaDir -> directory where the media files are located
+                p_oldJson -> the server json the media directory was synced to before
+            @Return
+                the diffManifest result of the sync'''
+        
+        m_diff = self.diffManifest(p_oldJson, self.c_cachedJson)
+        print('Syncing medias: %d added, %d changed, %d removed, %d unchanged' %
+              (len(m_diff['added']), len(m_diff['changed']), len(m_diff['removed']), len(m_diff['unchanged'])))
+        
+        ##Changed files are downloaded again, the rest only if missing
+        m_mediaInfo = self.getMediaInfo()
+        m_toDownload = [t_fileName for t_fileName in m_diff['added'] + m_diff['unchanged'] if not self.isMediaComplete(p_mediaDir, m_mediaInfo[t_fileName])]
+        self.downloadMediaFiles(p_mediaDir, m_toDownload + m_diff['changed'], p_isOverwrite=True)
+        
+        self.removeStalePartials(p_mediaDir)
+        print('Media sync accommodated')
+        return m_diff
+
+    def removeStalePartials(self, p_mediaDir):
+        '''Partial downloads of files that c_cachedJson does not reference will never be resumed, deletes them
+            @Params
+                p_mediaDir -> directory where the media files are located'''
+        
+        m_errProcessName = self.__class__.__name__ + '-removeStalePartials ->'
+        try:
+            m_referenced = self.getMediaInfo()
+            for t_fileName in imListFile(p_mediaDir):
+                if not t_fileName.endswith(PARTIAL_DOWNLOAD_SUFFIX): continue
+                t_suffix = VALIDATOR_SUFFIX if t_fileName.endswith(VALIDATOR_SUFFIX) else PARTIAL_DOWNLOAD_SUFFIX
+                if t_fileName[:-len(t_suffix)] not in m_referenced: self.deleteMedia(p_mediaDir, t_fileName)
+            ##Encoded copies of media the cache has evicted
+            if self.c_transcodeModule != None: self.c_transcodeModule.removeUnusedOutputs()
+        except Exception as e:
+            self.c_lastError = 'Error in removing unreferenced partial downloads: %s%s' % (m_errProcessName, str(e.args))
+
+    def deleteAllMedia(self, p_mediaDir):
+        '''Deletes the medias that are not in the list of medias to be played
+            @Params
+                p_mediaDir -> directory where the media files was located'''
+
+        print('Deleting all previously used medias')
+        m_targetFiles = imListFile(p_mediaDir)
+        for t_mediaFile in m_targetFiles: self.deleteMedia(p_mediaDir, t_mediaFile)
+        print('Obsolete medias deleted')
+        
+    def deleteMedia(self, p_mediaDir, p_fileName):
+        '''Deletes a specified target file
+            @Params
+                p_mediaDir -> directory where the media files was located
+                p_fileName -> the target filename'''
+        
+        m_errProcessName = self.__class__.__name__ + '-deleteMedia ->'
+        try:
+            print('Deleting %s%s' % (p_mediaDir, p_fileName))
+            if ( imPath.exists(p_mediaDir + p_fileName) ): imDelete(p_mediaDir + p_fileName)
+            self.c_mediaCache.forgetMedia(p_fileName)
+        except Exception as e:
+            self.c_lastError = 'Error in deleting file: %s%s' % ( m_errProcessName, str(e.args) )
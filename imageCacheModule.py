@@ -0,0 +1,150 @@
+from os import stat as imFileStats
+from collections import OrderedDict as imOrderedDict
+from queue import Queue as imQueue
+from timeit import default_timer as imTimer
+from threading import (
+    Thread as imThread,
+    Lock as imLock,
+    Event as imEvent
+)
+
+class ImageCacheModule():
+    '''Image Cache Module
+        Decodes the images of the playlist once, scaled to the screen, and keeps them
+        in memory within c_budgetBytes, the least recently shown is dropped first. An
+        image that comes round again in the loop is shown without reading or decoding
+        the file, the budget should hold the images of a whole slideshow
+
+        preloadImage decodes an image on a background thread, e.g. the next one of the
+        playlist while the current one is shown. getImage of an image that is still
+        being decoded waits for it instead of decoding it a second time
+
+        Images are told apart by their path, modified time and size, so a file that
+        was replaced by a new version of the campaign is decoded again
+
+    @Usage: (On a project)
+        import imageCacheModule
+
+        g_ImageCacheModule = imageCacheModule.ImageCacheModule()
+        g_ImageCacheModule.c_width, g_ImageCacheModule.c_height = 1920, 1080
+        g_ImageCacheModule.c_budgetBytes = 64 * 1024 ** 2
+
+        g_ImageCacheModule.preloadImage('/home/pi/media files/sale.jpg')   ##while another media plays
+        m_pixbuf = g_ImageCacheModule.getImage('/home/pi/media files/sale.jpg')
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+
+        self.c_width = 1920 ##size the images are scaled to, keeping their aspect ratio
+        self.c_height = 1080
+        self.c_budgetBytes = 64 * 1024 ** 2 ##bytes of decoded images kept, 0 to decode on every show
+        self.c_decoder = self.decodePixbuf  ##(file, width, height) -> (decoded image, bytes it holds)
+
+        self.c_images = imOrderedDict() ##(file, modified time, size) -> (decoded image, bytes), least recently shown first
+        self.c_storedBytes = 0
+        self.c_hitCount = 0 ##images shown from memory
+        self.c_missCount = 0    ##images that had to be decoded when they were shown
+        self.c_evictedCount = 0
+        self.c_decodeCount = 0
+        self.c_decodeSeconds = 0
+
+        self.__c_lock = imLock()
+        self.__c_decoding = {}  ##key -> Event set once the decode of the image has ended
+        self.__c_preloadQueue = imQueue()
+        self.__c_preloadThread = None
+
+        self.c_lastError = ''
+
+    def getKey(self, p_file):
+        '''Returns (file, modified time, size), raises OSError if the file is missing'''
+        m_stats = imFileStats(p_file)
+        return (p_file, m_stats.st_mtime, m_stats.st_size)
+
+    def getImage(self, p_file):
+        '''Returns the decoded image of the file, from memory if it was decoded before
+            @Return
+                None -> if the file could not be decoded, see c_lastError'''
+        return self.__loadImage(p_file, True)
+
+    def preloadImage(self, p_file):
+        '''Decodes the image on the background thread if it is not in memory yet, returns right away'''
+        if self.c_budgetBytes <= 0: return  ##it would not be kept
+        if self.__c_preloadThread == None:
+            self.__c_preloadThread = imThread(target = self.__preload, name = 'imagePreload', daemon = True)
+            self.__c_preloadThread.start()
+        self.__c_preloadQueue.put(p_file)
+
+    def clear(self):
+        '''Drops every decoded image'''
+        with self.__c_lock:
+            self.c_images.clear()
+            self.c_storedBytes = 0
+
+    def decodePixbuf(self, p_file, p_width, p_height):
+        '''Decodes and scales in one pass with GdkPixbuf, the jpeg loader decodes at the
+            reduced size directly instead of decoding the full picture and scaling it down'''
+        ##Imported on the first image, like libvlc the headless player runs without it
+        import gi
+        gi.require_version('GdkPixbuf', '2.0')
+        from gi.repository import GdkPixbuf
+        m_pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(p_file, p_width, p_height, True)
+        return m_pixbuf, m_pixbuf.get_rowstride() * m_pixbuf.get_height()
+
+    def __loadImage(self, p_file, p_isShown):
+        '''(Private method)Returns the image from memory, waits for a decode of it in progress or decodes it
+            @Params
+                p_isShown -> counted as a hit or a miss, a preload is not'''
+
+        m_errProcessName = self.__class__.__name__ + '-getImage ->'
+        try:
+            m_key = self.getKey(p_file)
+            while True:
+                with self.__c_lock:
+                    if m_key in self.c_images:
+                        self.c_images.move_to_end(m_key)
+                        if p_isShown: self.c_hitCount += 1
+                        return self.c_images[m_key][0]
+                    m_decodingEvent = self.__c_decoding.get(m_key)
+                    if m_decodingEvent == None:
+                        self.__c_decoding[m_key] = imEvent()
+                        if p_isShown: self.c_missCount += 1
+                        break
+                ##Decoded by the other thread, or failed there and decoded here on the next pass
+                m_decodingEvent.wait()
+
+            try:
+                m_started = imTimer()
+                m_image, m_bytes = self.c_decoder(p_file, self.c_width, self.c_height)
+                self.__storeImage(m_key, m_image, m_bytes, imTimer() - m_started)
+                return m_image
+            finally:
+                with self.__c_lock: self.__c_decoding.pop(m_key).set()
+        except Exception as e:
+            self.c_lastError = 'Error in decoding the image %s: %s%s' % (p_file, m_errProcessName, str(e.args))
+            return None
+
+    def __storeImage(self, p_key, p_image, p_bytes, p_seconds):
+        '''(Private method)Keeps a decoded image, drops older versions of the file and the
+            least recently shown images until the budget is kept'''
+        with self.__c_lock:
+            self.c_decodeCount += 1
+            self.c_decodeSeconds += p_seconds
+            for t_key in [t_key for t_key in self.c_images if t_key[0] == p_key[0]]:
+                self.c_storedBytes -= self.c_images.pop(t_key)[1]
+            if p_bytes > self.c_budgetBytes: return
+            self.c_images[p_key] = (p_image, p_bytes)
+            self.c_storedBytes += p_bytes
+            while self.c_storedBytes > self.c_budgetBytes:
+                self.c_storedBytes -= self.c_images.popitem(last = False)[1][1]
+                self.c_evictedCount += 1
+
+    def __preload(self):
+        '''(Private method)Decodes the queued images one at a time, so the playback keeps the rest of the cpu'''
+        while True:
+            self.__loadImage(self.__c_preloadQueue.get(), False)
@@ -1,243 +1,498 @@
-'''Main program
-
-    @Variable / Method prefixes:
-    im -> Imported method
-    c_ -> Class variable
-    m_ -> Method variable
-    t_ -> temporary variable
-    __ -> methods to be used only by the class
-'''
-
-print ('Initializing Components')
-##============================================>>
-## Program settings variables                 >>
-##============================================>>
-
-##Dependency file locations
-from threading import Thread as imThread
-from os import getcwd as imGetCurrentDir
-
-g_sysSettingsFile = imGetCurrentDir() + '/configurations/System Config.json'
-g_cachedJsonFile = imGetCurrentDir() + '/configurations/cachedSched.json'
-g_mediaDir = imGetCurrentDir() + '/media files/' #Where the downloaded media files will be stored
-g_splashDir = imGetCurrentDir() + '/splash/'
-g_isSystemReady = False ##Main switch of the system procedures
-
-g_serverUrl = 'http://192.168.1.19:8080/getJson'
-##g_serverUrl = 'https://jsonblob.com/api/jsonBlob/65573a66-d754-11e8-839a-f3e5fcd22764'
-g_downloadUrl = 'http://192.168.1.19:8080/download?file='
-
-g_jsonMain = {} #json data where the instructions will be parsed
-g_jsonStamp = {} #json data used for tracking changes
-g_currentIP = ''
-
-g_lastKnownProcess = None
-g_errProcessName = ''
-g_systemError = ''
-
-## Program settings variables
-##--------------------------------------------<<
-
-##============================================>>
-## Module settings                            >>
-##============================================>>
-try:
-    print('Loading libraries')
-    g_errProcessName = 'Module Settings: MediaPanelModule ->'
-    import mediaPanelModule
-    g_lastKnownProcess = 0x01
-    ##Initialization for media panel module
-    g_MediaPanelModule = mediaPanelModule.MediaPanelModule()
-    g_MediaPanelModule.show_all()
-    g_MediaPanelModule.playMedia(g_splashDir + 'rpi2.mp4')   ##play splash screen
-    g_isSystemReady = True
-    
-    g_errProcessName = 'Module Settings: NetworkModule ->'
-    import networkModule
-    g_lastKnownProcess = 0x00
-    ##Initial settings for network module
-    g_NetworkModule = networkModule.NetworkModule()
-    g_NetworkModule.c_requestDelay = 1 #delay in seconds before repeating network test
-    g_NetworkModule.c_serverUrl = g_serverUrl
-    
-    g_errProcessName = 'Module Settings: FileManagerModule ->'
-    import fileManagerModule
-    g_lastKnownProcess = 0x02
-    ##Initialization for file manager module
-    g_FileManagerModule = fileManagerModule.FileManagerModule()
-    g_FileManagerModule.c_downloadUrl = g_downloadUrl
-    g_FileManagerModule.c_sysSettingsFile = g_sysSettingsFile
-    g_FileManagerModule.c_cachedJsonFile = g_cachedJsonFile
-    g_FileManagerModule.c_mediaDir = g_mediaDir
-    
-except Exception as e:
-    print('Error occured preventing start up of the system')
-    g_systemError = 'Error in library imports: %s%s' % (g_errProcessName, str(e.args))
-    g_lastKnownProcess = 0x03
-## Module settings
-##--------------------------------------------<<
-
-def interruptService():
-    '''Subroutine for external interrupts'''
-
-def shutdownDevice():
-    '''For safely shutting down the system'''
-
-def abort():
-    '''Aborts all the process / stops the main loop'''
-    if g_lastKnownProcess < 0x0B: m_isSafeToProceed = True
-    else: m_isSafeToProceed = False
-    g_MediaPanelModule.stop()
-    g_MediaPanelModule.c_isMediaListPlayerOn = False
-    g_NetworkModule.c_isPersistentCheckingEnabled = False
-    g_lastKnownProcess = 0x1E
-    print('All routines aborted')
-    
-def main():
-    '''Main routine'''
-
-    global g_errProcessName, g_jsonStamp, g_currentIP, g_jsonMain, g_isSystemReady
-    g_errProcessName = 'main ->'
-
-    g_lastKnownProcess = 0x04
-    m_isWithoutSchedPlaying = False
-    m_networkRetries = 0
-    m_isSafeToProceed = False
-
-    ##============================>>
-    ## Initial network and json test
-    ##----------------------------<<
-    if g_isSystemReady == False:
-        ##Critical initialization has errors, prevent starting up
-        print('Please verify that the Module settings has no errors')
-        g_lastKnownProcess = 0x05
-        return
-    else:
-        print ('\n================ Starting Main Routine ================\n')
-        print('Checking network and server')
-        g_lastKnownProcess = 0x06
-        while(not m_isSafeToProceed):
-            try:
-                if m_networkRetries >= 5:
-                    ##Access cached instructions, read json from cache
-                    print('Accessing from cache')
-                    m_networkRetries = 0
-                    ##use the method regardless of its return value
-                    g_FileManagerModule.getCachedJson()
-                    g_lastKnownProcess = 0x07
-                else:
-                    ##Read json from server
-                    print('Accessing server instructions')
-                    g_NetworkModule.checkNetworkAndServer()
-                    m_networkRetries += 1
-                    g_lastKnownProcess = 0x08
-                    ##If theres no server stop here
-                    if (not g_NetworkModule.c_isServerActive): continue
-                    
-                    g_FileManagerModule.c_cachedJson = g_NetworkModule.c_jsonResponse.copy()
-                    g_FileManagerModule.saveJson()
-                    g_lastKnownProcess = 0x09
-                ##check if the json from cache or server has contents
-                if ( len(g_FileManagerModule.c_cachedJson) ):
-                    m_isSafeToProceed = True
-                    g_lastKnownProcess = 0x0A
-                
-            except Exception as e:
-                g_systemError = 'Error in getting the initial json data: %s%s' % (g_errProcessName, str(e.args))
-                g_lastKnownProcess = 0x0B
-                continue
-
-    ##if needed components are successfully initialized proceed to main loop
-    ##ADD CONDITION to refer to settings file for the time deviation if the server is not online
-    g_FileManagerModule.calcTimeDeviation()
-    g_lastKnownProcess = 0x0C
-    g_FileManagerModule.arrangeMediaList(g_mediaDir)
-    g_lastKnownProcess = 0x0D
-
-    print('Downloading medias')
-    g_FileManagerModule.downloadListOfMedia(g_mediaDir, 0) ##download all media from server instruction
-    g_lastKnownProcess = 0x0E
-
-    if g_FileManagerModule.isThereScheduledToPlayNow():
-        g_MediaPanelModule.c_mediaResourceLocatorList = [g_mediaDir + g_FileManagerModule.c_scheduledToPlayNow]
-        g_lastKnownProcess = 0x0F
-    else:
-        g_MediaPanelModule.c_mediaResourceLocatorList = g_FileManagerModule.c_mediaWithoutSched
-        m_isWithoutSchedPlaying = True
-        g_lastKnownProcess = 0x10
-
-    print('\nAiring media and proceeding to routine')
-    g_MediaPanelModule.startMediaListPlayer()
-    g_lastKnownProcess = 0x11
-    g_NetworkModule.c_isPersistentCheckingEnabled = True
-    g_NetworkModule.startPersistentCheck()
-    g_lastKnownProcess = 0x12
-    
-    ##Starting the main proceedure
-    while (g_isSystemReady):
-        
-        ##This condition triggers when: Server was active, there was a new json instruction, c_json response was not empty
-        if ( (g_NetworkModule.c_isServerActive) and
-                (g_NetworkModule.c_jsonResponse['mediaFiles'] != g_FileManagerModule.c_cachedJson['mediaFiles']) and
-                 len(g_NetworkModule.c_jsonResponse) ):
-            
-            ##Check if the server requests a change of media contents or
-            ##issues an administrative commands
-            
-            g_lastKnownProcess = 0x13
-            print('changes detected, copying the new instruction')
-            g_MediaPanelModule.stop()   ##Stop the player as it will be restarted again later
-            m_isWithoutSchedPlaying = False
-            g_NetworkModule.c_isCheckingPaused = True ##Pause network checking
-            g_lastKnownProcess = 0x14
-            
-            ##Copy new instruction and save to file
-            ##THIS SAVE ALL THE JSON RESPONSE FROM THE SERVER
-            g_FileManagerModule.c_cachedJson = g_NetworkModule.c_jsonResponse.copy()
-            g_FileManagerModule.saveJson()
-            g_lastKnownProcess = 0x15
-            
-            ##Clear out the space before downloading another set of media
-            g_FileManagerModule.deleteAllMedia(g_mediaDir)
-            g_FileManagerModule.downloadListOfMedia(g_mediaDir)
-            g_FileManagerModule.arrangeMediaList(g_mediaDir)
-            g_lastKnownProcess = 0x16
-            
-            g_NetworkModule.c_isCheckingPaused = False
-
-        ##Play scheduled media files
-        if ( g_FileManagerModule.isThereScheduledToPlayNow() and
-                (g_MediaPanelModule.c_currentMedia != (g_mediaDir + g_FileManagerModule.c_scheduledToPlayNow)) ):
-            g_lastKnownProcess = 0x17
-            print('Playing scheduled media')
-            g_MediaPanelModule.stop()
-            m_isWithoutSchedPlaying = False
-            g_MediaPanelModule.c_mediaResourceLocatorList = [g_mediaDir + g_FileManagerModule.c_scheduledToPlayNow]
-            g_MediaPanelModule.startMediaListPlayer(p_isScheduled=True)
-            g_lastKnownProcess = 0x18
-            
-        ##Play unscheduled media files
-        elif ( (not m_isWithoutSchedPlaying) and (not g_FileManagerModule.isThereScheduledToPlayNow()) and
-               len(g_FileManagerModule.c_mediaWithoutSched) ):
-            g_lastKnownProcess = 0x19
-            print('Playing unscheduled media list')
-            g_MediaPanelModule.stop()
-            g_MediaPanelModule.c_mediaResourceLocatorList = g_FileManagerModule.c_mediaWithoutSched
-            m_isWithoutSchedPlaying = True
-            g_MediaPanelModule.startMediaListPlayer()
-            g_lastKnownProcess = 0x1A
-
-    g_lastKnownProcess = 0x1B
-    print('Main thread has ended')
-    g_MediaPanelModule.stop()
-    g_NetworkModule.c_isPersistentCheckingEnabled = False
-    g_lastKnownProcess = 0x1C
-
-if __name__ == '__main__':
-    '''Start the system'''
-
-    ##Start the system on threaded mode so that we can debug later
-    g_lastKnownProcess = 0x1D
-    g_mainThread = imThread (target = main)
-    g_mainThread.start()
-    print('Thread has started')
+'''Main program
+
+    @Variable / Method prefixes:
+    im -> Imported method
+    c_ -> Class variable
+    m_ -> Method variable
+    t_ -> temporary variable
+    __ -> methods to be used only by the class
+'''
+
+print ('Initializing Components')
+##============================================>>
+## Program settings variables                 >>
+##============================================>>
+
+##Created first so the start up profile counts every import
+import startupProfilerModule
+g_StartupProfiler = startupProfilerModule.StartupProfilerModule()
+
+##Dependency file locations
+from threading import Thread as imThread
+from time import monotonic as imMonotonic
+from datetime import timedelta as imTimeDelta
+from os import (
+    getcwd as imGetCurrentDir,
+    path as imPath
+)
+
+g_sysSettingsFile = imGetCurrentDir() + '/configurations/System Config.json'
+g_cachedJsonFile = imGetCurrentDir() + '/configurations/cachedSched.json' #json of older versions, imported into the store once
+g_manifestStoreFile = imGetCurrentDir() + '/configurations/manifestStore.db' #versions of the server json and the download states
+g_mediaCacheFile = imGetCurrentDir() + '/configurations/mediaCache.json' #index of the stored media files
+g_mediaMetadataFile = imGetCurrentDir() + '/configurations/mediaMetadata.json' #durations, codecs and resolutions of the stored media
+g_playLogDir = imGetCurrentDir() + '/configurations/playLog/' #journal of the airings until they are uploaded
+g_mediaDir = imGetCurrentDir() + '/media files/' #Where the downloaded media files will be stored
+g_splashDir = imGetCurrentDir() + '/splash/'
+g_startupProfileFile = imGetCurrentDir() + '/configurations/startupProfile.jsonl' #start up phases of every start, None to only print
+g_isSystemReady = False ##Main switch of the system procedures
+g_startedAt = g_StartupProfiler.c_origin #start up time of the process, the cached json should be playing soon after
+g_isHeadless = False #play on a simulated player without a display or libvlc, for tests and benchmarks
+g_isDoubleBuffered = False #pre-roll the next media on a second player so a switch is only a swap, needs two decoders
+g_prerollTime = 2 #seconds before a schedule change its media is pre-rolled
+g_imageDisplayTime = 10 #seconds an image of the media list is shown
+g_imageCacheBudget = 64 * 1024 ** 2 #bytes of images kept decoded at the screen size, enough for the whole slideshow
+
+g_serverUrl = 'http://192.168.1.19:8080/getJson'
+g_pushUrl = 'http://192.168.1.19:8080/subscribe' #server-sent events of the json, None to only poll
+##g_serverUrl = 'https://jsonblob.com/api/jsonBlob/65573a66-d754-11e8-839a-f3e5fcd22764'
+g_downloadUrl = 'http://192.168.1.19:8080/download?file='
+g_timeUrl = None #time endpoint for the clock offset (e.g. 'http://192.168.1.19:8080/time'), None to use the minutes of serverDateTime
+g_playLogUrl = 'http://192.168.1.19:8080/playLog' #where the airings are uploaded for the proof of play, None to only keep the journal
+g_playLogBudget = 64 * 1024 ** 2 #bytes of airings kept on disk while the server cannot be reached
+g_isSyncStart = False #start media lists and schedule changes at the same server instant as the other screens
+g_syncStartQuantum = 5 #seconds, media lists start on server times that are multiples of this
+g_syncLead = .05 #seconds a synchronized schedule change wakes up early to wait for the exact instant
+g_maxDownloadWorkers = 4 #number of media files downloaded at the same time
+g_mediaCacheBudget = 0 #bytes of media to keep stored, 0 to only be limited by the free space
+g_peerSharePort = None #port media are shared on with the players of the same group (e.g. 8765, served on every interface of the LAN), None to only download from the server
+g_peerGroup = '' #players that share their media over the LAN, e.g. the name of the store
+g_isTranscoding = False #re-encode the videos that the display cannot decode smoothly, needs ffmpeg and ffprobe
+g_transcodeDir = imGetCurrentDir() + '/transcoded/' #encoded copies of the media, named by the hash of the source
+g_maxVideoSize = (1920, 1080) #biggest video the display decodes without dropping frames
+g_maxFrameRate = 30
+g_transcodeWorkers = 1 #ffmpeg processes at the same time, each runs at the lowest cpu priority
+g_metricsPort = 9105 #port of the local metrics endpoint (/metrics and /metrics.json), None to disable
+
+g_jsonMain = {} #json data where the instructions will be parsed
+g_jsonStamp = {} #json data used for tracking changes
+g_currentIP = ''
+
+g_lastKnownProcess = None
+g_errProcessName = ''
+g_systemError = ''
+
+## Program settings variables
+##--------------------------------------------<<
+
+##============================================>>
+## Module settings                            >>
+##============================================>>
+try:
+    print('Loading libraries')
+    g_errProcessName = 'Module Settings: MediaPanelModule ->'
+    g_lastKnownProcess = 0x01
+    g_StartupProfiler.c_reportFile = g_startupProfileFile
+    if g_isHeadless:
+        import mediaPlayerModule
+        import playerBackendModule
+        ##Same playlist logic on a backend that only simulates the media durations
+        g_MediaPanelModule = mediaPlayerModule.MediaPlayerModule()
+        g_MediaPanelModule.setBackend(playerBackendModule.HeadlessPlayerBackend())
+        g_MediaPanelModule.c_backend.c_isDoubleBuffered = g_isDoubleBuffered
+        g_MediaPanelModule.c_backend.c_imageDisplayTime = g_imageDisplayTime
+    else:
+        import playerBackendModule
+        ##libvlc and its plugins load while gi and Gtk do, the panel reuses the instance once realized
+        playerBackendModule.prewarmVlcInstance()
+        import mediaPanelModule
+        ##Initialization for media panel module
+        g_MediaPanelModule = mediaPanelModule.MediaPanelModule(g_isDoubleBuffered, g_imageDisplayTime, g_imageCacheBudget)
+        g_MediaPanelModule.show_all()
+    g_StartupProfiler.mark('media panel and player backend')
+    g_MediaPanelModule.c_mediaPlayingEvent.clear()
+    g_MediaPanelModule.playMedia(g_splashDir + 'rpi2.mp4')   ##play splash screen
+    g_StartupProfiler.markOnEvent('splash playing (first frame)', g_MediaPanelModule.c_mediaPlayingEvent)
+    g_isSystemReady = True
+    
+    g_errProcessName = 'Module Settings: NetworkModule ->'
+    import networkModule
+    g_lastKnownProcess = 0x00
+    ##Initial settings for network module
+    g_NetworkModule = networkModule.NetworkModule()
+    g_NetworkModule.c_requestDelay = 1 #delay in seconds before repeating network test
+    g_NetworkModule.c_serverUrl = g_serverUrl
+    g_NetworkModule.c_pushUrl = g_pushUrl
+    
+    g_errProcessName = 'Module Settings: FileManagerModule ->'
+    import fileManagerModule
+    g_lastKnownProcess = 0x02
+    ##Initialization for file manager module
+    g_FileManagerModule = fileManagerModule.FileManagerModule()
+    g_FileManagerModule.c_downloadUrl = g_downloadUrl
+    g_FileManagerModule.c_maxDownloadWorkers = g_maxDownloadWorkers
+    g_FileManagerModule.c_sysSettingsFile = g_sysSettingsFile
+    g_FileManagerModule.c_cachedJsonFile = g_cachedJsonFile
+    g_FileManagerModule.c_manifestStore.c_storeFile = g_manifestStoreFile
+    g_FileManagerModule.c_mediaDir = g_mediaDir
+    g_FileManagerModule.c_mediaCache.c_mediaDir = g_mediaDir
+    g_FileManagerModule.c_mediaCache.c_indexFile = g_mediaCacheFile
+    g_FileManagerModule.c_mediaCache.c_budgetBytes = g_mediaCacheBudget
+    g_FileManagerModule.c_mediaCache.loadIndex()
+    g_MediaPanelModule.c_mediaStartListener = lambda p_media: g_FileManagerModule.c_mediaCache.touchMedia(imPath.basename(p_media))
+    
+    g_errProcessName = 'Module Settings: MetadataIndexModule ->'
+    import metadataIndexModule
+    ##What is inside each stored media, probed once after its download and dropped on its eviction
+    g_MetadataIndexModule = metadataIndexModule.MetadataIndexModule()
+    g_MetadataIndexModule.c_indexFile = g_mediaMetadataFile
+    g_MetadataIndexModule.loadIndex()
+    g_FileManagerModule.c_metadataIndex = g_MetadataIndexModule
+    g_MediaPanelModule.c_durationResolver = g_MetadataIndexModule.getDuration
+    
+    g_errProcessName = 'Module Settings: PeerShareModule ->'
+    import peerShareModule
+    ##Media are fetched from the players of the same store first, the server sends the rest
+    g_PeerShareModule = peerShareModule.PeerShareModule()
+    g_PeerShareModule.c_fileManagerModule = g_FileManagerModule
+    g_PeerShareModule.c_mediaDir = g_mediaDir
+    g_PeerShareModule.c_groupName = g_peerGroup
+    if g_peerSharePort != None:
+        g_PeerShareModule.c_port = g_peerSharePort
+        g_FileManagerModule.c_downloadManager.c_peerShareModule = g_PeerShareModule
+    
+    g_errProcessName = 'Module Settings: TranscodeModule ->'
+    import transcodeModule
+    ##Videos bigger or faster than the display handles are encoded again after their download
+    g_TranscodeModule = transcodeModule.TranscodeModule()
+    g_TranscodeModule.c_outputDir = g_transcodeDir
+    g_TranscodeModule.c_maxWidth, g_TranscodeModule.c_maxHeight = g_maxVideoSize
+    g_TranscodeModule.c_maxFrameRate = g_maxFrameRate
+    g_TranscodeModule.c_maxWorkers = g_transcodeWorkers
+    if g_isTranscoding:
+        g_FileManagerModule.c_transcodeModule = g_TranscodeModule
+        g_MediaPanelModule.c_mediaResolver = g_TranscodeModule.getPlayableMedia
+    
+    g_errProcessName = 'Module Settings: ClockSyncModule ->'
+    import clockSyncModule
+    ##Offset of the local clock from the server clock, measured with round trip compensation
+    g_ClockSyncModule = clockSyncModule.ClockSyncModule()
+    g_ClockSyncModule.c_timeUrl = g_timeUrl
+    g_ClockSyncModule.c_offsetListener = g_FileManagerModule.setTimeOffset
+    
+    g_errProcessName = 'Module Settings: PlayLogModule ->'
+    import playLogModule
+    ##Every airing goes to a journal on disk, uploaded in batches for the proof of play
+    g_PlayLogModule = playLogModule.PlayLogModule()
+    g_PlayLogModule.c_journalDir = g_playLogDir
+    g_PlayLogModule.c_uploadUrl = g_playLogUrl
+    g_PlayLogModule.c_maxJournalBytes = g_playLogBudget
+    g_PlayLogModule.c_mediaDir = g_mediaDir
+    g_PlayLogModule.c_fileManagerModule = g_FileManagerModule
+    g_PlayLogModule.c_clockSyncModule = g_ClockSyncModule
+    g_PlayLogModule.open()
+    g_MediaPanelModule.c_airingListener = g_PlayLogModule.recordAiring
+    
+    g_errProcessName = 'Module Settings: PrefetchModule ->'
+    import prefetchModule
+    ##Downloads the missing media in the background, the soonest needed first
+    g_PrefetchModule = prefetchModule.PrefetchModule()
+    g_PrefetchModule.c_fileManagerModule = g_FileManagerModule
+    g_PrefetchModule.c_mediaDir = g_mediaDir
+    ##A media that airs soon is not waited for on the peers
+    g_PeerShareModule.c_neededTimeGetter = g_PrefetchModule.getSecondsUntilNeeded
+    
+    g_errProcessName = 'Module Settings: SchedulerModule ->'
+    import schedulerModule
+    ##Wakes the main loop up on a new manifest, the end of a media or a schedule transition
+    g_SchedulerModule = schedulerModule.SchedulerModule()
+    g_NetworkModule.c_manifestListener = g_SchedulerModule.notifyManifestChanged
+    g_MediaPanelModule.c_mediaEndListener = g_SchedulerModule.notifyMediaEndReached
+    g_PrefetchModule.c_mediaReadyListener = g_SchedulerModule.notifyMediaReady
+    g_ClockSyncModule.c_stepListener = g_SchedulerModule.notifyClockStepped
+    
+    g_errProcessName = 'Module Settings: AsyncRuntimeModule ->'
+    import asyncRuntimeModule
+    ##Event loop for polling, push and downloads so they never block the playback decisions
+    g_AsyncRuntimeModule = asyncRuntimeModule.AsyncRuntimeModule()
+    g_AsyncRuntimeModule.c_networkModule = g_NetworkModule
+    g_AsyncRuntimeModule.c_prefetchModule = g_PrefetchModule
+    g_AsyncRuntimeModule.c_clockSyncModule = g_ClockSyncModule
+    g_AsyncRuntimeModule.c_playLogModule = g_PlayLogModule
+    
+    g_errProcessName = 'Module Settings: MetricsModule ->'
+    import metricsModule
+    ##Counters and latencies of this player for /metrics, instead of logging into the Pi
+    g_MetricsModule = metricsModule.MetricsModule()
+    g_MetricsModule.c_port = g_metricsPort
+    g_MetricsModule.watchModules(g_NetworkModule, g_FileManagerModule, g_MediaPanelModule, g_SchedulerModule)
+    g_MetricsModule.defineCounter('player_main_loop_iterations_total', 'Iterations of the main loop')
+    g_MetricsModule.defineGauge('player_media_at_risk', 'Scheduled media not expected to be downloaded in time',
+                                lambda: len(g_PrefetchModule.c_atRiskMedia))
+    g_MetricsModule.defineGauge('player_media_missing', 'Media of the server json not on disk yet', lambda: len(g_PrefetchModule.c_plan))
+    if not g_isHeadless:
+        g_MetricsModule.defineCounter('player_image_cache_hits_total', 'Images shown without decoding them', lambda: g_MediaPanelModule.c_imageCache.c_hitCount)
+        g_MetricsModule.defineCounter('player_image_cache_misses_total', 'Images decoded when they were shown', lambda: g_MediaPanelModule.c_imageCache.c_missCount)
+        g_MetricsModule.defineCounter('player_image_decode_seconds_total', 'Seconds spent decoding images', lambda: g_MediaPanelModule.c_imageCache.c_decodeSeconds)
+        g_MetricsModule.defineGauge('player_image_cache_bytes', 'Bytes of decoded images in memory', lambda: g_MediaPanelModule.c_imageCache.c_storedBytes)
+        ##Falls behind the images the backend played when the gtk main loop does not run
+        g_MetricsModule.defineCounter('player_images_displayed_total', 'Images the gui put on screen', lambda: g_MediaPanelModule.c_displayedImageCount)
+    g_MetricsModule.defineCounter('player_peer_received_bytes_total', 'Bytes of media fetched from the other players',
+                                  lambda: g_PeerShareModule.c_receivedBytes)
+    g_MetricsModule.defineCounter('player_peer_served_bytes_total', 'Bytes of media sent to the other players',
+                                  lambda: g_PeerShareModule.c_servedBytes)
+    g_MetricsModule.defineGauge('player_peers', 'Players of the same group heard lately', lambda: len(g_PeerShareModule.getPeers()))
+    g_MetricsModule.defineCounter('player_media_probed_total', 'Media whose metadata were read with ffprobe', lambda: g_MetadataIndexModule.c_probedCount)
+    g_MetricsModule.defineGauge('player_media_indexed', 'Stored media in the metadata index', lambda: len(g_MetadataIndexModule.c_files))
+    g_MetricsModule.defineCounter('player_transcoded_media_total', 'Videos encoded again for the display', lambda: g_TranscodeModule.c_transcodedCount)
+    g_MetricsModule.defineCounter('player_transcode_failures_total', 'Videos that could not be encoded', lambda: g_TranscodeModule.c_failedCount)
+    g_MetricsModule.defineCounter('player_transcode_seconds_total', 'Seconds spent encoding videos', lambda: g_TranscodeModule.c_transcodeSeconds)
+    g_MetricsModule.defineCounter('player_airings_logged_total', 'Airings written to the play log', lambda: g_PlayLogModule.c_loggedCount)
+    g_MetricsModule.defineCounter('player_airings_uploaded_total', 'Airings of the play log taken by the server', lambda: g_PlayLogModule.c_uploadedCount)
+    g_MetricsModule.defineCounter('player_airings_dropped_total', 'Airings dropped to keep the play log within its budget',
+                                  lambda: g_PlayLogModule.c_droppedCount)
+    g_MetricsModule.defineGauge('player_play_log_pending_bytes', 'Bytes of the play log not uploaded yet', g_PlayLogModule.getPendingBytes)
+    g_MetricsModule.defineGauge('player_clock_offset_seconds', 'Seconds the server clock is ahead of the local clock',
+                                lambda: g_ClockSyncModule.c_offset or 0)
+    g_MetricsModule.defineGauge('player_clock_delay_seconds', 'Round trip of the time exchange the offset is based on',
+                                lambda: g_ClockSyncModule.c_delay or 0)
+    g_MetricsModule.defineGauge('player_clock_sync_failures', 'Clock synchronizations failed in a row',
+                                lambda: g_ClockSyncModule.c_failures)
+    g_MetricsModule.defineGauge('player_startup_seconds', 'Seconds from start up until the media list was playing')
+    g_MetricsModule.defineGauge('player_reconcile_seconds', 'Seconds from start up until the first server json was applied')
+    g_MetricsModule.defineGauge('player_startup_phase_seconds', 'Seconds from the process start until each start up phase ended',
+                                g_StartupProfiler.getPhaseTimes, 'phase')
+    g_StartupProfiler.mark('other modules')
+    
+except Exception as e:
+    print('Error occured preventing start up of the system')
+    g_systemError = 'Error in library imports: %s%s' % (g_errProcessName, str(e.args))
+    g_lastKnownProcess = 0x03
+## Module settings
+##--------------------------------------------<<
+
+def interruptService():
+    '''Subroutine for external interrupts'''
+
+def shutdownDevice():
+    '''For safely shutting down the system'''
+
+def abort():
+    '''Aborts all the process / stops the main loop'''
+    if g_lastKnownProcess < 0x0B: m_isSafeToProceed = True
+    else: m_isSafeToProceed = False
+    g_MediaPanelModule.stop()
+    g_MediaPanelModule.c_isMediaListPlayerOn = False
+    g_AsyncRuntimeModule.stop()
+    g_PeerShareModule.stop()
+    g_TranscodeModule.stop()
+    g_MetricsModule.stop()
+    g_PlayLogModule.close()
+    g_lastKnownProcess = 0x1E
+    print('All routines aborted')
+    
+def main():
+    '''Main routine'''
+
+    global g_errProcessName, g_jsonStamp, g_currentIP, g_jsonMain, g_isSystemReady
+    g_errProcessName = 'main ->'
+
+    g_lastKnownProcess = 0x04
+    m_isWithoutSchedPlaying = False
+    m_isReconciled = False ##True once a json of the server was applied since the start up
+    m_isSafeToProceed = False
+
+    ##============================>>
+    ## Initial network and json test
+    ##----------------------------<<
+    if g_isSystemReady == False:
+        ##Critical initialization has errors, prevent starting up
+        print('Please verify that the Module settings has no errors')
+        g_lastKnownProcess = 0x05
+        return
+    else:
+        print ('\n================ Starting Main Routine ================\n')
+        ##The last good json is played right away, the server is reconciled with in the background
+        print('Loading the cached json')
+        g_FileManagerModule.getCachedJson()
+        g_StartupProfiler.mark('cached json loaded')
+        g_lastKnownProcess = 0x07
+        if len(g_FileManagerModule.c_cachedJson):
+            ##The serverDateTime of the cached json is as old as the json, trust the local clock
+            ##until the server answers
+            g_FileManagerModule.c_timeDeviation = imTimeDelta(0)
+            m_isSafeToProceed = True
+        else:
+            ##Nothing cached (first start), nothing to play until the server answers
+            print('No cached json, checking network and server')
+            g_lastKnownProcess = 0x06
+            
+        while(not m_isSafeToProceed):
+            try:
+                ##Read json from server
+                print('Accessing server instructions')
+                g_NetworkModule.checkNetworkAndServer()
+                g_lastKnownProcess = 0x08
+                ##If theres no server stop here
+                if (not g_NetworkModule.c_isServerActive) or (not len(g_NetworkModule.c_jsonResponse)): continue
+                
+                g_FileManagerModule.c_cachedJson = g_NetworkModule.c_jsonResponse.copy()
+                g_FileManagerModule.saveJson()
+                g_FileManagerModule.calcTimeDeviation()
+                m_isReconciled = True
+                m_isSafeToProceed = True
+                g_lastKnownProcess = 0x09
+                
+            except Exception as e:
+                g_systemError = 'Error in getting the initial json data: %s%s' % (g_errProcessName, str(e.args))
+                g_lastKnownProcess = 0x0B
+                continue
+
+    ##if needed components are successfully initialized proceed to main loop
+    g_lastKnownProcess = 0x0C
+    g_FileManagerModule.arrangeMediaList(g_mediaDir)
+    g_lastKnownProcess = 0x0D
+
+    ##Media are downloaded by the prefetcher in the order they are needed, only what
+    ##is fully on disk is played and the rest joins as it arrives
+    m_scheduledMedia = None
+    if g_FileManagerModule.isThereScheduledToPlayNow():
+        m_scheduledMedia = (g_PrefetchModule.filterLocalMedia([g_mediaDir + g_FileManagerModule.c_scheduledToPlayNow]) or [None])[0]
+    m_localWithoutSched = g_PrefetchModule.filterLocalMedia(g_FileManagerModule.c_mediaWithoutSched)
+    g_lastKnownProcess = 0x0E
+
+    if m_scheduledMedia != None:
+        m_startupList = [m_scheduledMedia]
+        g_lastKnownProcess = 0x0F
+    else:
+        m_startupList = m_localWithoutSched
+        m_isWithoutSchedPlaying = len(m_localWithoutSched) > 0
+        g_lastKnownProcess = 0x10
+
+    print('\nAiring media and proceeding to routine')
+    ##Replaces the splash right away, with nothing on disk yet the splash stays until the prefetcher has the first media
+    if len(m_startupList):
+        g_MediaPanelModule.switchMediaList(m_startupList, p_isScheduled=(m_scheduledMedia != None))
+        g_MetricsModule.setGauge('player_startup_seconds', imMonotonic() - g_startedAt)
+        g_StartupProfiler.mark('media list playing')
+        print('Playing %.2fs after start up' % (imMonotonic() - g_startedAt))
+    g_lastKnownProcess = 0x11
+    ##Announced before the prefetcher starts, so the peers are known by the first download
+    if g_peerSharePort != None: g_PeerShareModule.start()
+    ##Media downloaded by an earlier run, the ones already checked only cost a look at the index
+    g_MetadataIndexModule.syncDirectory(g_mediaDir)
+    if g_isTranscoding: g_TranscodeModule.submitFiles(g_PrefetchModule.filterLocalMedia(list(g_FileManagerModule.c_mediaWithoutSched) +
+                                                                                       [g_mediaDir + t_media['fileName'] for t_media in g_FileManagerModule.c_mediaWithSched]))
+    g_AsyncRuntimeModule.start()
+    if g_metricsPort != None: g_MetricsModule.start()
+    g_StartupProfiler.mark('network and metrics started')
+    g_StartupProfiler.printReport()
+    g_lastKnownProcess = 0x12
+    
+    ##Starting the main proceedure
+    while (g_isSystemReady):
+        
+        ##Sleep until the server posts a new manifest, a media ends or is downloaded, or the schedule changes
+        ##(wakes g_prerollTime early once to pre-roll the media of the change)
+        ##(and g_syncLead early for the exact instant of a synchronized start)
+        m_secondsToTransition = g_FileManagerModule.getSecondsToNextTransition()
+        m_transitionAt = None
+        if (m_secondsToTransition != None) and (m_secondsToTransition > g_prerollTime): m_secondsToTransition -= g_prerollTime
+        elif (m_secondsToTransition != None) and g_isSyncStart:
+            m_transitionAt = g_ClockSyncModule.getServerTime() + m_secondsToTransition
+            m_secondsToTransition = max(0, m_secondsToTransition - g_syncLead)
+        m_events = g_SchedulerModule.waitForEvents(m_secondsToTransition)
+        m_dueAt = imMonotonic() - g_SchedulerModule.c_lastWakeLatency ##when the event that woke the loop was posted or due
+        g_MetricsModule.increment('player_main_loop_iterations_total')
+        
+        ##This condition triggers when: Server was active, there was a new json instruction, c_json response was not empty
+        if ( (g_NetworkModule.c_isServerActive) and len(g_NetworkModule.c_jsonResponse) and
+                g_FileManagerModule.isManifestChanged(g_NetworkModule.c_jsonResponse) ):
+            
+            ##Check if the server requests a change of media contents or
+            ##issues an administrative commands
+            
+            g_lastKnownProcess = 0x13
+            print('changes detected, copying the new instruction')
+            
+            ##Copy new instruction and store it as a new version
+            g_FileManagerModule.c_cachedJson = g_NetworkModule.c_jsonResponse.copy()
+            g_FileManagerModule.saveJson()
+            g_lastKnownProcess = 0x15
+            
+            ##Switch over to the new lists right away, the prefetcher downloads what they miss
+            g_FileManagerModule.arrangeMediaList(g_mediaDir)
+            g_PrefetchModule.wake()
+            g_lastKnownProcess = 0x16
+
+        ##The first answer of the server since a start up from the cached json, the server time is known now
+        if ( (not m_isReconciled) and (g_NetworkModule.c_isServerActive) and len(g_NetworkModule.c_jsonResponse) ):
+            m_isReconciled = True
+            if g_ClockSyncModule.c_offset == None: g_FileManagerModule.calcTimeDeviation(g_NetworkModule.c_jsonResponse)
+            g_MetricsModule.setGauge('player_reconcile_seconds', imMonotonic() - g_startedAt)
+            print('Reconciled with the server %.2fs after start up' % (imMonotonic() - g_startedAt))
+
+        ##Only what is fully on disk is played, whatever is local keeps playing meanwhile
+        m_scheduledMedia = None
+        if g_FileManagerModule.isThereScheduledToPlayNow():
+            m_scheduledMedia = (g_PrefetchModule.filterLocalMedia([g_mediaDir + g_FileManagerModule.c_scheduledToPlayNow]) or [None])[0]
+        m_localWithoutSched = g_PrefetchModule.filterLocalMedia(g_FileManagerModule.c_mediaWithoutSched)
+
+        ##Open the media of a schedule change that is about to happen, so the switch is only a swap
+        m_secondsToTransition = g_FileManagerModule.getSecondsToNextTransition()
+        if (m_secondsToTransition != None) and (m_secondsToTransition <= g_prerollTime):
+            m_upcomingMedia = g_FileManagerModule.getUpcomingScheduledMedia()
+            if m_upcomingMedia != None: m_upcomingMedia = g_PrefetchModule.filterLocalMedia([g_mediaDir + m_upcomingMedia])
+            else: m_upcomingMedia = m_localWithoutSched
+            if len(m_upcomingMedia): g_MediaPanelModule.prerollMedia(m_upcomingMedia[0])
+
+        ##Woken g_syncLead before the schedule changes, the other screens switch at the exact same server instant
+        if ( (m_transitionAt != None) and (g_SchedulerModule.EVENT_SCHEDULE_TRANSITION in m_events) and
+             (0 < m_transitionAt - g_ClockSyncModule.getServerTime() <= g_syncLead) ):
+            g_ClockSyncModule.waitUntil(m_transitionAt)
+            if g_FileManagerModule.isThereScheduledToPlayNow():
+                m_scheduledMedia = (g_PrefetchModule.filterLocalMedia([g_mediaDir + g_FileManagerModule.c_scheduledToPlayNow]) or [None])[0]
+            else: m_scheduledMedia = None
+
+        ##Play scheduled media files
+        if ( (m_scheduledMedia != None) and (g_MediaPanelModule.c_currentMedia != m_scheduledMedia) ):
+            g_lastKnownProcess = 0x17
+            print('Playing scheduled media')
+            m_isWithoutSchedPlaying = False
+            g_MediaPanelModule.switchMediaList([m_scheduledMedia], p_isScheduled=True)
+            g_MetricsModule.observe('player_schedule_switch_seconds', imMonotonic() - m_dueAt)
+            g_lastKnownProcess = 0x18
+            
+        ##Play unscheduled media files
+        elif ( (not m_isWithoutSchedPlaying) and (m_scheduledMedia == None) and len(m_localWithoutSched) ):
+            g_lastKnownProcess = 0x19
+            print('Playing unscheduled media list')
+            m_isWithoutSchedPlaying = True
+            if g_isSyncStart:
+                ##Screens that got the same json within g_syncStartQuantum start the list together
+                g_MediaPanelModule.prerollMedia(m_localWithoutSched[0])
+                g_ClockSyncModule.waitUntil(g_ClockSyncModule.getSyncStartTime(g_syncStartQuantum))
+            g_MediaPanelModule.switchMediaList(m_localWithoutSched)
+            g_MetricsModule.observe('player_schedule_switch_seconds', imMonotonic() - m_dueAt)
+            g_lastKnownProcess = 0x1A
+
+        ##A new json or a finished download changed what is local, the playlist thread
+        ##picks the new list up once the media on screen has ended (the old list stays
+        ##until at least one media of the new one is on disk)
+        elif ( m_isWithoutSchedPlaying and (m_scheduledMedia == None) and len(m_localWithoutSched) and
+               (g_MediaPanelModule.c_mediaResourceLocatorList != m_localWithoutSched) ):
+            g_MediaPanelModule.c_mediaResourceLocatorList = m_localWithoutSched
+
+    g_lastKnownProcess = 0x1B
+    print('Main thread has ended')
+    g_MediaPanelModule.stop()
+    g_AsyncRuntimeModule.stop()
+    g_PeerShareModule.stop()
+    g_TranscodeModule.stop()
+    g_MetricsModule.stop()
+    g_PlayLogModule.close()
+    g_FileManagerModule.c_manifestStore.close()
+    if not g_isHeadless: g_MediaPanelModule.quitGuiLoop()
+    g_lastKnownProcess = 0x1C
+
+if __name__ == '__main__':
+    '''Start the system'''
+
+    ##Start the system on threaded mode so that we can debug later
+    g_lastKnownProcess = 0x1D
+    g_mainThread = imThread (target = main)
+    g_mainThread.start()
+    print('Thread has started')
+
+    ##Gtk is not thread safe, the gui calls of the player threads run on the main loop of this thread
+    if g_isSystemReady and (not g_isHeadless): g_MediaPanelModule.runGuiLoop()
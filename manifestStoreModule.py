@@ -0,0 +1,262 @@
+from time import time as imTime
+from hashlib import sha1 as imSha1
+from sqlite3 import connect as imConnectDatabase
+from json import (
+    dumps as imJsonString,
+    loads as imJsonParse
+)
+from threading import RLock as imLock
+
+##Keys of the server json that change on every answer without the instructions changing
+VOLATILE_MANIFEST_KEYS = ('serverDateTime',)
+
+DOWNLOAD_PENDING = 'pending'
+DOWNLOAD_DOWNLOADING = 'downloading'
+DOWNLOAD_COMPLETE = 'complete'
+DOWNLOAD_FAILED = 'failed'
+
+class ManifestStoreModule():
+    '''Manifest Store Module
+        Keeps the server json in a local SQLite database instead of one json file that
+        is rewritten on every change. Every different json is stored as a new version
+        in a single transaction, so a power cut leaves either the old or the new version
+        and never half of one, and the last c_historySize versions are kept to roll back to
+
+        The media of a version are rows indexed by file name and start time, and the
+        download state of every file (pending, downloading, complete, failed) is kept
+        beside them. A json is told apart from the stored one by a digest of its
+        contents (without VOLATILE_MANIFEST_KEYS), the digest of the same json object
+        is only computed once until a version is saved or rolled back to, so a json
+        must not be changed in place once it was compared. A loaded version is the
+        json as it was saved and has the digest it was stored with
+
+    @Usage: (On a project)
+        import manifestStoreModule
+
+        g_ManifestStore = manifestStoreModule.ManifestStoreModule()
+        g_ManifestStore.c_storeFile = '/home/pi/configurations/manifestStore.db'
+        g_ManifestStore.open()
+
+        g_ManifestStore.saveManifest(m_jsonResponse)  ##True if it was a new version
+        m_manifest = g_ManifestStore.loadManifest()
+        g_ManifestStore.findMedia('rpi1.mp4')
+        g_ManifestStore.setDownloadStates([('rpi1.mp4', m_identity, manifestStoreModule.DOWNLOAD_COMPLETE, 1024, None)])
+        m_manifest = g_ManifestStore.rollback()   ##back to the version before
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+
+        self.c_storeFile = None
+        self.c_historySize = 20 ##versions kept to roll back to
+
+        self.c_connection = None
+        self.c_currentVersion = None
+        self.c_currentDigest = None
+        self.__c_lock = imLock()
+        self.__c_lastDigest = (None, None)  ##(json object, digest) of the last getDigest
+
+        self.c_lastError = ''
+
+    def open(self):
+        '''Opens the database and creates the tables on the first start
+            @Return
+                True -> if the store can be used'''
+
+        m_errProcessName = self.__class__.__name__ + '-open ->'
+        with self.__c_lock:
+            if self.c_connection != None: return True
+            try:
+                self.c_connection = imConnectDatabase(self.c_storeFile, check_same_thread = False)
+                self.c_connection.execute('PRAGMA journal_mode = WAL')
+                self.c_connection.execute('PRAGMA synchronous = FULL')
+                with self.c_connection:
+                    self.c_connection.executescript('''
+                        CREATE TABLE IF NOT EXISTS manifests (version INTEGER PRIMARY KEY AUTOINCREMENT,
+                            digest TEXT NOT NULL, savedAt REAL NOT NULL, body TEXT NOT NULL);
+                        CREATE TABLE IF NOT EXISTS media (version INTEGER NOT NULL, position INTEGER NOT NULL,
+                            fileName TEXT NOT NULL, startTime TEXT, endTime TEXT, entry TEXT NOT NULL,
+                            PRIMARY KEY (version, position));
+                        CREATE INDEX IF NOT EXISTS mediaByFileName ON media (version, fileName);
+                        CREATE INDEX IF NOT EXISTS mediaByStartTime ON media (version, startTime);
+                        CREATE TABLE IF NOT EXISTS downloads (fileName TEXT PRIMARY KEY, identity TEXT,
+                            state TEXT NOT NULL, bytes INTEGER, attempts INTEGER NOT NULL DEFAULT 0,
+                            error TEXT, updatedAt REAL NOT NULL);
+                        CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT);''')
+                m_row = self.c_connection.execute('''SELECT manifests.version, manifests.digest FROM settings
+                    JOIN manifests ON manifests.version = CAST(settings.value AS INTEGER)
+                    WHERE settings.key = 'currentVersion' ''').fetchone()
+                self.c_currentVersion, self.c_currentDigest = m_row if m_row != None else (None, None)
+                return True
+            except Exception as e:
+                self.c_lastError = 'Error in opening the manifest store: %s%s' % (m_errProcessName, str(e.args))
+                self.c_connection = None
+                return False
+
+    def close(self):
+        with self.__c_lock:
+            if self.c_connection == None: return
+            self.c_connection.close()
+            self.c_connection = None
+
+    ##========================>>
+    ##Manifest versions
+    ##========================>>
+    def getDigest(self, p_json):
+        '''Digest of the contents of a server json that matter, VOLATILE_MANIFEST_KEYS left out'''
+        if p_json is self.__c_lastDigest[0]: return self.__c_lastDigest[1]
+        m_contents = dict((t_key, t_value) for t_key, t_value in p_json.items() if t_key not in VOLATILE_MANIFEST_KEYS)
+        m_digest = imSha1(imJsonString(m_contents, sort_keys = True, separators = (',', ':')).encode()).hexdigest()
+        self.__c_lastDigest = (p_json, m_digest)
+        return m_digest
+
+    def isChanged(self, p_json):
+        '''Checks if a server json differs from the current version'''
+        return self.getDigest(p_json) != self.c_currentDigest
+
+    def saveManifest(self, p_json):
+        '''Stores a server json as the current version, a json with the contents of the
+            current version is not stored again
+            @Return
+                True -> if a new version was stored
+                False -> if nothing changed or the store failed (see c_lastError)'''
+
+        m_errProcessName = self.__class__.__name__ + '-saveManifest ->'
+        m_digest = self.getDigest(p_json)
+        with self.__c_lock:
+            if m_digest == self.c_currentDigest: return False
+            try:
+                ##The media are rows, the body keeps an empty list only if the json had one
+                m_body = dict((t_key, [] if t_key == 'mediaFiles' else t_value) for t_key, t_value in p_json.items())
+                with self.c_connection:
+                    m_version = self.c_connection.execute('INSERT INTO manifests (digest, savedAt, body) VALUES (?, ?, ?)',
+                                                          (m_digest, imTime(), imJsonString(m_body))).lastrowid
+                    self.c_connection.executemany('INSERT INTO media VALUES (?, ?, ?, ?, ?, ?)',
+                        ((m_version, t_position, t_media.get('fileName'), t_media.get('startTime'), t_media.get('endTime'),
+                          imJsonString(t_media)) for t_position, t_media in enumerate(p_json.get('mediaFiles', []))))
+                    self.__setCurrentVersion(m_version)
+                    self.__pruneHistory()
+                self.c_currentVersion, self.c_currentDigest = m_version, m_digest
+                self.__c_lastDigest = (None, None)
+                return True
+            except Exception as e:
+                self.c_lastError = 'Error in saving the manifest: %s%s' % (m_errProcessName, str(e.args))
+                return False
+
+    def loadManifest(self, p_version=None):
+        '''Returns the server json of a version, the current one if None, {} if there is none'''
+
+        m_errProcessName = self.__class__.__name__ + '-loadManifest ->'
+        with self.__c_lock:
+            try:
+                if p_version == None: p_version = self.c_currentVersion
+                if p_version == None: return {}
+                m_row = self.c_connection.execute('SELECT body FROM manifests WHERE version = ?', (p_version,)).fetchone()
+                if m_row == None: return {}
+                m_manifest = imJsonParse(m_row[0])
+                m_mediaFiles = [imJsonParse(t_row[0]) for t_row in self.c_connection.execute(
+                    'SELECT entry FROM media WHERE version = ? ORDER BY position', (p_version,))]
+                if ('mediaFiles' in m_manifest) or m_mediaFiles: m_manifest['mediaFiles'] = m_mediaFiles
+                return m_manifest
+            except Exception as e:
+                self.c_lastError = 'Error in loading the manifest: %s%s' % (m_errProcessName, str(e.args))
+                return {}
+
+    def getVersions(self):
+        '''Returns (version, saved at epoch seconds, number of media) of the kept versions, newest first'''
+        with self.__c_lock:
+            return self.c_connection.execute('''SELECT manifests.version, manifests.savedAt, COUNT(media.position) FROM manifests
+                LEFT JOIN media ON media.version = manifests.version GROUP BY manifests.version
+                ORDER BY manifests.version DESC''').fetchall()
+
+    def rollback(self, p_version=None):
+        '''Makes an older version the current one
+            @Params
+                p_version -> the version to go back to, the one before the current if None
+            @Return
+                the server json of that version, {} if there is none to go back to'''
+
+        m_errProcessName = self.__class__.__name__ + '-rollback ->'
+        with self.__c_lock:
+            try:
+                if p_version == None:
+                    m_row = self.c_connection.execute('SELECT version FROM manifests WHERE version < ? ORDER BY version DESC LIMIT 1',
+                                                      (self.c_currentVersion or 0,)).fetchone()
+                    if m_row == None: return {}
+                    p_version = m_row[0]
+                m_row = self.c_connection.execute('SELECT digest FROM manifests WHERE version = ?', (p_version,)).fetchone()
+                if m_row == None: return {}
+                with self.c_connection: self.__setCurrentVersion(p_version)
+                self.c_currentVersion, self.c_currentDigest = p_version, m_row[0]
+                self.__c_lastDigest = (None, None)
+                return self.loadManifest(p_version)
+            except Exception as e:
+                self.c_lastError = 'Error in rolling back the manifest: %s%s' % (m_errProcessName, str(e.args))
+                return {}
+
+    def __setCurrentVersion(self, p_version):
+        '''(Private method)Runs inside the transaction of the caller'''
+        self.c_connection.execute("INSERT OR REPLACE INTO settings VALUES ('currentVersion', ?)", (str(p_version),))
+
+    def __pruneHistory(self):
+        '''(Private method)Drops the versions older than the last c_historySize, runs inside the transaction of the caller'''
+        m_row = self.c_connection.execute('SELECT version FROM manifests ORDER BY version DESC LIMIT 1 OFFSET ?',
+                                          (max(1, self.c_historySize) - 1,)).fetchone()
+        if m_row == None: return
+        self.c_connection.execute('DELETE FROM media WHERE version < ?', (m_row[0],))
+        self.c_connection.execute('DELETE FROM manifests WHERE version < ?', (m_row[0],))
+
+    ##========================>>
+    ##Queries of the current version
+    ##========================>>
+    def findMedia(self, p_fileName):
+        '''Media entries of a file in the current version, a file can be listed more than once'''
+        with self.__c_lock:
+            return [imJsonParse(t_row[0]) for t_row in self.c_connection.execute(
+                'SELECT entry FROM media WHERE version = ? AND fileName = ? ORDER BY position', (self.c_currentVersion, p_fileName))]
+
+    def getScheduledMedia(self):
+        '''Media entries of the current version that have a start time, earliest first'''
+        with self.__c_lock:
+            return [imJsonParse(t_row[0]) for t_row in self.c_connection.execute(
+                '''SELECT entry FROM media WHERE version = ? AND startTime IS NOT NULL AND TRIM(startTime) != ''
+                ORDER BY startTime, position''', (self.c_currentVersion,))]
+
+    ##========================>>
+    ##Download state of the files
+    ##========================>>
+    def setDownloadStates(self, p_states):
+        '''Records the download state of files in one transaction
+            @Params
+                p_states -> list of (file name, identity, state, bytes or None, error or None),
+                            a DOWNLOAD_DOWNLOADING state counts as an attempt'''
+
+        m_errProcessName = self.__class__.__name__ + '-setDownloadStates ->'
+        with self.__c_lock:
+            try:
+                m_now = imTime()
+                with self.c_connection:
+                    self.c_connection.executemany('''INSERT INTO downloads (fileName, identity, state, bytes, attempts, error, updatedAt)
+                        VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7) ON CONFLICT (fileName) DO UPDATE SET identity = ?2, state = ?3,
+                        bytes = COALESCE(?4, bytes), attempts = CASE WHEN identity IS ?2 THEN attempts + ?5 ELSE ?5 END,
+                        error = ?6, updatedAt = ?7''',
+                        ((t_fileName, imJsonString(t_identity), t_state, t_bytes, int(t_state == DOWNLOAD_DOWNLOADING), t_error, m_now)
+                         for t_fileName, t_identity, t_state, t_bytes, t_error in p_states))
+            except Exception as e:
+                self.c_lastError = 'Error in recording the download states: %s%s' % (m_errProcessName, str(e.args))
+
+    def getDownloadStates(self, p_state=None):
+        '''Returns file name -> {'identity', 'state', 'bytes', 'attempts', 'error', 'updatedAt'}
+            @Params
+                p_state -> only the files in this state, all if None'''
+        with self.__c_lock:
+            m_query = 'SELECT fileName, identity, state, bytes, attempts, error, updatedAt FROM downloads'
+            m_rows = self.c_connection.execute(m_query + ' WHERE state = ?', (p_state,)) if p_state != None else self.c_connection.execute(m_query)
+            return dict((t_row[0], {'identity' : imJsonParse(t_row[1]) if t_row[1] != None else None, 'state' : t_row[2],
+                                    'bytes' : t_row[3], 'attempts' : t_row[4], 'error' : t_row[5], 'updatedAt' : t_row[6]})
+                        for t_row in m_rows)
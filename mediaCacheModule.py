@@ -0,0 +1,206 @@
+from os import (
+    path as imPath,
+    remove as imDelete,
+    listdir as imListFile,
+    makedirs as imMakeDirs,
+    replace as imReplaceFile,
+    statvfs as imFileSystemStats
+)
+
+from json import (
+    load as imJsonLoad,
+    dump as imSaveJson
+)
+
+from time import time as imTime
+from threading import RLock as imLock
+
+from downloadManagerModule import PARTIAL_DOWNLOAD_SUFFIX
+
+class MediaCacheModule():
+    '''Media Cache Module
+        Keeps the media directory within a byte budget. Every stored file is tracked
+        in an index (size, content identity, last time it was added or aired) that is
+        kept in memory and saved beside the configurations, so the stored bytes are
+        known without listing the directory or running df
+
+        Files that the current server json does not reference are not deleted right
+        away, they stay until the space is needed and are then evicted least recently
+        aired first, so a campaign that comes back does not have to be downloaded again
+
+    @Usage: (On a project)
+        import mediaCacheModule
+
+        g_MediaCacheModule = mediaCacheModule.MediaCacheModule()
+        g_MediaCacheModule.c_mediaDir = '/home/pi/media files/'
+        g_MediaCacheModule.c_indexFile = '/home/pi/configurations/mediaCache.json'
+        g_MediaCacheModule.c_budgetBytes = 8 * 1024 ** 3
+        g_MediaCacheModule.loadIndex()
+
+        g_MediaCacheModule.reserveSpace(250 * 1024 ** 2, ['rpi1.mp4', 'rpi2.mp4']) ##evicts anything but the listed files
+        g_MediaCacheModule.addMedia('rpi3.mp4', ('rpi3.mp4', None, None, None))
+        g_MediaCacheModule.touchMedia('rpi1.mp4')   ##on every airing
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+
+        self.c_mediaDir = None
+        self.c_indexFile = None
+        self.c_budgetBytes = 0  ##maximum bytes of media to keep, 0 for no budget other than the free space
+        self.c_reserveBytes = 100 * 1024 * 1024 ##free space to always leave on the storage
+        self.c_saveInterval = 60    ##seconds between index saves caused only by airings
+        self.c_forgetListener = None    ##called with the file name when a file has left the cache
+        self.c_derivedBytesGetter = None    ##returns the bytes of files made from the media (encoded copies), counted in the budget
+
+        self.c_index = {}   ##file name -> {'size', 'identity', 'lastUsed'}
+        self.c_storedBytes = 0
+        self.c_evictedCount = 0
+        self.c_hitCount = 0 ##media of the server json that was already stored
+        self.c_missCount = 0    ##media of the server json that had to be downloaded
+        self.__c_lock = imLock()
+        self.__c_lastSaved = 0
+        self.__c_isDirty = False
+
+        self.c_lastError = ''
+
+    def loadIndex(self):
+        '''Loads the saved index and reconciles it once with the media directory,
+            files that appeared are added and files that disappeared are dropped'''
+
+        m_errProcessName = self.__class__.__name__ + '-loadIndex ->'
+        with self.__c_lock:
+            try:
+                if not imPath.isdir(self.c_mediaDir): imMakeDirs(self.c_mediaDir)
+                m_savedIndex = {}
+                if (self.c_indexFile != None) and imPath.isfile(self.c_indexFile):
+                    with open(self.c_indexFile, 'r') as t_indexFile: m_savedIndex = imJsonLoad(t_indexFile)
+
+                self.c_index = {}
+                for t_fileName in imListFile(self.c_mediaDir):
+                    t_filePath = self.c_mediaDir + t_fileName
+                    if (not imPath.isfile(t_filePath)) or t_fileName.endswith(PARTIAL_DOWNLOAD_SUFFIX): continue
+                    t_entry = m_savedIndex.get(t_fileName, {})
+                    t_size = imPath.getsize(t_filePath)
+                    ##A file that changed size behind the index has an unknown identity
+                    if t_entry.get('size') != t_size: t_entry = {'identity' : None, 'lastUsed' : imPath.getmtime(t_filePath)}
+                    t_entry['size'] = t_size
+                    self.c_index[t_fileName] = t_entry
+                self.c_storedBytes = sum(t_entry['size'] for t_entry in self.c_index.values())
+                self.saveIndex()
+            except Exception as e:
+                self.c_lastError = 'Error in loading the media cache index: %s%s' % (m_errProcessName, str(e.args))
+
+    def saveIndex(self):
+        '''Writes the index to a temporary file and moves it over the old one'''
+
+        m_errProcessName = self.__class__.__name__ + '-saveIndex ->'
+        if self.c_indexFile == None: return
+        with self.__c_lock:
+            try:
+                with open(self.c_indexFile + '.tmp', 'w') as t_indexFile: imSaveJson(self.c_index, t_indexFile)
+                imReplaceFile(self.c_indexFile + '.tmp', self.c_indexFile)
+                self.__c_lastSaved = imTime()
+                self.__c_isDirty = False
+            except Exception as e:
+                self.c_lastError = 'Error in saving the media cache index: %s%s' % (m_errProcessName, str(e.args))
+
+    def getFreeBytes(self):
+        '''Free bytes of the file system holding the media directory'''
+        m_stats = imFileSystemStats(self.c_mediaDir if self.c_mediaDir != None else '/')
+        return m_stats.f_bavail * m_stats.f_frsize
+
+    def hasMedia(self, p_fileName, p_identity):
+        '''Checks if a file is stored with the given content identity
+            @Params
+                p_fileName -> the media file name
+                p_identity -> identity of the media entry, see FileManagerModule.getMediaIdentity'''
+        m_entry = self.c_index.get(p_fileName)
+        return (m_entry != None) and (m_entry.get('identity') == list(p_identity))
+
+    def hasOtherVersion(self, p_fileName, p_identity):
+        '''Checks if a file is stored for a different, known content identity
+            @Params
+                p_fileName -> the media file name
+                p_identity -> identity of the media entry, see FileManagerModule.getMediaIdentity'''
+        m_entry = self.c_index.get(p_fileName)
+        return (m_entry != None) and (m_entry.get('identity') != None) and (m_entry['identity'] != list(p_identity))
+
+    def addMedia(self, p_fileName, p_identity):
+        '''Records a file that was just placed in the media directory
+            @Params
+                p_fileName -> the media file name
+                p_identity -> identity of the media entry it was downloaded for'''
+        with self.__c_lock:
+            m_size = imPath.getsize(self.c_mediaDir + p_fileName)
+            if p_fileName in self.c_index: self.c_storedBytes -= self.c_index[p_fileName]['size']
+            self.c_index[p_fileName] = {'size' : m_size, 'identity' : list(p_identity), 'lastUsed' : imTime()}
+            self.c_storedBytes += m_size
+            self.saveIndex()
+
+    def touchMedia(self, p_fileName):
+        '''Marks a file as just aired, it becomes the last to be evicted'''
+        with self.__c_lock:
+            if p_fileName not in self.c_index: return
+            self.c_index[p_fileName]['lastUsed'] = imTime()
+            self.__c_isDirty = True
+            if imTime() - self.__c_lastSaved >= self.c_saveInterval: self.saveIndex()
+
+    def forgetMedia(self, p_fileName):
+        '''Drops a file from the index, for files deleted from outside the cache'''
+        with self.__c_lock:
+            m_entry = self.c_index.pop(p_fileName, None)
+            if m_entry == None: return
+            self.c_storedBytes -= m_entry['size']
+            self.__c_isDirty = True
+            if self.c_forgetListener != None: self.c_forgetListener(p_fileName)
+
+    def evictMedia(self, p_fileName):
+        '''Deletes a stored file and drops it from the index'''
+        m_errProcessName = self.__class__.__name__ + '-evictMedia ->'
+        with self.__c_lock:
+            try:
+                if imPath.exists(self.c_mediaDir + p_fileName): imDelete(self.c_mediaDir + p_fileName)
+                self.forgetMedia(p_fileName)
+                self.c_evictedCount += 1
+                print('\tEvicted %s from the media cache' % p_fileName)
+            except Exception as e:
+                self.c_lastError = 'Error in evicting %s: %s%s' % (p_fileName, m_errProcessName, str(e.args))
+
+    def reserveSpace(self, p_bytes, p_protectedFiles):
+        '''Evicts unprotected files, least recently aired first, until p_bytes more
+            fit in the budget and still leave c_reserveBytes free on the storage
+            @Params
+                p_bytes -> number of bytes about to be downloaded
+                p_protectedFiles -> file names that must not be evicted (referenced by the server json)
+            @Return
+                True -> if the space is available
+                False -> if it is not even after evicting everything allowed'''
+
+        m_errProcessName = self.__class__.__name__ + '-reserveSpace ->'
+        with self.__c_lock:
+            try:
+                m_protectedFiles = set(p_protectedFiles)
+                m_candidates = sorted((t_entry['lastUsed'], t_fileName) for t_fileName, t_entry in self.c_index.items()
+                                      if t_fileName not in m_protectedFiles)
+                m_freeBytes = self.getFreeBytes()
+                for t_lastUsed, t_fileName in m_candidates:
+                    if self.__isWithinBudget(p_bytes, m_freeBytes): break
+                    m_freeBytes += self.c_index[t_fileName]['size']
+                    self.evictMedia(t_fileName)
+                if self.__c_isDirty: self.saveIndex()
+                return self.__isWithinBudget(p_bytes, self.getFreeBytes())
+            except Exception as e:
+                self.c_lastError = 'Error in reserving media storage: %s%s' % (m_errProcessName, str(e.args))
+                return False
+
+    def __isWithinBudget(self, p_bytes, p_freeBytes):
+        '''(Private method)Checks both the byte budget and the free space'''
+        m_derivedBytes = self.c_derivedBytesGetter() if self.c_derivedBytesGetter != None else 0
+        if self.c_budgetBytes and (self.c_storedBytes + m_derivedBytes + p_bytes > self.c_budgetBytes): return False
+        return p_freeBytes - p_bytes >= self.c_reserveBytes
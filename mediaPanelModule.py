@@ -1,178 +1,212 @@
-import vlc
-from os import path as imPath
-from time import time as imTime
-from threading import Thread as imThread
-
-import gi
-gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk
-gi.require_version('GdkX11', '3.0')
-from gi.repository import GdkX11
-
-class MediaPanelModule(Gtk.Window):
-    '''Creates a gui panel that will encapsulate the media player so playing and
-        stoping the media will not make the scree flicker simplified version of
-        media player handler
-
-        @Precaution:
-            If a media was to be deleted while the media player was still playing
-            please use:
-
-                g_MediaPanel.stop()
-
-            to ensure the file deletion will not throw file handle error
-
-        @Usage: (On a project)
-            import mediaPanelModule
-            g_MediaPanel = mediaPanelModule.MediaPanelModule()
-            g_MediaPanel.show_all()
-            ##You can use this module to play just one media by:
-            g_MediaPanel.playMedia('Exact/media/directory/MediaFile.mp4')
-            
-            ##Or just queue up a list of media to play then start the thread
-            g_MediaPanel.c_mediaResourceLocatorList = videoList ##Necessary to add playlist for the media player
-            g_MediaPanel.c_isMediaListPlayerOn = True ##Necessary to enable the thread that will play the media
-            g_MediaPanel.startMediaListPlayer()
-        
-        @Supported video formats:
-            -MP4
-            -MOV
-            -AVI
-            
-        @Supported image formats:
-            -JPG
-            -PNG
-
-        @Variable / Method prefixes:
-            im -> Imported method
-            c_ -> Class variable
-            m_ -> Method variable
-            t_ -> temporary variable
-            __ -> methods to be used only by the class'''
-
-    def __init__(self):
-        '''Pre initialize the needed component
-            @Params:
-            -p_isPlaybackEnabled -> enables sequencial playing of medias in the list
-            -p_imageDisplayTime -> default number of seconds to display an image media'''
-        
-        Gtk.Window.__init__(self)
-        self.fullscreen()
-        self.connect("destroy",Gtk.main_quit)
-        
-        ##To make the media panel the size of the screen
-        self.__c_screenHeight = Gtk.Window().get_screen().get_height()
-        self.__c_screenWidth = Gtk.Window().get_screen().get_width()
-
-        ##Variables for media player
-        self.c_currentMedia = None
-        self.c_mediaPlayer = None
-        self.c_airedStampTime = 0
-        self.c_isMediaEndReached = True
-
-        ##Variables for media list player
-        self.c_mediaListPlayerThread = None
-        self.c_isMediaListPlayerOn = False
-        self.c_mediaIndex = 0
-        self.c_scheduledMediaIndex = 0  ##Not implemented yet
-        self.c_mediaResourceLocatorList = []
-        
-        ##Sets up the instance of the gui as well as the media player and its events
-        self.c_videoPanel = Gtk.DrawingArea()
-        self.c_videoPanel.set_size_request(self.__c_screenWidth, self.__c_screenHeight)
-        self.c_videoPanel.connect("realize",self.__realized)
-        self.vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
-        self.add(self.vbox)
-        self.vbox.pack_start(self.c_videoPanel, True, True, 0)
-        
-        self.c_lastError = ''
-        
-    def __realized(self, p_widget, data=None):
-        '''Creates the media player instance in the draw area of the gui
-        @Vlc instance params:
-        --no-xlib -> please check the documentations
-        --avcodec-threads -> sets the number of threads for decoding the video
-        --sout-avcodec-hurry-up -> set the encoder to make on-the-fly quality trade
-                        offs if the cpu cant keep up with the rate'''
-        
-        ##create a media player instance and attach it to gui panel
-        m_windowID = p_widget.get_window().get_xid()
-        self.c_vlcInstance = vlc.Instance("--no-xlib --avcodec-threads=3 --sout-avcodec-hurry-up")
-        self.c_mediaPlayer = self.c_vlcInstance.media_player_new()
-        self.c_mediaPlayer.set_xwindow(m_windowID)
-        
-        ##Set up an event listener, call a function on event
-        self.c_mediaPlayerEndWatcher = self.c_mediaPlayer.event_manager()
-        self.c_mediaPlayerEndWatcher.event_attach(vlc.EventType().MediaPlayerEndReached, self.__setMediaEndReached)
-    
-    ##========================>>
-    ##Media player instructions
-    ##========================>>
-    def playMediaList(self, p_isScheduled):
-        '''Play / loop over a list of media files, does nothing if media playing is not enabled'''
-        print('Media playlist thread has started')
-
-        ##start the playing of media list if switch is on and media list is not empty
-        while(self.c_isMediaListPlayerOn and len(self.c_mediaResourceLocatorList)):
-            
-            ##Check first if the previously played media has ended
-            if (self.c_isMediaEndReached):
-                if (p_isScheduled):
-##                    print('\nPlaying scheduled media in %s' % (self.c_mediaResourceLocatorList[0]) )
-                    self.playMedia(self.c_mediaResourceLocatorList[0])
-                else:
-##                    print('\nPlaying unscheduled media in %s' % (self.c_mediaResourceLocatorList[self.c_mediaIndex]) )
-                    self.playMedia(self.c_mediaResourceLocatorList[self.c_mediaIndex])
-                    self.c_mediaIndex = (self.c_mediaIndex + 1) % len(self.c_mediaResourceLocatorList)
-             
-        print('Media playlist thread has stopped')
-
-    def startMediaListPlayer(self, p_isScheduled=False):
-        '''Starts the media list player in threaded mode
-            @Params
-                p_isScheduled -> '''
-        self.c_isMediaListPlayerOn = True
-        self.c_mediaListPlayerThread = imThread (target = self.playMediaList, args=(p_isScheduled,))
-        self.c_mediaListPlayerThread.start()
-        while(self.c_mediaPlayer.get_state() != vlc.State.Playing): continue
-            
-    def playMedia(self, p_mediaResourceLocator):
-        '''Play a single a media only, checks first if the file exist, if not do nothing
-            if already playing media, stop then play the new media'''
-        if imPath.isfile(p_mediaResourceLocator):
-            if ( not self.c_isMediaEndReached ) : self.stop()
-            self.c_mediaPlayer.set_mrl(p_mediaResourceLocator)
-            self.c_currentMedia = p_mediaResourceLocator
-            self.c_mediaPlayer.play()
-            self.c_airedStampTime = int(imTime())
-            self.c_isMediaEndReached = False
-        else:
-            self.c_lastError = 'File in (' + p_mediaResourceLocator + ') does not exist yet'
-
-    def play(self):
-        self.c_isMediaEndReached = False
-        self.c_mediaPlayer.play()
-
-    def pause(self):
-        self.c_mediaPlayer.pause()
-
-    def stop(self):
-        self.c_isMediaListPlayerOn = False
-        self.c_airedStampTime = 0
-        self.c_mediaPlayer.stop()
-        self.c_isMediaEndReached = True
-
-    def __setMediaEndReached(self, p_event):
-        '''Indicate that the end of the media was reached
-            this is a lot faster than getting the state of the media player'''
-        self.c_isMediaEndReached = True
-
-    def getAiredTime(self):
-        '''Returns the number of seconds a media was played'''
-        if self.c_airedStampTime != 0:
-            return int(imTime()) - self.c_airedStampTime
-        else:
-            return 0
-    ##========================<<
-    ##Media player instructions
-    ##========================<<
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk
+from gi.repository import Gdk
+from gi.repository import GLib
+gi.require_version('GdkX11', '3.0')
+from gi.repository import GdkX11
+
+from threading import (
+    Event as imEvent,
+    current_thread as imCurrentThread
+)
+
+from mediaPlayerModule import MediaPlayerModule
+from imageCacheModule import ImageCacheModule
+from playerBackendModule import (
+    VlcPlayerBackend,
+    DoubleBufferedVlcBackend,
+    ImageSlideshowBackend
+)
+
+class MediaPanelModule(Gtk.Window, MediaPlayerModule):
+    '''Creates a gui panel that will encapsulate the media player so playing and
+        stoping the media will not make the scree flicker simplified version of
+        media player handler, the playlist logic is in MediaPlayerModule and the
+        media is played by a VlcPlayerBackend drawing in the window
+
+        Double buffered, a second drawing area is stacked on the first and a
+        DoubleBufferedVlcBackend pre-rolls the next media in the hidden one
+
+        Images do not go through vlc, an ImageSlideshowBackend decodes them once at
+        the size of the screen, keeps them in c_imageCache and shows them in an image
+        widget beside the video for p_imageDisplayTime seconds
+
+        Gtk3 is not thread safe, the player threads hand their gui calls to the gtk
+        main loop, runGuiLoop has to run on the thread that made the panel (the main
+        thread) or nothing they ask for reaches the screen
+
+        @Precaution:
+            If a media was to be deleted while the media player was still playing
+            please use:
+
+                g_MediaPanel.stop()
+
+            to ensure the file deletion will not throw file handle error
+
+        @Usage: (On a project)
+            import mediaPanelModule
+            g_MediaPanel = mediaPanelModule.MediaPanelModule()  ##or MediaPanelModule(True) to double buffer
+            g_MediaPanel.show_all()
+            ##You can use this module to play just one media by:
+            g_MediaPanel.playMedia('Exact/media/directory/MediaFile.mp4')
+            
+            ##Or just queue up a list of media to play then start the thread
+            g_MediaPanel.c_mediaResourceLocatorList = videoList ##Necessary to add playlist for the media player
+            g_MediaPanel.c_isMediaListPlayerOn = True ##Necessary to enable the thread that will play the media
+            g_MediaPanel.startMediaListPlayer()
+
+            g_MediaPanel.runGuiLoop()   ##on the main thread, until quitGuiLoop
+        
+        @Supported video formats:
+            -MP4
+            -MOV
+            -AVI
+            
+        @Supported image formats:
+            -JPG
+            -PNG
+            (shown for p_imageDisplayTime seconds)
+
+        @Variable / Method prefixes:
+            im -> Imported method
+            c_ -> Class variable
+            m_ -> Method variable
+            t_ -> temporary variable
+            __ -> methods to be used only by the class'''
+
+    def __init__(self, p_isDoubleBuffered=False, p_imageDisplayTime=10, p_imageCacheBudget=64 * 1024 ** 2):
+        '''Pre initialize the needed component
+            @Params:
+            -p_isDoubleBuffered -> play on two stacked players, switching to a pre-rolled media is a swap
+            -p_imageDisplayTime -> seconds an image is shown
+            -p_imageCacheBudget -> bytes of decoded images kept in memory'''
+        
+        Gtk.Window.__init__(self)
+        MediaPlayerModule.__init__(self)
+        self.fullscreen()
+        self.connect("destroy",Gtk.main_quit)
+        
+        ##To make the media panel the size of the screen
+        self.__c_screenHeight = Gtk.Window().get_screen().get_height()
+        self.__c_screenWidth = Gtk.Window().get_screen().get_width()
+
+        ##Images are decoded once at the size of the screen
+        self.c_imageDisplayTime = p_imageDisplayTime
+        self.c_imageCache = ImageCacheModule()
+        self.c_imageCache.c_width = self.__c_screenWidth
+        self.c_imageCache.c_height = self.__c_screenHeight
+        self.c_imageCache.c_budgetBytes = p_imageCacheBudget
+        self.c_imagePanel = Gtk.Image()
+        self.c_stack = Gtk.Stack()
+        self.c_displayedImageCount = 0  ##images the gui put on screen, behind the count of the backend if the main loop does not run
+
+        ##Gui calls of the other threads run on the gtk main loop of this thread
+        self.c_guiTimeout = 1   ##seconds a player thread waits for its gui call
+        self.c_isGuiLoopRunning = False
+        self.__c_guiThread = imCurrentThread()
+
+        ##Sets up the instance of the gui as well as the media player and its events
+        self.c_videoPanel = Gtk.DrawingArea()
+        self.c_videoPanel.set_size_request(self.__c_screenWidth, self.__c_screenHeight)
+        self.c_videoPanel.connect("realize",self.__realized)
+        self.vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        self.add(self.vbox)
+        self.vbox.pack_start(self.c_stack, True, True, 0)
+
+        self.c_isDoubleBuffered = p_isDoubleBuffered
+        self.c_standbyPanel = None
+        if p_isDoubleBuffered:
+            ##The second drawing area covers the first, only one of their windows is shown at a time
+            self.c_standbyPanel = Gtk.DrawingArea()
+            self.c_standbyPanel.set_size_request(self.__c_screenWidth, self.__c_screenHeight)
+            self.c_standbyPanel.connect("realize",self.__realized)
+            self.c_overlay = Gtk.Overlay()
+            self.c_overlay.add(self.c_videoPanel)
+            self.c_overlay.add_overlay(self.c_standbyPanel)
+            self.c_stack.add_named(self.c_overlay, 'video')
+        else:
+            self.c_stack.add_named(self.c_videoPanel, 'video')
+        self.c_stack.add_named(self.c_imagePanel, 'image')
+        
+    def __realized(self, p_widget, data=None):
+        '''Creates the media player instance in the draw area of the gui'''
+        
+        ##create a media player instance and attach it to gui panel
+        if not self.c_isDoubleBuffered:
+            m_windowID = p_widget.get_window().get_xid()
+            self.setBackend(self.__makeSlideshowBackend(VlcPlayerBackend(m_windowID)))
+            return
+
+        ##Both drawing areas need their window before the players can be attached
+        if not (self.c_videoPanel.get_realized() and self.c_standbyPanel.get_realized()): return
+        self.c_playerWindows = [self.c_videoPanel.get_window(), self.c_standbyPanel.get_window()]
+        m_backend = DoubleBufferedVlcBackend([t_window.get_xid() for t_window in self.c_playerWindows])
+        ##Waits for the swap, the backend stops the outgoing player right after
+        m_backend.c_showWindowListener = lambda p_index: self.__runOnGui(self.__showPlayerWindow, p_index)
+        self.setBackend(self.__makeSlideshowBackend(m_backend))
+        self.__runOnGui(self.__showPlayerWindow, 0)
+
+    def __makeSlideshowBackend(self, p_videoBackend):
+        '''Puts the image path in front of the vlc backend'''
+        m_backend = ImageSlideshowBackend(p_videoBackend, self.c_imageCache)
+        m_backend.c_imageDisplayTime = self.c_imageDisplayTime
+        ##Waits for the image to be on screen, the backend stops the video right after
+        m_backend.c_showImageListener = lambda p_image: self.__runOnGui(self.__showImage, p_image)
+        return m_backend
+
+    def runGuiLoop(self):
+        '''Runs the gtk main loop on the calling thread, the one that made the panel,
+            returns after quitGuiLoop or once the window is destroyed'''
+        GLib.idle_add(self.__setGuiLoopRunning)
+        Gtk.main()
+        self.c_isGuiLoopRunning = False
+
+    def quitGuiLoop(self):
+        '''Ends runGuiLoop, safe to call from any thread'''
+        GLib.idle_add(Gtk.main_quit)
+
+    def __setGuiLoopRunning(self):
+        '''(Private method)First call of the main loop'''
+        self.c_isGuiLoopRunning = True
+        return False
+
+    def __runOnGui(self, p_function, *p_args):
+        '''(Private method)Runs a gui call on the gtk main loop and waits for it to be done,
+            right away when called on the gui thread
+            @Return
+                True -> if the call ran, False if the main loop did not take it in c_guiTimeout'''
+        if imCurrentThread() is self.__c_guiThread:
+            p_function(*p_args)
+            return True
+
+        m_doneEvent = imEvent()
+        def m_run():
+            try: p_function(*p_args)
+            finally: m_doneEvent.set()
+            return False
+        GLib.idle_add(m_run)
+        if m_doneEvent.wait(self.c_guiTimeout): return True
+        self.c_lastError = 'Gui call %s did not run in %ss, is runGuiLoop running: %s' % (p_function.__name__, self.c_guiTimeout, self.c_isGuiLoopRunning)
+        print(self.c_lastError)
+        return False
+
+    def __showImage(self, p_image):
+        '''Shows a decoded image over the video, the video again if None (runs on the gui thread)'''
+        if p_image == None:
+            self.c_stack.set_visible_child_name('video')
+            ##Mapping the video again shows both player windows, only the active one should be
+            if self.c_isDoubleBuffered: self.__showPlayerWindow(self.c_backend.c_videoBackend.c_activePlayer)
+        else:
+            self.c_imagePanel.set_from_pixbuf(p_image)
+            self.c_stack.set_visible_child_name('image')
+            self.c_displayedImageCount += 1
+
+    def __showPlayerWindow(self, p_index):
+        '''Puts the window of the given player on top and hides the other one,
+            the new one is shown before the old one is hidden so nothing shows through
+            (runs on the gui thread)'''
+        self.c_playerWindows[p_index].show()
+        self.c_playerWindows[p_index].raise_()
+        self.c_playerWindows[1 - p_index].hide()
+        Gdk.flush()
@@ -0,0 +1,296 @@
+from os import path as imPath
+from time import (
+    time as imTime,
+    monotonic as imMonotonic
+)
+from threading import (
+    Thread as imThread,
+    Event as imEvent,
+    Lock as imLock
+)
+
+##Why an airing ended, see c_airingListener
+AIRING_COMPLETED = 'completed'  ##played to its end
+AIRING_SWITCHED = 'switched'    ##replaced by another media or list, e.g. a schedule change
+AIRING_STOPPED = 'stopped'  ##the player was stopped, e.g. on a shutdown
+
+class MediaPlayerModule():
+    '''Plays single media or loops over a list of media on a player backend, the
+        playlist logic of the media panel without the gui, so it can run headless
+
+        @Precaution:
+            If a media was to be deleted while the media player was still playing
+            please use:
+
+                g_MediaPlayerModule.stop()
+
+            to ensure the file deletion will not throw file handle error
+
+        @Usage: (On a project)
+            import mediaPlayerModule
+            import playerBackendModule
+            g_MediaPlayerModule = mediaPlayerModule.MediaPlayerModule()
+            g_MediaPlayerModule.setBackend(playerBackendModule.HeadlessPlayerBackend())
+            ##You can use this module to play just one media by:
+            g_MediaPlayerModule.playMedia('Exact/media/directory/MediaFile.mp4')
+
+            ##Or just queue up a list of media to play then start the thread
+            g_MediaPlayerModule.c_mediaResourceLocatorList = videoList ##Necessary to add playlist for the media player
+            g_MediaPlayerModule.startMediaListPlayer()
+
+            ##A schedule change, the media is pre-rolled a little before so the switch is only a swap
+            g_MediaPlayerModule.prerollMedia(scheduledVideo)
+            g_MediaPlayerModule.switchMediaList([scheduledVideo], p_isScheduled=True)
+
+        @Variable / Method prefixes:
+            im -> Imported method
+            c_ -> Class variable
+            m_ -> Method variable
+            t_ -> temporary variable
+            __ -> methods to be used only by the class'''
+
+    def __init__(self):
+
+        ##Variables for media player
+        self.c_backend = None   ##see playerBackendModule, set with setBackend
+        self.c_currentMedia = None
+        self.c_airedStampTime = 0
+        self.c_isMediaEndReached = True
+        self.c_mediaEndListener = None  ##called without arguments when a media has ended
+        self.c_mediaStartListener = None    ##called with the media resource locator when a media has started
+        self.c_switchListener = None    ##called with the seconds between the end of a media and the next one playing
+        self.c_mediaResolver = None ##returns the file the backend plays for a media, e.g. TranscodeModule.getPlayableMedia
+        self.c_durationResolver = None  ##returns the seconds of a media or None, e.g. MetadataIndexModule.getDuration
+        self.c_airingListener = None    ##called with (media, started at, ended at, AIRING_* reason, is scheduled) when an airing ends
+        self.c_mediaEndEvent = imEvent()    ##wakes the media list player thread when a media has ended
+        self.c_mediaPlayingEvent = imEvent()    ##set once the media player has started playing
+
+        ##Seconds between the end of a media and the next one playing
+        self.c_lastSwitchLatency = 0
+        self.c_maxSwitchLatency = 0
+        self.c_switchCount = 0
+        self.__c_mediaEndedAt = None
+
+        ##Variables for media list player
+        self.c_mediaListPlayerThread = None
+        self.c_isMediaListPlayerOn = False
+        self.c_mediaIndex = 0
+        self.c_scheduledMediaIndex = 0  ##Not implemented yet
+        self.c_mediaResourceLocatorList = []
+        self.c_mediaListGeneration = 0  ##changes on every start so an old playlist thread knows it has to end
+        self.c_preloadedMedia = None    ##(media resource locator, prepared media of the backend) of the next media in the list
+        self.__c_pinnedMedia = None ##media resource locator of prerollMedia, kept until it was played
+        self.__c_preloadLock = imLock()
+        self.c_mediaRetryDelay = 1  ##seconds to wait when none of the media in the list can be played
+        self.c_preloadLead = 3  ##seconds before the end of a media of known duration to parse the next one
+        self.c_isScheduledList = False  ##the list being played is the media of a schedule slot
+        self.__c_airing = None  ##(media resource locator, epoch time it started, is scheduled) of the media on screen
+        self.__c_airingLock = imLock()
+
+        self.c_lastError = ''
+
+    def setBackend(self, p_backend):
+        '''Plays on the given backend from now on
+            @Params
+                p_backend -> a playerBackendModule.PlayerBackend'''
+        self.c_backend = p_backend
+        self.c_backend.c_endReachedListener = self.__setMediaEndReached
+        self.c_backend.c_playingListener = self.__setMediaPlaying
+
+    ##========================>>
+    ##Media player instructions
+    ##========================>>
+    def playMediaList(self, p_isScheduled, p_generation):
+        '''Play / loop over a list of media files, does nothing if media playing is not enabled
+            The thread sleeps until the media player reports the end of the media, the next
+            media is already parsed by then so the switch does not wait on the file
+            @Params
+                p_isScheduled -> repeat the first media of the list instead of looping over the list
+                p_generation -> the c_mediaListGeneration this thread was started for'''
+        print('Media playlist thread has started')
+        m_failedInARow = 0
+
+        ##start the playing of media list if switch is on and media list is not empty
+        while(self.__isMediaListCurrent(p_generation) and len(self.c_mediaResourceLocatorList)):
+
+            ##Sleep until the previously played media has ended
+            if (not self.c_isMediaEndReached):
+                self.c_mediaEndEvent.wait()
+                self.c_mediaEndEvent.clear()
+                continue
+
+            if (p_isScheduled): self.c_mediaIndex = 0
+            self.c_mediaIndex = self.c_mediaIndex % len(self.c_mediaResourceLocatorList)
+            m_mediaResourceLocator = self.c_mediaResourceLocatorList[self.c_mediaIndex]
+            if (not p_isScheduled):
+                self.c_mediaIndex = (self.c_mediaIndex + 1) % len(self.c_mediaResourceLocatorList)
+            self.playMedia(m_mediaResourceLocator, self.__takePreloadedMedia(m_mediaResourceLocator))
+
+            if (self.c_isMediaEndReached):
+                ##File was not playable, do not spin when the whole list is missing
+                m_failedInARow += 1
+                if m_failedInARow >= len(self.c_mediaResourceLocatorList):
+                    m_failedInARow = 0
+                    self.c_mediaEndEvent.wait(self.c_mediaRetryDelay)
+                continue
+            m_failedInARow = 0
+
+            ##Parse the next media while this one is playing, when its duration is known only
+            ##c_preloadLead seconds before the end so the standby player is not held all along
+            m_remainingTime = self.getRemainingTime()
+            if (m_remainingTime != None) and (m_remainingTime > self.c_preloadLead):
+                self.c_mediaEndEvent.wait(m_remainingTime - self.c_preloadLead)
+                if not self.__isMediaListCurrent(p_generation): break
+            self.__preloadMedia(self.c_mediaResourceLocatorList[self.c_mediaIndex % len(self.c_mediaResourceLocatorList)])
+
+        print('Media playlist thread has stopped')
+
+    def startMediaListPlayer(self, p_isScheduled=False, p_timeout=5):
+        '''Starts the media list player in threaded mode, returns once the media player is playing
+            @Params
+                p_isScheduled -> repeat the first media of the list instead of looping over the list
+                p_timeout -> maximum seconds to wait for the media player to start'''
+        self.c_mediaListGeneration += 1
+        self.c_isMediaListPlayerOn = True
+        self.c_isScheduledList = p_isScheduled
+        self.c_mediaPlayingEvent.clear()
+        self.c_mediaListPlayerThread = imThread (target = self.playMediaList, args=(p_isScheduled, self.c_mediaListGeneration))
+        self.c_mediaListPlayerThread.start()
+        if not self.c_mediaPlayingEvent.wait(p_timeout):
+            self.c_lastError = 'Media player did not start playing within %s seconds' % p_timeout
+
+    def switchMediaList(self, p_mediaResourceLocatorList, p_isScheduled=False, p_timeout=5):
+        '''Replaces the list being played without stopping the backend first, the new
+            first media replaces the playing one directly, and when it was pre-rolled
+            (prerollMedia) on a double buffered backend the switch is only a swap
+            @Params
+                p_mediaResourceLocatorList -> the new list, its first media plays right away
+                p_isScheduled -> repeat the first media of the list instead of looping over the list
+                p_timeout -> maximum seconds to wait for the media player to start'''
+        self.c_mediaListGeneration += 1 ##the running playlist thread ends when it wakes up
+        self.__endAiring(AIRING_SWITCHED)
+        self.c_mediaResourceLocatorList = p_mediaResourceLocatorList
+        self.c_mediaIndex = 0
+        self.c_isMediaEndReached = True
+        self.c_mediaEndEvent.set()
+        self.startMediaListPlayer(p_isScheduled, p_timeout)
+
+    def prerollMedia(self, p_mediaResourceLocator):
+        '''Prepares a media that is about to be switched to, e.g. a scheduled media a little
+            before its slot, the playlist thread does not replace it with its own next
+            media until it was played'''
+        self.__c_pinnedMedia = p_mediaResourceLocator
+        self.__preloadMedia(p_mediaResourceLocator, True)
+
+    def playMedia(self, p_mediaResourceLocator, p_media=None):
+        '''Play a single a media only, checks first if the file exist, if not do nothing
+            if already playing media, stop then play the new media
+            @Params
+                p_mediaResourceLocator -> the media file to play
+                p_media -> the already prepared media of the backend for the same file, optional'''
+        if imPath.isfile(p_mediaResourceLocator):
+            if ( not self.c_isMediaEndReached ) :
+                self.__endAiring(AIRING_SWITCHED)
+                self.stop()
+            self.c_currentMedia = p_mediaResourceLocator
+            self.c_backend.play(self.__resolveMedia(p_mediaResourceLocator), p_media)
+            self.c_airedStampTime = int(imTime())
+            with self.__c_airingLock: self.__c_airing = (p_mediaResourceLocator, imTime(), self.c_isScheduledList)
+            self.c_isMediaEndReached = False
+            if self.c_mediaStartListener != None: self.c_mediaStartListener(p_mediaResourceLocator)
+        else:
+            self.c_lastError = 'File in (' + p_mediaResourceLocator + ') does not exist yet'
+
+    def play(self):
+        self.c_isMediaEndReached = False
+        self.c_backend.resume()
+
+    def pause(self):
+        self.c_backend.pause()
+
+    def stop(self):
+        self.__endAiring(AIRING_STOPPED)
+        self.c_isMediaListPlayerOn = False
+        self.c_airedStampTime = 0
+        self.c_backend.stop()
+        self.c_isMediaEndReached = True
+        self.c_preloadedMedia = None
+        self.__c_pinnedMedia = None
+        self.c_mediaEndEvent.set()  ##let the media list player thread see that it was stopped
+
+    def __endAiring(self, p_reason):
+        '''Reports the end of the media on screen to c_airingListener, once per airing'''
+        with self.__c_airingLock:
+            m_airing = self.__c_airing
+            self.__c_airing = None
+        if (m_airing == None) or (self.c_airingListener == None): return
+        self.c_airingListener(m_airing[0], m_airing[1], imTime(), p_reason, m_airing[2])
+
+    def __resolveMedia(self, p_mediaResourceLocator):
+        '''The file the backend should play, the playlist keeps the downloaded one'''
+        if self.c_mediaResolver == None: return p_mediaResourceLocator
+        return self.c_mediaResolver(p_mediaResourceLocator)
+
+    def __isMediaListCurrent(self, p_generation):
+        '''Checks if a media list player thread is still the one that should be playing'''
+        return self.c_isMediaListPlayerOn and (p_generation == self.c_mediaListGeneration)
+
+    def __preloadMedia(self, p_mediaResourceLocator, p_isPinned=False):
+        '''Lets the backend prepare the next media in the background so
+            switching to it only has to start the decoder
+            @Params
+                p_isPinned -> the media of prerollMedia, a pinned media is not replaced by an unpinned one'''
+        with self.__c_preloadLock:
+            if (not p_isPinned) and (self.__c_pinnedMedia not in (None, p_mediaResourceLocator)): return
+            if (self.c_preloadedMedia != None) and (self.c_preloadedMedia[0] == p_mediaResourceLocator): return
+            if not imPath.isfile(p_mediaResourceLocator): return
+            self.c_preloadedMedia = (p_mediaResourceLocator, self.c_backend.prepareMedia(self.__resolveMedia(p_mediaResourceLocator)))
+
+    def __takePreloadedMedia(self, p_mediaResourceLocator):
+        '''Returns the preloaded media if it is of the given file, None if not, a media
+            is taken only once since a pre-rolled one is used up by playing it'''
+        with self.__c_preloadLock:
+            if (self.c_preloadedMedia != None) and (self.c_preloadedMedia[0] == p_mediaResourceLocator):
+                m_media = self.c_preloadedMedia[1]
+                self.c_preloadedMedia = None
+                if self.__c_pinnedMedia == p_mediaResourceLocator: self.__c_pinnedMedia = None
+                return m_media
+            return None
+
+    def __setMediaEndReached(self):
+        '''Indicate that the end of the media was reached
+            this is a lot faster than getting the state of the media player
+            (runs on the thread of the backend, the backend must not be called from here)'''
+        self.__c_mediaEndedAt = imMonotonic()
+        self.__endAiring(AIRING_COMPLETED)
+        self.c_isMediaEndReached = True
+        self.c_mediaEndEvent.set()
+        if self.c_mediaEndListener != None: self.c_mediaEndListener()
+
+    def __setMediaPlaying(self):
+        '''Indicate that the media player has started playing'''
+        if self.__c_mediaEndedAt != None:
+            self.c_lastSwitchLatency = imMonotonic() - self.__c_mediaEndedAt
+            self.c_maxSwitchLatency = max(self.c_maxSwitchLatency, self.c_lastSwitchLatency)
+            self.c_switchCount += 1
+            self.__c_mediaEndedAt = None
+            if self.c_switchListener != None: self.c_switchListener(self.c_lastSwitchLatency)
+        self.c_mediaPlayingEvent.set()
+
+    def getAiredTime(self):
+        '''Returns the number of seconds a media was played'''
+        if self.c_airedStampTime != 0:
+            return int(imTime()) - self.c_airedStampTime
+        else:
+            return 0
+
+    def getRemainingTime(self):
+        '''Returns the seconds until the current media ends from its indexed duration,
+            None if nothing is playing or its duration is not known'''
+        if (self.c_durationResolver == None) or (self.c_currentMedia == None) or self.c_isMediaEndReached: return None
+        m_duration = self.c_durationResolver(self.c_currentMedia)
+        if m_duration == None: return None
+        return max(0, m_duration - self.getAiredTime())
+    ##========================<<
+    ##Media player instructions
+    ##========================<<
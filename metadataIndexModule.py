@@ -0,0 +1,251 @@
+from os import (
+    path as imPath,
+    listdir as imListFile,
+    replace as imReplaceFile
+)
+
+from json import (
+    load as imJsonLoad,
+    dump as imSaveJson
+)
+
+from hashlib import sha256 as imHash
+from shutil import which as imFindExecutable
+from queue import Queue as imQueue
+from threading import (
+    Thread as imThread,
+    RLock as imLock
+)
+
+from downloadManagerModule import (
+    PARTIAL_DOWNLOAD_SUFFIX,
+    CHECKSUM_ALGORITHMS
+)
+from transcodeModule import (
+    probeMedia as imProbeMedia,
+    IMAGE_FORMATS
+)
+
+class MetadataIndexModule():
+    '''Metadata Index Module
+        Knows what is inside every stored media without opening it: duration,
+        container, codecs, resolution, frame rate, bit rate and checksum. Each file is
+        probed once with ffprobe after its download, on a background thread, and the
+        results are kept in a sidecar index beside the configurations
+
+        The metadata are keyed by the content ('<algorithm>:<hex>', the md5, sha1 or
+        sha256 checksum of the server json when it gave one, 'sha256:<hex>' hashed here
+        when not or of another algorithm), a file name points at a
+        content with the modified time and size it had. The same video under another
+        name or a campaign that comes back is not probed again, a file that was
+        replaced is
+
+        The index follows the media directory: indexMedia / submit as files arrive,
+        removeMedia as they are evicted (MediaCacheModule.c_forgetListener) and
+        syncDirectory at the start up for what changed while the player was off
+
+        Without ffprobe only the checksum and size are known, the rest is None and the
+        file is probed on the next syncDirectory that has ffprobe
+
+    @Usage: (On a project)
+        import metadataIndexModule
+
+        g_MetadataIndexModule = metadataIndexModule.MetadataIndexModule()
+        g_MetadataIndexModule.c_indexFile = '/home/pi/configurations/mediaMetadata.json'
+        g_MetadataIndexModule.loadIndex()
+        g_MetadataIndexModule.syncDirectory('/home/pi/media files/')
+
+        g_MetadataIndexModule.submit('/home/pi/media files/rpi1.mp4', 'sha256:9f86d0...')   ##after its download
+        g_MetadataIndexModule.getDuration('/home/pi/media files/rpi1.mp4')    ##15.02, None if unknown
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+
+        self.c_indexFile = None
+        self.c_ffprobePath = 'ffprobe'
+
+        self.c_files = {}   ##file name -> [modified time, size, content key]
+        self.c_contents = {}    ##content key -> metadata, see getMetadata
+        self.c_probedCount = 0
+        self.c_failedCount = 0
+
+        self.__c_lock = imLock()
+        self.__c_queue = imQueue()
+        self.__c_thread = None
+
+        self.c_lastError = ''
+
+    def loadIndex(self):
+        '''Reads the sidecar index, a missing or broken one starts empty'''
+
+        m_errProcessName = self.__class__.__name__ + '-loadIndex ->'
+        if (self.c_indexFile == None) or (not imPath.isfile(self.c_indexFile)): return
+        with self.__c_lock:
+            try:
+                with open(self.c_indexFile, 'r') as t_indexFile: m_index = imJsonLoad(t_indexFile)
+                self.c_files = m_index.get('files', {})
+                self.c_contents = m_index.get('contents', {})
+            except Exception as e:
+                self.c_files, self.c_contents = {}, {}
+                self.c_lastError = 'Error in loading the metadata index: %s%s' % (m_errProcessName, str(e.args))
+
+    def saveIndex(self):
+        '''Writes the index to a temporary file and moves it over the old one'''
+
+        m_errProcessName = self.__class__.__name__ + '-saveIndex ->'
+        if self.c_indexFile == None: return
+        with self.__c_lock:
+            try:
+                with open(self.c_indexFile + '.tmp', 'w') as t_indexFile: imSaveJson({'files' : self.c_files, 'contents' : self.c_contents}, t_indexFile)
+                imReplaceFile(self.c_indexFile + '.tmp', self.c_indexFile)
+            except Exception as e:
+                self.c_lastError = 'Error in saving the metadata index: %s%s' % (m_errProcessName, str(e.args))
+
+    def getMetadata(self, p_file):
+        '''Returns the metadata of a stored media from the index, the file is not opened
+            @Params
+                p_file -> the media file, with or without its directory
+            @Return
+                dict of 'checksum', 'size', 'duration' (seconds), 'container', 'videoCodec',
+                'audioCodec', 'width', 'height', 'frameRate', 'bitRate' (bits per second),
+                'isImage' and 'isProbed', None if the media is not indexed'''
+        with self.__c_lock:
+            m_file = self.c_files.get(imPath.basename(p_file))
+            return dict(self.c_contents[m_file[2]]) if (m_file != None) and (m_file[2] in self.c_contents) else None
+
+    def getDuration(self, p_file):
+        '''Seconds of a video from the index, None if not known (images, not probed yet)'''
+        m_metadata = self.getMetadata(p_file)
+        return m_metadata['duration'] if m_metadata != None else None
+
+    def submit(self, p_file, p_checksum=None):
+        '''Indexes a media on the background thread, returns right away
+            @Params
+                p_checksum -> checksum of the server json ('sha256:<hex>', or a bare md5,
+                              sha1 or sha256 hex as DownloadManagerModule takes it), saves hashing the file'''
+        if self.__c_thread == None:
+            self.__c_thread = imThread(target = self.__indexQueued, name = 'metadataIndex', daemon = True)
+            self.__c_thread.start()
+        self.__c_queue.put((p_file, p_checksum))
+
+    def indexMedia(self, p_file, p_checksum=None):
+        '''Probes a media unless the index already has it, a file whose modified time and
+            size did not change is not looked at again
+            @Return
+                the metadata of the media, None if it could not be read'''
+
+        m_errProcessName = self.__class__.__name__ + '-indexMedia ->'
+        try:
+            m_fileName = imPath.basename(p_file)
+            m_stats = [imPath.getmtime(p_file), imPath.getsize(p_file)]
+            with self.__c_lock:
+                m_file = self.c_files.get(m_fileName)
+                if (m_file != None) and (m_file[:2] == m_stats) and self.__isComplete(m_file[2]): return self.getMetadata(m_fileName)
+
+            p_checksum = self.__getContentKey(p_file, p_checksum)
+            with self.__c_lock:
+                if self.__isComplete(p_checksum):
+                    self.__setFile(m_fileName, m_stats, p_checksum)
+                    self.saveIndex()
+                    return self.getMetadata(m_fileName)
+
+            m_metadata = {'checksum' : p_checksum, 'size' : m_stats[1], 'duration' : None, 'container' : None,
+                          'videoCodec' : None, 'audioCodec' : None, 'width' : None, 'height' : None,
+                          'frameRate' : None, 'bitRate' : None, 'isImage' : False, 'isProbed' : False}
+            if imFindExecutable(self.c_ffprobePath) != None:
+                m_metadata.update(self.readProbe(imProbeMedia(p_file, self.c_ffprobePath)))
+                m_metadata['isProbed'] = True
+                self.c_probedCount += 1
+
+            with self.__c_lock:
+                self.c_contents[p_checksum] = m_metadata
+                self.__setFile(m_fileName, m_stats, p_checksum)
+                self.saveIndex()
+            return dict(m_metadata)
+        except Exception as e:
+            self.c_failedCount += 1
+            self.c_lastError = 'Error in indexing %s: %s%s' % (p_file, m_errProcessName, str(e.args))
+            return None
+
+    def readProbe(self, p_probe):
+        '''Picks the indexed fields out of the ffprobe json'''
+        m_format = p_probe.get('format', {})
+        m_streams = p_probe.get('streams', [])
+        m_video = ([t_stream for t_stream in m_streams if t_stream.get('codec_type') == 'video'] or [{}])[0]
+        m_audio = ([t_stream for t_stream in m_streams if t_stream.get('codec_type') == 'audio'] or [{}])[0]
+        m_isImage = m_format.get('format_name', '').startswith(IMAGE_FORMATS)
+        m_frameRate = m_video.get('avg_frame_rate') or '0/0'
+        m_numerator, t_separator, m_denominator = m_frameRate.partition('/')
+        return {'duration' : float(m_format['duration']) if (m_format.get('duration') and not m_isImage) else None,
+                'container' : m_format.get('format_name'),
+                'videoCodec' : m_video.get('codec_name'), 'audioCodec' : m_audio.get('codec_name'),
+                'width' : m_video.get('width'), 'height' : m_video.get('height'),
+                'frameRate' : round(float(m_numerator) / float(m_denominator), 3) if float(m_denominator or 0) else None,
+                'bitRate' : int(m_format['bit_rate']) if m_format.get('bit_rate') else None,
+                'isImage' : m_isImage}
+
+    def removeMedia(self, p_fileName):
+        '''Drops a file that was evicted or deleted, and its content once no file has it'''
+        with self.__c_lock:
+            m_file = self.c_files.pop(imPath.basename(p_fileName), None)
+            if m_file == None: return
+            if not any(t_file[2] == m_file[2] for t_file in self.c_files.values()): self.c_contents.pop(m_file[2], None)
+            self.saveIndex()
+
+    def syncDirectory(self, p_mediaDir):
+        '''Brings the index up to the media directory: files that are gone are dropped,
+            new, replaced or not yet probed files are queued, the rest is not touched'''
+
+        m_errProcessName = self.__class__.__name__ + '-syncDirectory ->'
+        try:
+            m_fileNames = [t_fileName for t_fileName in imListFile(p_mediaDir)
+                           if imPath.isfile(p_mediaDir + t_fileName) and (not t_fileName.endswith(PARTIAL_DOWNLOAD_SUFFIX))]
+            for t_fileName in [t_fileName for t_fileName in list(self.c_files) if t_fileName not in m_fileNames]: self.removeMedia(t_fileName)
+            m_isProbing = imFindExecutable(self.c_ffprobePath) != None
+            for t_fileName in m_fileNames:
+                with self.__c_lock:
+                    t_file = self.c_files.get(t_fileName)
+                    t_isCurrent = ((t_file != None) and (t_file[:2] == [imPath.getmtime(p_mediaDir + t_fileName), imPath.getsize(p_mediaDir + t_fileName)]) and
+                                   ((not m_isProbing) or self.__isComplete(t_file[2])))
+                if not t_isCurrent: self.submit(p_mediaDir + t_fileName)
+        except Exception as e:
+            self.c_lastError = 'Error in syncing the metadata index: %s%s' % (m_errProcessName, str(e.args))
+
+    def hashFile(self, p_file):
+        '''sha256 of the content of a file'''
+        m_hash = imHash()
+        with open(p_file, 'rb') as t_file:
+            for t_chunk in iter(lambda: t_file.read(1024 * 1024), b''): m_hash.update(t_chunk)
+        return m_hash.hexdigest()
+
+    def __setFile(self, p_fileName, p_stats, p_key):
+        '''(Private method)Points a file name at a content, the content it had before is dropped once no file has it'''
+        m_file = self.c_files.get(p_fileName)
+        self.c_files[p_fileName] = p_stats + [p_key]
+        if (m_file != None) and (not any(t_file[2] == m_file[2] for t_file in self.c_files.values())): self.c_contents.pop(m_file[2], None)
+
+    def __getContentKey(self, p_file, p_checksum):
+        '''(Private method)Content key of a file from the checksum of the server json, read the way
+            DownloadManagerModule verifies it, the file is hashed with sha256 when there is no
+            checksum or it is of an algorithm other than md5, sha1 and sha256'''
+        if p_checksum:
+            if ':' in p_checksum: m_algorithm, m_digest = p_checksum.split(':', 1)
+            else: m_algorithm, m_digest = CHECKSUM_ALGORITHMS.get(len(p_checksum), 'md5'), p_checksum
+            m_algorithm = m_algorithm.replace('-', '').lower()
+            if m_algorithm in CHECKSUM_ALGORITHMS.values(): return m_algorithm + ':' + m_digest.lower()
+        return 'sha256:' + self.hashFile(p_file)
+
+    def __isComplete(self, p_key):
+        '''(Private method)The content is indexed and was probed, or cannot be without ffprobe'''
+        return (p_key in self.c_contents) and (self.c_contents[p_key]['isProbed'] or (imFindExecutable(self.c_ffprobePath) == None))
+
+    def __indexQueued(self):
+        '''(Private method)Indexes the queued media one at a time, so the playback keeps the rest of the cpu'''
+        while True:
+            self.indexMedia(*self.__c_queue.get())
@@ -0,0 +1,278 @@
+from json import dumps as imJsonString
+from bisect import bisect_left as imBisect
+from threading import (
+    Thread as imThread,
+    Lock as imLock,
+    enumerate as imListThreads
+)
+try:
+    from os import sysconf as imSystemSetting
+except ImportError:
+    imSystemSetting = None  ##not on Windows, only the process cpu is reported there
+from time import (
+    monotonic as imMonotonic,
+    process_time as imProcessTime
+)
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+class MetricsModule():
+    '''Metrics Module
+        Counters, gauges and histograms of the player, served on a small local http
+        server so a slow screen can be found from a browser or a Prometheus scrape
+        instead of logging into every Pi
+
+            /metrics        -> Prometheus text format
+            /metrics.json   -> the same values as json
+
+        Histograms are filled as things happen (observe), counters and gauges either
+        count up (increment) or are read from the other modules only when scraped
+        (p_getter), so watching an existing counter costs nothing between scrapes.
+        With p_label the getter returns a dict of label value -> value, e.g. {'MainThread' : 1.5}
+
+    @Usage: (On a project)
+        import metricsModule
+
+        g_MetricsModule = metricsModule.MetricsModule()
+        g_MetricsModule.c_port = 9105
+        g_MetricsModule.watchModules(g_NetworkModule, g_FileManagerModule, g_MediaPanelModule, g_SchedulerModule)
+        g_MetricsModule.defineCounter('player_main_loop_iterations_total', 'Iterations of the main loop')
+        g_MetricsModule.start()
+
+        g_MetricsModule.increment('player_main_loop_iterations_total')
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+
+        self.c_host = '0.0.0.0'
+        self.c_port = 9105
+
+        self.c_metrics = {} ##name -> {'type', 'help', and 'value', 'getter' or the histogram fields}
+        self.c_server = None
+        self.c_startedAt = imMonotonic()
+        self.__c_lock = imLock()
+
+        self.defineGauge('player_uptime_seconds', 'Seconds since the metrics module was created',
+                         lambda: imMonotonic() - self.c_startedAt)
+        self.defineCounter('player_process_cpu_seconds_total', 'CPU seconds of the whole player process', imProcessTime)
+        self.defineCounter('player_thread_cpu_seconds_total', 'CPU seconds of every running thread', self.getThreadCpuTimes, 'thread')
+
+        self.c_lastError = ''
+
+    ##========================>>
+    ##Metric definitions
+    ##========================>>
+    def defineCounter(self, p_name, p_help, p_getter=None, p_label=None):
+        '''A value that only goes up
+            @Params
+                p_name -> metric name, e.g. player_poll_failures_total
+                p_help -> one line description
+                p_getter -> returns the value when scraped, leave None to count with increment
+                p_label -> name of the label when p_getter returns a dict of label value -> value'''
+        self.__define(p_name, 'counter', p_help, {'value' : 0, 'getter' : p_getter, 'label' : p_label})
+
+    def defineGauge(self, p_name, p_help, p_getter=None, p_label=None):
+        '''A value that goes up and down, set with setGauge or read with p_getter when scraped'''
+        self.__define(p_name, 'gauge', p_help, {'value' : 0, 'getter' : p_getter, 'label' : p_label})
+
+    def defineHistogram(self, p_name, p_help, p_buckets=LATENCY_BUCKETS):
+        '''Distribution of observed values
+            @Params
+                p_buckets -> sorted upper bounds of the buckets, an +Inf bucket is added'''
+        self.__define(p_name, 'histogram', p_help, {'buckets' : tuple(p_buckets), 'counts' : [0] * (len(p_buckets) + 1),
+                                                    'sum' : 0, 'count' : 0})
+
+    def __define(self, p_name, p_type, p_help, p_fields):
+        '''(Private method)'''
+        with self.__c_lock:
+            if p_name in self.c_metrics: return
+            p_fields.update({'type' : p_type, 'help' : p_help})
+            self.c_metrics[p_name] = p_fields
+
+    ##========================>>
+    ##Recording, safe to call from any thread
+    ##========================>>
+    def increment(self, p_name, p_amount=1):
+        with self.__c_lock: self.c_metrics[p_name]['value'] += p_amount
+
+    def setGauge(self, p_name, p_value):
+        with self.__c_lock: self.c_metrics[p_name]['value'] = p_value
+
+    def observe(self, p_name, p_value):
+        '''Adds a value to a histogram'''
+        with self.__c_lock:
+            m_metric = self.c_metrics[p_name]
+            m_metric['counts'][imBisect(m_metric['buckets'], p_value)] += 1
+            m_metric['sum'] += p_value
+            m_metric['count'] += 1
+
+    def getThreadCpuTimes(self):
+        '''CPU seconds of every running thread by thread name, read from /proc/self/task
+            so a thread that ends meanwhile is only missing from the scrape, empty where
+            there is no /proc (the process cpu is still reported)'''
+        m_times = {}
+        if imSystemSetting == None: return m_times
+        try:
+            m_ticks = float(imSystemSetting('SC_CLK_TCK'))
+        except (ValueError, OSError):
+            return m_times
+        for t_thread in imListThreads():
+            try:
+                with open('/proc/self/task/%d/stat' % t_thread.native_id, 'r') as t_statFile:
+                    ##utime and stime follow the thread name, which may hold spaces and brackets
+                    t_fields = t_statFile.read().rsplit(')', 1)[1].split()
+                m_times[t_thread.name] = (int(t_fields[11]) + int(t_fields[12])) / m_ticks
+            except (OSError, IndexError, ValueError, TypeError):
+                continue    ##the thread ended meanwhile or the platform has no /proc
+        return m_times
+
+    ##========================>>
+    ##Player metrics
+    ##========================>>
+    def watchModules(self, p_networkModule=None, p_fileManagerModule=None, p_mediaPlayerModule=None, p_schedulerModule=None):
+        '''Defines the metrics of the player modules, takes over their c_pollListener and c_switchListener'''
+        if p_networkModule != None:
+            self.defineHistogram('player_poll_latency_seconds', 'Seconds of the answered server json requests')
+            self.defineCounter('player_poll_failures_total', 'Server json requests that failed',
+                               lambda: p_networkModule.c_failedRequestCount)
+            self.defineCounter('player_poll_not_modified_total', 'Server json requests answered with 304',
+                               lambda: p_networkModule.c_notModifiedCount)
+            self.defineCounter('player_manifest_changes_total', 'Times the server json changed',
+                               lambda: p_networkModule.c_manifestChangeCount)
+            self.defineGauge('player_push_connected', '1 while the push subscription is connected',
+                             lambda: int(p_networkModule.c_isPushConnected))
+            p_networkModule.c_pollListener = self.__observePoll
+
+        if p_fileManagerModule != None:
+            m_downloadManager = p_fileManagerModule.c_downloadManager
+            m_mediaCache = p_fileManagerModule.c_mediaCache
+            self.defineCounter('player_downloaded_bytes_total', 'Bytes of media downloaded', lambda: m_downloadManager.c_downloadedBytes)
+            self.defineCounter('player_downloaded_files_total', 'Media files downloaded', lambda: m_downloadManager.c_downloadedFileCount)
+            self.defineCounter('player_download_failures_total', 'Media files that failed to download',
+                               lambda: m_downloadManager.c_failedFileCount)
+            self.defineGauge('player_download_rate_bytes', 'Bytes per second of the last batch of downloads',
+                             m_downloadManager.getAggregateRate)
+            self.defineCounter('player_cache_hits_total', 'Media of the server json that was already stored', lambda: m_mediaCache.c_hitCount)
+            self.defineCounter('player_cache_misses_total', 'Media of the server json that had to be downloaded',
+                               lambda: m_mediaCache.c_missCount)
+            self.defineCounter('player_cache_evictions_total', 'Media evicted to make room', lambda: m_mediaCache.c_evictedCount)
+            self.defineGauge('player_cache_stored_bytes', 'Bytes of media stored', lambda: m_mediaCache.c_storedBytes)
+            self.defineGauge('player_storage_free_bytes', 'Free bytes on the media storage', m_mediaCache.getFreeBytes)
+            self.defineGauge('player_manifest_version', 'Version of the server json in the manifest store',
+                             lambda: p_fileManagerModule.c_manifestStore.c_currentVersion or 0)
+
+        if p_mediaPlayerModule != None:
+            self.defineHistogram('player_playback_gap_seconds', 'Seconds between the end of a media and the next one playing')
+            self.defineCounter('player_media_switches_total', 'Media switches of the media list player',
+                               lambda: p_mediaPlayerModule.c_switchCount)
+            p_mediaPlayerModule.c_switchListener = lambda p_seconds: self.observe('player_playback_gap_seconds', p_seconds)
+            ##The backend is only set once the gui is realized, so it is looked up when scraped
+            self.defineGauge('player_last_swap_seconds', 'Seconds the last swap to a pre-rolled media took',
+                             lambda: p_mediaPlayerModule.c_backend.getSwapStats()[0] or 0)
+            self.defineGauge('player_max_swap_seconds', 'Longest swap to a pre-rolled media in seconds',
+                             lambda: p_mediaPlayerModule.c_backend.getSwapStats()[1])
+            self.defineCounter('player_swaps_total', 'Switches to a pre-rolled media', lambda: p_mediaPlayerModule.c_backend.getSwapStats()[2])
+
+        if p_schedulerModule != None:
+            self.defineHistogram('player_schedule_switch_seconds', 'Seconds from a due schedule change to the new media playing')
+            self.defineGauge('player_scheduler_wake_latency_seconds', 'Seconds the main loop last woke up late',
+                             lambda: p_schedulerModule.c_lastWakeLatency)
+            self.defineCounter('player_scheduler_wakes_total', 'Times the main loop woke up', lambda: p_schedulerModule.c_wakeCount)
+
+    def __observePoll(self, p_seconds):
+        '''(Private method)Poll listener of the network module'''
+        if p_seconds != None: self.observe('player_poll_latency_seconds', p_seconds)
+
+    ##========================>>
+    ##Rendering and serving
+    ##========================>>
+    def getValues(self):
+        '''Returns name -> value, label dict or histogram dict of every metric'''
+        m_values = {}
+        with self.__c_lock: m_metrics = [(t_name, dict(t_metric)) for t_name, t_metric in self.c_metrics.items()]
+        for t_name, t_metric in m_metrics:
+            if t_metric['type'] == 'histogram':
+                m_cumulative = 0
+                m_buckets = {}
+                for t_bound, t_count in zip(t_metric['buckets'] + ('+Inf',), t_metric['counts']):
+                    m_cumulative += t_count
+                    m_buckets[str(t_bound)] = m_cumulative
+                m_values[t_name] = {'buckets' : m_buckets, 'sum' : t_metric['sum'], 'count' : t_metric['count']}
+                continue
+            try:
+                m_values[t_name] = t_metric['getter']() if t_metric['getter'] != None else t_metric['value']
+            except Exception as e:
+                self.c_lastError = 'Error in reading the metric %s: %s' % (t_name, str(e.args))
+        return m_values
+
+    def renderText(self):
+        '''Prometheus text exposition format'''
+        m_lines = []
+        for t_name, t_value in self.getValues().items():
+            m_lines.append('# HELP %s %s' % (t_name, self.c_metrics[t_name]['help']))
+            m_lines.append('# TYPE %s %s' % (t_name, self.c_metrics[t_name]['type']))
+            if self.c_metrics[t_name]['type'] == 'histogram':
+                for t_bound, t_count in t_value['buckets'].items(): m_lines.append('%s_bucket{le="%s"} %d' % (t_name, t_bound, t_count))
+                m_lines.append('%s_sum %r' % (t_name, float(t_value['sum'])))
+                m_lines.append('%s_count %d' % (t_name, t_value['count']))
+            elif self.c_metrics[t_name]['label'] != None:
+                for t_labelValue, t_value in t_value.items():
+                    m_lines.append('%s{%s="%s"} %r' % (t_name, self.c_metrics[t_name]['label'], t_labelValue.replace('"', "'"), float(t_value)))
+            else:
+                m_lines.append('%s %r' % (t_name, float(t_value)))
+        return '\n'.join(m_lines) + '\n'
+
+    def renderJson(self):
+        return imJsonString(self.getValues(), indent = 1)
+
+    def start(self):
+        '''Starts serving the metrics in a daemon thread'''
+        m_errProcessName = self.__class__.__name__ + '-start ->'
+        try:
+            ##Imported once the server starts, after the first media is playing
+            from http.server import ThreadingHTTPServer as imHttpServer
+            self.c_server = imHttpServer((self.c_host, self.c_port), self.__makeHandler())
+            self.c_server.daemon_threads = True
+            imThread(target = self.c_server.serve_forever, name = 'metrics', daemon = True).start()
+            print('Metrics served on port %d' % self.c_server.server_address[1])
+        except Exception as e:
+            self.c_lastError = 'Error in starting the metrics server: %s%s' % (m_errProcessName, str(e.args))
+            print(self.c_lastError)
+
+    def stop(self):
+        if self.c_server == None: return
+        self.c_server.shutdown()
+        self.c_server.server_close()
+        self.c_server = None
+
+    def __makeHandler(self):
+        '''(Private method)Request handler class bound to this module'''
+        from http.server import BaseHTTPRequestHandler as imRequestHandler
+        m_metricsModule = self
+
+        class MetricsRequestHandler(imRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    m_body, m_contentType = m_metricsModule.renderText(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    m_body, m_contentType = m_metricsModule.renderJson(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                m_body = m_body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', m_contentType)
+                self.send_header('Content-Length', str(len(m_body)))
+                self.end_headers()
+                self.wfile.write(m_body)
+
+            def log_message(self, p_format, *p_args):
+                pass    ##a scrape every few seconds would flood the console
+
+        return MetricsRequestHandler
@@ -1,116 +1,261 @@
-from socket import (
-    socket as imSocket,
-    AF_INET as imAF_INET,
-    SOCK_DGRAM as imSOCK_DGRAM
-)
-
-from time import sleep as imDelay
-from requests import get as imGetServerResponse
-from threading import Thread as imThread
-from uuid import getnode as imGetMac
-
-class NetworkModule:
-    '''Module for testing network communication and server availability
-        @Usage: (On a project)
-            import networkModule
-            g_NetworkModule = networkModule.NetworkModule()
-            g_NetworkModule.fetchCurrentIP()  ##Check if there was a network, acquire the assigned IP
-            
-            g_currentIP = g_NetworkModule.c_currentIP  ##Necessary
-            g_NetworkModule.c_serverUrl = 'http://www.sampleserver.com' ##Necessary
-            g_NetworkModule.c_requestParam = {'ipAddress' : g_currentIP}  ##Necessary
-            
-            g_NetworkModule.checkNetworkAndServer() ##this will fill up c_currentIP and c_isServerActive with values
-            
-        @Variable / Method prefixes:
-            im -> Imported method
-            c_ -> Class variable
-            m_ -> Method variable
-            t_ -> temporary variable
-            __ -> methods to be used only by the class'''
-    def __init__(self):
-        '''Initialize variables'''
-        ##Variables that will be assigned by the user program
-        self.c_serverUrl = ''
-        
-        ##Variables for checking network and server
-        self.c_isUsingSocket = False
-        self.c_requestParam = None
-        self.c_jsonResponse = {}
-        self.c_macAddres = self.__getMacAddress()
-        self.c_currentIP = None
-        self.c_isServerActive = False
-        self.c_isCheckingPaused = False
-        
-        ##Variables for assigning the network checking to a thread
-        self.c_requestDelay = .5
-        self.c_persistentChecking = None
-        self.c_isPersistentCheckingEnabled = False
-        
-        self.c_lastError = ''
-        
-    def fetchCurrentIP(self):
-        '''For testing the network connectivity check if the local machine
-           have an ip address'''
-        m_errProcessName = self.__class__.__name__ + 'fetchCurrentIP -> '
-        
-        try:
-            m_socket = imSocket(imAF_INET, imSOCK_DGRAM)
-            m_socket.connect(("8.8.8.8",80))
-            self.c_currentIP = m_socket.getsockname()[0]
-            m_socket.close()
-        except OSError:
-            self.c_lastError = 'No network connection'
-        except Exception as e:
-            self.c_lastError = 'Error in retrieving IP Address: %s%s' % (m_errProcessName,str(e.args))
-
-    def fetchJsonFromServer(self):
-        '''Get the json response from the server, at the same time checking
-            if the server is online'''
-        m_errProcessName = self.__class__.__name__ + 'fetchJsonFromServer -> '
-
-        ##If no network yet,return to avoid wasting process
-        if self.c_currentIP == None : return
-        ##if the request parameter was empty fabricate one
-        if self.c_requestParam == None: self.c_requestParam = {'ipAddress': self.c_currentIP, 'macAddress' : self.c_macAddres}
-        
-        try:
-            self.c_jsonResponse = imGetServerResponse(url = self.c_serverUrl, params = self.c_requestParam, headers={'Connection': 'close'}).json()
-            self.c_isServerActive = True
-            
-        except Exception as e:
-            self.c_lastError = 'Unable to find the server: %s%s' % (m_errProcessName,str(e.args))
-            self.c_isServerActive = False
-
-    def __getMacAddress(self):
-        '''(Private method)Issues the mac address of the machine network interface'''
-        m_errProcessName = self.__class__.__name__ + '__getMacAddress -> '
-        try: 
-            return ':'.join(['{:02x}'.format((imGetMac() >> i) & 0xff) for i in range(0,8*6,8)][::-1]).upper()
-        except Exception as e:
-            self.c_lastError = 'Unable to get ip address: %s%s' % (m_errProcessName, str(e.args))
-            return None
-
-    def checkNetworkAndServer(self):
-        '''Successively check the network and the server'''
-        self.c_isUsingSocket = True
-        self.fetchCurrentIP()
-        self.fetchJsonFromServer()
-        self.c_isUsingSocket = False
-        imDelay(self.c_requestDelay) ##Delay before another request
-        while(self.c_isCheckingPaused): pass ##Pause network and server check
-
-    def __persistentCheck(self):
-        '''(Private method)Continuously loop on checking the network and server
-            this method will be used in multithreading'''
-        print('Persisten network and server checking started')
-        while(self.c_isPersistentCheckingEnabled):
-            self.checkNetworkAndServer()
-        print('Persisten network and server checking has stopped')
-        
-    def startPersistentCheck(self):
-        '''Start a thread that will periodically check the network and server
-            this method needs the c_isPersistentCheckingEnabled, c_serverUrl and c_requestParam
-            to be initialized first'''
-        self.c_persistentChecking = imThread(target = self.__persistentCheck)
-        self.c_persistentChecking.start()
+from socket import (
+    socket as imSocket,
+    AF_INET as imAF_INET,
+    SOCK_DGRAM as imSOCK_DGRAM
+)
+
+from time import (
+    sleep as imDelay,
+    monotonic as imMonotonic
+)
+from random import uniform as imRandomUniform
+from json import loads as imJsonParse
+from threading import Event as imEvent
+from uuid import getnode as imGetMac
+
+class NetworkModule:
+    '''Module for testing network communication and server availability
+        @Usage: (On a project)
+            import networkModule
+            g_NetworkModule = networkModule.NetworkModule()
+            g_NetworkModule.fetchCurrentIP()  ##Check if there was a network, acquire the assigned IP
+            
+            g_currentIP = g_NetworkModule.c_currentIP  ##Necessary
+            g_NetworkModule.c_serverUrl = 'http://www.sampleserver.com' ##Necessary
+            g_NetworkModule.c_requestParam = {'ipAddress' : g_currentIP}  ##Necessary
+            
+            g_NetworkModule.checkNetworkAndServer() ##this will fill up c_currentIP and c_isServerActive with values
+            
+        @Polling:
+            The server json is requested on a kept alive session with If-None-Match /
+            If-Modified-Since, an unchanged json is answered with 304 and not parsed again.
+            The delay between requests starts at c_requestDelay and grows by c_backoffFactor
+            while nothing changes (doubles on failures) up to c_maxRequestDelay, with
+            c_jitter so a fleet of players does not poll in lockstep
+            
+        @Push:
+            With c_pushUrl set, subscribeToPush keeps a server-sent events stream open
+            and every json pushed on it is applied like a polled one (c_jsonResponse and
+            c_manifestListener). AsyncRuntimeModule runs the polling and the subscription
+            as tasks, while the stream is connected it only polls every c_pushSafetyPollDelay,
+            when the stream drops it polls as usual until the subscription is back
+            
+        @Variable / Method prefixes:
+            im -> Imported method
+            c_ -> Class variable
+            m_ -> Method variable
+            t_ -> temporary variable
+            __ -> methods to be used only by the class'''
+    def __init__(self):
+        '''Initialize variables'''
+        ##Variables that will be assigned by the user program
+        self.c_serverUrl = ''
+        
+        ##Variables for checking network and server
+        self.c_isUsingSocket = False
+        self.c_requestParam = None
+        self.c_jsonResponse = {}
+        self.c_macAddres = self.__getMacAddress()
+        self.c_currentIP = None
+        self.c_isServerActive = False
+        self.c_resumedEvent = imEvent() ##cleared while the checking is paused, see c_isCheckingPaused
+        self.c_resumedEvent.set()
+        self.c_manifestListener = None  ##called without arguments when the server json has changed
+        self.c_pollListener = None  ##called with the seconds of every json request, None if it failed
+        self.c_requestTimeout = 10
+        self.c_session = None
+        self.c_manifestETag = None
+        self.c_manifestLastModified = None
+        
+        ##Variables for the network checking, the push subscription ends once this is cleared
+        self.c_isPersistentCheckingEnabled = False
+        self.c_requestDelay = .5    ##delay after a change, the shortest delay between requests
+        self.c_maxRequestDelay = 15 ##longest delay between requests when idle or failing
+        self.c_backoffFactor = 1.5
+        self.c_jitter = .2  ##the delay is randomized by this fraction
+        self.c_currentDelay = None
+        
+        ##Counters of the polling
+        self.c_requestCount = 0
+        self.c_notModifiedCount = 0 ##requests answered with 304, each one saved a download and a parse
+        self.c_failedRequestCount = 0
+        self.c_bytesReceived = 0
+        self.c_bytesSaved = 0   ##size of the json that the 304 answers did not have to send
+        self.c_lastPollLatency = None   ##seconds the last answered request took
+        self.c_manifestChangeCount = 0
+        self.__c_lastBodySize = 0
+        
+        ##Variables for the push subscription, polling takes over while it is not connected
+        self.c_pushUrl = None
+        self.c_isPushConnected = False
+        self.c_pushReadTimeout = 60 ##the server sends a keep alive comment more often than this
+        self.c_pushSafetyPollDelay = 60 ##seconds between polls while push is connected
+        self.c_pushLostEvent = imEvent()
+        self.c_pushEventCount = 0
+        self.c_pushRetryDelay = None
+        self.__c_lastPushEventId = None
+        
+        self.c_lastError = ''
+        
+    @property
+    def c_isCheckingPaused(self):
+        '''True while the network and server checking is paused'''
+        return not self.c_resumedEvent.is_set()
+
+    @c_isCheckingPaused.setter
+    def c_isCheckingPaused(self, p_isPaused):
+        if p_isPaused: self.c_resumedEvent.clear()
+        else: self.c_resumedEvent.set()
+
+    def fetchCurrentIP(self):
+        '''For testing the network connectivity check if the local machine
+           have an ip address'''
+        m_errProcessName = self.__class__.__name__ + 'fetchCurrentIP -> '
+        
+        try:
+            m_socket = imSocket(imAF_INET, imSOCK_DGRAM)
+            m_socket.connect(("8.8.8.8",80))
+            self.c_currentIP = m_socket.getsockname()[0]
+            m_socket.close()
+        except OSError:
+            self.c_lastError = 'No network connection'
+        except Exception as e:
+            self.c_lastError = 'Error in retrieving IP Address: %s%s' % (m_errProcessName,str(e.args))
+
+    def fetchJsonFromServer(self):
+        '''Get the json response from the server, at the same time checking
+            if the server is online'''
+        m_errProcessName = self.__class__.__name__ + 'fetchJsonFromServer -> '
+
+        ##If no network yet,return to avoid wasting process
+        if self.c_currentIP == None : return
+        ##if the request parameter was empty fabricate one
+        if self.c_requestParam == None: self.c_requestParam = {'ipAddress': self.c_currentIP, 'macAddress' : self.c_macAddres}
+        
+        m_headers = {}
+        if self.c_manifestETag != None: m_headers['If-None-Match'] = self.c_manifestETag
+        if self.c_manifestLastModified != None: m_headers['If-Modified-Since'] = self.c_manifestLastModified
+        
+        try:
+            m_started = imMonotonic()
+            m_response = self.__getSession().get(url = self.c_serverUrl, params = self.c_requestParam, headers = m_headers,
+                                                 timeout = self.c_requestTimeout)
+            self.c_lastPollLatency = imMonotonic() - m_started
+            self.c_requestCount += 1
+            self.c_isServerActive = True
+            if self.c_pollListener != None: self.c_pollListener(self.c_lastPollLatency)
+            if m_response.status_code == 304:
+                ##Same json as the last one, nothing to download or parse
+                self.c_notModifiedCount += 1
+                self.c_bytesSaved += self.__c_lastBodySize
+                self.__increaseDelay(self.c_backoffFactor)
+                return
+            m_response.raise_for_status()
+            
+            self.c_bytesReceived += len(m_response.content)
+            self.__c_lastBodySize = len(m_response.content)
+            self.c_manifestETag = m_response.headers.get('ETag')
+            self.c_manifestLastModified = m_response.headers.get('Last-Modified')
+            if self.__applyJsonResponse(m_response.json()): self.c_currentDelay = self.c_requestDelay
+            else: self.__increaseDelay(self.c_backoffFactor)
+            
+        except Exception as e:
+            self.c_lastError = 'Unable to find the server: %s%s' % (m_errProcessName,str(e.args))
+            self.c_isServerActive = False
+            self.c_failedRequestCount += 1
+            if self.c_pollListener != None: self.c_pollListener(None)
+            self.__increaseDelay(2)
+            ##Start over with a new connection on the next request
+            if self.c_session != None: self.c_session.close()
+            self.c_session = None
+
+    def __applyJsonResponse(self, p_jsonResponse):
+        '''(Private method)Keeps a json from the server, tells the listener if it changed
+            @Return
+                True -> if the json was different from the last one'''
+        if p_jsonResponse == self.c_jsonResponse: return False
+        self.c_jsonResponse = p_jsonResponse
+        self.c_manifestChangeCount += 1
+        if self.c_manifestListener != None: self.c_manifestListener()
+        return True
+
+    def getNextDelay(self):
+        '''Seconds to wait before the next request, randomized by c_jitter'''
+        if self.c_currentDelay == None: self.c_currentDelay = self.c_requestDelay
+        return self.c_currentDelay * imRandomUniform(1 - self.c_jitter, 1 + self.c_jitter)
+
+    def __increaseDelay(self, p_factor):
+        '''(Private method)Backs the polling off, up to c_maxRequestDelay'''
+        if self.c_currentDelay == None: self.c_currentDelay = self.c_requestDelay
+        self.c_currentDelay = min(self.c_currentDelay * p_factor, max(self.c_maxRequestDelay, self.c_requestDelay))
+
+    def __getSession(self):
+        '''(Private method)Kept alive session used for every request to the server'''
+        if self.c_session == None: self.c_session = self.__newSession()
+        return self.c_session
+
+    def __newSession(self):
+        '''(Private method)requests takes a while to load on a Pi, it is imported on the first request
+            instead of when the player starts'''
+        from requests import Session as imSession
+        return imSession()
+
+    def __getMacAddress(self):
+        '''(Private method)Issues the mac address of the machine network interface'''
+        m_errProcessName = self.__class__.__name__ + '__getMacAddress -> '
+        try: 
+            return ':'.join(['{:02x}'.format((imGetMac() >> i) & 0xff) for i in range(0,8*6,8)][::-1]).upper()
+        except Exception as e:
+            self.c_lastError = 'Unable to get ip address: %s%s' % (m_errProcessName, str(e.args))
+            return None
+
+    def checkNetworkAndServer(self):
+        '''Successively check the network and the server'''
+        self.c_isUsingSocket = True
+        self.fetchCurrentIP()
+        self.fetchJsonFromServer()
+        self.c_isUsingSocket = False
+        imDelay(self.getNextDelay()) ##Delay before another request
+        self.c_resumedEvent.wait() ##Pause network and server check
+
+    def subscribeToPush(self):
+        '''Opens the server-sent events stream of c_pushUrl and applies every json it pushes,
+            returns when the stream ends or fails'''
+        m_errProcessName = self.__class__.__name__ + 'subscribeToPush -> '
+        
+        if self.c_currentIP == None: self.fetchCurrentIP()
+        if self.c_requestParam == None: self.c_requestParam = {'ipAddress': self.c_currentIP, 'macAddress' : self.c_macAddres}
+        m_headers = {'Accept' : 'text/event-stream'}
+        if self.__c_lastPushEventId != None: m_headers['Last-Event-ID'] = self.__c_lastPushEventId
+        
+        m_session = self.__newSession()
+        try:
+            with m_session.get(url = self.c_pushUrl, params = self.c_requestParam, headers = m_headers, stream = True,
+                               timeout = (self.c_requestTimeout, self.c_pushReadTimeout)) as t_response:
+                t_response.raise_for_status()
+                self.c_isPushConnected = True
+                self.c_isServerActive = True
+                m_data = []
+                for t_line in t_response.iter_lines(chunk_size = None, decode_unicode = True):
+                    if not self.c_isPersistentCheckingEnabled: break
+                    if t_line.startswith('data:'): m_data.append(t_line[5:].strip())
+                    elif t_line.startswith('id:'): self.__c_lastPushEventId = t_line[3:].strip()
+                    elif (not t_line) and m_data:
+                        ##A blank line ends an event
+                        self.c_pushEventCount += 1
+                        self.__applyJsonResponse(imJsonParse('\n'.join(m_data)))
+                        m_data = []
+        except Exception as e:
+            self.c_lastError = 'Push subscription lost: %s%s' % (m_errProcessName, str(e.args))
+        finally:
+            m_session.close()
+            self.c_isPushConnected = False
+            self.c_pushLostEvent.set()  ##let the polling take over right away
+
+    def getPushRetryDelay(self, p_wasHealthy):
+        '''Seconds to wait before subscribing again, doubles while the subscription keeps failing
+            @Params
+                p_wasHealthy -> the last stream delivered events, reconnect quickly'''
+        if p_wasHealthy or (self.c_pushRetryDelay == None): self.c_pushRetryDelay = self.c_requestDelay
+        else: self.c_pushRetryDelay = min(self.c_pushRetryDelay * 2, max(self.c_maxRequestDelay, self.c_requestDelay))
+        return self.c_pushRetryDelay * imRandomUniform(1 - self.c_jitter, 1 + self.c_jitter)
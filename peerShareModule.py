@@ -0,0 +1,430 @@
+import socket
+from os import (
+    path as imPath,
+    pwrite as imWriteAt,
+    fsync as imFlushToDisk
+)
+
+from uuid import uuid4 as imNewId
+from hashlib import sha1 as imHash
+from json import (
+    loads as imJsonParse,
+    dumps as imJsonString
+)
+
+from urllib.parse import (
+    urlsplit as imSplitUrl,
+    parse_qs as imParseQuery,
+    quote as imEscapeUrl
+)
+
+from http.client import HTTPConnection as imHTTPConnection
+from concurrent.futures import ThreadPoolExecutor as imThreadPool
+from re import match as imRegExMatch
+from time import (
+    sleep as imDelay,
+    monotonic as imMonotonic
+)
+
+from threading import (
+    Thread as imThread,
+    Lock as imLock,
+    BoundedSemaphore as imSemaphore,
+    local as imThreadLocal
+)
+
+class PeerBusyError(IOError):
+    '''The peer is sending as many media as it allows, another chunk may find it free'''
+
+class PeerShareModule():
+    '''Peer Share Module
+        Lets the players of a store share their media over the LAN, so a new campaign
+        goes through the uplink of the server once per store instead of once per screen
+
+        Discovery -> every player broadcasts {"id", "group", "port"} on c_discoveryPort
+                     every c_announceInterval seconds, players of the same c_groupName
+                     are kept as peers until they are silent for c_peerTimeout
+        Serving   -> /have lists the media of the current server json that are complete
+                     on disk (with their size and checksum), /media?file=NAME sends one
+                     of them, ranges included. Partial downloads are never served
+        Fetching  -> DownloadManagerModule asks fetchToPartial before the server. The
+                     file is split in c_chunkSize chunks that are fetched with ranges
+                     from every peer holding the same version at once, the chunks no
+                     peer could send are left to the server, which resumes after them
+
+        When nobody in the store has a file yet, only one player downloads it from
+        the server: the one whose id hashed with the file name is the lowest (the
+        same choice on every player without talking about it). The others wait up to
+        c_peerWaitTimeout for it and fetch it from the peers that have it by then. A
+        media that airs sooner is only waited for until c_originMargin seconds before
+        its airtime (c_neededTimeGetter), then the server is asked right away
+
+        Only media with a checksum in the server json are taken from the peers, the
+        downloaded file is checked against it, a matching size alone could be another
+        version. The media are served on every interface of the player, sharing is
+        off unless the port is set on purpose (g_peerSharePort of mainSystem)
+
+    @Usage: (On a project)
+        import peerShareModule
+
+        g_PeerShareModule = peerShareModule.PeerShareModule()
+        g_PeerShareModule.c_fileManagerModule = g_FileManagerModule
+        g_PeerShareModule.c_mediaDir = g_mediaDir
+        g_PeerShareModule.c_groupName = 'store 12'
+        g_PeerShareModule.c_neededTimeGetter = g_PrefetchModule.getSecondsUntilNeeded
+        g_FileManagerModule.c_downloadManager.c_peerShareModule = g_PeerShareModule
+        g_PeerShareModule.start()
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+
+        self.c_fileManagerModule = None
+        self.c_mediaDir = None
+        self.c_groupName = ''   ##only players of the same group share, e.g. the store
+        self.c_port = 8765  ##http port the media are served on, 0 for any free port
+        self.c_discoveryPort = 45210
+        self.c_broadcastAddress = '255.255.255.255' ##'127.255.255.255' for several players on one machine
+        self.c_announceInterval = 5
+        self.c_peerTimeout = 20 ##seconds of silence after which a peer is dropped
+        self.c_discoveryDelay = 1   ##seconds after start before a player takes that it is alone
+        self.c_peerWaitTimeout = 120    ##seconds to wait for the player fetching a file from the server
+        self.c_originMargin = 120   ##seconds before its airtime a media is asked from the server instead of waiting
+        self.c_neededTimeGetter = None  ##returns the seconds until a file name airs or None, see PrefetchModule.getSecondsUntilNeeded
+        self.c_pollInterval = 2 ##seconds between asking the peers for a file that is being fetched
+        self.c_chunkSize = 1024 * 1024
+        self.c_maxConnections = 4   ##chunks fetched at the same time
+        self.c_maxUploads = 4   ##media sent to peers at the same time, more are answered 503
+        self.c_timeout = 10
+
+        self.c_peerId = imNewId().hex
+        self.c_peers = {}   ##peer id -> (base url, monotonic time it was last heard)
+        self.c_haveLists = {}   ##base url -> (monotonic time, /have of the peer)
+        self.c_isRunning = False
+        self.c_startedAt = None
+        self.c_server = None
+        self.c_socket = None
+        self.__c_isServing = False  ##serve_forever was started, only then can the server be shut down
+        self.__c_lock = imLock()
+        self.__c_uploads = None
+        self.__c_threadLocal = imThreadLocal()
+
+        self.c_receivedBytes = 0    ##bytes fetched from peers
+        self.c_servedBytes = 0  ##bytes sent to peers
+        self.c_chunkFailureCount = 0
+
+        self.c_lastError = ''
+
+    ##========================>>
+    ##Discovery and serving
+    ##========================>>
+    def start(self):
+        '''Starts serving the media and announcing this player, both on daemon threads'''
+        m_errProcessName = self.__class__.__name__ + '-start ->'
+        try:
+            ##Imported once sharing starts, the same as MetricsModule
+            from http.server import ThreadingHTTPServer as imHttpServer
+            self.__c_uploads = imSemaphore(max(1, self.c_maxUploads))
+            self.c_server = imHttpServer(('0.0.0.0', self.c_port), self.__makeHandler())
+            self.c_server.daemon_threads = True
+            self.c_port = self.c_server.server_address[1]
+
+            self.c_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            ##Every player on the machine gets a copy of the broadcasts
+            self.c_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.c_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            self.c_socket.bind(('', self.c_discoveryPort))
+            self.c_socket.settimeout(self.c_announceInterval)
+
+            self.c_isRunning = True
+            self.c_startedAt = imMonotonic()
+            imThread(target = self.c_server.serve_forever, name = 'peerShare', daemon = True).start()
+            self.__c_isServing = True
+            imThread(target = self.__discover, name = 'peerDiscovery', daemon = True).start()
+            print('Sharing media with peers on port %d' % self.c_port)
+        except Exception as e:
+            self.c_lastError = 'Error in starting the peer share: %s%s' % (m_errProcessName, str(e.args))
+            print(self.c_lastError)
+            ##Nothing serves yet, stop only closes the server and discovery sockets
+            self.stop()
+
+    def stop(self):
+        self.c_isRunning = False
+        if self.c_server != None:
+            ##shutdown waits for serve_forever, it would never return if it did not start
+            if self.__c_isServing: self.c_server.shutdown()
+            self.__c_isServing = False
+            self.c_server.server_close()
+            self.c_server = None
+        if self.c_socket != None:
+            self.c_socket.close()
+            self.c_socket = None
+
+    def announce(self):
+        '''Broadcasts this player to the peers of its group'''
+        m_errProcessName = self.__class__.__name__ + '-announce ->'
+        try:
+            m_message = imJsonString({'id' : self.c_peerId, 'group' : self.c_groupName, 'port' : self.c_port}).encode()
+            self.c_socket.sendto(m_message, (self.c_broadcastAddress, self.c_discoveryPort))
+        except Exception as e:
+            self.c_lastError = 'Error in announcing to the peers: %s%s' % (m_errProcessName, str(e.args))
+
+    def __discover(self):
+        '''(Private method)Announces every c_announceInterval and keeps the peers that are heard,
+            a new peer is answered right away so it does not wait a whole interval'''
+        m_announcedAt = 0
+        while self.c_isRunning:
+            if imMonotonic() - m_announcedAt >= self.c_announceInterval:
+                self.announce()
+                m_announcedAt = imMonotonic()
+            try:
+                t_message, t_address = self.c_socket.recvfrom(1024)
+                t_announcement = imJsonParse(t_message.decode())
+                if (t_announcement.get('id') == self.c_peerId) or (t_announcement.get('group') != self.c_groupName): continue
+                with self.__c_lock:
+                    t_isNew = t_announcement['id'] not in self.c_peers
+                    self.c_peers[t_announcement['id']] = ('http://%s:%d' % (t_address[0], int(t_announcement['port'])), imMonotonic())
+                if t_isNew: m_announcedAt = 0
+            except socket.timeout:
+                continue
+            except Exception as e:
+                if not self.c_isRunning: break
+                self.c_lastError = 'Error in discovering peers: %s' % str(e.args)
+
+    def getPeers(self):
+        '''Returns peer id -> base url of the peers heard within c_peerTimeout'''
+        m_now = imMonotonic()
+        with self.__c_lock:
+            for t_peerId in [t_peerId for t_peerId, (t_url, t_seenAt) in self.c_peers.items() if m_now - t_seenAt > self.c_peerTimeout]:
+                del self.c_peers[t_peerId]
+            ##The /have of a silent peer would otherwise be kept forever
+            m_urls = set(t_url for t_url, t_seenAt in self.c_peers.values())
+            for t_url in [t_url for t_url in self.c_haveLists if t_url not in m_urls]: del self.c_haveLists[t_url]
+            return dict((t_peerId, t_url) for t_peerId, (t_url, t_seenAt) in self.c_peers.items())
+
+    def getLocalMedia(self):
+        '''Returns file name -> {'size', 'checksum'} of the media of the current server json that are complete on disk'''
+        m_fileManager = self.c_fileManagerModule
+        m_localMedia = {}
+        for t_fileName, t_media in m_fileManager.getMediaInfo().items():
+            if m_fileManager.isMediaComplete(self.c_mediaDir, t_media):
+                m_localMedia[t_fileName] = {'size' : imPath.getsize(self.c_mediaDir + t_fileName), 'checksum' : t_media.get('checksum')}
+        return m_localMedia
+
+    def __makeHandler(self):
+        '''(Private method)Request handler class bound to this module'''
+        from http.server import BaseHTTPRequestHandler as imRequestHandler
+        m_peerShareModule = self
+        m_uploads = self.__c_uploads
+        m_lock = self.__c_lock
+
+        class PeerRequestHandler(imRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                m_url = imSplitUrl(self.path)
+                if m_url.path == '/have':
+                    self.sendBody(200, imJsonString(m_peerShareModule.getLocalMedia()).encode(), 'application/json')
+                elif m_url.path == '/media':
+                    self.sendMedia(imParseQuery(m_url.query).get('file', [''])[0])
+                else:
+                    self.sendBody(404, b'Not found', 'text/plain')
+
+            def sendMedia(self, p_fileName):
+                if p_fileName not in m_peerShareModule.getLocalMedia():
+                    self.sendBody(404, b'Not found', 'text/plain')
+                    return
+                ##The playback comes first, a busy player sends the peer to another one
+                if not m_uploads.acquire(blocking = False):
+                    self.sendBody(503, b'Busy', 'text/plain')
+                    return
+                try:
+                    with open(m_peerShareModule.c_mediaDir + p_fileName, 'rb') as t_file:
+                        m_size = imPath.getsize(m_peerShareModule.c_mediaDir + p_fileName)
+                        m_range = imRegExMatch(r'bytes=(\d+)-(\d*)$', self.headers.get('Range') or '')
+                        m_start, m_end = 0, m_size - 1
+                        if m_range:
+                            m_start = int(m_range.group(1))
+                            if m_range.group(2): m_end = min(m_end, int(m_range.group(2)))
+                            if m_start > m_end:
+                                self.send_response(416)
+                                self.send_header('Content-Range', 'bytes */%d' % m_size)
+                                self.send_header('Content-Length', '0')
+                                self.end_headers()
+                                return
+                            self.send_response(206)
+                            self.send_header('Content-Range', 'bytes %d-%d/%d' % (m_start, m_end, m_size))
+                        else:
+                            self.send_response(200)
+                        self.send_header('Content-Type', 'application/octet-stream')
+                        self.send_header('Content-Length', str(m_end - m_start + 1))
+                        self.end_headers()
+
+                        t_file.seek(m_start)
+                        m_remaining = m_end - m_start + 1
+                        while m_remaining > 0:
+                            t_chunk = t_file.read(min(64 * 1024, m_remaining))
+                            if not t_chunk: break
+                            self.wfile.write(t_chunk)
+                            m_remaining -= len(t_chunk)
+                        with m_lock: m_peerShareModule.c_servedBytes += m_end - m_start + 1 - m_remaining
+                finally:
+                    m_uploads.release()
+
+            def sendBody(self, p_status, p_body, p_contentType):
+                self.send_response(p_status)
+                self.send_header('Content-Type', p_contentType)
+                self.send_header('Content-Length', str(len(p_body)))
+                self.end_headers()
+                self.wfile.write(p_body)
+
+            def log_message(self, p_format, *p_args):
+                pass    ##every chunk is a request
+
+        return PeerRequestHandler
+
+    ##========================>>
+    ##Fetching
+    ##========================>>
+    def isOriginFetcher(self, p_fileName):
+        '''Checks if this player is the one of the group that downloads p_fileName from the server'''
+        m_ids = [self.c_peerId] + list(self.getPeers())
+        return min(m_ids, key = lambda t_peerId: imHash(('%s/%s' % (t_peerId, p_fileName)).encode()).hexdigest()) == self.c_peerId
+
+    def findSources(self, p_fileName, p_expectedSize=None, p_checksum=None):
+        '''Returns (base urls of the peers holding the same version of p_fileName, its size),
+            a peer is only used if its size and checksum match what the server json gives'''
+        m_sources = []
+        m_size = None
+        for t_url in self.getPeers().values():
+            t_media = self.__getHaveList(t_url).get(p_fileName)
+            if t_media == None: continue
+            if (p_expectedSize != None) and (int(p_expectedSize) != t_media['size']): continue
+            if p_checksum and ((t_media['checksum'] or '').lower() != p_checksum.lower()): continue
+            if (m_size != None) and (m_size != t_media['size']): continue
+            m_size = t_media['size']
+            m_sources.append(t_url)
+        return m_sources, m_size
+
+    def __getHaveList(self, p_url):
+        '''(Private method)/have of a peer, asked at most once every c_pollInterval'''
+        with self.__c_lock: m_cached = self.c_haveLists.get(p_url)
+        if (m_cached != None) and (imMonotonic() - m_cached[0] < self.c_pollInterval): return m_cached[1]
+        try:
+            m_response = self.__request(p_url, '/have')
+            m_body = m_response.read()
+            m_haveList = imJsonParse(m_body.decode()) if m_response.status == 200 else {}
+        except Exception:
+            self.__closeConnection(p_url)
+            m_haveList = {}
+        with self.__c_lock: self.c_haveLists[p_url] = (imMonotonic(), m_haveList)
+        return m_haveList
+
+    def fetchToPartial(self, p_fileName, p_partialFile, p_expectedSize=None, p_checksum=None):
+        '''Fetches a file from the peers into the partial file of DownloadManagerModule
+            @Params
+                p_fileName -> file name to fetch
+                p_partialFile -> partial file, its bytes are kept and continued
+                p_expectedSize -> size in bytes given by the server json
+                p_checksum -> checksum given by the server json, without it nothing is fetched from the peers
+            @Return
+                (bytes received, total size) -> the partial file is whole
+                (bytes received, None) -> the partial file holds what could be fetched from
+                    its start on, the rest has to come from the server'''
+
+        ##Without a checksum a peer could hold another version of the file of the same size
+        if (not self.c_isRunning) or (not p_checksum): return 0, None
+        m_errProcessName = self.__class__.__name__ + '-fetchToPartial ->'
+        ##Gives the announcements of the peers time to arrive after the start
+        imDelay(max(0, self.c_discoveryDelay - (imMonotonic() - self.c_startedAt)))
+
+        m_waitSeconds = self.c_peerWaitTimeout
+        m_neededSeconds = self.c_neededTimeGetter(p_fileName) if self.c_neededTimeGetter != None else None
+        if m_neededSeconds != None: m_waitSeconds = max(0, min(m_waitSeconds, m_neededSeconds - self.c_originMargin))
+        m_waitUntil = imMonotonic() + m_waitSeconds
+        while self.c_isRunning:
+            m_sources, m_size = self.findSources(p_fileName, p_expectedSize, p_checksum)
+            if m_sources: break
+            if self.isOriginFetcher(p_fileName) or (imMonotonic() >= m_waitUntil): return 0, None
+            imDelay(self.c_pollInterval)
+        else:
+            return 0, None
+
+        try:
+            return self.__fetchChunks(p_fileName, p_partialFile, m_sources, m_size)
+        except Exception as e:
+            self.c_lastError = 'Error in fetching %s from the peers: %s%s' % (p_fileName, m_errProcessName, str(e.args))
+            return 0, None
+
+    def __fetchChunks(self, p_fileName, p_partialFile, p_sources, p_size):
+        '''(Private method)Fetches the chunks after what the partial file already holds, spread over the sources'''
+        m_offset = imPath.getsize(p_partialFile) if imPath.exists(p_partialFile) else 0
+        m_firstChunk = min(m_offset, p_size) // self.c_chunkSize
+        m_chunks = list(range(m_firstChunk, (p_size + self.c_chunkSize - 1) // self.c_chunkSize))
+        m_failedSources = set()
+        m_doneChunks = {}   ##chunk -> bytes received
+
+        with open(p_partialFile, 'r+b' if imPath.exists(p_partialFile) else 'wb') as t_file:
+            t_file.truncate(p_size)
+            m_fileNumber = t_file.fileno()
+
+            def m_fetchChunk(p_chunk):
+                '''Tries the sources from the one of the chunk on, a source that fails is not used again'''
+                m_start = p_chunk * self.c_chunkSize
+                m_end = min(p_size, m_start + self.c_chunkSize) - 1
+                for t_index in range(len(p_sources)):
+                    t_url = p_sources[(p_chunk + t_index) % len(p_sources)]
+                    if t_url in m_failedSources: continue
+                    try:
+                        t_response = self.__request(t_url, '/media?file=' + imEscapeUrl(p_fileName), {'Range' : 'bytes=%d-%d' % (m_start, m_end)})
+                        t_body = t_response.read()
+                        if t_response.status == 503: raise PeerBusyError('Peer is busy')
+                        if (t_response.status != 206) or (len(t_body) != m_end - m_start + 1):
+                            raise IOError('Peer answered %d with %d bytes' % (t_response.status, len(t_body)))
+                        imWriteAt(m_fileNumber, t_body, m_start)
+                        with self.__c_lock: m_doneChunks[p_chunk] = len(t_body)
+                        return
+                    except PeerBusyError:
+                        ##A busy peer may be free for the next chunk
+                        with self.__c_lock: self.c_chunkFailureCount += 1
+                    except Exception:
+                        self.__closeConnection(t_url)
+                        with self.__c_lock:
+                            self.c_chunkFailureCount += 1
+                            m_failedSources.add(t_url)
+
+            with imThreadPool(max_workers = max(1, min(self.c_maxConnections, len(m_chunks)))) as t_pool:
+                list(t_pool.map(m_fetchChunk, m_chunks))
+
+            ##Only the chunks before the first missing one are kept, the server continues from there
+            m_missingChunks = [t_chunk for t_chunk in m_chunks if t_chunk not in m_doneChunks]
+            if m_missingChunks: t_file.truncate(max(m_firstChunk * self.c_chunkSize, m_missingChunks[0] * self.c_chunkSize))
+            m_received = sum(t_bytes for t_chunk, t_bytes in m_doneChunks.items() if (not m_missingChunks) or (t_chunk < m_missingChunks[0]))
+            with self.__c_lock: self.c_receivedBytes += m_received
+            t_file.flush()
+            imFlushToDisk(m_fileNumber)
+
+        print('\tFetched %s from %d peers, %d of %d chunks' % (p_fileName, len(p_sources), len(m_doneChunks), len(m_chunks)))
+        return m_received, (None if m_missingChunks else p_size)
+
+    def __request(self, p_url, p_path, p_headers=None):
+        '''(Private method)Sends a GET on the kept alive connection of the current thread to the peer'''
+        m_connections = self.__getConnections()
+        if p_url not in m_connections: m_connections[p_url] = imHTTPConnection(imSplitUrl(p_url).netloc, timeout = self.c_timeout)
+        m_connections[p_url].request('GET', p_path, headers = p_headers or {})
+        return m_connections[p_url].getresponse()
+
+    def __getConnections(self):
+        '''(Private method)Base url -> connection of the current thread'''
+        if getattr(self.__c_threadLocal, 'connections', None) == None: self.__c_threadLocal.connections = {}
+        return self.__c_threadLocal.connections
+
+    def __closeConnection(self, p_url):
+        '''(Private method)Drops the connection of the current thread to a peer'''
+        m_connection = self.__getConnections().pop(p_url, None)
+        if m_connection != None: m_connection.close()
@@ -0,0 +1,346 @@
+from os import (
+    path as imPath,
+    fsync as imSyncFile,
+    remove as imDelete,
+    replace as imReplaceFile,
+    listdir as imListFile,
+    makedirs as imMakeDirs
+)
+
+from json import (
+    dumps as imJsonString,
+    loads as imJsonParse,
+    load as imJsonLoad,
+    dump as imSaveJson
+)
+
+from gzip import compress as imCompress
+from uuid import uuid4 as imNewId
+from queue import Queue as imQueue
+from datetime import datetime as imDatetime
+from collections import OrderedDict as imOrderedDict
+from threading import (
+    RLock as imLock,
+    Thread as imThread
+)
+
+SEGMENT_PREFIX = 'airings-'
+SEGMENT_SUFFIX = '.jsonl'
+
+class PlayLogModule():
+    '''Play Log Module
+        Proof of play: every airing (file, start, end, schedule slot and why it ended,
+        see mediaPlayerModule AIRING_*) is queued the moment it ends and appended as one
+        json line to a journal on disk by a writer thread, so the event thread of the
+        player never waits for the storage. The journal is uploaded to the server in batches
+
+        The journal is a directory of segments of c_segmentBytes, only the last one is
+        written to and it is synced to the storage on every airing, a power cut loses
+        the airing on screen and the ones still queued. The segments together stay within
+        c_maxJournalBytes, past it the oldest segment is dropped (c_droppedCount), so a
+        player that never reaches the server does not fill its storage
+
+        Only the open segment, the upload cursor and the sizes of the segments are
+        kept in memory, whatever the length of the journal. An upload reads c_batchSize
+        lines from the cursor, posts them gzip compressed to c_uploadUrl (one airing
+        per line, 'application/x-ndjson') and moves the cursor only once the server
+        answered 2xx, a finished segment is then deleted. A failed upload is retried
+        after c_retryDelay, doubled on every failure up to c_maxRetryDelay
+
+        Every airing has an id made of the player id and a sequence number that never
+        goes back, a batch that is sent again (the answer was lost, or the player
+        restarted before it saved the cursor) carries the same ids so the server drops
+        the duplicates. A player back from a week offline sends at most
+        c_maxBatchesPerRun batches every c_catchUpDelay seconds until it has caught up
+
+    @Usage: (On a project)
+        import playLogModule
+
+        g_PlayLogModule = playLogModule.PlayLogModule()
+        g_PlayLogModule.c_journalDir = '/home/pi/configurations/playLog/'
+        g_PlayLogModule.c_uploadUrl = 'http://192.168.1.19:8080/playLog'
+        g_PlayLogModule.c_fileManagerModule = g_FileManagerModule    ##schedule slots (its schedule index) and durations, optional
+        g_PlayLogModule.open()
+        g_MediaPanelModule.c_airingListener = g_PlayLogModule.recordAiring
+        g_AsyncRuntimeModule.c_playLogModule = g_PlayLogModule  ##runs uploadPending on the event loop
+
+        g_PlayLogModule.flush() ##waits until the queued airings are written
+        g_PlayLogModule.close() ##after the media panel was stopped, its last airing is recorded
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+
+        self.c_journalDir = None
+        self.c_uploadUrl = None
+        self.c_playerId = None  ##kept in the journal directory when not set
+        self.c_mediaDir = None  ##airings of files outside of it (the splash screen) are not logged
+        self.c_fileManagerModule = None
+        self.c_clockSyncModule = None   ##the clock offset is logged with every airing when set
+        self.c_segmentBytes = 256 * 1024
+        self.c_maxJournalBytes = 64 * 1024 ** 2 ##bytes of journal kept on disk, about 250000 airings
+        self.c_isSyncWrites = True  ##sync every airing to the storage
+        self.c_batchSize = 500  ##airings per upload
+        self.c_maxBatchesPerRun = 10
+        self.c_uploadInterval = 60  ##seconds between uploads when caught up
+        self.c_catchUpDelay = 5 ##seconds between uploads while behind
+        self.c_retryDelay = 30
+        self.c_maxRetryDelay = 3600
+        self.c_requestTimeout = 30
+
+        self.c_sequence = 0 ##sequence number of the last airing logged
+        self.c_loggedCount = 0
+        self.c_uploadedCount = 0
+        self.c_uploadCount = 0  ##requests that were answered 2xx
+        self.c_failedUploadCount = 0
+        self.c_droppedCount = 0 ##airings dropped to keep c_maxJournalBytes
+        self.c_session = None
+
+        self.__c_lock = imLock()
+        self.__c_file = None    ##open segment
+        self.__c_segments = imOrderedDict() ##segment file name -> bytes, oldest first
+        self.__c_cursor = None  ##[segment file name, offset] of the first airing not uploaded
+        self.__c_failures = 0   ##uploads failed in a row
+        self.__c_queue = imQueue()  ##airings waiting for the writer thread
+        self.__c_thread = None
+
+        self.c_lastError = ''
+
+    def open(self):
+        '''Opens the journal, continues the sequence and the upload where they were'''
+
+        m_errProcessName = self.__class__.__name__ + '-open ->'
+        with self.__c_lock:
+            try:
+                if not imPath.isdir(self.c_journalDir): imMakeDirs(self.c_journalDir)
+                if self.c_playerId == None: self.c_playerId = self.__loadPlayerId()
+                for t_fileName in sorted(imListFile(self.c_journalDir)):
+                    if t_fileName.startswith(SEGMENT_PREFIX) and t_fileName.endswith(SEGMENT_SUFFIX):
+                        self.__c_segments[t_fileName] = imPath.getsize(self.c_journalDir + t_fileName)
+                if self.__c_segments: self.c_sequence = self.__repairLastSegment(next(reversed(self.__c_segments)))
+                if imPath.isfile(self.c_journalDir + 'cursor.json'):
+                    with open(self.c_journalDir + 'cursor.json', 'r') as t_cursorFile: self.__c_cursor = imJsonLoad(t_cursorFile)
+                self.__openSegment()
+                if self.__c_thread == None:
+                    self.__c_thread = imThread(target = self.__writeQueued, name = 'playLog', daemon = True)
+                    self.__c_thread.start()
+            except Exception as e:
+                self.c_lastError = 'Error in opening the play log: %s%s' % (m_errProcessName, str(e.args))
+                print(self.c_lastError)
+
+    def close(self):
+        '''Writes the airings still queued and closes the journal'''
+        if self.__c_thread != None:
+            self.__c_queue.put(None)
+            self.__c_thread.join()
+            self.__c_thread = None
+        with self.__c_lock:
+            if self.__c_file != None: self.__c_file.close()
+            self.__c_file = None
+
+    def flush(self):
+        '''Waits until every airing queued so far is in the journal'''
+        if self.__c_thread != None: self.__c_queue.join()
+
+    def recordAiring(self, p_media, p_startedAt, p_endedAt, p_reason, p_isScheduled=False):
+        '''Queues an airing for the journal, the c_airingListener of MediaPlayerModule,
+            returns right away since it is called on the event thread of the player
+            @Params
+                p_media -> the media resource locator that was played
+                p_startedAt, p_endedAt -> epoch seconds of the local clock
+                p_reason -> why it ended, see mediaPlayerModule AIRING_*
+                p_isScheduled -> it was played as the media of a schedule slot'''
+
+        if (self.__c_thread == None) or ((self.c_mediaDir != None) and (not p_media.startswith(self.c_mediaDir))): return
+        ##The offset of the moment the airing ended, not of the moment it is written
+        m_offset = self.c_clockSyncModule.c_offset if self.c_clockSyncModule != None else None
+        self.__c_queue.put((p_media, p_startedAt, p_endedAt, p_reason, p_isScheduled, m_offset))
+
+    def __writeQueued(self):
+        '''(Private method)Writes the queued airings one at a time until close queues None'''
+        while True:
+            m_airing = self.__c_queue.get()
+            try:
+                if m_airing == None: break
+                self.__writeAiring(*m_airing)
+            finally:
+                self.__c_queue.task_done()
+
+    def __writeAiring(self, p_media, p_startedAt, p_endedAt, p_reason, p_isScheduled, p_offset):
+        '''(Private method)Appends an airing to the journal and syncs it to the storage'''
+
+        m_errProcessName = self.__class__.__name__ + '-writeAiring ->'
+        try:
+            m_fileName = imPath.basename(p_media)
+            m_slot, m_duration = None, None
+            if self.c_fileManagerModule != None:
+                m_duration = self.c_fileManagerModule.getMediaDuration(m_fileName)
+                if p_isScheduled: m_slot = self.__getSlot(m_fileName, p_startedAt, p_endedAt)
+
+            with self.__c_lock:
+                if self.__c_file == None: return
+                self.c_sequence += 1
+                m_line = (imJsonString({'id' : '%s-%d' % (self.c_playerId, self.c_sequence), 'file' : m_fileName,
+                                        'start' : round(p_startedAt, 3), 'end' : round(p_endedAt, 3), 'slot' : m_slot,
+                                        'reason' : p_reason, 'duration' : m_duration, 'clockOffset' : p_offset},
+                                       separators = (',', ':')) + '\n').encode()
+                self.__c_file.write(m_line)
+                self.__c_file.flush()
+                if self.c_isSyncWrites: imSyncFile(self.__c_file.fileno())
+                self.__c_segments[imPath.basename(self.__c_file.name)] += len(m_line)
+                self.c_loggedCount += 1
+                if self.__c_segments[imPath.basename(self.__c_file.name)] >= self.c_segmentBytes: self.__openSegment(True)
+                self.__keepWithinBudget()
+        except Exception as e:
+            self.c_lastError = 'Error in logging the airing of %s: %s%s' % (p_media, m_errProcessName, str(e.args))
+
+    def __getSlot(self, p_fileName, p_startedAt, p_endedAt):
+        '''(Private method)Schedule slot the airing was played in, looked up in the schedule index at
+            its start in server time, or at its middle for an airing started a little before its slot
+            @Return
+                "startTime-endTime" of the slot, None if the file was not scheduled then'''
+        m_fileManager = self.c_fileManagerModule
+        for t_time in (p_startedAt, (p_startedAt + p_endedAt) / 2.0):
+            t_serverTime = imDatetime.fromtimestamp(t_time)
+            if m_fileManager.c_timeDeviation != None: t_serverTime += m_fileManager.c_timeDeviation
+            t_media = m_fileManager.c_scheduleIndex.getMediaAt(t_serverTime.time())
+            if (t_media != None) and (t_media.get('fileName') == p_fileName): return '%s-%s' % (t_media.get('startTime'), t_media.get('endTime'))
+        return None
+
+    def getPendingBytes(self):
+        '''Bytes of the journal not uploaded yet'''
+        with self.__c_lock:
+            m_cursor = self.__getCursor()
+            if m_cursor == None: return 0
+            return sum(t_bytes for t_segment, t_bytes in self.__c_segments.items() if t_segment >= m_cursor[0]) - m_cursor[1]
+
+    def getNextDelay(self):
+        '''Seconds until the next uploadPending, longer on every failure in a row'''
+        if self.__c_failures: return min(self.c_retryDelay * 2 ** (self.__c_failures - 1), self.c_maxRetryDelay)
+        return self.c_catchUpDelay if self.getPendingBytes() > 0 else self.c_uploadInterval
+
+    def uploadPending(self):
+        '''Uploads up to c_maxBatchesPerRun batches of the journal, stops at the first failure
+            @Return
+                number of airings the server took'''
+
+        m_errProcessName = self.__class__.__name__ + '-uploadPending ->'
+        m_uploaded = 0
+        if self.c_uploadUrl == None: return 0
+        for t_run in range(self.c_maxBatchesPerRun):
+            m_lines, m_nextCursor = self.__readBatch()
+            if not m_lines: break
+            try:
+                m_response = self.__getSession().post(url = self.c_uploadUrl, data = imCompress(b''.join(m_lines)), timeout = self.c_requestTimeout,
+                                                      headers = {'Content-Type' : 'application/x-ndjson', 'Content-Encoding' : 'gzip',
+                                                                 'X-Player-Id' : self.c_playerId})
+                m_response.raise_for_status()
+            except Exception as e:
+                self.__c_failures += 1
+                self.c_failedUploadCount += 1
+                self.c_lastError = 'Error in uploading the play log: %s%s' % (m_errProcessName, str(e.args))
+                break
+            self.__c_failures = 0
+            self.c_uploadCount += 1
+            self.c_uploadedCount += len(m_lines)
+            m_uploaded += len(m_lines)
+            self.__moveCursor(m_nextCursor)
+        return m_uploaded
+
+    def __readBatch(self):
+        '''(Private method)Reads up to c_batchSize complete lines from the cursor, deletes the
+            segments that were read to the end on the way
+            @Return
+                (list of lines, cursor after them)'''
+        with self.__c_lock:
+            m_lines = []
+            m_cursor = self.__getCursor()
+            while (m_cursor != None) and (len(m_lines) < self.c_batchSize):
+                with open(self.c_journalDir + m_cursor[0], 'rb') as t_segmentFile:
+                    t_segmentFile.seek(m_cursor[1])
+                    while len(m_lines) < self.c_batchSize:
+                        t_line = t_segmentFile.readline()
+                        if not t_line.endswith(b'\n'): break    ##end of the segment, or an airing half written
+                        m_lines.append(t_line)
+                        m_cursor = [m_cursor[0], m_cursor[1] + len(t_line)]
+                if len(m_lines) >= self.c_batchSize: break
+                m_segments = list(self.__c_segments)
+                if m_cursor[0] == m_segments[-1]: break  ##the open segment, the rest is not written yet
+                m_cursor = [m_segments[m_segments.index(m_cursor[0]) + 1], 0]
+            return m_lines, m_cursor
+
+    def __moveCursor(self, p_cursor):
+        '''(Private method)Saves the cursor and deletes the segments before it'''
+        with self.__c_lock:
+            self.__c_cursor = p_cursor
+            with open(self.c_journalDir + 'cursor.json.tmp', 'w') as t_cursorFile: imSaveJson(p_cursor, t_cursorFile)
+            imReplaceFile(self.c_journalDir + 'cursor.json.tmp', self.c_journalDir + 'cursor.json')
+            for t_segment in [t_segment for t_segment in self.__c_segments if t_segment < p_cursor[0]]: self.__deleteSegment(t_segment)
+
+    def __getCursor(self):
+        '''(Private method)The saved cursor, the start of the oldest segment if its segment was dropped'''
+        if not self.__c_segments: return None
+        if (self.__c_cursor == None) or (self.__c_cursor[0] not in self.__c_segments):
+            self.__c_cursor = [next(iter(self.__c_segments)), 0]
+        return self.__c_cursor
+
+    def __keepWithinBudget(self):
+        '''(Private method)Drops the oldest segments while the journal is over c_maxJournalBytes'''
+        while (sum(self.__c_segments.values()) > self.c_maxJournalBytes) and (len(self.__c_segments) > 1):
+            m_segment = next(iter(self.__c_segments))
+            with open(self.c_journalDir + m_segment, 'rb') as t_segmentFile:
+                if (self.__c_cursor != None) and (self.__c_cursor[0] == m_segment): t_segmentFile.seek(self.__c_cursor[1])
+                m_dropped = sum(t_chunk.count(b'\n') for t_chunk in iter(lambda: t_segmentFile.read(64 * 1024), b''))
+            self.c_droppedCount += m_dropped
+            self.__deleteSegment(m_segment)
+            if m_dropped: self.c_lastError = 'Play log over %d bytes, %d airings not uploaded were dropped' % (self.c_maxJournalBytes, m_dropped)
+
+    def __deleteSegment(self, p_segment):
+        '''(Private method)'''
+        del self.__c_segments[p_segment]
+        if imPath.exists(self.c_journalDir + p_segment): imDelete(self.c_journalDir + p_segment)
+
+    def __openSegment(self, p_isNew=False):
+        '''(Private method)Opens the last segment to append to, a new one when p_isNew or there is none'''
+        if self.__c_file != None: self.__c_file.close()
+        if p_isNew or (not self.__c_segments):
+            ##Named by the first sequence number in it, the names sort in the order they were written
+            self.__c_segments['%s%012d%s' % (SEGMENT_PREFIX, self.c_sequence + 1, SEGMENT_SUFFIX)] = 0
+        self.__c_file = open(self.c_journalDir + next(reversed(self.__c_segments)), 'ab')
+
+    def __repairLastSegment(self, p_segment):
+        '''(Private method)Cuts an airing that was half written when the power went off, the
+            next one would be appended to it
+            @Return
+                sequence number of the last complete airing of the journal'''
+        with open(self.c_journalDir + p_segment, 'rb+') as t_segmentFile:
+            m_start = max(0, self.__c_segments[p_segment] - 4096)
+            t_segmentFile.seek(m_start)
+            m_tail = t_segmentFile.read()
+            if m_tail and (not m_tail.endswith(b'\n')):
+                t_segmentFile.truncate(m_start + m_tail.rfind(b'\n') + 1)
+                self.__c_segments[p_segment] = m_start + m_tail.rfind(b'\n') + 1
+        m_lines = m_tail.split(b'\n')[:-1]
+        if m_start > 0: m_lines = m_lines[1:]   ##the first one is cut by the seek
+        if not m_lines: return int(p_segment[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) - 1
+        return int(imJsonParse(m_lines[-1].decode())['id'].rsplit('-', 1)[1])
+
+    def __loadPlayerId(self):
+        '''(Private method)Id of this player, made on the first start and kept with the journal'''
+        if imPath.isfile(self.c_journalDir + 'player.id'):
+            with open(self.c_journalDir + 'player.id', 'r') as t_idFile: return t_idFile.read().strip()
+        m_playerId = imNewId().hex
+        with open(self.c_journalDir + 'player.id', 'w') as t_idFile: t_idFile.write(m_playerId)
+        return m_playerId
+
+    def __getSession(self):
+        '''(Private method)requests is imported on the first upload, like NetworkModule does'''
+        if self.c_session == None:
+            from requests import Session as imSession
+            self.c_session = imSession()
+        return self.c_session
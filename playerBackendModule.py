@@ -0,0 +1,571 @@
+from os import path as imPath
+from abc import (
+    ABC as imAbstractClass,
+    abstractmethod as imAbstractMethod
+)
+from time import monotonic as imMonotonic
+from time import sleep as imDelay
+from threading import (
+    Thread as imThread,
+    Timer as imTimer,
+    RLock as imLock,
+    Event as imEvent
+)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+VLC_INSTANCE_PARAMS = "--no-xlib --avcodec-threads=3 --sout-avcodec-hurry-up"
+
+##libvlc instances by their params, creating one loads libvlc and scans its plugin cache
+##which takes seconds on a Pi, so it is done once per process and shared by the backends
+VLC_INSTANCES = {}
+VLC_INSTANCE_LOCK = imLock()
+
+def getVlcInstance(p_instanceParams=VLC_INSTANCE_PARAMS):
+    '''Returns the shared vlc.Instance of the given params, creates it on the first call'''
+    with VLC_INSTANCE_LOCK:
+        if p_instanceParams not in VLC_INSTANCES:
+            ##Imported here so the headless backend runs where libvlc is not installed
+            import vlc
+            VLC_INSTANCES[p_instanceParams] = vlc.Instance(p_instanceParams)
+        return VLC_INSTANCES[p_instanceParams]
+
+def prewarmVlcInstance(p_instanceParams=VLC_INSTANCE_PARAMS):
+    '''Creates the shared vlc.Instance in a background thread, e.g. while the gui libraries
+        load, the backend created later only waits for what is left of it
+        @Return
+            the started thread'''
+    m_thread = imThread(target = getVlcInstance, args = (p_instanceParams,), name = 'vlcPrewarm', daemon = True)
+    m_thread.start()
+    return m_thread
+
+class PlayerBackend(imAbstractClass):
+    '''Player Backend
+        What MediaPlayerModule needs from the thing that actually renders the media.
+        A backend plays one media at a time and reports two events through listeners,
+        both may be called from a thread of the backend and must only hand over:
+
+            c_playingListener -> called without arguments once the media is playing
+            c_endReachedListener -> called without arguments once the media has ended
+
+        A backend that can pre-roll (open and pause a media ahead of time) records how
+        long the swap to a pre-rolled media took in c_lastSwapTime, read them through
+        getSwapStats since a wrapping backend swaps nothing itself
+
+        play, resume, pause and stop are abstract, a backend has to implement them to be
+        created, prepareMedia is optional
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+
+        self.c_playingListener = None
+        self.c_endReachedListener = None
+
+        ##Seconds the play() of a pre-rolled media took
+        self.c_lastSwapTime = None
+        self.c_maxSwapTime = 0
+        self.c_swapCount = 0
+
+        self.c_lastError = ''
+
+    def prepareMedia(self, p_mediaResourceLocator):
+        '''Does the slow part of opening a media ahead of time
+            @Return
+                a handle to pass to play(), None if the media could not be prepared'''
+        return None
+
+    @imAbstractMethod
+    def play(self, p_mediaResourceLocator, p_preparedMedia=None):
+        '''Stops what is playing and plays the given media
+            @Params
+                p_mediaResourceLocator -> the media file to play
+                p_preparedMedia -> what prepareMedia returned for the same file, optional'''
+
+    @imAbstractMethod
+    def resume(self):
+        '''Continues a paused media'''
+
+    @imAbstractMethod
+    def pause(self):
+        '''Pauses the media, resume continues it'''
+
+    @imAbstractMethod
+    def stop(self):
+        '''Stops the media, no event of it is reported afterwards'''
+
+    def _notifyPlaying(self, p_event=None):
+        if self.c_playingListener != None: self.c_playingListener()
+
+    def _notifyEndReached(self, p_event=None):
+        if self.c_endReachedListener != None: self.c_endReachedListener()
+
+    def getSwapStats(self):
+        '''Returns (last, longest) seconds of the swaps to a pre-rolled media and how many there were'''
+        return self.c_lastSwapTime, self.c_maxSwapTime, self.c_swapCount
+
+    def _recordSwap(self, p_seconds):
+        self.c_lastSwapTime = p_seconds
+        self.c_maxSwapTime = max(self.c_maxSwapTime, p_seconds)
+        self.c_swapCount += 1
+
+class VlcPlayerBackend(PlayerBackend):
+    '''Vlc Player Backend
+        Plays the media with libvlc, in the X window of the media panel if one is given
+
+    @Usage: (On a project)
+        import playerBackendModule
+        g_MediaPlayerModule.setBackend(playerBackendModule.VlcPlayerBackend(p_widget.get_window().get_xid()))
+
+    @Vlc instance params:
+        --no-xlib -> please check the documentations
+        --avcodec-threads -> sets the number of threads for decoding the video
+        --sout-avcodec-hurry-up -> set the encoder to make on-the-fly quality trade
+                        offs if the cpu cant keep up with the rate
+    '''
+    def __init__(self, p_windowID=None, p_instanceParams=VLC_INSTANCE_PARAMS):
+        PlayerBackend.__init__(self)
+
+        ##create a media player on the shared instance and attach it to the window
+        self.c_vlcInstance = getVlcInstance(p_instanceParams)
+        import vlc
+        self.__c_vlc = vlc
+        self.c_mediaPlayer = self.c_vlcInstance.media_player_new()
+        if p_windowID != None: self.c_mediaPlayer.set_xwindow(p_windowID)
+
+        ##Set up an event listener, call a function on event
+        self.c_mediaPlayerEndWatcher = self.c_mediaPlayer.event_manager()
+        self.c_mediaPlayerEndWatcher.event_attach(vlc.EventType().MediaPlayerEndReached, self._notifyEndReached)
+        self.c_mediaPlayerEndWatcher.event_attach(vlc.EventType().MediaPlayerPlaying, self._notifyPlaying)
+
+    def prepareMedia(self, p_mediaResourceLocator):
+        '''Creates and parses the vlc.Media so switching to it only has to start the decoder'''
+        m_media = self.c_vlcInstance.media_new(p_mediaResourceLocator)
+        m_media.parse_with_options(self.__c_vlc.MediaParseFlag.local, -1)
+        return m_media
+
+    def play(self, p_mediaResourceLocator, p_preparedMedia=None):
+        if p_preparedMedia != None: self.c_mediaPlayer.set_media(p_preparedMedia)
+        else: self.c_mediaPlayer.set_mrl(p_mediaResourceLocator)
+        self.c_mediaPlayer.play()
+
+    def resume(self):
+        self.c_mediaPlayer.play()
+
+    def pause(self):
+        self.c_mediaPlayer.pause()
+
+    def stop(self):
+        self.c_mediaPlayer.stop()
+
+class DoubleBufferedVlcBackend(PlayerBackend):
+    '''Double Buffered Vlc Backend
+        Two vlc players on two stacked windows. While one plays, prepareMedia opens
+        the next media on the other one, lets it decode its first picture and pauses
+        it there (pre-roll). Playing that media is then only a swap: the standby player
+        is unpaused and its window raised, there are no black frames while a file opens
+        and its decoder starts. A media that was not pre-rolled plays on the active
+        player like on VlcPlayerBackend
+
+        The backend does not know the gui, c_showWindowListener is called with the
+        index of the player whose window has to be on top
+
+    @Usage: (On a project)
+        import playerBackendModule
+        g_Backend = playerBackendModule.DoubleBufferedVlcBackend([m_windowID, m_standbyWindowID])
+        g_Backend.c_showWindowListener = m_showWindow
+        g_MediaPlayerModule.setBackend(g_Backend)
+        g_MediaPlayerModule.prerollMedia('/home/pi/media files/rpi1.mp4')    ##a little before it is due
+    '''
+    def __init__(self, p_windowIDs, p_instanceParams=VLC_INSTANCE_PARAMS):
+        PlayerBackend.__init__(self)
+
+        self.c_vlcInstance = getVlcInstance(p_instanceParams)
+        import vlc
+        self.__c_vlc = vlc
+
+        self.c_prerollTimeout = 2   ##seconds to wait for the first picture of a pre-rolled media
+        self.c_showWindowListener = None    ##called with the index of the player to show
+        self.c_mediaPlayers = []
+        self.c_activePlayer = 0
+        self.c_standbyMedia = None  ##media resource locator paused on the standby player
+        self.__c_firstPictureEvents = []
+        self.__c_prerollToken = 0   ##changes on every pre-roll and stop so a pre-roll that was taken over knows it
+        self.__c_lock = imLock()
+
+        for t_index, t_windowID in enumerate(p_windowIDs[:2]):
+            t_mediaPlayer = self.c_vlcInstance.media_player_new()
+            t_mediaPlayer.set_xwindow(t_windowID)
+            t_eventManager = t_mediaPlayer.event_manager()
+            t_eventManager.event_attach(vlc.EventType().MediaPlayerEndReached, self.__setEndReached, t_index)
+            t_eventManager.event_attach(vlc.EventType().MediaPlayerPlaying, self.__setPlaying, t_index)
+            t_eventManager.event_attach(vlc.EventType().MediaPlayerVout, self.__setFirstPicture, t_index)
+            self.c_mediaPlayers.append(t_mediaPlayer)
+            self.__c_firstPictureEvents.append(imEvent())
+
+    def prepareMedia(self, p_mediaResourceLocator):
+        '''Parses the media and pre-rolls it on the standby player, paused on its first picture'''
+        m_errProcessName = self.__class__.__name__ + '-prepareMedia ->'
+        m_media = self.c_vlcInstance.media_new(p_mediaResourceLocator)
+        m_media.parse_with_options(self.__c_vlc.MediaParseFlag.local, -1)
+
+        with self.__c_lock:
+            if self.c_standbyMedia == p_mediaResourceLocator: return m_media
+            self.__c_prerollToken += 1
+            m_prerollToken = self.__c_prerollToken
+            m_standbyIndex = 1 - self.c_activePlayer
+            m_standbyPlayer = self.c_mediaPlayers[m_standbyIndex]
+            self.c_standbyMedia = None
+            ##Stopped first so the video output is created again and reports the first picture
+            m_standbyPlayer.stop()
+            self.__c_firstPictureEvents[m_standbyIndex].clear()
+            m_standbyPlayer.set_media(m_media)
+            m_standbyPlayer.audio_set_mute(True)
+            m_standbyPlayer.play()
+
+        ##Waited for without the lock, so play and stop are not held up by a slow first picture
+        if not self.__c_firstPictureEvents[m_standbyIndex].wait(self.c_prerollTimeout):
+            self.c_lastError = 'No picture of %s within %s seconds: %s' % (p_mediaResourceLocator, self.c_prerollTimeout, m_errProcessName)
+
+        with self.__c_lock:
+            ##A stop or another pre-roll took the standby player over in the meantime
+            if m_prerollToken != self.__c_prerollToken: return m_media
+            m_standbyPlayer.set_pause(1)
+            self.c_standbyMedia = p_mediaResourceLocator
+        return m_media
+
+    def play(self, p_mediaResourceLocator, p_preparedMedia=None):
+        with self.__c_lock:
+            if self.c_standbyMedia == p_mediaResourceLocator:
+                m_started = imMonotonic()
+                m_outgoingIndex = self.c_activePlayer
+                self.c_activePlayer = 1 - m_outgoingIndex
+                self.c_standbyMedia = None
+                self.c_mediaPlayers[self.c_activePlayer].set_pause(0)
+                self.c_mediaPlayers[self.c_activePlayer].audio_set_mute(False)
+                if self.c_showWindowListener != None: self.c_showWindowListener(self.c_activePlayer)
+                self._recordSwap(imMonotonic() - m_started)
+                self.c_mediaPlayers[m_outgoingIndex].stop()
+                return
+
+            m_mediaPlayer = self.c_mediaPlayers[self.c_activePlayer]
+            if p_preparedMedia != None: m_mediaPlayer.set_media(p_preparedMedia)
+            else: m_mediaPlayer.set_mrl(p_mediaResourceLocator)
+            m_mediaPlayer.play()
+
+    def resume(self):
+        self.c_mediaPlayers[self.c_activePlayer].play()
+
+    def pause(self):
+        self.c_mediaPlayers[self.c_activePlayer].pause()
+
+    def stop(self):
+        with self.__c_lock:
+            self.__c_prerollToken += 1
+            for t_mediaPlayer in self.c_mediaPlayers: t_mediaPlayer.stop()
+            self.c_standbyMedia = None
+
+    def __setEndReached(self, p_event, p_index):
+        '''(Private method)Runs on the vlc event thread, only the active player counts'''
+        if p_index == self.c_activePlayer: self._notifyEndReached()
+
+    def __setPlaying(self, p_event, p_index):
+        '''(Private method)Runs on the vlc event thread, the standby player plays only to pre-roll'''
+        if p_index == self.c_activePlayer: self._notifyPlaying()
+
+    def __setFirstPicture(self, p_event, p_index):
+        '''(Private method)Runs on the vlc event thread'''
+        self.__c_firstPictureEvents[p_index].set()
+
+class ImageSlideshowBackend(PlayerBackend):
+    '''Image Slideshow Backend
+        Shows the images of the playlist itself and plays everything else on the
+        wrapped backend. vlc would open a decoder and a video output for a still
+        picture and read and decode the file at full resolution every time it comes
+        round, here an ImageCacheModule decodes it once scaled to the screen,
+        prepareMedia decodes the next image in the background and it is shown for
+        c_imageDisplayTime seconds with nothing running meanwhile
+
+        The backend does not know the gui, c_showImageListener is called with the
+        decoded image to show, and with None once a video plays again. The listener
+        returns once the image is on screen, the video is stopped right after it. The
+        image stays on screen until the video reports playing, so there is no black
+        frame between
+
+    @Usage: (On a project)
+        import playerBackendModule
+        import imageCacheModule
+
+        g_Backend = playerBackendModule.ImageSlideshowBackend(playerBackendModule.VlcPlayerBackend(m_windowID),
+                                                              imageCacheModule.ImageCacheModule())
+        g_Backend.c_imageDisplayTime = 8
+        g_Backend.c_showImageListener = m_showImage
+        g_MediaPlayerModule.setBackend(g_Backend)
+    '''
+    def __init__(self, p_videoBackend, p_imageCache):
+        PlayerBackend.__init__(self)
+
+        self.c_videoBackend = p_videoBackend
+        self.c_imageCache = p_imageCache
+        self.c_imageDisplayTime = 10    ##seconds an image is shown
+        self.c_failedImageDelay = 1 ##seconds before an image that could not be decoded counts as ended
+        self.c_showImageListener = None ##called with the decoded image, None to show the video again
+        self.c_currentImage = None  ##media resource locator of the image playing, None while a video plays
+        self.c_isImageShown = False ##an image is on screen, also while the next video starts
+        self.c_shownImageCount = 0
+
+        self.__c_lock = imLock()
+        self.__c_timer = None
+        self.__c_playToken = 0  ##changes on every play and stop so a late timer knows it is stale
+        self.__c_remainingTime = 0  ##seconds left of the image when it was paused
+        self.__c_shownAt = 0    ##monotonic time the remaining time started to run down
+        self.__c_isPaused = False
+
+        p_videoBackend.c_playingListener = self.__setVideoPlaying
+        p_videoBackend.c_endReachedListener = self.__setVideoEndReached
+
+    def getSwapStats(self):
+        '''Images are never swapped to, the videos are pre-rolled by the wrapped backend'''
+        return self.c_videoBackend.getSwapStats()
+
+    def isImage(self, p_mediaResourceLocator):
+        return imPath.splitext(p_mediaResourceLocator)[1].lower() in IMAGE_EXTENSIONS
+
+    def prepareMedia(self, p_mediaResourceLocator):
+        '''Decodes an image in the background, a video is prepared by the wrapped backend'''
+        if not self.isImage(p_mediaResourceLocator): return self.c_videoBackend.prepareMedia(p_mediaResourceLocator)
+        self.c_imageCache.preloadImage(p_mediaResourceLocator)
+        return None
+
+    def play(self, p_mediaResourceLocator, p_preparedMedia=None):
+        if not self.isImage(p_mediaResourceLocator):
+            with self.__c_lock:
+                self.__cancelTimer()
+                self.c_currentImage = None
+            self.c_videoBackend.play(p_mediaResourceLocator, p_preparedMedia)
+            return
+
+        m_errProcessName = self.__class__.__name__ + '-play ->'
+        m_image = self.c_imageCache.getImage(p_mediaResourceLocator)
+        with self.__c_lock:
+            self.__cancelTimer()
+            m_isVideoPlaying = self.c_currentImage == None
+            self.c_currentImage = p_mediaResourceLocator
+            self.__c_isPaused = False
+            if m_image == None:
+                ##The playlist moves on after a moment, the way it does for a missing file
+                self.c_lastError = 'Image %s was not shown: %s%s' % (p_mediaResourceLocator, m_errProcessName, self.c_imageCache.c_lastError)
+                self.__startTimer(self.c_failedImageDelay)
+                return
+            ##Shown before the video is stopped so nothing shows through
+            if self.c_showImageListener != None: self.c_showImageListener(m_image)
+            self.c_isImageShown = True
+            self.c_shownImageCount += 1
+            self.__startTimer(self.c_imageDisplayTime)
+        if m_isVideoPlaying: self.c_videoBackend.stop()
+        self._notifyPlaying()
+
+    def resume(self):
+        with self.__c_lock:
+            if self.c_currentImage == None:
+                self.c_videoBackend.resume()
+            elif self.__c_isPaused:
+                self.__c_isPaused = False
+                self.__startTimer(self.__c_remainingTime)
+
+    def pause(self):
+        with self.__c_lock:
+            if self.c_currentImage == None:
+                self.c_videoBackend.pause()
+            elif (not self.__c_isPaused) and (self.__c_timer != None):
+                m_remainingTime = max(0, self.__c_remainingTime - (imMonotonic() - self.__c_shownAt))
+                self.__cancelTimer()
+                self.__c_remainingTime = m_remainingTime
+                self.__c_isPaused = True
+
+    def stop(self):
+        with self.__c_lock:
+            self.__cancelTimer()
+            self.c_currentImage = None
+            self.__hideImage()
+        self.c_videoBackend.stop()
+
+    def __hideImage(self):
+        '''(Private method)'''
+        if not self.c_isImageShown: return
+        self.c_isImageShown = False
+        if self.c_showImageListener != None: self.c_showImageListener(None)
+
+    def __startTimer(self, p_seconds):
+        '''(Private method)Ends the image after p_seconds unless play, pause or stop is called first'''
+        self.__c_remainingTime = p_seconds
+        self.__c_shownAt = imMonotonic()
+        self.__c_timer = imTimer(p_seconds, self.__endImage, args = (self.__c_playToken,))
+        self.__c_timer.daemon = True
+        self.__c_timer.start()
+
+    def __cancelTimer(self):
+        '''(Private method)'''
+        self.__c_playToken += 1
+        if self.__c_timer != None: self.__c_timer.cancel()
+        self.__c_timer = None
+
+    def __endImage(self, p_playToken):
+        '''(Private method)Runs on the timer thread, the image stays on screen until the next media replaces it'''
+        with self.__c_lock:
+            if p_playToken != self.__c_playToken: return
+            self.__c_timer = None
+        self._notifyEndReached()
+
+    def __setVideoPlaying(self):
+        '''(Private method)Runs on the thread of the wrapped backend'''
+        if self.c_currentImage != None: return
+        with self.__c_lock: self.__hideImage()
+        self._notifyPlaying()
+
+    def __setVideoEndReached(self):
+        '''(Private method)A video stopped for an image does not end the image'''
+        if self.c_currentImage == None: self._notifyEndReached()
+
+class HeadlessPlayerBackend(PlayerBackend):
+    '''Headless Player Backend
+        Pretends to play the media: nothing is decoded or drawn, the playing and end
+        of media events are fired by timers after the duration of the media. With
+        c_clockSpeed above 1 the media end sooner, e.g. 60 plays an hour of
+        programming in a minute, so playlist advancement, switch latency and CPU
+        use can be measured without a display or libvlc
+
+        c_startDelay simulates the time a player takes to open a media, with
+        c_isDoubleBuffered a prepared media is pre-rolled meanwhile (like
+        DoubleBufferedVlcBackend) and playing it skips that delay
+
+        The duration of a media is looked up in c_durations, images last
+        c_imageDisplayTime and anything else c_defaultDuration
+
+    @Usage: (On a project)
+        import mediaPlayerModule
+        import playerBackendModule
+
+        g_HeadlessBackend = playerBackendModule.HeadlessPlayerBackend()
+        g_HeadlessBackend.c_clockSpeed = 60
+        g_HeadlessBackend.c_durations = {'/home/pi/media files/rpi1.mp4' : 15}
+        g_MediaPlayerModule = mediaPlayerModule.MediaPlayerModule()
+        g_MediaPlayerModule.setBackend(g_HeadlessBackend)
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+        PlayerBackend.__init__(self)
+
+        self.c_clockSpeed = 1.0 ##media seconds that pass in one real second
+        self.c_defaultDuration = 30 ##seconds of a video that is not in c_durations
+        self.c_imageDisplayTime = 10    ##seconds of an image that is not in c_durations
+        self.c_startDelay = 0   ##media seconds between play() and the playing event, to simulate the decoder start
+        self.c_durations = {}   ##media resource locator -> seconds
+        self.c_isDoubleBuffered = False
+
+        self.c_currentMedia = None
+        self.c_isPlaying = False
+        self.c_isPaused = False
+        self.c_playedCount = 0
+
+        self.__c_lock = imLock()
+        self.__c_timers = []
+        self.__c_playToken = 0  ##changes on every play and stop so a late timer knows it is stale
+        self.__c_remainingTime = 0  ##media seconds left of the current media
+        self.__c_segmentStarted = 0 ##monotonic time the remaining time started to run down
+        self.__c_standbyMedia = None    ##media resource locator pre-rolled by prepareMedia
+
+    def getDuration(self, p_mediaResourceLocator):
+        '''Returns the simulated duration of a media in media seconds'''
+        if p_mediaResourceLocator in self.c_durations: return self.c_durations[p_mediaResourceLocator]
+        if imPath.splitext(p_mediaResourceLocator)[1].lower() in IMAGE_EXTENSIONS: return self.c_imageDisplayTime
+        return self.c_defaultDuration
+
+    def prepareMedia(self, p_mediaResourceLocator):
+        '''The duration stands in for the parsed media, when double buffered the
+            media is also opened (c_startDelay) on the simulated standby player'''
+        if self.c_isDoubleBuffered and (self.__c_standbyMedia != p_mediaResourceLocator):
+            imDelay(self.c_startDelay / self.c_clockSpeed)
+            self.__c_standbyMedia = p_mediaResourceLocator
+        return self.getDuration(p_mediaResourceLocator)
+
+    def play(self, p_mediaResourceLocator, p_preparedMedia=None):
+        with self.__c_lock:
+            m_started = imMonotonic()
+            m_isSwap = self.c_isDoubleBuffered and (self.__c_standbyMedia == p_mediaResourceLocator)
+            m_startDelay = 0 if m_isSwap else self.c_startDelay
+            self.__c_standbyMedia = None
+            self.__cancelTimers()
+            self.c_currentMedia = p_mediaResourceLocator
+            self.c_isPlaying = True
+            self.c_isPaused = False
+            self.c_playedCount += 1
+            self.__c_remainingTime = p_preparedMedia if p_preparedMedia != None else self.getDuration(p_mediaResourceLocator)
+            self.__c_segmentStarted = imMonotonic() + m_startDelay / self.c_clockSpeed
+            self.__startTimer(m_startDelay, self._notifyPlaying)
+            self.__startTimer(m_startDelay + self.__c_remainingTime, self.__endReached)
+            if m_isSwap: self._recordSwap(imMonotonic() - m_started)
+
+    def resume(self):
+        with self.__c_lock:
+            if self.c_isPaused:
+                self.c_isPaused = False
+                self.__c_segmentStarted = imMonotonic()
+                self.__startTimer(0, self._notifyPlaying)
+                self.__startTimer(self.__c_remainingTime, self.__endReached)
+            elif (not self.c_isPlaying) and (self.c_currentMedia != None):
+                ##Like vlc, playing again after a stop or the end starts the media over
+                self.play(self.c_currentMedia)
+
+    def pause(self):
+        with self.__c_lock:
+            if (not self.c_isPlaying) or self.c_isPaused: return
+            self.__cancelTimers()
+            m_elapsed = max(0, imMonotonic() - self.__c_segmentStarted) * self.c_clockSpeed
+            self.__c_remainingTime = max(0, self.__c_remainingTime - m_elapsed)
+            self.c_isPaused = True
+
+    def stop(self):
+        with self.__c_lock:
+            self.__cancelTimers()
+            self.c_isPlaying = False
+            self.c_isPaused = False
+            self.__c_standbyMedia = None
+
+    def __startTimer(self, p_mediaSeconds, p_function):
+        '''(Private method)Calls p_function after p_mediaSeconds of the simulated clock, unless
+            play, pause or stop is called first'''
+        m_timer = imTimer(p_mediaSeconds / self.c_clockSpeed, self.__fireTimer, args = (self.__c_playToken, p_function))
+        m_timer.daemon = True
+        self.__c_timers.append(m_timer)
+        m_timer.start()
+
+    def __cancelTimers(self):
+        '''(Private method)'''
+        self.__c_playToken += 1
+        for t_timer in self.__c_timers: t_timer.cancel()
+        self.__c_timers = []
+
+    def __fireTimer(self, p_playToken, p_function):
+        '''(Private method)Runs on the timer thread, drops timers of an earlier play. The token
+            is checked and the event reported under the lock, so a play, pause or stop
+            that raced the timer either comes first and the event is dropped, or waits
+            until it was reported'''
+        with self.__c_lock:
+            if p_playToken != self.__c_playToken: return
+            p_function()
+
+    def __endReached(self):
+        '''(Private method)Called by __fireTimer with the lock held'''
+        self.c_isPlaying = False
+        self._notifyEndReached()
@@ -0,0 +1,156 @@
+from os import path as imPath
+from datetime import datetime as imDatetime
+from threading import (
+    Event as imEvent,
+    Lock as imLock
+)
+
+class PrefetchModule():
+    '''Prefetch Module
+        Downloads the media of the server json in the background in the order they
+        are needed, so the screen keeps playing what is already on disk instead of
+        going dark while the whole list downloads
+
+        The missing media are ordered by the seconds until they are needed:
+            -scheduled media by their next airtime (ScheduleIndexModule)
+            -unscheduled media by their place in the rotation, after the durations of the
+             media ahead of them (metadata index), c_rotationSlotSeconds for the unknown ones
+            -media in neither list last
+
+        A scheduled media whose download is not expected to finish c_safetyMargin
+        seconds before its airtime, from the queued bytes ahead of it and the measured
+        download rate, is reported as at risk
+
+    @Usage: (On a project)
+        import prefetchModule
+
+        g_PrefetchModule = prefetchModule.PrefetchModule()
+        g_PrefetchModule.c_fileManagerModule = g_FileManagerModule
+        g_PrefetchModule.c_mediaDir = g_mediaDir
+        g_PrefetchModule.c_mediaReadyListener = g_SchedulerModule.notifyMediaReady
+        g_AsyncRuntimeModule.c_prefetchModule = g_PrefetchModule  ##runs prefetchNext on the event loop
+
+        g_PrefetchModule.wake() ##after a new server json was arranged
+        g_PrefetchModule.filterLocalMedia(g_FileManagerModule.c_mediaWithoutSched)    ##what can be played now
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+
+        self.c_fileManagerModule = None
+        self.c_mediaDir = None
+        self.c_rotationSlotSeconds = 30 ##assumed airtime of an unscheduled media whose duration is not known
+        self.c_safetyMargin = 60    ##seconds a scheduled media should be on disk before its airtime
+        self.c_idleDelay = 30   ##seconds between plans when nothing was downloaded
+        self.c_mediaReadyListener = None    ##called with the file name when a media is fully on disk
+        self.c_atRiskListener = None    ##called with the file name and the seconds until its airtime
+
+        self.c_wakeEvent = imEvent()    ##set when the plan has to be made again right away
+        self.c_plan = []    ##(seconds until needed, file name) of the missing media, soonest first
+        self.c_atRiskMedia = {} ##file name -> seconds until its airtime when it was reported
+        self.c_downloadRate = None  ##smoothed bytes per second of the download batches
+        self.c_prefetchedCount = 0
+        self.__c_lock = imLock()
+
+        self.c_lastError = ''
+
+    def wake(self):
+        '''Makes the plan again on the next run, e.g. after a new server json, safe to call from any thread'''
+        self.c_wakeEvent.set()
+
+    def filterLocalMedia(self, p_mediaResourceLocators):
+        '''Returns the media of the list that are on disk, a download only appears under
+            its name once it is complete so anything returned can be played'''
+        return [t_mediaResourceLocator for t_mediaResourceLocator in p_mediaResourceLocators if imPath.isfile(t_mediaResourceLocator)]
+
+    def getNeededTimes(self):
+        '''Returns file name -> seconds until the media is needed, and the file names that are scheduled'''
+        m_fileManager = self.c_fileManagerModule
+        m_now = imDatetime.now()
+        if m_fileManager.c_timeDeviation != None: m_now += m_fileManager.c_timeDeviation
+        m_scheduled = m_fileManager.c_scheduleIndex.getSecondsToEachMedia(m_now.time())
+
+        m_neededTimes = dict(m_scheduled)
+        m_rotationTime = 0
+        for t_mediaResourceLocator in m_fileManager.c_mediaWithoutSched:
+            t_fileName = imPath.basename(t_mediaResourceLocator)
+            m_neededTimes[t_fileName] = min(m_neededTimes.get(t_fileName, float('inf')), m_rotationTime)
+            t_duration = m_fileManager.getMediaDuration(t_fileName)
+            m_rotationTime += t_duration if t_duration != None else self.c_rotationSlotSeconds
+        return m_neededTimes, set(m_scheduled)
+
+    def getSecondsUntilNeeded(self, p_fileName):
+        '''Seconds until a media of the server json is needed, None if it is in neither list'''
+        m_errProcessName = self.__class__.__name__ + '-getSecondsUntilNeeded ->'
+        try:
+            return self.getNeededTimes()[0].get(p_fileName)
+        except Exception as e:
+            self.c_lastError = 'Error in getting when %s is needed: %s%s' % (p_fileName, m_errProcessName, str(e.args))
+            return None
+
+    def planDownloads(self):
+        '''Orders the missing media of the server json by the time they are needed and
+            reports the scheduled ones that are at risk of missing their slot
+            @Return
+                list of (seconds until needed, file name), soonest first'''
+
+        m_errProcessName = self.__class__.__name__ + '-planDownloads ->'
+        try:
+            m_fileManager = self.c_fileManagerModule
+            m_mediaInfo = m_fileManager.getMediaInfo()
+            m_neededTimes, m_scheduled = self.getNeededTimes()
+            m_plan = sorted((m_neededTimes.get(t_fileName, float('inf')), t_fileName) for t_fileName, t_media in m_mediaInfo.items()
+                            if not m_fileManager.isMediaComplete(self.c_mediaDir, t_media))
+
+            ##Everything ahead in the queue has to be downloaded first
+            m_atRiskMedia = {}
+            m_queuedBytes = 0
+            for t_seconds, t_fileName in m_plan:
+                m_queuedBytes += int(m_mediaInfo[t_fileName].get('size') or 0)
+                if t_fileName not in m_scheduled: continue
+                if self.c_downloadRate: t_expectedSeconds = m_queuedBytes / self.c_downloadRate
+                else: t_expectedSeconds = 0    ##no rate measured yet, only the margin can tell
+                if t_expectedSeconds + self.c_safetyMargin > t_seconds: m_atRiskMedia[t_fileName] = t_seconds
+
+            for t_fileName, t_seconds in m_atRiskMedia.items():
+                if t_fileName in self.c_atRiskMedia: continue
+                print('\t%s is at risk of missing its slot in %.0fs' % (t_fileName, t_seconds))
+                if self.c_atRiskListener != None: self.c_atRiskListener(t_fileName, t_seconds)
+            with self.__c_lock:
+                self.c_plan = m_plan
+                self.c_atRiskMedia = m_atRiskMedia
+            return m_plan
+        except Exception as e:
+            self.c_lastError = 'Error in planning the downloads: %s%s' % (m_errProcessName, str(e.args))
+            return []
+
+    def prefetchNext(self):
+        '''Downloads the next batch of the plan, as many files as the download manager runs at once
+            @Return
+                True -> if a media was downloaded, the plan should be made again right away
+                False -> if nothing is missing or the whole batch failed'''
+
+        m_fileManager = self.c_fileManagerModule
+        m_batch = [t_fileName for t_seconds, t_fileName in self.planDownloads()[:max(1, m_fileManager.c_maxDownloadWorkers)]]
+        if not m_batch:
+            m_fileManager.removeStalePartials(self.c_mediaDir)
+            return False
+
+        m_failedFiles = m_fileManager.downloadMediaFiles(self.c_mediaDir, m_batch)
+        m_downloadManager = m_fileManager.c_downloadManager
+        if m_downloadManager.c_totalBytes and (m_downloadManager.c_totalSeconds > 0):
+            m_rate = m_downloadManager.getAggregateRate()
+            self.c_downloadRate = m_rate if self.c_downloadRate == None else .7 * self.c_downloadRate + .3 * m_rate
+
+        m_isAnyReady = False
+        for t_fileName in m_batch:
+            if t_fileName in m_failedFiles: continue
+            m_isAnyReady = True
+            self.c_prefetchedCount += 1
+            if self.c_mediaReadyListener != None: self.c_mediaReadyListener(t_fileName)
+        return m_isAnyReady
@@ -0,0 +1,156 @@
+from bisect import bisect_right as imBisectRight
+from heapq import (
+    heappush as imHeapPush,
+    heappop as imHeapPop
+)
+
+from datetime import datetime as imDatetime
+
+##Microseconds in a day, the index works on microseconds of the day so that the
+##comparison is as exact as the old datetime.time comparison
+DAY_MICROSECONDS = 24 * 60 * 60 * 1000000
+
+class ScheduleIndexModule():
+    '''Schedule Index Module
+        Compiles the list of scheduled media into a sorted list of non overlapping
+        intervals once per manifest, so asking what plays now or when the next
+        transition happens is a binary search instead of a scan that parses every
+        schedule string
+
+        Rules kept from the linear scan of FileManagerModule.isThereScheduledToPlayNow:
+            -a media covers startTime <= now <= endTime (the end time itself is included)
+            -on overlapping schedules the media listed first in the manifest wins
+        New rules:
+            -a schedule whose startTime is later than its endTime crosses midnight
+            -entries with unparseable times are skipped instead of breaking the check
+
+    @Usage: (On a project)
+        import scheduleIndexModule
+
+        g_ScheduleIndex = scheduleIndexModule.ScheduleIndexModule()
+        g_ScheduleIndex.compileSchedule([{"fileName":"rpi1.mp4","startTime":"11:00","endTime":"12:00"},
+                                         {"fileName":"late.mp4","startTime":"23:30","endTime":"00:30"}])
+        g_ScheduleIndex.getMediaAt(imDatetime.now().time()) ##media dict or None
+        g_ScheduleIndex.getSecondsToNextTransition(imDatetime.now().time())
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+
+        ##Sorted segment start points (microseconds of the day), the last item is always DAY_MICROSECONDS
+        ##segment i spans [c_boundaries[i], c_boundaries[i + 1]) and plays c_segmentMedia[i]
+        self.c_boundaries = [0, DAY_MICROSECONDS]
+        self.c_segmentMedia = [None]
+        self.c_scheduleCount = 0
+
+        self.c_lastError = ''
+
+    def compileSchedule(self, p_mediaWithSched):
+        '''Builds the interval index from the list of scheduled media
+            @Params
+                p_mediaWithSched -> list of media dicts with fileName, startTime and endTime ("%H:%M")'''
+
+        m_errProcessName = self.__class__.__name__ + '-compileSchedule ->'
+        m_intervals = []
+
+        for t_order, t_media in enumerate(p_mediaWithSched):
+            try:
+                m_start = self.__toMicroseconds(imDatetime.strptime(t_media['startTime'], '%H:%M').time())
+                m_end = self.__toMicroseconds(imDatetime.strptime(t_media['endTime'], '%H:%M').time()) + 1
+            except Exception as e:
+                self.c_lastError = 'Skipping invalid schedule of %s: %s%s' % (t_media.get('fileName'), m_errProcessName, str(e.args))
+                continue
+
+            if m_start < m_end:
+                m_intervals.append((m_start, m_end, t_order, t_media))
+            else:
+                ##Crosses midnight, split into the evening and the morning part
+                m_intervals.append((m_start, DAY_MICROSECONDS, t_order, t_media))
+                m_intervals.append((0, m_end, t_order, t_media))
+
+        ##Sweep over every boundary, keeping the active schedules in a heap ordered by
+        ##manifest position so the first listed media wins on overlaps
+        m_events = sorted(set([0] + [t_interval[0] for t_interval in m_intervals] + [t_interval[1] for t_interval in m_intervals]))
+        m_intervals.sort(key=lambda t_interval: t_interval[0])
+        m_boundaries = []
+        m_segmentMedia = []
+        m_active = []
+        m_next = 0
+
+        for t_point in m_events:
+            if t_point >= DAY_MICROSECONDS: break
+            while m_next < len(m_intervals) and m_intervals[m_next][0] <= t_point:
+                t_interval = m_intervals[m_next]
+                imHeapPush(m_active, (t_interval[2], t_interval[1], t_interval[3]))
+                m_next += 1
+            ##Lazily drop the schedules that already ended
+            while m_active and m_active[0][1] <= t_point: imHeapPop(m_active)
+
+            t_media = m_active[0][2] if m_active else None
+            ##Merge neighbouring segments that play the same media
+            if m_segmentMedia and m_segmentMedia[-1] is t_media: continue
+            m_boundaries.append(t_point)
+            m_segmentMedia.append(t_media)
+
+        m_boundaries.append(DAY_MICROSECONDS)
+        self.c_boundaries = m_boundaries
+        self.c_segmentMedia = m_segmentMedia
+        self.c_scheduleCount = len(p_mediaWithSched)
+
+    def getMediaAt(self, p_time):
+        '''Returns the scheduled media dict playing at the given time
+            @Params
+                p_time -> datetime.time to look up
+            @Return
+                media dict -> the media scheduled at p_time
+                None -> if nothing was scheduled'''
+        return self.c_segmentMedia[imBisectRight(self.c_boundaries, self.__toMicroseconds(p_time)) - 1]
+
+    def getSecondsToNextTransition(self, p_time):
+        '''Returns the number of seconds from p_time until the scheduled media changes
+            @Params
+                p_time -> datetime.time to start from
+            @Return
+                number of seconds (float) -> until the next change, looks past midnight
+                None -> if the schedule never changes'''
+        if len(self.c_segmentMedia) == 1: return None
+
+        m_now = self.__toMicroseconds(p_time)
+        m_index = imBisectRight(self.c_boundaries, m_now) - 1
+        m_nextBoundary = self.c_boundaries[m_index + 1]
+
+        ##The last segment of the day continues into the first one when both play the same media
+        if (m_nextBoundary == DAY_MICROSECONDS) and (self.c_segmentMedia[0] is self.c_segmentMedia[-1]):
+            m_nextBoundary = DAY_MICROSECONDS + self.c_boundaries[1]
+
+        return (m_nextBoundary - m_now) / 1000000.0
+
+    def getSecondsToEachMedia(self, p_time):
+        '''Returns how long until each scheduled media airs next, looking one day ahead
+            @Params
+                p_time -> datetime.time to start from
+            @Return
+                dict of file name -> number of seconds (float), 0 for the media scheduled at p_time'''
+        m_now = self.__toMicroseconds(p_time)
+        m_index = imBisectRight(self.c_boundaries, m_now) - 1
+        m_seconds = {}
+
+        for t_offset in range(len(self.c_segmentMedia)):
+            t_index = (m_index + t_offset) % len(self.c_segmentMedia)
+            t_media = self.c_segmentMedia[t_index]
+            if (t_media == None) or (t_media['fileName'] in m_seconds): continue
+            if t_offset == 0: t_start = m_now
+            ##Segments before the current one start again tomorrow
+            elif t_index < m_index: t_start = self.c_boundaries[t_index] + DAY_MICROSECONDS
+            else: t_start = self.c_boundaries[t_index]
+            m_seconds[t_media['fileName']] = (t_start - m_now) / 1000000.0
+        return m_seconds
+
+    def __toMicroseconds(self, p_time):
+        '''Converts a datetime.time to microseconds of the day'''
+        return ((p_time.hour * 60 + p_time.minute) * 60 + p_time.second) * 1000000 + p_time.microsecond
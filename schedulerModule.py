@@ -0,0 +1,112 @@
+from threading import Condition as imCondition
+from time import monotonic as imMonotonic
+
+class SchedulerModule():
+    '''Scheduler Module
+        Lets the main loop sleep until something that can change what is on screen
+        has happened, instead of polling the network response and the schedule
+        in a loop that never sleeps
+
+        The main loop is woken up by:
+            -the network thread posting a new manifest
+            -the media player reporting the end of a media
+            -the next schedule transition (passed as the wait timeout)
+            -the prefetcher having a media fully on disk
+            -the clock offset stepping, the wait for the next transition was measured on the old one
+
+    @Usage: (On a project)
+        import schedulerModule
+
+        g_SchedulerModule = schedulerModule.SchedulerModule()
+        g_NetworkModule.c_manifestListener = g_SchedulerModule.notifyManifestChanged
+        g_MediaPanelModule.c_mediaEndListener = g_SchedulerModule.notifyMediaEndReached
+
+        while (g_isSystemReady):
+            m_events = g_SchedulerModule.waitForEvents(g_FileManagerModule.getSecondsToNextTransition())
+            ...
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    EVENT_MANIFEST_CHANGED = 'manifestChanged'
+    EVENT_MEDIA_END_REACHED = 'mediaEndReached'
+    EVENT_SCHEDULE_TRANSITION = 'scheduleTransition'
+    EVENT_MEDIA_READY = 'mediaReady'
+    EVENT_CLOCK_STEPPED = 'clockStepped'
+
+    def __init__(self):
+
+        self.c_condition = imCondition()
+        self.c_pendingEvents = {}   ##event name -> monotonic time it was first posted
+
+        ##Upper bound of a single sleep, keeps the loop honest when the system clock
+        ##is adjusted (the Pi has no RTC and syncs its clock after boot)
+        self.c_maxWaitTime = 60
+
+        ##Seconds between an event being posted (or a transition being due) and the loop waking up
+        self.c_lastWakeLatency = 0
+        self.c_maxWakeLatency = 0
+        self.c_wakeCount = 0
+
+        self.c_lastError = ''
+
+    def postEvent(self, p_eventName):
+        '''Posts an event and wakes up the waiting loop, safe to call from any thread
+            @Params
+                p_eventName -> one of the EVENT_ names'''
+        with self.c_condition:
+            if p_eventName not in self.c_pendingEvents: self.c_pendingEvents[p_eventName] = imMonotonic()
+            self.c_condition.notify_all()
+
+    def notifyManifestChanged(self):
+        '''Listener for the network module'''
+        self.postEvent(self.EVENT_MANIFEST_CHANGED)
+
+    def notifyMediaEndReached(self):
+        '''Listener for the media panel module'''
+        self.postEvent(self.EVENT_MEDIA_END_REACHED)
+
+    def notifyMediaReady(self, p_fileName=None):
+        '''Listener for the prefetch module
+            @Params
+                p_fileName -> the media that was downloaded, not used'''
+        self.postEvent(self.EVENT_MEDIA_READY)
+
+    def notifyClockStepped(self, p_offset=None):
+        '''Listener for the clock sync module
+            @Params
+                p_offset -> the new offset, not used'''
+        self.postEvent(self.EVENT_CLOCK_STEPPED)
+
+    def waitForEvents(self, p_timeout=None):
+        '''Blocks until an event was posted or the timeout ran out
+            @Params
+                p_timeout -> seconds until the next schedule transition, None if there is none
+            @Return
+                list of the posted event names, [EVENT_SCHEDULE_TRANSITION] when the timeout ran out'''
+        if (p_timeout == None) or (p_timeout > self.c_maxWaitTime): p_timeout = self.c_maxWaitTime
+        m_deadline = imMonotonic() + max(p_timeout, 0)
+
+        with self.c_condition:
+            while not self.c_pendingEvents:
+                m_remaining = m_deadline - imMonotonic()
+                if m_remaining <= 0: break
+                self.c_condition.wait(m_remaining)
+
+            m_wokenAt = imMonotonic()
+            if self.c_pendingEvents:
+                m_events = list(self.c_pendingEvents)
+                m_latency = m_wokenAt - min(self.c_pendingEvents.values())
+                self.c_pendingEvents = {}
+            else:
+                m_events = [self.EVENT_SCHEDULE_TRANSITION]
+                m_latency = m_wokenAt - m_deadline
+
+        self.c_lastWakeLatency = m_latency
+        self.c_maxWakeLatency = max(self.c_maxWakeLatency, m_latency)
+        self.c_wakeCount += 1
+        return m_events
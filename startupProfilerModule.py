@@ -0,0 +1,90 @@
+import sys
+from os import sysconf as imSystemConfig
+from json import dumps as imJsonString
+from datetime import datetime as imDatetime
+from time import monotonic as imMonotonic
+from threading import (
+    Thread as imThread,
+    Lock as imLock
+)
+
+class StartupProfilerModule():
+    '''Startup Profiler Module
+        Marks the phases of the start up and prints how long each one took, counted from
+        the start of the process so the interpreter and the imports before the first mark
+        are included (read from /proc, from the creation of the profiler where there is none).
+        With c_reportFile every report is appended as a json line, so the time to the first
+        frame can be compared between releases
+
+        Import it first and create it before anything heavy is imported
+
+    @Usage: (On a project)
+        import startupProfilerModule
+        g_StartupProfiler = startupProfilerModule.StartupProfilerModule()
+
+        g_StartupProfiler.mark('media panel created')
+        g_StartupProfiler.markOnEvent('splash playing', g_MediaPanelModule.c_mediaPlayingEvent)
+        g_StartupProfiler.printReport()
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+
+        self.c_reportFile = None    ##json lines file the reports are appended to, None to only print
+        self.c_origin = imMonotonic() - self.getProcessAge()   ##monotonic time the process started
+        self.c_phases = []  ##(phase, seconds since the process started, number of imported modules)
+        self.__c_lock = imLock()
+
+        self.c_lastError = ''
+
+        self.mark('interpreter and first imports')
+
+    def getProcessAge(self):
+        '''Seconds since the process started, 0 where /proc is not available'''
+        try:
+            ##The process name in the stat line can hold spaces, the fields after it can not
+            with open('/proc/self/stat', 'r') as t_statFile: m_fields = t_statFile.read().rsplit(')', 1)[1].split()
+            with open('/proc/uptime', 'r') as t_uptimeFile: m_uptime = float(t_uptimeFile.read().split()[0])
+            return max(0, m_uptime - int(m_fields[19]) / float(imSystemConfig('SC_CLK_TCK')))
+        except Exception:
+            return 0
+
+    def mark(self, p_phase):
+        '''Records that a phase of the start up has ended'''
+        with self.__c_lock: self.c_phases.append((p_phase, imMonotonic() - self.c_origin, len(sys.modules)))
+
+    def markOnEvent(self, p_phase, p_event, p_timeout=60):
+        '''Marks a phase once a threading.Event is set without waiting for it, e.g. the
+            media player playing, nothing is marked if it is not set within p_timeout seconds'''
+        def m_waitForEvent():
+            if p_event.wait(p_timeout): self.mark(p_phase)
+        imThread(target = m_waitForEvent, name = 'startupProfiler', daemon = True).start()
+
+    def getPhaseTimes(self):
+        '''Returns phase -> seconds since the process started, in the order they ended'''
+        with self.__c_lock: return dict((t_phase, t_seconds) for t_phase, t_seconds, t_moduleCount in sorted(self.c_phases, key = lambda t_item: t_item[1]))
+
+    def printReport(self):
+        '''Prints every phase with the time it took and the modules it imported, appends it to c_reportFile'''
+
+        m_errProcessName = self.__class__.__name__ + '-printReport ->'
+        with self.__c_lock: m_phases = sorted(self.c_phases, key = lambda t_item: t_item[1])
+        print('\nStart up profile (seconds since the process started)')
+        m_previousSeconds, m_previousModules = 0, 0
+        for t_phase, t_seconds, t_moduleCount in m_phases:
+            print('\t%7.3fs  %+7.3fs  %4d modules  %s' % (t_seconds, t_seconds - m_previousSeconds, t_moduleCount - m_previousModules, t_phase))
+            m_previousSeconds, m_previousModules = t_seconds, t_moduleCount
+        print('')
+
+        if self.c_reportFile == None: return
+        try:
+            with open(self.c_reportFile, 'a') as t_reportFile:
+                t_reportFile.write(imJsonString({'date' : imDatetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                                 'phases' : [[t_phase, round(t_seconds, 4)] for t_phase, t_seconds, t_moduleCount in m_phases]}) + '\n')
+        except Exception as e:
+            self.c_lastError = 'Error in saving the start up profile: %s%s' % (m_errProcessName, str(e.args))
@@ -0,0 +1,105 @@
+'''Unit tests of the schedule index
+
+Usage:
+    python -m unittest discover -s tests
+
+Prefixes:
+
+c_    :    Class variables
+m_    :    Method variables
+t_    :    Temporary variables
+
+'''
+
+import sys
+import unittest
+from os import path as imPath
+from datetime import time as imTime
+
+sys.path.insert(0, imPath.dirname(imPath.dirname(imPath.abspath(__file__))))
+import scheduleIndexModule
+
+def makeMedia(p_fileName, p_startTime, p_endTime):
+    return {'fileName' : p_fileName, 'startTime' : p_startTime, 'endTime' : p_endTime}
+
+class ScheduleIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.c_index = scheduleIndexModule.ScheduleIndexModule()
+
+    def getFileAt(self, p_time):
+        m_media = self.c_index.getMediaAt(p_time)
+        return m_media['fileName'] if m_media != None else None
+
+    def testEmptySchedule(self):
+        self.c_index.compileSchedule([])
+        self.assertIsNone(self.getFileAt(imTime(12, 0)))
+        self.assertIsNone(self.c_index.getSecondsToNextTransition(imTime(12, 0)))
+
+    def testSlotCrossingMidnight(self):
+        self.c_index.compileSchedule([makeMedia('late.mp4', '23:30', '00:30')])
+        self.assertIsNone(self.getFileAt(imTime(23, 29, 59)))
+        self.assertEqual(self.getFileAt(imTime(23, 30)), 'late.mp4')
+        self.assertEqual(self.getFileAt(imTime(23, 59, 59, 999999)), 'late.mp4')
+        self.assertEqual(self.getFileAt(imTime(0, 0)), 'late.mp4')
+        self.assertEqual(self.getFileAt(imTime(0, 30)), 'late.mp4')
+        self.assertIsNone(self.getFileAt(imTime(0, 30, 0, 1)))
+        self.assertIsNone(self.getFileAt(imTime(12, 0)))
+
+    def testOverlapFirstListedWins(self):
+        self.c_index.compileSchedule([makeMedia('first.mp4', '10:00', '12:00'),
+                                      makeMedia('second.mp4', '11:00', '13:00')])
+        self.assertEqual(self.getFileAt(imTime(10, 30)), 'first.mp4')
+        self.assertEqual(self.getFileAt(imTime(11, 30)), 'first.mp4')
+        self.assertEqual(self.getFileAt(imTime(12, 0)), 'first.mp4')
+        self.assertEqual(self.getFileAt(imTime(12, 0, 0, 1)), 'second.mp4')
+        self.assertIsNone(self.getFileAt(imTime(13, 0, 0, 1)))
+
+    def testOverlapLaterListedIsHidden(self):
+        ##The inner schedule is listed second, it never airs
+        self.c_index.compileSchedule([makeMedia('outer.mp4', '10:00', '14:00'),
+                                      makeMedia('inner.mp4', '11:00', '12:00')])
+        for t_hour in (10, 11, 12, 13, 14):
+            self.assertEqual(self.getFileAt(imTime(t_hour, 0)), 'outer.mp4')
+
+    def testEndTimeIsIncluded(self):
+        ##Same as the old startTime <= now <= endTime comparison, the end instant still plays
+        self.c_index.compileSchedule([makeMedia('rpi1.mp4', '11:00', '12:00')])
+        self.assertIsNone(self.getFileAt(imTime(10, 59, 59, 999999)))
+        self.assertEqual(self.getFileAt(imTime(11, 0)), 'rpi1.mp4')
+        self.assertEqual(self.getFileAt(imTime(12, 0)), 'rpi1.mp4')
+        self.assertIsNone(self.getFileAt(imTime(12, 0, 0, 1)))
+
+    def testInvalidScheduleIsSkipped(self):
+        self.c_index.compileSchedule([makeMedia('broken.mp4', '25:00', '26:00'),
+                                      makeMedia('rpi1.mp4', '11:00', '12:00')])
+        self.assertEqual(self.getFileAt(imTime(11, 30)), 'rpi1.mp4')
+        self.assertIn('broken.mp4', self.c_index.c_lastError)
+
+    def testSecondsToNextTransition(self):
+        self.c_index.compileSchedule([makeMedia('rpi1.mp4', '11:00', '12:00')])
+        self.assertEqual(self.c_index.getSecondsToNextTransition(imTime(10, 0)), 3600)
+        ##The slot ends right after the end instant
+        self.assertAlmostEqual(self.c_index.getSecondsToNextTransition(imTime(11, 0)), 3600, places = 5)
+
+    def testSecondsToNextTransitionAcrossMidnight(self):
+        ##Nothing scheduled until 01:00 tomorrow, the empty evening continues into the empty morning
+        self.c_index.compileSchedule([makeMedia('rpi1.mp4', '01:00', '02:00')])
+        self.assertEqual(self.c_index.getSecondsToNextTransition(imTime(23, 0)), 2 * 3600)
+
+    def testSecondsToNextTransitionInSlotCrossingMidnight(self):
+        ##The evening part continues into the morning part, the change is at 00:30
+        self.c_index.compileSchedule([makeMedia('late.mp4', '23:30', '00:30')])
+        self.assertAlmostEqual(self.c_index.getSecondsToNextTransition(imTime(23, 45)), 45 * 60, places = 5)
+        self.assertAlmostEqual(self.c_index.getSecondsToNextTransition(imTime(0, 15)), 15 * 60, places = 5)
+        self.assertAlmostEqual(self.c_index.getSecondsToNextTransition(imTime(0, 31)), 23 * 3600 - 60, places = 5)
+
+    def testSecondsToNextTransitionBetweenAdjacentSlots(self):
+        ##A slot starting right at midnight is a different media than the one ending there
+        self.c_index.compileSchedule([makeMedia('evening.mp4', '22:00', '23:59'),
+                                      makeMedia('night.mp4', '00:00', '01:00')])
+        self.assertAlmostEqual(self.c_index.getSecondsToNextTransition(imTime(23, 59, 30)), 30, places = 5)
+        self.assertEqual(self.getFileAt(imTime(0, 0)), 'night.mp4')
+
+if __name__ == '__main__':
+    unittest.main()
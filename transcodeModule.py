@@ -0,0 +1,319 @@
+from os import (
+    path as imPath,
+    remove as imDelete,
+    replace as imReplaceFile,
+    listdir as imListFile,
+    makedirs as imMakeDirs
+)
+
+from json import (
+    loads as imJsonParse,
+    load as imJsonLoad,
+    dump as imSaveJson
+)
+
+from hashlib import sha256 as imHash
+from shutil import which as imFindExecutable
+from subprocess import (
+    run as imRunProcess,
+    PIPE as imPipe,
+    DEVNULL as imNoOutput
+)
+from fractions import Fraction as imFraction
+from timeit import default_timer as imTimer
+from concurrent.futures import ThreadPoolExecutor as imThreadPool
+from threading import Lock as imLock
+
+TRANSCODED_SUFFIX = '.mp4'
+IMAGE_FORMATS = ('image2', 'png_pipe', 'jpeg_pipe', 'gif')  ##ffprobe sees a picture as a one frame video
+
+def probeMedia(p_file, p_ffprobePath='ffprobe', p_timeout=60):
+    '''Reads the container and streams of a media with ffprobe
+        @Return
+            the ffprobe json ('format' and 'streams'), raises OSError if ffprobe failed'''
+    m_result = imRunProcess([p_ffprobePath, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', p_file],
+                            stdout = imPipe, stderr = imPipe, timeout = p_timeout)
+    if m_result.returncode != 0: raise OSError('ffprobe failed: %s' % m_result.stderr.decode(errors = 'replace').strip())
+    return imJsonParse(m_result.stdout.decode())
+
+class TranscodeModule():
+    '''Transcode Module
+        Normalizes the downloaded videos for the display of the player, a Pi drops
+        frames on a 4K or 60 fps file or a codec profile its hardware decoder does not
+        handle. After a download every video is probed, one that is bigger than
+        c_maxWidth x c_maxHeight, faster than c_maxFrameRate or not in
+        c_allowedCodecs / c_allowedProfiles / c_maxLevel is re-encoded by ffmpeg to
+        h264 that the display decodes without falling behind
+
+        The encodes run in the background, at most c_maxWorkers ffmpeg processes at a
+        time and at the lowest cpu priority so the playback comes first. The results
+        are kept in c_outputDir named by the sha256 of the source, a file is encoded
+        once whatever its name, a version of a campaign that comes back is not encoded
+        again. The hashes are kept in an index beside the outputs
+
+        The source file stays where it is (its size is what the server json gives),
+        getPlayableMedia gives the encoded copy once it is done, the source until then.
+        A file that ffmpeg could not encode is played as it is and not tried again
+        until it was replaced. The encoded copies count in the budget of the media
+        cache (getOutputBytes) and go with their source when it is evicted (removeMedia)
+
+        ffmpeg and ffprobe are optional, without them the module does nothing
+
+    @Usage: (On a project)
+        import transcodeModule
+
+        g_TranscodeModule = transcodeModule.TranscodeModule()
+        g_TranscodeModule.c_outputDir = '/home/pi/transcoded/'
+        g_TranscodeModule.c_maxWidth, g_TranscodeModule.c_maxHeight = 1920, 1080
+        g_FileManagerModule.c_transcodeModule = g_TranscodeModule   ##submits every download
+        g_MediaPanelModule.c_mediaResolver = g_TranscodeModule.getPlayableMedia
+
+    @Variable / Method prefixes:
+        im -> Imported method
+        c_ -> Class variable
+        m_ -> Method variable
+        t_ -> temporary variable
+        __ -> methods to be used only by the class
+    '''
+    def __init__(self):
+
+        self.c_outputDir = None
+        self.c_ffmpegPath = 'ffmpeg'
+        self.c_ffprobePath = 'ffprobe'
+        self.c_maxWorkers = 1   ##ffmpeg processes at the same time
+        self.c_niceness = 19    ##cpu priority of ffmpeg, 19 is the lowest
+        self.c_timeout = 4 * 3600   ##seconds an encode may take
+
+        ##What the display decodes without dropping frames
+        self.c_maxWidth = 1920
+        self.c_maxHeight = 1080
+        self.c_maxFrameRate = 30
+        self.c_allowedCodecs = ('h264',)
+        self.c_allowedProfiles = ('Baseline', 'Constrained Baseline', 'Main', 'High')
+        self.c_maxLevel = 41    ##h264 level times ten
+        self.c_encoderArgs = ['-c:v', 'libx264', '-profile:v', 'high', '-level', '4.1', '-pix_fmt', 'yuv420p',
+                              '-preset', 'veryfast', '-crf', '21', '-c:a', 'aac', '-b:a', '128k', '-movflags', '+faststart']
+
+        self.c_sources = {} ##source file -> [modified time, size, sha256, 'transcoded' / 'kept' / 'failed']
+        self.c_transcodedCount = 0
+        self.c_keptCount = 0    ##probed and already fit for the display
+        self.c_failedCount = 0
+        self.c_transcodeSeconds = 0
+
+        self.__c_pool = None
+        self.__c_pending = {}   ##source file -> future of its job
+        self.__c_lock = imLock()
+        self.__c_isLoaded = False
+
+        self.c_lastError = ''
+
+    def isAvailable(self):
+        '''Checks if ffmpeg and ffprobe are installed'''
+        return (imFindExecutable(self.c_ffmpegPath) != None) and (imFindExecutable(self.c_ffprobePath) != None)
+
+    def submit(self, p_file):
+        '''Queues a downloaded media to be probed and encoded if it does not fit the display, returns right away
+            @Return
+                the future of the job, None if there is nothing to do or no ffmpeg'''
+        if (self.c_outputDir == None) or (not imPath.isfile(p_file)): return None
+        with self.__c_lock:
+            if p_file in self.__c_pending: return self.__c_pending[p_file]
+            if self.__c_pool == None:
+                if not self.isAvailable():
+                    self.c_lastError = 'ffmpeg or ffprobe is not installed, media are played as downloaded'
+                    return None
+                self.__c_pool = imThreadPool(max_workers = max(1, self.c_maxWorkers), thread_name_prefix = 'transcode')
+            m_future = self.__c_pool.submit(self.transcodeMedia, p_file)
+            self.__c_pending[p_file] = m_future
+        m_future.add_done_callback(lambda p_future: self.__removePending(p_file))
+        return m_future
+
+    def submitFiles(self, p_files):
+        '''Queues every file of the list, see submit'''
+        for t_file in p_files: self.submit(t_file)
+
+    def getPlayableMedia(self, p_file):
+        '''Returns the encoded copy of a media if there is one for its current content, the media itself if not'''
+        with self.__c_lock:
+            self.__loadIndex()
+            m_source = self.c_sources.get(p_file)
+        if (m_source == None) or (m_source[3] != 'transcoded'): return p_file
+        try:
+            if [imPath.getmtime(p_file), imPath.getsize(p_file)] != m_source[:2]: return p_file
+        except OSError:
+            return p_file
+        m_output = self.getOutputFile(m_source[2])
+        return m_output if imPath.isfile(m_output) else p_file
+
+    def getOutputFile(self, p_hash):
+        return self.c_outputDir + p_hash + TRANSCODED_SUFFIX
+
+    def getReasons(self, p_probe):
+        '''Returns why a probed media does not fit the display, an empty list if it does'''
+        if p_probe.get('format', {}).get('format_name', '').startswith(IMAGE_FORMATS): return []   ##shown by the image slideshow
+        m_video = [t_stream for t_stream in p_probe.get('streams', []) if t_stream.get('codec_type') == 'video']
+        if not m_video: return []   ##audio only
+        m_video = m_video[0]
+        m_reasons = []
+        if (int(m_video.get('width') or 0) > self.c_maxWidth) or (int(m_video.get('height') or 0) > self.c_maxHeight):
+            m_reasons.append('resolution %sx%s' % (m_video.get('width'), m_video.get('height')))
+        if self.getFrameRate(m_video) > self.c_maxFrameRate: m_reasons.append('%.2f fps' % self.getFrameRate(m_video))
+        if m_video.get('codec_name') not in self.c_allowedCodecs: m_reasons.append('codec %s' % m_video.get('codec_name'))
+        elif (m_video.get('profile') != None) and (m_video.get('profile') not in self.c_allowedProfiles):
+            m_reasons.append('profile %s' % m_video.get('profile'))
+        elif int(m_video.get('level') or 0) > self.c_maxLevel: m_reasons.append('level %s' % m_video.get('level'))
+        return m_reasons
+
+    def getFrameRate(self, p_stream):
+        '''Frames per second of a probed video stream, 0 if unknown'''
+        try:
+            return float(imFraction(p_stream.get('avg_frame_rate') or p_stream.get('r_frame_rate') or '0'))
+        except (ValueError, ZeroDivisionError):
+            return 0
+
+    def transcodeMedia(self, p_file):
+        '''Probes a media and encodes it for the display if needed, runs on the pool
+            @Return
+                the file to play, the encoded copy or the source'''
+
+        m_errProcessName = self.__class__.__name__ + '-transcodeMedia ->'
+        try:
+            m_stats = [imPath.getmtime(p_file), imPath.getsize(p_file)]
+            with self.__c_lock:
+                self.__loadIndex()
+                m_source = self.c_sources.get(p_file)
+            ##Same content as last time, the hash and the verdict still hold, a failed encode
+            ##is only tried again once the file was replaced
+            if (m_source != None) and (m_source[:2] == m_stats): return self.getPlayableMedia(p_file)
+
+            m_hash = self.hashFile(p_file)
+            if imPath.isfile(self.getOutputFile(m_hash)):
+                self.__setSource(p_file, m_stats + [m_hash, 'transcoded'])
+                return self.getOutputFile(m_hash)
+
+            m_probe = probeMedia(p_file, self.c_ffprobePath)
+            m_reasons = self.getReasons(m_probe)
+            if not m_reasons:
+                self.c_keptCount += 1
+                self.__setSource(p_file, m_stats + [m_hash, 'kept'])
+                return p_file
+
+            print('\tTranscoding %s (%s)' % (imPath.basename(p_file), ', '.join(m_reasons)))
+            m_started = imTimer()
+            self.encode(p_file, self.getOutputFile(m_hash), m_probe)
+            self.c_transcodeSeconds += imTimer() - m_started
+            self.c_transcodedCount += 1
+            self.__setSource(p_file, m_stats + [m_hash, 'transcoded'])
+            print('\tTranscoded %s in %.0fs' % (imPath.basename(p_file), imTimer() - m_started))
+            return self.getOutputFile(m_hash)
+
+        except Exception as e:
+            self.c_lastError = 'Error in transcoding %s: %s%s' % (p_file, m_errProcessName, str(e.args))
+            print(self.c_lastError)
+            self.c_failedCount += 1
+            if imPath.isfile(p_file): self.__setSource(p_file, [imPath.getmtime(p_file), imPath.getsize(p_file), None, 'failed'])
+            return p_file
+
+    def encode(self, p_file, p_outputFile, p_probe):
+        '''Runs ffmpeg into a partial file that is moved in place once complete, the
+            picture is only scaled down and the frame rate only lowered'''
+        m_filters = ['scale=w=%d:h=%d:force_original_aspect_ratio=decrease:force_divisible_by=2' % (self.c_maxWidth, self.c_maxHeight)]
+        m_video = [t_stream for t_stream in p_probe.get('streams', []) if t_stream.get('codec_type') == 'video'][0]
+        if (int(m_video.get('width') or 0) <= self.c_maxWidth) and (int(m_video.get('height') or 0) <= self.c_maxHeight): m_filters = []
+        if self.getFrameRate(m_video) > self.c_maxFrameRate: m_filters.append('fps=%s' % self.c_maxFrameRate)
+
+        m_partialFile = p_outputFile + '.part'
+        m_command = [self.c_ffmpegPath, '-nostdin', '-v', 'error', '-y', '-i', p_file]
+        if m_filters: m_command += ['-vf', ','.join(m_filters)]
+        m_command += self.c_encoderArgs + ['-f', 'mp4', m_partialFile]
+        try:
+            ##nice starts ffmpeg at the low priority, no code runs in the forked child of this threaded process
+            m_result = imRunProcess(['nice', '-n', str(self.c_niceness)] + m_command, stdout = imNoOutput, stderr = imPipe,
+                                    timeout = self.c_timeout)
+            if m_result.returncode != 0: raise OSError('ffmpeg failed: %s' % m_result.stderr.decode(errors = 'replace').strip()[-500:])
+            imReplaceFile(m_partialFile, p_outputFile)
+        finally:
+            if imPath.exists(m_partialFile): imDelete(m_partialFile)
+
+    def hashFile(self, p_file):
+        '''sha256 of the content of a file'''
+        m_hash = imHash()
+        with open(p_file, 'rb') as t_file:
+            for t_chunk in iter(lambda: t_file.read(1024 * 1024), b''): m_hash.update(t_chunk)
+        return m_hash.hexdigest()
+
+    def getOutputBytes(self):
+        '''Bytes of the encoded copies on disk, see MediaCacheModule.c_derivedBytesGetter'''
+        with self.__c_lock:
+            self.__loadIndex()
+            m_hashes = set(t_source[2] for t_source in self.c_sources.values() if t_source[3] == 'transcoded')
+        m_bytes = 0
+        for t_hash in m_hashes:
+            try:
+                m_bytes += imPath.getsize(self.getOutputFile(t_hash))
+            except OSError:
+                continue
+        return m_bytes
+
+    def removeMedia(self, p_fileName):
+        '''Deletes the encoded copy of a media that left the media cache, unless another stored media has the same content'''
+        m_errProcessName = self.__class__.__name__ + '-removeMedia ->'
+        try:
+            with self.__c_lock:
+                self.__loadIndex()
+                m_files = [t_file for t_file in self.c_sources if imPath.basename(t_file) == imPath.basename(p_fileName)]
+                if not m_files: return
+                m_hashes = set(self.c_sources.pop(t_file)[2] for t_file in m_files)
+                m_hashes -= set(t_source[2] for t_source in self.c_sources.values())
+                self.__saveIndex()
+            for t_hash in m_hashes:
+                if (t_hash != None) and imPath.isfile(self.getOutputFile(t_hash)): imDelete(self.getOutputFile(t_hash))
+        except Exception as e:
+            self.c_lastError = 'Error in removing the transcoded copy of %s: %s%s' % (p_fileName, m_errProcessName, str(e.args))
+
+    def removeUnusedOutputs(self):
+        '''Deletes the encoded copies whose source is not on disk anymore (evicted by the media cache)'''
+        m_errProcessName = self.__class__.__name__ + '-removeUnusedOutputs ->'
+        try:
+            with self.__c_lock:
+                self.__loadIndex()
+                for t_file in [t_file for t_file in self.c_sources if not imPath.isfile(t_file)]: del self.c_sources[t_file]
+                m_usedHashes = set(t_source[2] for t_source in self.c_sources.values())
+                self.__saveIndex()
+            for t_fileName in imListFile(self.c_outputDir):
+                if t_fileName.endswith(TRANSCODED_SUFFIX) and (t_fileName[:-len(TRANSCODED_SUFFIX)] not in m_usedHashes):
+                    imDelete(self.c_outputDir + t_fileName)
+        except Exception as e:
+            self.c_lastError = 'Error in removing unused transcoded media: %s%s' % (m_errProcessName, str(e.args))
+
+    def stop(self):
+        '''Drops the queued jobs, a running ffmpeg is left to finish'''
+        with self.__c_lock:
+            if self.__c_pool != None: self.__c_pool.shutdown(wait = False, cancel_futures = True)
+            self.__c_pool = None
+
+    def __setSource(self, p_file, p_source):
+        '''(Private method)'''
+        with self.__c_lock:
+            self.c_sources[p_file] = p_source
+            self.__saveIndex()
+
+    def __removePending(self, p_file):
+        '''(Private method)'''
+        with self.__c_lock: self.__c_pending.pop(p_file, None)
+
+    def __loadIndex(self):
+        '''(Private method)Reads the index beside the outputs once, the caller holds the lock'''
+        if self.__c_isLoaded or (self.c_outputDir == None): return
+        self.__c_isLoaded = True
+        try:
+            if imPath.isfile(self.c_outputDir + 'index.json'):
+                with open(self.c_outputDir + 'index.json', 'r') as t_indexFile: self.c_sources = imJsonLoad(t_indexFile)
+        except Exception as e:
+            self.c_lastError = 'Error in loading the transcode index: %s' % str(e.args)
+
+    def __saveIndex(self):
+        '''(Private method)Written beside and moved in place, the caller holds the lock'''
+        if not imPath.isdir(self.c_outputDir): imMakeDirs(self.c_outputDir)
+        with open(self.c_outputDir + 'index.json.part', 'w') as t_indexFile: imSaveJson(self.c_sources, t_indexFile)
+        imReplaceFile(self.c_outputDir + 'index.json.part', self.c_outputDir + 'index.json')
@@ -0,0 +1,226 @@
+'''Benchmark suite of the player's hot paths
+
+Times the code the player runs over and over and appends the numbers to a
+results file (one json line per run, tagged with the git commit), then compares
+them with the previous run of the same machine and --media so a regression shows
+up before it reaches the fleet
+
+Benchmarks (the names --only takes):
+    scheduleLookup      -> FileManagerModule.isThereScheduledToPlayNow
+    arrangeMediaList    -> FileManagerModule.arrangeMediaList
+    jsonCache           -> FileManagerModule.saveJson of a changed json (a new version in the manifest
+                           store) and FileManagerModule.getCachedJson
+    manifestCompare     -> FileManagerModule.isManifestChanged of a new json object, as mainSystem.main does
+    downloadThroughput  -> DownloadManagerModule against the local media server
+    switchLatency       -> media list player on the headless backend, and the swap to a
+                           pre-rolled scheduled media on the double buffered one
+
+Usage:
+    python utilities/benchmarkSuite.py [--media 200] [--output utilities/benchmarkResults.jsonl]
+                                       [--threshold 20] [--only scheduleLookup,jsonCache]
+
+    Exits with 1 if a benchmark got worse than the previous comparable run by more than the threshold (percent)
+
+Prefixes:
+
+g_    :    Global variables
+f_    :    Local variables
+t_    :    Temporary variables
+c_    :    Class variables
+
+'''
+
+import sys
+import platform
+from os import path as imPath
+from json import (
+    dumps as imJsonString,
+    loads as imJsonParse
+)
+from shutil import rmtree as imDeleteDir
+from tempfile import mkdtemp as imMakeTempDir
+from subprocess import (
+    check_output as imRunCommand,
+    DEVNULL as imDevNull
+)
+from argparse import ArgumentParser as imArgumentParser
+from datetime import (
+    datetime as imDatetime,
+    timedelta as imTimeDelta
+)
+from timeit import default_timer as imTimer
+
+sys.path.insert(0, imPath.dirname(imPath.dirname(imPath.abspath(__file__))))
+sys.path.insert(0, imPath.dirname(imPath.abspath(__file__)))
+import fileManagerModule
+import downloadManagerModule
+import localMediaServer
+import downloadBenchmark
+import headlessPlayerBenchmark
+import scheduleIndexBenchmark
+
+def timePerCall(p_function, p_minSeconds=.2, p_repeat=5):
+    '''Calls p_function in batches of at least p_minSeconds, returns the best seconds per call of p_repeat batches'''
+    f_calls = 1
+    while True:
+        f_started = imTimer()
+        for t_index in range(f_calls): p_function()
+        f_elapsed = imTimer() - f_started
+        if f_elapsed >= p_minSeconds / 10: break
+        f_calls *= 10
+    f_best = f_elapsed / f_calls
+    for t_index in range(p_repeat):
+        f_started = imTimer()
+        for t_index in range(f_calls): p_function()
+        f_best = min(f_best, (imTimer() - f_started) / f_calls)
+    return f_best
+
+def fabricateManifest(p_count):
+    '''A server json with p_count media, a third of them scheduled'''
+    f_mediaFiles = []
+    for t_index, t_media in enumerate(scheduleIndexBenchmark.fabricateSchedule(p_count)):
+        if t_index % 3: t_media['startTime'] = t_media['endTime'] = None
+        t_media['size'] = 5 * 1024 * 1024
+        f_mediaFiles.append(t_media)
+    return {'mediaFiles' : f_mediaFiles, 'serverDateTime' : imDatetime.now().strftime('%Y-%m-%d %H:%M')}
+
+def makeFileManager(p_manifest, p_storeFile=None):
+    f_fileManager = fileManagerModule.FileManagerModule()
+    f_fileManager.c_manifestStore.c_storeFile = p_storeFile
+    f_fileManager.c_cachedJson = p_manifest
+    f_fileManager.c_timeDeviation = imTimeDelta(0)
+    return f_fileManager
+
+def benchScheduleLookup(p_args):
+    f_fileManager = makeFileManager(fabricateManifest(p_args.media))
+    f_fileManager.arrangeMediaList('/home/pi/media files/')
+    return {'scheduleLookup' : (timePerCall(f_fileManager.isThereScheduledToPlayNow) * 1e6, 'us/call', False)}
+
+def benchArrangeMediaList(p_args):
+    f_fileManager = makeFileManager(fabricateManifest(p_args.media))
+    return {'arrangeMediaList' : (timePerCall(lambda: f_fileManager.arrangeMediaList('/home/pi/media files/')) * 1e6, 'us/call', False)}
+
+def benchJsonCache(p_args):
+    f_storeDir = imMakeTempDir()
+    try:
+        f_manifests = [fabricateManifest(p_args.media), fabricateManifest(p_args.media)]
+        f_manifests[1]['mediaFiles'][-1]['size'] += 1
+        f_fileManager = makeFileManager(f_manifests[0], imPath.join(f_storeDir, 'manifestStore.db'))
+        def f_save():
+            ##Alternates between two json so every save is a new version
+            f_fileManager.c_cachedJson = f_manifests[(f_fileManager.c_manifestStore.c_currentVersion or 0) % 2]
+            if not f_fileManager.saveJson(): raise AssertionError(f_fileManager.c_manifestStore.c_lastError or 'nothing saved')
+        f_saveTime = timePerCall(f_save, p_repeat = 2)
+        f_loadTime = timePerCall(f_fileManager.getCachedJson)
+        if f_fileManager.c_lastError: raise AssertionError(f_fileManager.c_lastError)
+        f_fileManager.c_manifestStore.close()
+        return {'saveJson' : (f_saveTime * 1e6, 'us/call', False), 'getCachedJson' : (f_loadTime * 1e6, 'us/call', False)}
+    finally:
+        imDeleteDir(f_storeDir)
+
+def benchManifestCompare(p_args):
+    '''Worst case of the comparison: every answer of the server is a new json object'''
+    f_fileManager = makeFileManager(fabricateManifest(p_args.media))
+    f_fileManager.c_manifestStore.c_currentDigest = f_fileManager.c_manifestStore.getDigest(f_fileManager.c_cachedJson)
+    f_jsonResponses = [imJsonParse(imJsonString(f_fileManager.c_cachedJson)) for t_index in range(2)]
+    f_jsonResponses[1]['mediaFiles'][-1]['size'] += 1
+    def f_compare():
+        f_jsonResponses.reverse()
+        return f_fileManager.isManifestChanged(f_jsonResponses[0])
+    return {'manifestCompare' : (timePerCall(f_compare) * 1e6, 'us/call', False)}
+
+def benchDownloadThroughput(p_args):
+    f_serverDir = imMakeTempDir()
+    f_clientDir = imMakeTempDir() + '/'
+    try:
+        f_fileNames = downloadBenchmark.fabricateMedia(f_serverDir, 16, 2 * 1024 * 1024)
+        f_server = localMediaServer.LocalMediaServer(f_serverDir)
+        f_manager = downloadManagerModule.DownloadManagerModule()
+        f_manager.c_downloadUrl = f_server.start() + '/download?file='
+        f_manager.downloadFiles(f_clientDir, f_fileNames)
+        f_server.stop()
+        if f_manager.c_failedFiles: raise AssertionError('%d downloads failed' % len(f_manager.c_failedFiles))
+        return {'downloadThroughput' : (f_manager.getAggregateRate() / 1048576.0, 'MB/s', True)}
+    finally:
+        imDeleteDir(f_serverDir)
+        imDeleteDir(f_clientDir)
+
+def benchSwitchLatency(p_args):
+    f_latencies, f_aired, f_cpu, f_wall = headlessPlayerBenchmark.benchmark(5, 30, 600, 5)
+    if not f_latencies: raise AssertionError('the headless player did not switch media')
+    f_swapTimes = headlessPlayerBenchmark.benchmarkScheduleSwitch(20, .05, True)
+    return {'switchLatencyP50' : (f_latencies[len(f_latencies) // 2] * 1e3, 'ms', False),
+            'switchLatencyMax' : (f_latencies[-1] * 1e3, 'ms', False),
+            'scheduleSwapMax' : (f_swapTimes[-1] * 1e3, 'ms', False),
+            'playerCpu' : (f_cpu / f_wall * 100, '%', False)}
+
+BENCHMARKS = (
+    ('scheduleLookup', benchScheduleLookup),
+    ('arrangeMediaList', benchArrangeMediaList),
+    ('jsonCache', benchJsonCache),
+    ('manifestCompare', benchManifestCompare),
+    ('downloadThroughput', benchDownloadThroughput),
+    ('switchLatency', benchSwitchLatency)
+)
+
+def getCommit():
+    '''Returns the short hash of the checked out commit, with a + if the tree has changes'''
+    try:
+        f_repoDir = imPath.dirname(imPath.dirname(imPath.abspath(__file__)))
+        f_commit = imRunCommand(['git', '-C', f_repoDir, 'rev-parse', '--short', 'HEAD'], stderr = imDevNull).decode().strip()
+        f_changes = imRunCommand(['git', '-C', f_repoDir, 'status', '--porcelain', '--untracked-files=no'], stderr = imDevNull)
+        return f_commit + ('+' if f_changes.strip() else '')
+    except Exception:
+        return None
+
+def loadPreviousRun(p_outputFile, p_run):
+    '''Returns the last run of the results file made on the same machine with the same --media, None if there is none'''
+    if not imPath.isfile(p_outputFile): return None
+    f_previous = None
+    with open(p_outputFile, 'r') as t_file:
+        for t_line in t_file:
+            if not t_line.strip(): continue
+            t_run = imJsonParse(t_line)
+            if (t_run.get('machine') == p_run['machine']) and (t_run.get('media') == p_run['media']): f_previous = t_run
+    return f_previous
+
+def compareRuns(p_previous, p_results, p_threshold):
+    '''Prints every benchmark next to the previous run, returns the names that regressed'''
+    f_regressions = []
+    for t_name, (t_value, t_unit, t_isHigherBetter) in p_results.items():
+        t_line = '%-20s %12.2f %-8s' % (t_name, t_value, t_unit)
+        t_previous = (p_previous or {}).get('results', {}).get(t_name)
+        if t_previous and t_previous[0]:
+            t_change = (t_value - t_previous[0]) / t_previous[0] * 100
+            t_isWorse = (-t_change if t_isHigherBetter else t_change) > p_threshold
+            t_line += ' %+7.1f%% vs %s%s' % (t_change, p_previous.get('commit'), '  REGRESSION' if t_isWorse else '')
+            if t_isWorse: f_regressions.append(t_name)
+        print(t_line)
+    return f_regressions
+
+if __name__ == '__main__':
+    g_parser = imArgumentParser(description = 'Benchmarks the hot paths of the player and records the results')
+    g_parser.add_argument('--media', type = int, default = 200, help = 'media files in the fabricated manifest')
+    g_parser.add_argument('--output', default = imPath.join(imPath.dirname(imPath.abspath(__file__)), 'benchmarkResults.jsonl'),
+                          help = 'results file, one json line per run')
+    g_parser.add_argument('--threshold', type = float, default = 20, help = 'percent a benchmark may get worse before it is a regression')
+    g_parser.add_argument('--only', default = '', help = 'comma separated benchmarks to run, all by default')
+    g_args = g_parser.parse_args()
+
+    g_only = [t_name for t_name in g_args.only.split(',') if t_name]
+    g_unknown = [t_name for t_name in g_only if t_name not in dict(BENCHMARKS)]
+    if g_unknown: g_parser.error('unknown benchmark %s, choose from %s' % (', '.join(g_unknown), ', '.join(t_name for t_name, t_benchmark in BENCHMARKS)))
+    g_results = {}
+    for t_name, t_benchmark in BENCHMARKS:
+        if g_only and (t_name not in g_only): continue
+        g_results.update(t_benchmark(g_args))
+
+    g_run = {'commit' : getCommit(), 'date' : imDatetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+             'machine' : platform.node(), 'python' : platform.python_version(), 'media' : g_args.media,
+             'results' : g_results}
+    g_previousRun = loadPreviousRun(g_args.output, g_run)
+    print('\nCommit %s, %d media in the manifest\n' % (g_run['commit'], g_args.media))
+    g_regressions = compareRuns(g_previousRun, g_results, g_args.threshold)
+    with open(g_args.output, 'a') as t_file: t_file.write(imJsonString(g_run) + '\n')
+    print('\nResults appended to %s' % g_args.output)
+    if g_regressions: sys.exit(1)
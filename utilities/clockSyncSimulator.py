@@ -0,0 +1,118 @@
+'''Clock synchronization simulator
+
+Runs a group of simulated players against the bundled local media server, every
+one with a local clock that is off by a random number of seconds, and checks how
+close ClockSyncModule gets them to the server clock and to each other
+
+Phases:
+    synchronize -> every player runs a few bursts against the time endpoint (with
+                   the per request latency and the random delay each way of the
+                   server), reports the error of the offset it measured
+    start       -> every player waits for the same getSyncStartTime on its own
+                   thread, reports the spread of the real instants they woke up at
+
+The result is put against the serverDateTime of the manifest the players used
+before, it only has minutes so two screens could be up to a minute apart
+
+Usage:
+    python utilities/clockSyncSimulator.py [--clients 20] [--skew 30] [--latency 5] [--jitter 10]
+                                           [--bursts 3] [--quantum 2]
+
+Prefixes:
+
+g_    :    Global variables
+f_    :    Local variables
+t_    :    Temporary variables
+c_    :    Class variables
+
+'''
+
+import sys
+from os import path as imPath
+from random import uniform as imRandomUniform
+from tempfile import mkdtemp as imMakeTempDir
+from shutil import rmtree as imDeleteDir
+from argparse import ArgumentParser as imArgumentParser
+from threading import (
+    Thread as imThread,
+    Barrier as imBarrier
+)
+from time import time as imTime
+
+sys.path.insert(0, imPath.dirname(imPath.dirname(imPath.abspath(__file__))))
+sys.path.insert(0, imPath.dirname(imPath.abspath(__file__)))
+import clockSyncModule
+import localMediaServer
+
+FRAME_SECONDS = 1 / 25.0    ##one frame of a 25 fps video
+
+def makeClient(p_timeUrl, p_skew):
+    '''Returns a ClockSyncModule whose local clock is p_skew seconds off the server clock'''
+    f_client = clockSyncModule.ClockSyncModule()
+    f_client.c_timeUrl = p_timeUrl
+    f_client.c_localClock = lambda: imTime() + p_skew
+    return f_client
+
+def synchronizeClients(p_clients, p_bursts):
+    '''Runs p_bursts bursts on every client at the same time, the server sees them all at once'''
+    def f_synchronize(p_client):
+        for t_burst in range(p_bursts): p_client.synchronize()
+    f_threads = [imThread(target = f_synchronize, args = (t_client,), daemon = True) for t_client in p_clients]
+    for t_thread in f_threads: t_thread.start()
+    for t_thread in f_threads: t_thread.join()
+
+def startClients(p_clients, p_quantum):
+    '''Every client picks its synchronized start and waits for it, returns the real
+        (server clock) times they woke up at'''
+    f_startedAt = [None] * len(p_clients)
+    f_barrier = imBarrier(len(p_clients))
+    def f_start(p_index):
+        f_barrier.wait()
+        p_clients[p_index].waitUntil(p_clients[p_index].getSyncStartTime(p_quantum))
+        f_startedAt[p_index] = imTime()
+    f_threads = [imThread(target = f_start, args = (t_index,), daemon = True) for t_index in range(len(p_clients))]
+    for t_thread in f_threads: t_thread.start()
+    for t_thread in f_threads: t_thread.join()
+    return f_startedAt
+
+def minuteDeviationSpread(p_clientCount):
+    '''Spread of the clocks corrected with serverDateTime, every player read the manifest
+        at another second of the minute and the seconds are cut off'''
+    f_errors = [-imRandomUniform(0, 60) for t_index in range(p_clientCount)]
+    return max(f_errors) - min(f_errors)
+
+if __name__ == '__main__':
+    g_parser = imArgumentParser(description = 'Simulates players synchronizing their clocks to the server')
+    g_parser.add_argument('--clients', type = int, default = 20)
+    g_parser.add_argument('--skew', type = float, default = 30, help = 'most seconds a local clock is off')
+    g_parser.add_argument('--latency', type = float, default = 5, help = 'ms added to every request')
+    g_parser.add_argument('--jitter', type = float, default = 10, help = 'most ms of random delay each way')
+    g_parser.add_argument('--bursts', type = int, default = 3)
+    g_parser.add_argument('--quantum', type = float, default = 2, help = 'seconds, starts are on multiples of it')
+    g_args = g_parser.parse_args()
+
+    g_mediaDir = imMakeTempDir() + '/'
+    g_Server = localMediaServer.LocalMediaServer(g_mediaDir)
+    g_Server.c_latency = g_args.latency / 1e3
+    g_Server.c_timeJitter = g_args.jitter / 1e3
+    try:
+        g_timeUrl = g_Server.start() + '/time'
+        g_skews = [imRandomUniform(-g_args.skew, g_args.skew) for t_index in range(g_args.clients)]
+        g_clients = [makeClient(g_timeUrl, t_skew) for t_skew in g_skews]
+
+        synchronizeClients(g_clients, g_args.bursts)
+        g_synchronized = [t_index for t_index in range(len(g_clients)) if g_clients[t_index].c_offset != None]
+        g_errors = sorted(abs(g_clients[t_index].c_offset + g_skews[t_index]) for t_index in g_synchronized)
+        print('%d of %d players synchronized, local clocks off by up to %.0fs' % (len(g_synchronized), len(g_clients), g_args.skew))
+        if not g_errors: sys.exit('No player reached the time endpoint')
+        print('offset error  p50 %.2fms, max %.2fms, round trip p50 %.2fms' % (
+            g_errors[len(g_errors) // 2] * 1e3, g_errors[-1] * 1e3,
+            sorted(t_client.c_delay for t_client in g_clients if t_client.c_delay != None)[len(g_errors) // 2] * 1e3))
+
+        g_startedAt = startClients([g_clients[t_index] for t_index in g_synchronized], g_args.quantum)
+        g_spread = max(g_startedAt) - min(g_startedAt)
+        print('synchronized start spread %.2fms (%.2f frames at 25 fps)' % (g_spread * 1e3, g_spread / FRAME_SECONDS))
+        print('serverDateTime start spread %.1fs' % minuteDeviationSpread(len(g_clients)))
+    finally:
+        g_Server.stop()
+        imDeleteDir(g_mediaDir)
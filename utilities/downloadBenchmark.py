@@ -0,0 +1,85 @@
+'''Compares the old one-file-at-a-time download against the pooled download manager
+
+Starts the local media server on a temporary directory of generated media,
+downloads the whole list once with urlretrieve (a new connection per file, as
+FileManagerModule did before) and once with DownloadManagerModule
+
+Usage:
+    python utilities/downloadBenchmark.py [files] [size in KB] [workers] [latency ms] [KB/s per connection]
+
+Prefixes:
+
+g_    :    Global variables
+f_    :    Local variables
+t_    :    Temporary variables
+c_    :    Class variables
+
+'''
+
+import sys
+from os import (
+    path as imPath,
+    urandom as imRandomBytes
+)
+from shutil import rmtree as imDeleteDir
+from tempfile import mkdtemp as imMakeTempDir
+from timeit import default_timer as imTimer
+from urllib.request import urlretrieve as imDownload
+
+sys.path.insert(0, imPath.dirname(imPath.dirname(imPath.abspath(__file__))))
+sys.path.insert(0, imPath.dirname(imPath.abspath(__file__)))
+import downloadManagerModule
+import localMediaServer
+
+def fabricateMedia(p_mediaDir, p_count, p_size):
+    '''Writes p_count files of p_size random bytes, returns their names'''
+    f_fileNames = []
+    for t_index in range(p_count):
+        t_fileName = 'media %d.mp4' % t_index
+        with open(imPath.join(p_mediaDir, t_fileName), 'wb') as t_file: t_file.write(imRandomBytes(p_size))
+        f_fileNames.append(t_fileName)
+    return f_fileNames
+
+def benchmark(p_count=20, p_size=512 * 1024, p_workers=4, p_latency=.05, p_bandwidth=2 * 1024 * 1024):
+    '''Returns (sequential seconds, pooled seconds, pooled manager)'''
+    f_serverDir = imMakeTempDir()
+    f_clientDir = imMakeTempDir() + '/'
+    try:
+        f_fileNames = fabricateMedia(f_serverDir, p_count, p_size)
+        f_server = localMediaServer.LocalMediaServer(f_serverDir)
+        f_server.c_latency = p_latency
+        f_server.c_bandwidth = p_bandwidth
+        f_downloadUrl = f_server.start() + '/download?file='
+
+        f_started = imTimer()
+        for t_fileName in f_fileNames:
+            imDownload(f_downloadUrl + downloadManagerModule.imEscapeUrl(t_fileName), f_clientDir + t_fileName)
+        f_sequential = imTimer() - f_started
+
+        f_manager = downloadManagerModule.DownloadManagerModule()
+        f_manager.c_downloadUrl = f_downloadUrl
+        f_manager.c_maxWorkers = p_workers
+        f_started = imTimer()
+        f_manager.downloadFiles(f_clientDir, f_fileNames)
+        f_pooled = imTimer() - f_started
+
+        f_server.stop()
+        for t_fileName in f_fileNames:
+            if imPath.getsize(f_clientDir + t_fileName) != p_size: raise AssertionError('%s is incomplete' % t_fileName)
+        return f_sequential, f_pooled, f_manager
+    finally:
+        imDeleteDir(f_serverDir)
+        imDeleteDir(f_clientDir)
+
+if __name__ == '__main__':
+    g_args = [float(t_arg) for t_arg in sys.argv[1:]]
+    g_count = int(g_args[0]) if len(g_args) > 0 else 20
+    g_size = int(g_args[1] * 1024) if len(g_args) > 1 else 512 * 1024
+    g_workers = int(g_args[2]) if len(g_args) > 2 else 4
+    g_latency = g_args[3] / 1000 if len(g_args) > 3 else .05
+    g_bandwidth = int(g_args[4] * 1024) if len(g_args) > 4 else 2 * 1024 * 1024
+
+    g_sequential, g_pooled, g_manager = benchmark(g_count, g_size, g_workers, g_latency, g_bandwidth)
+    print('%d files of %s: sequential %.2fs, %d workers %.2fs (%.1fx), aggregate %s/s' %
+          (g_count, g_manager.formatSize(g_size), g_sequential, g_workers, g_pooled, g_sequential / g_pooled,
+           g_manager.formatSize(g_manager.getAggregateRate())))
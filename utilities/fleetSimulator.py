@@ -0,0 +1,257 @@
+'''Fleet load simulator
+
+Spawns a number of headless virtual players against the bundled local media
+server to see how many screens one server can carry. Every virtual player is
+a NetworkModule polling (or subscribed to) the manifest and a FileManagerModule
+syncing its own media directory, the same code the real players run, without
+the media panel
+
+Phases:
+    warm up   -> every player gets the first manifest and downloads its media
+    change    -> the manifest gets a new media file, measures the time until every
+                 player has it on disk (time to converge)
+    steady    -> nothing changes for a while, measures the idle load on the server
+
+A player has converged once every media of the manifest is in its media directory
+and matches the checksum of the manifest, not just once it synced
+
+Reports requests per second, p50/p99 manifest latency, download throughput and
+the time to converge
+
+Usage:
+    python utilities/fleetSimulator.py [--clients 200] [--media 4] [--size 256]
+                                       [--steady 10] [--push] [--delay 1] [--maxDelay 5]
+
+Prefixes:
+
+g_    :    Global variables
+f_    :    Local variables
+t_    :    Temporary variables
+c_    :    Class variables
+
+'''
+
+import sys
+from os import (
+    path as imPath,
+    urandom as imRandomBytes
+)
+from hashlib import sha256 as imHash
+from json import (
+    dumps as imJsonString,
+    loads as imJsonParse
+)
+from shutil import rmtree as imDeleteDir
+from tempfile import mkdtemp as imMakeTempDir
+from argparse import ArgumentParser as imArgumentParser
+from threading import (
+    Thread as imThread,
+    Lock as imLock,
+    Event as imEvent
+)
+from time import (
+    sleep as imDelay,
+    monotonic as imMonotonic
+)
+
+sys.path.insert(0, imPath.dirname(imPath.dirname(imPath.abspath(__file__))))
+sys.path.insert(0, imPath.dirname(imPath.abspath(__file__)))
+import networkModule
+import fileManagerModule
+import localMediaServer
+
+class VirtualPlayer():
+    '''One headless player: polls or subscribes to the manifest and syncs its media directory'''
+    def __init__(self, p_index, p_baseUrl, p_mediaDir, p_args, p_fleet):
+        self.c_fleet = p_fleet
+        self.c_mediaDir = p_mediaDir
+        self.c_isRunning = True
+        self.c_changedEvent = imEvent()
+        self.c_syncedManifest = {}
+        self.c_syncedAt = None
+
+        self.c_networkModule = networkModule.NetworkModule()
+        self.c_networkModule.c_serverUrl = p_baseUrl + '/getJson'
+        self.c_networkModule.c_pushUrl = p_baseUrl + '/subscribe' if p_args.push else None
+        self.c_networkModule.c_currentIP = '127.0.0.1'
+        self.c_networkModule.c_requestParam = {'ipAddress' : '127.0.0.1', 'macAddress' : 'virtual-%05d' % p_index}
+        self.c_networkModule.c_requestDelay = p_args.delay
+        self.c_networkModule.c_maxRequestDelay = p_args.maxDelay
+        self.c_networkModule.c_manifestListener = self.c_changedEvent.set
+
+        self.c_fileManagerModule = fileManagerModule.FileManagerModule()
+        self.c_fileManagerModule.c_downloadUrl = p_baseUrl + '/download?file='
+        self.c_fileManagerModule.c_maxDownloadWorkers = 1
+        self.c_fileManagerModule.c_mediaCache.c_mediaDir = p_mediaDir
+        self.c_fileManagerModule.c_mediaCache.c_reserveBytes = 0
+
+    def start(self):
+        imThread(target = self.pollLoop, daemon = True).start()
+        imThread(target = self.syncLoop, daemon = True).start()
+        if self.c_networkModule.c_pushUrl != None:
+            self.c_networkModule.c_isPersistentCheckingEnabled = True
+            imThread(target = self.pushLoop, daemon = True).start()
+
+    def stop(self):
+        self.c_isRunning = False
+        self.c_networkModule.c_isPersistentCheckingEnabled = False
+        self.c_changedEvent.set()
+
+    def pollLoop(self):
+        '''Same polling rhythm as the real player, only the latency is recorded'''
+        f_network = self.c_networkModule
+        while self.c_isRunning:
+            if f_network.c_isPushConnected:
+                f_network.c_pushLostEvent.wait(f_network.c_pushSafetyPollDelay)
+                f_network.c_pushLostEvent.clear()
+                if not self.c_isRunning: break
+            t_requestCount = f_network.c_requestCount
+            f_network.fetchJsonFromServer()
+            if f_network.c_requestCount != t_requestCount: self.c_fleet.recordPoll(f_network.c_lastPollLatency)
+            else: self.c_fleet.recordPoll(None)
+            imDelay(f_network.getNextDelay())
+
+    def pushLoop(self):
+        '''Keeps the push subscription open with the retry delays of the real player'''
+        f_network = self.c_networkModule
+        while self.c_isRunning:
+            t_eventCount = f_network.c_pushEventCount
+            f_network.subscribeToPush()
+            imDelay(f_network.getPushRetryDelay(f_network.c_pushEventCount != t_eventCount))
+
+    def syncLoop(self):
+        '''Syncs the media directory whenever a new manifest arrived'''
+        while self.c_isRunning:
+            self.c_changedEvent.wait()
+            self.c_changedEvent.clear()
+            if not self.c_isRunning: break
+            t_manifest = self.c_networkModule.c_jsonResponse
+            self.c_fileManagerModule.c_cachedJson = t_manifest
+            self.c_fileManagerModule.c_downloadManager.c_totalBytes = 0
+            self.c_fileManagerModule.syncMedia(self.c_mediaDir, self.c_syncedManifest)
+            self.c_fleet.recordDownload(self.c_fileManagerModule.c_downloadManager.c_totalBytes)
+            if not self.hasMedia(t_manifest): continue
+            self.c_syncedManifest = t_manifest
+            self.c_syncedAt = imMonotonic()
+
+    def hasMedia(self, p_manifest):
+        '''Checks that every media of the manifest is on disk with the checksum of the manifest'''
+        for t_media in p_manifest['mediaFiles']:
+            t_filePath = self.c_mediaDir + t_media['fileName']
+            if not imPath.isfile(t_filePath): return False
+            with open(t_filePath, 'rb') as t_file:
+                if 'sha256:' + imHash(t_file.read()).hexdigest() != t_media['checksum']: return False
+        return True
+
+class Fleet():
+    '''Shared counters of all virtual players'''
+    def __init__(self):
+        self.c_lock = imLock()
+        self.c_pollLatencies = []
+        self.c_failedPolls = 0
+        self.c_downloadedBytes = 0
+
+    def recordPoll(self, p_latency):
+        with self.c_lock:
+            if p_latency == None: self.c_failedPolls += 1
+            else: self.c_pollLatencies.append(p_latency)
+
+    def recordDownload(self, p_bytes):
+        with self.c_lock: self.c_downloadedBytes += p_bytes
+
+    def resetCounters(self):
+        with self.c_lock:
+            self.c_pollLatencies = []
+            self.c_failedPolls = 0
+            self.c_downloadedBytes = 0
+
+def percentile(p_values, p_percent):
+    if not p_values: return float('nan')
+    f_values = sorted(p_values)
+    return f_values[min(len(f_values) - 1, int(len(f_values) * p_percent / 100.0))]
+
+def fabricateManifest(p_mediaFiles, p_checksums):
+    return imJsonString({'mediaFiles' : [{'fileName' : t_fileName, 'startTime' : None, 'endTime' : None, 'checksum' : p_checksums[t_fileName]}
+                                         for t_fileName in p_mediaFiles],
+                         'serverDateTime' : '2018-10-26 15:42'}).encode()
+
+def waitForConvergence(p_players, p_manifest, p_started, p_timeout):
+    '''Waits until every player has the media of p_manifest, returns the seconds each one took since p_started'''
+    while imMonotonic() - p_started < p_timeout:
+        if all(t_player.c_syncedManifest == p_manifest for t_player in p_players): break
+        imDelay(.05)
+    return [t_player.c_syncedAt - p_started if t_player.c_syncedManifest == p_manifest else float('inf') for t_player in p_players]
+
+def report(p_name, p_fleet, p_server, p_seconds):
+    f_requests = sum(t_count for t_path, t_count in p_server.c_requestCounts.items() if t_path != '304')
+    print('%-8s %6.1fs  %7.1f req/s  manifest latency p50 %6.1fms p99 %6.1fms  failed polls %d  downloaded %.1fMB (%.1fMB/s)' %
+          (p_name, p_seconds, f_requests / p_seconds, percentile(p_fleet.c_pollLatencies, 50) * 1e3,
+           percentile(p_fleet.c_pollLatencies, 99) * 1e3, p_fleet.c_failedPolls,
+           p_fleet.c_downloadedBytes / 1048576.0, p_fleet.c_downloadedBytes / 1048576.0 / p_seconds))
+
+def simulate(p_args):
+    f_serverDir = imMakeTempDir()
+    f_clientsDir = imMakeTempDir()
+    f_players = []
+    try:
+        f_mediaFiles = []
+        f_checksums = {}
+        for t_index in range(p_args.media + 1):
+            f_mediaFiles.append('spot %d.mp4' % t_index)
+            t_content = imRandomBytes(p_args.size * 1024)
+            f_checksums[f_mediaFiles[-1]] = 'sha256:' + imHash(t_content).hexdigest()
+            with open(imPath.join(f_serverDir, f_mediaFiles[-1]), 'wb') as t_file: t_file.write(t_content)
+        f_manifestFile = imPath.join(f_serverDir, 'manifest.json')
+        f_firstManifest = fabricateManifest(f_mediaFiles[:-1], f_checksums)
+        f_server = localMediaServer.LocalMediaServer(f_serverDir, f_manifestFile)
+        f_server.c_keepAliveInterval = 5
+        f_server.setManifest(f_firstManifest)
+        f_baseUrl = f_server.start()
+
+        f_fleet = Fleet()
+        for t_index in range(p_args.clients):
+            t_mediaDir = imPath.join(f_clientsDir, '%05d' % t_index) + '/'
+            f_players.append(VirtualPlayer(t_index, f_baseUrl, t_mediaDir, p_args, f_fleet))
+            f_players[-1].c_fileManagerModule.c_mediaCache.loadIndex()
+
+        ##Warm up, every player starts at once like after a power cut of the whole store
+        f_started = imMonotonic()
+        for t_player in f_players: t_player.start()
+        f_converged = waitForConvergence(f_players, imJsonParse(f_firstManifest), f_started, p_args.timeout)
+        report('warm up', f_fleet, f_server, imMonotonic() - f_started)
+        print('         converged p50 %.2fs, max %.2fs' % (percentile(f_converged, 50), max(f_converged)))
+
+        ##Manifest change
+        f_fleet.resetCounters()
+        f_server.c_requestCounts = {}
+        f_started = imMonotonic()
+        f_secondManifest = fabricateManifest(f_mediaFiles, f_checksums)
+        f_server.setManifest(f_secondManifest)
+        f_converged = waitForConvergence(f_players, imJsonParse(f_secondManifest), f_started, p_args.timeout)
+        report('change', f_fleet, f_server, imMonotonic() - f_started)
+        print('         converged p50 %.2fs, p99 %.2fs, max %.2fs' % (percentile(f_converged, 50), percentile(f_converged, 99), max(f_converged)))
+
+        ##Steady state
+        f_fleet.resetCounters()
+        f_server.c_requestCounts = {}
+        f_started = imMonotonic()
+        imDelay(p_args.steady)
+        report('steady', f_fleet, f_server, imMonotonic() - f_started)
+
+        for t_player in f_players: t_player.stop()
+        f_server.stop()
+    finally:
+        imDeleteDir(f_serverDir)
+        imDeleteDir(f_clientsDir)
+
+if __name__ == '__main__':
+    g_parser = imArgumentParser(description = 'Simulates a fleet of headless players against the local media server')
+    g_parser.add_argument('--clients', type = int, default = 200, help = 'number of virtual players')
+    g_parser.add_argument('--media', type = int, default = 4, help = 'media files in the first manifest')
+    g_parser.add_argument('--size', type = int, default = 256, help = 'size of a media file in KB')
+    g_parser.add_argument('--steady', type = float, default = 10, help = 'seconds of the steady phase')
+    g_parser.add_argument('--timeout', type = float, default = 120, help = 'seconds to wait for convergence')
+    g_parser.add_argument('--push', action = 'store_true', help = 'subscribe to /subscribe instead of only polling')
+    g_parser.add_argument('--delay', type = float, default = 1, help = 'c_requestDelay of the players')
+    g_parser.add_argument('--maxDelay', type = float, default = 5, help = 'c_maxRequestDelay of the players')
+    simulate(g_parser.parse_args())
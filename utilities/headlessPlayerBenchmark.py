@@ -0,0 +1,119 @@
+'''Runs the media list player on the headless backend
+
+Loops a playlist of generated (empty) media files on an accelerated clock and
+reports the switch latency between media, whether the playlist advanced in
+order and the CPU the player used, no display or libvlc needed
+
+With a start delay (the time a player takes to open a media, in real seconds)
+it also compares a single player with a double buffered one, where the next
+media is pre-rolled and a switch, in the playlist or to a scheduled media, is
+only a swap. The times are put against the length of a video frame
+
+Usage:
+    python utilities/headlessPlayerBenchmark.py [media] [seconds per media] [clock speed] [wall seconds] [start delay ms]
+
+Prefixes:
+
+g_    :    Global variables
+f_    :    Local variables
+t_    :    Temporary variables
+c_    :    Class variables
+
+'''
+
+import sys
+from os import path as imPath
+from shutil import rmtree as imDeleteDir
+from tempfile import mkdtemp as imMakeTempDir
+from time import (
+    sleep as imDelay,
+    process_time as imCpuTime,
+    monotonic as imMonotonic
+)
+
+sys.path.insert(0, imPath.dirname(imPath.dirname(imPath.abspath(__file__))))
+import mediaPlayerModule
+import playerBackendModule
+
+FRAME_SECONDS = 1 / 25.0    ##one frame of a 25 fps video, the slowest the media usually are
+
+def makePlayer(p_mediaDir, p_mediaCount, p_duration, p_clockSpeed, p_startDelay, p_isDoubleBuffered):
+    '''Returns (media player on a headless backend, list of p_mediaCount empty media files)'''
+    f_mediaList = []
+    for t_index in range(p_mediaCount):
+        f_mediaList.append(p_mediaDir + 'media %d.mp4' % t_index)
+        open(f_mediaList[-1], 'wb').close()
+
+    f_backend = playerBackendModule.HeadlessPlayerBackend()
+    f_backend.c_clockSpeed = p_clockSpeed
+    f_backend.c_defaultDuration = p_duration
+    f_backend.c_startDelay = p_startDelay * p_clockSpeed  ##simulated seconds, p_startDelay stays in real seconds
+    f_backend.c_isDoubleBuffered = p_isDoubleBuffered
+    f_player = mediaPlayerModule.MediaPlayerModule()
+    f_player.setBackend(f_backend)
+    return f_player, f_mediaList
+
+def benchmark(p_mediaCount=5, p_duration=30, p_clockSpeed=300, p_seconds=10, p_startDelay=0, p_isDoubleBuffered=False):
+    '''Returns (sorted switch latencies, aired media in order, cpu seconds, wall seconds)'''
+    f_mediaDir = imMakeTempDir() + '/'
+    try:
+        f_player, f_mediaList = makePlayer(f_mediaDir, p_mediaCount, p_duration, p_clockSpeed, p_startDelay, p_isDoubleBuffered)
+        f_latencies = []
+        f_aired = []
+        f_player.c_switchListener = f_latencies.append
+        f_player.c_mediaStartListener = f_aired.append
+        f_player.c_mediaResourceLocatorList = f_mediaList
+
+        f_started = imMonotonic()
+        f_cpuStarted = imCpuTime()
+        f_player.startMediaListPlayer()
+        imDelay(p_seconds)
+        f_player.stop()
+        f_player.c_mediaListPlayerThread.join()
+        return sorted(f_latencies), f_aired, imCpuTime() - f_cpuStarted, imMonotonic() - f_started
+    finally:
+        imDeleteDir(f_mediaDir)
+
+def benchmarkScheduleSwitch(p_switches=20, p_startDelay=.05, p_isDoubleBuffered=False):
+    '''Switches between a scheduled media and the unscheduled list the way the main loop
+        does, pre-rolling the media first, returns the sorted seconds until each was playing'''
+    f_mediaDir = imMakeTempDir() + '/'
+    try:
+        f_player, f_mediaList = makePlayer(f_mediaDir, 3, 3600, 1, p_startDelay, p_isDoubleBuffered)
+        f_player.startMediaListPlayer()
+        f_switchTimes = []
+        for t_index in range(p_switches):
+            if t_index % 2: t_mediaList, t_isScheduled = f_mediaList[1:], False
+            else: t_mediaList, t_isScheduled = f_mediaList[:1], True
+            f_player.prerollMedia(t_mediaList[0])
+            t_started = imMonotonic()
+            f_player.switchMediaList(t_mediaList, t_isScheduled)
+            f_switchTimes.append(imMonotonic() - t_started)
+        f_player.stop()
+        f_player.c_mediaListPlayerThread.join()
+        return sorted(f_switchTimes)
+    finally:
+        imDeleteDir(f_mediaDir)
+
+def describeTimes(p_times):
+    return 'p50 %.2fms, p99 %.2fms, max %.2fms (%.2f frames at 25 fps)' % (
+        p_times[len(p_times) // 2] * 1e3, p_times[min(len(p_times) - 1, len(p_times) * 99 // 100)] * 1e3,
+        p_times[-1] * 1e3, p_times[-1] / FRAME_SECONDS)
+
+if __name__ == '__main__':
+    g_mediaCount = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    g_duration = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+    g_clockSpeed = float(sys.argv[3]) if len(sys.argv) > 3 else 300
+    g_seconds = float(sys.argv[4]) if len(sys.argv) > 4 else 10
+    g_startDelay = float(sys.argv[5]) / 1e3 if len(sys.argv) > 5 else 0
+
+    for t_isDoubleBuffered in ((False, True) if g_startDelay else (False,)):
+        if g_startDelay: print('\n%s player, %.0fms to open a media' % ('Double buffered' if t_isDoubleBuffered else 'Single', g_startDelay * 1e3))
+        g_latencies, g_aired, g_cpu, g_wall = benchmark(g_mediaCount, g_duration, g_clockSpeed, g_seconds, g_startDelay, t_isDoubleBuffered)
+        g_isInOrder = all(g_aired[t_index] == g_aired[t_index % g_mediaCount] for t_index in range(len(g_aired)))
+        print('%d media aired (%.1f media hours), playlist in order: %s' %
+              (len(g_aired), len(g_aired) * g_duration / 3600, g_isInOrder))
+        if g_latencies: print('switch latency %s' % describeTimes(g_latencies))
+        print('cpu %.3fs in %.1fs (%.2f%%), %.2fms per switch' %
+              (g_cpu, g_wall, g_cpu / g_wall * 100, g_cpu / max(1, len(g_aired)) * 1e3))
+        if g_startDelay: print('schedule switch %s' % describeTimes(benchmarkScheduleSwitch(20, g_startDelay, t_isDoubleBuffered)))
@@ -0,0 +1,108 @@
+'''Runs an image slideshow on the image path of the player, headless
+
+Loops a playlist of generated images through MediaPlayerModule on an
+ImageSlideshowBackend (videos would go to a HeadlessPlayerBackend) and reports
+how often the images were decoded, the CPU it took and the gap between the end
+of an image and the next one showing, once decoding every image when it is
+shown and once with the image cache and the background pre-decode
+
+There is no GdkPixbuf here, the images are zlib compressed raw pictures at
+camera resolution and the decoder inflates and scales them down to the screen,
+work of the same kind as decoding a jpeg
+
+Usage:
+    python utilities/imageSlideshowBenchmark.py [images] [display ms] [wall seconds] [source width] [source height]
+
+Prefixes:
+
+g_    :    Global variables
+f_    :    Local variables
+t_    :    Temporary variables
+c_    :    Class variables
+
+'''
+
+import sys
+from os import path as imPath
+from zlib import (
+    compress as imCompress,
+    decompress as imDecompress
+)
+from shutil import rmtree as imDeleteDir
+from tempfile import mkdtemp as imMakeTempDir
+from time import (
+    sleep as imDelay,
+    process_time as imCpuTime
+)
+
+sys.path.insert(0, imPath.dirname(imPath.dirname(imPath.abspath(__file__))))
+import mediaPlayerModule
+import playerBackendModule
+import imageCacheModule
+
+SCREEN_SIZE = (1920, 1080)
+
+def makeImages(p_mediaDir, p_count, p_width, p_height):
+    '''Writes p_count compressed pictures of p_width x p_height RGB pixels, returns their paths'''
+    f_images = []
+    for t_index in range(p_count):
+        t_row = bytes((t_x * (t_index + 3) + t_index) % 256 for t_x in range(p_width * 3))
+        f_images.append(p_mediaDir + 'slide %d.png' % t_index)
+        with open(f_images[-1], 'wb') as t_file: t_file.write(imCompress(t_row * p_height, 1))
+    return f_images
+
+def makeDecoder(p_width, p_height):
+    def decodeRaw(p_file, p_screenWidth, p_screenHeight):
+        '''Inflates the picture and keeps every n-th pixel of every n-th row to fit the screen'''
+        with open(p_file, 'rb') as t_file: f_pixels = imDecompress(t_file.read())
+        f_step = max(1, -(-p_width // p_screenWidth), -(-p_height // p_screenHeight))
+        f_rowBytes = p_width * 3
+        f_scaled = bytearray()
+        for t_y in range(0, p_height, f_step):
+            for t_channel in range(3): f_scaled += f_pixels[t_y * f_rowBytes + t_channel:(t_y + 1) * f_rowBytes:3 * f_step]
+        return f_scaled, len(f_scaled)
+    return decodeRaw
+
+def benchmark(p_images, p_displayTime, p_seconds, p_width, p_height, p_budgetBytes):
+    '''Returns (sorted gaps between images, the image cache, cpu seconds, images shown)'''
+    f_imageCache = imageCacheModule.ImageCacheModule()
+    f_imageCache.c_width, f_imageCache.c_height = SCREEN_SIZE
+    f_imageCache.c_budgetBytes = p_budgetBytes
+    f_imageCache.c_decoder = makeDecoder(p_width, p_height)
+    f_backend = playerBackendModule.ImageSlideshowBackend(playerBackendModule.HeadlessPlayerBackend(), f_imageCache)
+    f_backend.c_imageDisplayTime = p_displayTime
+    f_player = mediaPlayerModule.MediaPlayerModule()
+    f_player.setBackend(f_backend)
+    f_gaps = []
+    f_player.c_switchListener = f_gaps.append
+    f_player.c_mediaResourceLocatorList = p_images
+
+    f_cpuStarted = imCpuTime()
+    f_player.startMediaListPlayer()
+    imDelay(p_seconds)
+    f_player.stop()
+    f_player.c_mediaListPlayerThread.join()
+    return sorted(f_gaps), f_imageCache, imCpuTime() - f_cpuStarted, f_backend.c_shownImageCount
+
+if __name__ == '__main__':
+    g_imageCount = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    g_displayTime = float(sys.argv[2]) / 1e3 if len(sys.argv) > 2 else .2
+    g_seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 6
+    g_width = int(sys.argv[4]) if len(sys.argv) > 4 else 4000
+    g_height = int(sys.argv[5]) if len(sys.argv) > 5 else 3000
+
+    g_mediaDir = imMakeTempDir() + '/'
+    try:
+        g_images = makeImages(g_mediaDir, g_imageCount, g_width, g_height)
+        print('%d images of %dx%d shown on %dx%d for %.0fms each, %.0fs' % (g_imageCount, g_width, g_height, SCREEN_SIZE[0], SCREEN_SIZE[1],
+                                                                           g_displayTime * 1e3, g_seconds))
+        for t_label, t_budgetBytes in (('Decoded on every show', 0), ('Image cache and pre-decode', 64 * 1024 ** 2)):
+            t_gaps, t_imageCache, t_cpu, t_shownCount = benchmark(g_images, g_displayTime, g_seconds, g_width, g_height, t_budgetBytes)
+            print('\n%s' % t_label)
+            print('\t%d images shown, %d decodes (%.2fs), %d hits, %d misses, %.1fMB in memory' % (
+                t_shownCount, t_imageCache.c_decodeCount, t_imageCache.c_decodeSeconds, t_imageCache.c_hitCount,
+                t_imageCache.c_missCount, t_imageCache.c_storedBytes / 1024.0 ** 2))
+            print('\tcpu %.2fs in %.0fs (%.1f%%)' % (t_cpu, g_seconds, t_cpu / g_seconds * 100))
+            if t_gaps: print('\tgap between images p50 %.2fms, max %.2fms' % (t_gaps[len(t_gaps) // 2] * 1e3, t_gaps[-1] * 1e3))
+    finally:
+        imDeleteDir(g_mediaDir)
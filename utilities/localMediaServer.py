@@ -0,0 +1,352 @@
+'''Local stand-in of the media server
+
+Serves the same two endpoints the players use, so the network and download
+code can be exercised and benchmarked without the real server:
+
+    /getJson            -> the manifest (a json file, reloaded when it changes)
+    /subscribe          -> server-sent events stream, pushes the manifest on every change
+    /download?file=NAME -> the media file NAME of the media directory
+    /time               -> {"receive" : t1, "transmit" : t2}, see ClockSyncModule
+    POST /playLog       -> takes a gzip batch of airings, see PlayLogModule, and
+                           keeps each airing id once
+
+Connections are kept alive (HTTP/1.1) and downloads honour "Range: bytes=N-",
+media are sent with an ETag and a range with a stale If-Range gets the whole file.
+An artificial per request latency, a per connection bandwidth limit and a
+connection drop after a number of bytes can be set to behave like store Wi-Fi,
+an uplink limit shared by all the downloads like the uplink of the server.
+A share of the play log uploads can be refused, or taken and answered with an
+error as if the answer was lost, to exercise the retries and the deduplication.
+The time endpoint adds a random delay of up to c_timeJitter on the way in
+and another one on the way out, so the two directions are not symmetric
+
+Usage:
+    python utilities/localMediaServer.py <media directory> <manifest json> [port]
+
+    or from another utility:
+        g_Server = localMediaServer.LocalMediaServer(g_mediaDir, g_manifestFile)
+        g_Server.start()
+        ...
+        g_Server.stop()
+
+Prefixes:
+
+g_    :    Global variables
+f_    :    Local variables
+t_    :    Temporary variables
+c_    :    Class variables
+
+'''
+
+import sys
+from os import (
+    path as imPath,
+    stat as imStat
+)
+from re import match as imRegExMatch
+from hashlib import sha1 as imHash
+from gzip import decompress as imDecompress
+from json import (
+    loads as imJsonParse,
+    dumps as imJsonString
+)
+from random import (
+    uniform as imRandomUniform,
+    random as imRandom
+)
+from time import (
+    sleep as imDelay,
+    time as imTime,
+    monotonic as imMonotonic
+)
+from threading import (
+    Thread as imThread,
+    Lock as imLock,
+    Condition as imCondition
+)
+from urllib.parse import (
+    urlsplit as imSplitUrl,
+    parse_qs as imParseQuery
+)
+from http.server import (
+    ThreadingHTTPServer as imHTTPServer,
+    BaseHTTPRequestHandler as imRequestHandler
+)
+
+class MediaRequestHandler(imRequestHandler):
+    '''Handles the requests of one connection'''
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, p_format, *p_args):
+        '''Keeps the console quiet, the server counts requests instead'''
+
+    def do_GET(self):
+        f_url = imSplitUrl(self.path)
+        f_query = imParseQuery(f_url.query)
+        self.server.c_owner.countRequest(f_url.path)
+        if self.server.c_owner.c_latency: imDelay(self.server.c_owner.c_latency)
+
+        if f_url.path == '/getJson': self.sendManifest()
+        elif f_url.path == '/subscribe': self.sendManifestStream()
+        elif f_url.path == '/download': self.sendMedia(f_query.get('file', [''])[0])
+        elif f_url.path == '/time': self.sendTime()
+        else: self.sendBody(404, b'Not found', 'text/plain')
+
+    def do_HEAD(self):
+        '''Headers of a media without its body, players ask it for the size the manifest does not give'''
+        f_url = imSplitUrl(self.path)
+        self.server.c_owner.countRequest(f_url.path)
+        if f_url.path == '/download': self.sendMedia(imParseQuery(f_url.query).get('file', [''])[0], True)
+        else: self.sendBody(404, b'', 'text/plain')
+
+    def do_POST(self):
+        f_url = imSplitUrl(self.path)
+        self.server.c_owner.countRequest(f_url.path)
+        f_body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.server.c_owner.c_latency: imDelay(self.server.c_owner.c_latency)
+
+        if f_url.path == '/playLog': self.receivePlayLog(f_body)
+        else: self.sendBody(404, b'Not found', 'text/plain')
+
+    def receivePlayLog(self, p_body):
+        '''Keeps the airings of a batch, the ids already known are counted as duplicates'''
+        f_owner = self.server.c_owner
+        if imRandom() < f_owner.c_playLogRefuseRate: return self.sendBody(503, b'Busy', 'text/plain')
+        f_owner.c_playLogBytes += len(p_body)
+        if self.headers.get('Content-Encoding') == 'gzip': p_body = imDecompress(p_body)
+        f_ids = [imJsonParse(t_line)['id'] for t_line in p_body.splitlines() if t_line.strip()]
+        f_accepted = f_owner.addAirings(f_ids)
+        if imRandom() < f_owner.c_playLogLostAnswerRate: return self.sendBody(503, b'Answer lost', 'text/plain')
+        self.sendBody(200, imJsonString({'accepted' : f_accepted, 'duplicates' : len(f_ids) - f_accepted}).encode(), 'application/json')
+
+    def sendTime(self):
+        '''Receive and transmit time of the server clock, with the simulated delays around them'''
+        f_jitter = self.server.c_owner.c_timeJitter
+        if f_jitter: imDelay(imRandomUniform(0, f_jitter))
+        f_received = imTime()
+        f_body = imJsonString({'receive' : f_received, 'transmit' : imTime()}).encode()
+        if f_jitter: imDelay(imRandomUniform(0, f_jitter))
+        self.sendBody(200, f_body, 'application/json')
+
+    def sendManifest(self):
+        '''Sends the manifest, or 304 if the client already has this version'''
+        f_manifest, f_eTag = self.server.c_owner.getManifest()
+        if self.headers.get('If-None-Match') == f_eTag:
+            self.server.c_owner.countRequest('304')
+            self.send_response(304)
+            self.send_header('ETag', f_eTag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(f_manifest)))
+        self.send_header('ETag', f_eTag)
+        self.end_headers()
+        self.wfile.write(f_manifest)
+        self.server.c_owner.countBytes(len(f_manifest))
+
+    def sendManifestStream(self):
+        '''Streams the manifest as server-sent events until the client goes away'''
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        f_owner = self.server.c_owner
+        f_sentETag = None
+        try:
+            while f_owner.c_server != None:
+                f_manifest, f_eTag = f_owner.getManifest()
+                if f_eTag != f_sentETag:
+                    f_event = b'id: ' + f_eTag.encode() + b'\ndata: ' + f_manifest.replace(b'\n', b'') + b'\n\n'
+                    f_sentETag = f_eTag
+                else:
+                    f_event = b': keep alive\n\n'
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(f_event), f_event))
+                self.wfile.flush()
+                f_owner.countBytes(len(f_event))
+                f_owner.waitForManifestChange(f_eTag, f_owner.c_keepAliveInterval)
+        except OSError:
+            pass
+
+    def sendMedia(self, p_fileName, p_isHead=False):
+        f_filePath = imPath.join(self.server.c_owner.c_mediaDir, imPath.basename(p_fileName))
+        if not (p_fileName and imPath.isfile(f_filePath)):
+            self.sendBody(404, b'' if p_isHead else b'File not found', 'text/plain')
+            return
+        f_size = imPath.getsize(f_filePath)
+        f_eTag = '"%x-%x"' % (imStat(f_filePath).st_mtime_ns, f_size)
+        f_offset = 0
+        f_range = imRegExMatch(r'bytes=(\d+)-$', self.headers.get('Range') or '')
+        ##The file changed since the client started it, send it whole
+        if self.headers.get('If-Range') not in (None, f_eTag): f_range = None
+        if f_range:
+            f_offset = int(f_range.group(1))
+            if f_offset >= f_size:
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */%d' % f_size)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (f_offset, f_size - 1, f_size))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(f_size - f_offset))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', f_eTag)
+        self.end_headers()
+        if p_isHead: return
+        with open(f_filePath, 'rb') as t_file:
+            t_file.seek(f_offset)
+            self.sendThrottled(t_file, f_size - f_offset)
+
+    def sendThrottled(self, p_file, p_length):
+        '''Writes p_length bytes of p_file, at most c_bandwidth bytes per second if set,
+            drops the connection after c_dropAfterBytes if set'''
+        f_chunkSize = 64 * 1024
+        f_bandwidth = self.server.c_owner.c_bandwidth
+        f_dropAfter = self.server.c_owner.c_dropAfterBytes
+        f_sent = 0
+        while p_length > 0:
+            if f_dropAfter: f_chunkSize = min(f_chunkSize, f_dropAfter - f_sent)
+            t_chunk = p_file.read(min(f_chunkSize, p_length))
+            if not t_chunk: break
+            self.wfile.write(t_chunk)
+            p_length -= len(t_chunk)
+            f_sent += len(t_chunk)
+            self.server.c_owner.countBytes(len(t_chunk))
+            if f_bandwidth: imDelay(len(t_chunk) / float(f_bandwidth))
+            self.server.c_owner.waitForUplink(len(t_chunk))
+            if f_dropAfter and (f_sent >= f_dropAfter) and (p_length > 0):
+                self.close_connection = True
+                self.wfile.flush()
+                self.connection.shutdown(2)
+                return
+
+    def sendBody(self, p_status, p_body, p_contentType):
+        self.send_response(p_status)
+        self.send_header('Content-Type', p_contentType)
+        self.send_header('Content-Length', str(len(p_body)))
+        self.end_headers()
+        self.wfile.write(p_body)
+        self.server.c_owner.countBytes(len(p_body))
+
+class LocalMediaServer():
+    '''Runs the stand-in server on a background thread'''
+    def __init__(self, p_mediaDir, p_manifestFile=None, p_port=0):
+        self.c_mediaDir = p_mediaDir
+        self.c_manifestFile = p_manifestFile
+        self.c_port = p_port
+
+        self.c_latency = 0  ##seconds added to every request
+        self.c_bandwidth = 0    ##bytes per second per connection, 0 for unlimited
+        self.c_uplinkBandwidth = 0  ##bytes per second of all the downloads together, 0 for unlimited
+        self.c_dropAfterBytes = 0   ##cut every download after this many bytes, 0 to never drop
+        self.c_keepAliveInterval = 15   ##seconds between keep alive comments on the push streams
+        self.c_timeJitter = 0   ##most seconds of random delay each way on the time endpoint
+        self.c_watchInterval = .1   ##seconds between checks of the manifest file for the push streams
+        self.c_playLogRefuseRate = 0    ##share of the play log uploads refused before they are read
+        self.c_playLogLostAnswerRate = 0    ##share of the play log uploads taken but answered with an error
+
+        self.c_requestCounts = {}
+        self.c_bytesSent = 0
+        self.c_airingIds = set()    ##ids of the airings received on /playLog
+        self.c_duplicateAiringCount = 0
+        self.c_playLogBytes = 0 ##bytes of the play log uploads as they were sent
+        self.__c_statsLock = imLock()
+        self.__c_uplinkFreeAt = 0   ##monotonic time the uplink has sent everything queued on it
+        self.__c_manifestChanged = imCondition()
+        self.__c_manifestCache = (None, b'{}', '"empty"')  ##(modified time, bytes, etag) of the manifest file
+
+        self.c_server = None
+        self.c_thread = None
+
+    def start(self):
+        '''Starts serving, returns the base url of the server'''
+        self.c_server = imHTTPServer(('127.0.0.1', self.c_port), MediaRequestHandler)
+        self.c_server.daemon_threads = True
+        self.c_server.c_owner = self
+        self.c_port = self.c_server.server_address[1]
+        self.c_thread = imThread(target = self.c_server.serve_forever, daemon = True)
+        self.c_thread.start()
+        imThread(target = self.watchManifest, daemon = True).start()
+        return self.getBaseUrl()
+
+    def stop(self):
+        if self.c_server != None:
+            f_server = self.c_server
+            self.c_server = None
+            with self.__c_manifestChanged: self.__c_manifestChanged.notify_all()
+            f_server.shutdown()
+            f_server.server_close()
+
+    def setManifest(self, p_manifest):
+        '''Replaces the manifest file contents, pushed to the subscribers right away
+            @Params
+                p_manifest -> the new manifest bytes'''
+        with open(self.c_manifestFile, 'wb') as t_file: t_file.write(p_manifest)
+        self.getManifest()
+        with self.__c_manifestChanged: self.__c_manifestChanged.notify_all()
+
+    def waitForManifestChange(self, p_eTag, p_timeout):
+        '''Blocks a push stream until the manifest is not p_eTag anymore or p_timeout ran out'''
+        with self.__c_manifestChanged:
+            self.__c_manifestChanged.wait_for(lambda: (self.c_server == None) or (self.__c_manifestCache[2] != p_eTag), p_timeout)
+
+    def watchManifest(self):
+        '''Wakes the push streams up when the manifest file was edited by hand'''
+        while self.c_server != None:
+            f_eTag = self.__c_manifestCache[2]
+            self.getManifest()
+            if self.__c_manifestCache[2] != f_eTag:
+                with self.__c_manifestChanged: self.__c_manifestChanged.notify_all()
+            imDelay(self.c_watchInterval)
+
+    def getBaseUrl(self):
+        return 'http://127.0.0.1:%d' % self.c_port
+
+    def getManifest(self):
+        '''(bytes, etag) of the manifest file, re-read only when it was modified'''
+        if self.c_manifestFile == None: return self.__c_manifestCache[1:]
+        f_modified = imPath.getmtime(self.c_manifestFile)
+        if self.__c_manifestCache[0] != f_modified:
+            with open(self.c_manifestFile, 'rb') as t_file: f_manifest = t_file.read()
+            self.__c_manifestCache = (f_modified, f_manifest, '"%s"' % imHash(f_manifest).hexdigest())
+        return self.__c_manifestCache[1:]
+
+    def countRequest(self, p_path):
+        with self.__c_statsLock: self.c_requestCounts[p_path] = self.c_requestCounts.get(p_path, 0) + 1
+
+    def addAirings(self, p_ids):
+        '''Keeps the new airing ids, returns how many were new'''
+        with self.__c_statsLock:
+            f_newIds = set(p_ids) - self.c_airingIds
+            self.c_airingIds.update(f_newIds)
+            self.c_duplicateAiringCount += len(p_ids) - len(f_newIds)
+            return len(f_newIds)
+
+    def countBytes(self, p_bytes):
+        with self.__c_statsLock: self.c_bytesSent += p_bytes
+
+    def waitForUplink(self, p_bytes):
+        '''Queues p_bytes on the shared uplink and sleeps until they would have been sent'''
+        if not self.c_uplinkBandwidth: return
+        with self.__c_statsLock:
+            self.__c_uplinkFreeAt = max(imMonotonic(), self.__c_uplinkFreeAt) + p_bytes / float(self.c_uplinkBandwidth)
+            f_sentAt = self.__c_uplinkFreeAt
+        imDelay(max(0, f_sentAt - imMonotonic()))
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    g_Server = LocalMediaServer(sys.argv[1], sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 8080)
+    print('Serving on %s' % g_Server.start())
+    try:
+        while True: imDelay(1)
+    except KeyboardInterrupt:
+        g_Server.stop()
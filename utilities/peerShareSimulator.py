@@ -0,0 +1,155 @@
+'''Peer share simulator
+
+Runs stores of headless players on this machine against the bundled local media
+server, with the uplink of the server limited, and has every player download a
+new campaign at the same time. Each player has its own media directory, its own
+PeerShareModule on a free port and the players of a store are one group, the
+discovery broadcasts go to 127.255.255.255
+
+The same campaign is downloaded twice, once from the server only and once with
+the peers, and the bytes the server sent and the time until every player had
+every file are compared. The files are checked against their checksums
+
+With --stopOne a player of every store stops sharing right after discovery, the
+others have to notice it is gone (c_peerTimeout) and fall back on the server
+
+Usage:
+    python utilities/peerShareSimulator.py [--stores 2] [--screens 4] [--media 3] [--size 2048]
+                                           [--uplink 4096] [--stopOne]
+
+Prefixes:
+
+g_    :    Global variables
+f_    :    Local variables
+t_    :    Temporary variables
+c_    :    Class variables
+
+'''
+
+import sys
+from os import (
+    path as imPath,
+    urandom as imRandomBytes,
+    makedirs as imMakeDirs
+)
+from random import randint as imRandomInt
+from hashlib import sha256 as imHash
+from shutil import rmtree as imDeleteDir
+from tempfile import mkdtemp as imMakeTempDir
+from argparse import ArgumentParser as imArgumentParser
+from threading import Thread as imThread
+from time import (
+    sleep as imDelay,
+    monotonic as imMonotonic
+)
+
+sys.path.insert(0, imPath.dirname(imPath.dirname(imPath.abspath(__file__))))
+sys.path.insert(0, imPath.dirname(imPath.abspath(__file__)))
+import fileManagerModule
+import peerShareModule
+import localMediaServer
+
+def makeCampaign(p_mediaDir, p_mediaCount, p_size):
+    '''Writes p_mediaCount random media files, returns the server json of them'''
+    f_mediaFiles = []
+    for t_index in range(p_mediaCount):
+        t_content = imRandomBytes(p_size)
+        t_fileName = 'campaign %d.mp4' % t_index
+        with open(p_mediaDir + t_fileName, 'wb') as t_file: t_file.write(t_content)
+        f_mediaFiles.append({'fileName' : t_fileName, 'startTime' : None, 'endTime' : None,
+                             'size' : p_size, 'checksum' : 'sha256:' + imHash(t_content).hexdigest()})
+    return {'mediaFiles' : f_mediaFiles}
+
+def makePlayer(p_downloadUrl, p_mediaDir, p_manifest, p_group, p_discoveryPort, p_isSharing):
+    '''Returns (file manager, peer share) of one headless player'''
+    imMakeDirs(p_mediaDir)
+    f_fileManager = fileManagerModule.FileManagerModule()
+    f_fileManager.c_downloadUrl = p_downloadUrl
+    f_fileManager.c_maxDownloadWorkers = 2
+    f_fileManager.c_cachedJson = p_manifest
+    f_fileManager.c_mediaCache.c_mediaDir = p_mediaDir
+    f_fileManager.c_mediaCache.c_reserveBytes = 0
+
+    f_peerShare = peerShareModule.PeerShareModule()
+    f_peerShare.c_fileManagerModule = f_fileManager
+    f_peerShare.c_mediaDir = p_mediaDir
+    f_peerShare.c_groupName = p_group
+    f_peerShare.c_port = 0
+    f_peerShare.c_discoveryPort = p_discoveryPort
+    f_peerShare.c_broadcastAddress = '127.255.255.255'
+    f_peerShare.c_announceInterval = 1
+    f_peerShare.c_peerTimeout = 3
+    f_peerShare.c_pollInterval = .2
+    f_peerShare.c_chunkSize = 256 * 1024
+    if p_isSharing:
+        f_fileManager.c_downloadManager.c_peerShareModule = f_peerShare
+        f_peerShare.start()
+    return f_fileManager, f_peerShare
+
+def run(p_args, p_server, p_manifest, p_isSharing):
+    '''Every player downloads the campaign at once, returns (server bytes, peer bytes, seconds, players with every file intact)'''
+    f_workDir = imMakeTempDir() + '/'
+    f_discoveryPort = imRandomInt(40000, 60000)
+    f_players = []
+    try:
+        for t_store in range(p_args.stores):
+            for t_screen in range(p_args.screens):
+                f_players.append(makePlayer(p_server.getBaseUrl() + '/download?file=', f_workDir + 'store %d screen %d/' % (t_store, t_screen),
+                                            p_manifest, 'store %d' % t_store, f_discoveryPort, p_isSharing))
+        if p_isSharing:
+            imDelay(1.5)    ##discovery
+            print('\tpeers heard per player: %s' % sorted(len(t_peerShare.getPeers()) for t_fileManager, t_peerShare in f_players))
+            if p_args.stopOne:
+                for t_store in range(p_args.stores): f_players[t_store * p_args.screens][1].stop()
+
+        f_bytesBefore = p_server.c_bytesSent
+        f_started = imMonotonic()
+        f_downloading = [t_player for t_index, t_player in enumerate(f_players)
+                         if not (p_isSharing and p_args.stopOne and t_index % p_args.screens == 0)]
+        f_threads = [imThread(target = t_fileManager.downloadListOfMedia, args = (t_fileManager.c_mediaCache.c_mediaDir,), daemon = True)
+                     for t_fileManager, t_peerShare in f_downloading]
+        for t_thread in f_threads: t_thread.start()
+        for t_thread in f_threads: t_thread.join()
+        f_seconds = imMonotonic() - f_started
+
+        f_intactCount = 0
+        for t_fileManager, t_peerShare in f_downloading:
+            t_isIntact = True
+            for t_media in p_manifest['mediaFiles']:
+                t_filePath = t_fileManager.c_mediaCache.c_mediaDir + t_media['fileName']
+                if not imPath.isfile(t_filePath): t_isIntact = False
+                else:
+                    with open(t_filePath, 'rb') as t_file: t_isIntact = t_isIntact and ('sha256:' + imHash(t_file.read()).hexdigest() == t_media['checksum'])
+            f_intactCount += t_isIntact
+        f_peerBytes = sum(t_peerShare.c_receivedBytes for t_fileManager, t_peerShare in f_players)
+        return p_server.c_bytesSent - f_bytesBefore, f_peerBytes, f_seconds, f_intactCount, len(f_downloading)
+    finally:
+        for t_fileManager, t_peerShare in f_players: t_peerShare.stop()
+        imDeleteDir(f_workDir)
+
+if __name__ == '__main__':
+    g_parser = imArgumentParser(description = 'Simulates stores of players sharing a new campaign over the LAN')
+    g_parser.add_argument('--stores', type = int, default = 2)
+    g_parser.add_argument('--screens', type = int, default = 4, help = 'players per store')
+    g_parser.add_argument('--media', type = int, default = 3)
+    g_parser.add_argument('--size', type = int, default = 2048, help = 'KB per media')
+    g_parser.add_argument('--uplink', type = int, default = 4096, help = 'KB per second of the server uplink')
+    g_parser.add_argument('--stopOne', action = 'store_true', help = 'a player of every store stops sharing after discovery')
+    g_args = g_parser.parse_args()
+
+    g_mediaDir = imMakeTempDir() + '/'
+    g_Server = localMediaServer.LocalMediaServer(g_mediaDir)
+    g_Server.c_uplinkBandwidth = g_args.uplink * 1024
+    try:
+        g_manifest = makeCampaign(g_mediaDir, g_args.media, g_args.size * 1024)
+        g_Server.start()
+        g_campaignBytes = g_args.media * g_args.size * 1024
+        print('%d stores of %d players, %d media of %dKB, server uplink %dKB/s' % (g_args.stores, g_args.screens, g_args.media, g_args.size, g_args.uplink))
+        for t_isSharing in (False, True):
+            print('\n%s' % ('With peer sharing' if t_isSharing else 'Server only'))
+            t_serverBytes, t_peerBytes, t_seconds, t_intactCount, t_playerCount = run(g_args, g_Server, g_manifest, t_isSharing)
+            print('\tserver sent %.1fMB (%.1f campaigns), peers sent %.1fMB' % (t_serverBytes / 1024.0 ** 2, t_serverBytes / float(g_campaignBytes), t_peerBytes / 1024.0 ** 2))
+            print('\tevery player had the campaign after %.1fs, %d of %d players intact' % (t_seconds, t_intactCount, t_playerCount))
+    finally:
+        g_Server.stop()
+        imDeleteDir(g_mediaDir)
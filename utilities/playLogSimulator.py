@@ -0,0 +1,146 @@
+'''Play log simulator
+
+A player is cut off from the server for a number of days and keeps airing media,
+every airing goes to the journal of a PlayLogModule. It then reaches the bundled
+local media server again and uploads the whole backlog, with a share of the
+uploads refused and another share taken by the server but answered with an error
+(the answer was lost), so batches are sent again
+
+Halfway through the catch up the player restarts (the module is closed and a new
+one opens the same journal), it has to continue the sequence and the upload where
+the old one stopped
+
+Reported: requests and bytes compared with one request per airing, peak Python
+memory (tracemalloc) while logging and while uploading, and whether the server
+ended up with every airing exactly once. With a --budget smaller than the
+backlog the oldest airings are dropped and counted instead
+
+Usage:
+    python utilities/playLogSimulator.py [--days 7] [--airing 15] [--budget 64] [--batch 500]
+                                         [--refuse 0.2] [--lostAnswer 0.1]
+
+Prefixes:
+
+g_    :    Global variables
+f_    :    Local variables
+t_    :    Temporary variables
+c_    :    Class variables
+
+'''
+
+import sys
+import tracemalloc
+from os import (
+    path as imPath,
+    listdir as imListFile
+)
+from shutil import rmtree as imDeleteDir
+from tempfile import mkdtemp as imMakeTempDir
+from argparse import ArgumentParser as imArgumentParser
+from time import (
+    time as imTime,
+    sleep as imDelay,
+    monotonic as imMonotonic
+)
+
+sys.path.insert(0, imPath.dirname(imPath.dirname(imPath.abspath(__file__))))
+sys.path.insert(0, imPath.dirname(imPath.abspath(__file__)))
+import playLogModule
+import mediaPlayerModule
+import localMediaServer
+
+g_mediaDir = '/home/pi/media files/'
+
+def makePlayLog(p_journalDir, p_uploadUrl, p_args):
+    f_playLog = playLogModule.PlayLogModule()
+    f_playLog.c_journalDir = p_journalDir
+    f_playLog.c_uploadUrl = p_uploadUrl
+    f_playLog.c_playerId = 'screen-1'
+    f_playLog.c_mediaDir = g_mediaDir
+    f_playLog.c_maxJournalBytes = p_args.budget * 1024 ** 2
+    f_playLog.c_batchSize = p_args.batch
+    f_playLog.c_isSyncWrites = False    ##a week of airings in seconds, a player syncs every one
+    f_playLog.c_catchUpDelay = 0
+    f_playLog.c_retryDelay = .01
+    f_playLog.c_maxRetryDelay = .05
+    f_playLog.open()
+    return f_playLog
+
+def logAirings(p_playLog, p_count, p_airingSeconds, p_startedAt):
+    '''Airings one after the other from p_startedAt, every tenth one cut by a schedule change. Each one
+        is waited for, on air the writer thread is done long before the next airing ends'''
+    for t_index in range(p_count):
+        t_start = p_startedAt + t_index * p_airingSeconds
+        t_reason = mediaPlayerModule.AIRING_SWITCHED if t_index % 10 == 9 else mediaPlayerModule.AIRING_COMPLETED
+        p_playLog.recordAiring(g_mediaDir + 'campaign %d.mp4' % (t_index % 12), t_start, t_start + p_airingSeconds, t_reason)
+        p_playLog.flush()
+
+def catchUp(p_playLog, p_stopAtBytes=0):
+    '''Uploads until no more than p_stopAtBytes are pending, returns the calls made'''
+    f_calls = 0
+    while p_playLog.getPendingBytes() > p_stopAtBytes:
+        p_playLog.uploadPending()
+        f_calls += 1
+        if p_playLog.getPendingBytes() > p_stopAtBytes: imDelay(p_playLog.getNextDelay())
+    return f_calls
+
+if __name__ == '__main__':
+    g_parser = imArgumentParser(description = 'Simulates a player uploading the play log of a long time offline')
+    g_parser.add_argument('--days', type = float, default = 7)
+    g_parser.add_argument('--airing', type = float, default = 15, help = 'seconds per airing')
+    g_parser.add_argument('--budget', type = float, default = 64, help = 'MB of journal kept')
+    g_parser.add_argument('--batch', type = int, default = 500, help = 'airings per upload')
+    g_parser.add_argument('--refuse', type = float, default = .2, help = 'share of the uploads refused')
+    g_parser.add_argument('--lostAnswer', type = float, default = .1, help = 'share of the uploads taken but answered with an error')
+    g_args = g_parser.parse_args()
+
+    g_workDir = imMakeTempDir() + '/'
+    g_Server = localMediaServer.LocalMediaServer(g_workDir)
+    g_Server.c_playLogRefuseRate = g_args.refuse
+    g_Server.c_playLogLostAnswerRate = g_args.lostAnswer
+    try:
+        g_Server.start()
+        g_airingCount = int(g_args.days * 86400 / g_args.airing)
+        print('%.0f days offline, an airing every %.0fs: %d airings, journal budget %.0fMB' % (g_args.days, g_args.airing, g_airingCount, g_args.budget))
+
+        g_PlayLog = makePlayLog(g_workDir + 'playLog/', g_Server.getBaseUrl() + '/playLog', g_args)
+        tracemalloc.start()
+        g_started = imMonotonic()
+        logAirings(g_PlayLog, g_airingCount, g_args.airing, imTime() - g_args.days * 86400)
+        g_logSeconds = imMonotonic() - g_started
+        g_logPeak = tracemalloc.get_traced_memory()[1]
+        g_journalBytes = g_PlayLog.getPendingBytes()
+        print('\nOffline')
+        print('\tlogged in %.1fs (%.0fus per airing), peak memory %.0fKB' % (g_logSeconds, g_logSeconds / g_airingCount * 1e6, g_logPeak / 1024.0))
+        print('\tjournal %.1fMB in %d segments, %d airings dropped' % (g_journalBytes / 1024.0 ** 2,
+              len([t_name for t_name in imListFile(g_workDir + 'playLog/') if t_name.startswith(playLogModule.SEGMENT_PREFIX)]), g_PlayLog.c_droppedCount))
+
+        tracemalloc.reset_peak()
+        g_started = imMonotonic()
+        g_calls = catchUp(g_PlayLog, g_journalBytes // 2)
+        ##Restart: the new module continues from the journal, the cursor and the last sequence number
+        g_loggedCount, g_droppedCount = g_PlayLog.c_loggedCount, g_PlayLog.c_droppedCount
+        g_requestCount, g_failedCount = g_PlayLog.c_uploadCount, g_PlayLog.c_failedUploadCount
+        g_PlayLog.close()
+        g_PlayLog = makePlayLog(g_workDir + 'playLog/', g_Server.getBaseUrl() + '/playLog', g_args)
+        print('\tsequence after the restart: %d (%d logged)' % (g_PlayLog.c_sequence, g_loggedCount))
+        logAirings(g_PlayLog, 100, g_args.airing, imTime())  ##back on air while catching up
+        g_calls += catchUp(g_PlayLog)
+        g_uploadSeconds = imMonotonic() - g_started
+        g_uploadPeak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        g_loggedCount += g_PlayLog.c_loggedCount
+        g_requestCount += g_PlayLog.c_uploadCount
+        g_failedCount += g_PlayLog.c_failedUploadCount
+        g_expectedCount = g_loggedCount - g_droppedCount - g_PlayLog.c_droppedCount
+        print('\nCatch up (%.0f%% refused, %.0f%% answers lost, a restart halfway)' % (g_args.refuse * 100, g_args.lostAnswer * 100))
+        print('\t%.1fs, %d uploadPending calls, %d requests taken and %d failed, instead of %d requests of one airing' %
+              (g_uploadSeconds, g_calls, g_requestCount, g_failedCount, g_loggedCount))
+        print('\tsent %.2fMB gzip for %.1fMB of journal, peak memory %.0fKB (with the airing ids the server keeps)' % (g_Server.c_playLogBytes / 1024.0 ** 2, g_journalBytes / 1024.0 ** 2,
+                                                                               g_uploadPeak / 1024.0))
+        print('\tserver has %d airings of %d kept, %d duplicates dropped, %s' % (len(g_Server.c_airingIds), g_expectedCount, g_Server.c_duplicateAiringCount,
+              'every airing exactly once' if len(g_Server.c_airingIds) == g_expectedCount else 'AIRINGS MISSING'))
+    finally:
+        g_Server.stop()
+        imDeleteDir(g_workDir)
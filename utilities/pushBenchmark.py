@@ -0,0 +1,95 @@
+'''Compares how fast a manifest change reaches the players by push and by polling
+
+Starts the local media server, subscribes a number of NetworkModule clients,
+each run by its own AsyncRuntimeModule like on the player, either to
+/subscribe (push) or lets them poll /getJson, changes the manifest a
+few times and reports how long every client took to see each change and how
+many requests the server had to answer
+
+Usage:
+    python utilities/pushBenchmark.py [clients] [changes]
+
+Prefixes:
+
+g_    :    Global variables
+f_    :    Local variables
+t_    :    Temporary variables
+c_    :    Class variables
+
+'''
+
+import sys
+from os import (
+    path as imPath,
+    close as imCloseFile
+)
+from json import dumps as imJsonString
+from tempfile import mkstemp as imMakeTempFile
+from threading import Event as imEvent
+from time import (
+    sleep as imDelay,
+    monotonic as imMonotonic
+)
+
+sys.path.insert(0, imPath.dirname(imPath.dirname(imPath.abspath(__file__))))
+sys.path.insert(0, imPath.dirname(imPath.abspath(__file__)))
+import networkModule
+import asyncRuntimeModule
+import localMediaServer
+
+def fabricateManifest(p_version):
+    return imJsonString({'mediaFiles' : [{'fileName' : 'spot %d.mp4' % p_version, 'startTime' : None, 'endTime' : None}],
+                         'serverDateTime' : '2018-10-26 15:42'}).encode()
+
+def benchmark(p_clients, p_changes, p_isPush, p_requestDelay=1, p_maxRequestDelay=5):
+    '''Returns (list of propagation seconds, requests answered by the server)'''
+    f_fileHandle, f_manifestFile = imMakeTempFile(suffix = '.json')
+    imCloseFile(f_fileHandle)
+    f_server = localMediaServer.LocalMediaServer(imPath.dirname(f_manifestFile), f_manifestFile)
+    f_server.c_keepAliveInterval = 1
+    f_server.setManifest(fabricateManifest(0))
+    f_baseUrl = f_server.start()
+
+    f_clients = []
+    for t_index in range(p_clients):
+        t_client = networkModule.NetworkModule()
+        t_client.c_serverUrl = f_baseUrl + '/getJson'
+        t_client.c_pushUrl = f_baseUrl + '/subscribe' if p_isPush else None
+        t_client.c_currentIP = '127.0.0.1'
+        t_client.c_requestParam = {'ipAddress' : '127.0.0.1', 'macAddress' : 'client %d' % t_index}
+        t_client.c_requestDelay = p_requestDelay
+        t_client.c_maxRequestDelay = p_maxRequestDelay
+        t_client.c_changedEvent = imEvent()
+        t_client.c_manifestListener = t_client.c_changedEvent.set
+        t_client.c_runtime = asyncRuntimeModule.AsyncRuntimeModule()
+        t_client.c_runtime.c_networkModule = t_client
+        t_client.c_runtime.start()
+        f_clients.append(t_client)
+
+    ##Let every client get the first manifest and settle into its idle rhythm
+    for t_client in f_clients: t_client.c_changedEvent.wait(30)
+    imDelay(p_maxRequestDelay)
+    f_server.c_requestCounts = {}
+
+    f_latencies = []
+    for t_version in range(1, p_changes + 1):
+        for t_client in f_clients: t_client.c_changedEvent.clear()
+        t_changed = imMonotonic()
+        f_server.setManifest(fabricateManifest(t_version))
+        for t_client in f_clients:
+            t_client.c_changedEvent.wait(60)
+            f_latencies.append(imMonotonic() - t_changed)
+        imDelay(1)
+
+    f_requests = sum(f_server.c_requestCounts.get(t_path, 0) for t_path in ('/getJson', '/subscribe'))
+    for t_client in f_clients: t_client.c_runtime.stop()
+    f_server.stop()
+    return sorted(f_latencies), f_requests
+
+if __name__ == '__main__':
+    g_clients = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    g_changes = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    for t_name, t_isPush in (('poll', False), ('push', True)):
+        t_latencies, t_requests = benchmark(g_clients, g_changes, t_isPush)
+        print('%s: %d clients, %d changes, propagation p50 %.3fs, max %.3fs, %d requests to the server' %
+              (t_name, g_clients, g_changes, t_latencies[len(t_latencies) // 2], t_latencies[-1], t_requests))
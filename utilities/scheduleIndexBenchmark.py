@@ -0,0 +1,81 @@
+'''Microbenchmark of the schedule lookup
+
+Compares the compiled ScheduleIndexModule against the old linear scan that
+parsed every startTime / endTime on every call, and checks that both give the
+same answer for every probed time before reporting the numbers
+
+Usage:
+    python utilities/scheduleIndexBenchmark.py [number of scheduled media]
+
+Prefixes:
+
+g_    :    Global variables
+f_    :    Local variables
+t_    :    Temporary variables
+c_    :    Class variables
+
+'''
+
+import sys
+from os import path as imPath
+from random import Random as imRandom
+from timeit import default_timer as imTimer
+from datetime import (
+    datetime as imDatetime,
+    time as imTime
+)
+
+sys.path.insert(0, imPath.dirname(imPath.dirname(imPath.abspath(__file__))))
+import scheduleIndexModule
+
+def linearScan(p_mediaWithSched, p_time):
+    '''The lookup as it was done before the index, kept here as the reference'''
+    for t_media in p_mediaWithSched:
+        if ( (imDatetime.strptime(t_media['startTime'],'%H:%M').time() <= p_time) and
+                 ( imDatetime.strptime(t_media['endTime'],'%H:%M').time() >= p_time) ):
+            return t_media
+    return None
+
+def fabricateSchedule(p_count, p_seed=1):
+    '''Builds p_count non wrapping schedules at random times of the day'''
+    f_random = imRandom(p_seed)
+    f_schedule = []
+    for t_index in range(p_count):
+        t_start = f_random.randrange(0, 23 * 60)
+        t_end = min(t_start + f_random.randrange(1, 60), 24 * 60 - 1)
+        f_schedule.append({'fileName' : 'media%d.mp4' % t_index,
+                           'startTime' : '%02d:%02d' % divmod(t_start, 60),
+                           'endTime' : '%02d:%02d' % divmod(t_end, 60)})
+    return f_schedule
+
+def benchmark(p_count, p_lookups=2000):
+    '''Times both lookups and returns (linear seconds per call, index seconds per call, compile seconds)'''
+    f_schedule = fabricateSchedule(p_count)
+    f_random = imRandom(2)
+    f_probes = [imTime(f_random.randrange(24), f_random.randrange(60), f_random.randrange(60)) for t_index in range(p_lookups)]
+
+    f_index = scheduleIndexModule.ScheduleIndexModule()
+    f_started = imTimer()
+    f_index.compileSchedule(f_schedule)
+    f_compileTime = imTimer() - f_started
+
+    for t_probe in f_probes:
+        if linearScan(f_schedule, t_probe) is not f_index.getMediaAt(t_probe):
+            raise AssertionError('Index and linear scan disagree at %s' % t_probe)
+
+    f_started = imTimer()
+    for t_probe in f_probes: linearScan(f_schedule, t_probe)
+    f_linearTime = (imTimer() - f_started) / p_lookups
+
+    f_started = imTimer()
+    for t_probe in f_probes: f_index.getMediaAt(t_probe)
+    f_indexTime = (imTimer() - f_started) / p_lookups
+
+    return f_linearTime, f_indexTime, f_compileTime
+
+if __name__ == '__main__':
+    g_counts = [int(sys.argv[1])] if len(sys.argv) > 1 else [10, 100, 500]
+    for t_count in g_counts:
+        t_linear, t_index, t_compile = benchmark(t_count)
+        print('%5d scheduled media: linear scan %9.2f us/lookup, index %6.2f us/lookup (%.0fx), compile %.2f ms' %
+              (t_count, t_linear * 1e6, t_index * 1e6, t_linear / t_index, t_compile * 1e3))
@@ -0,0 +1,65 @@
+'''Measures how fast the SchedulerModule wakes the main loop and how much CPU
+the loop uses while nothing changes
+
+Usage:
+    python utilities/schedulerLatencyTester.py
+
+Prefixes:
+
+g_    :    Global variables
+f_    :    Local variables
+t_    :    Temporary variables
+c_    :    Class variables
+
+'''
+
+import sys
+from os import path as imPath
+from time import (
+    sleep as imDelay,
+    process_time as imProcessTime,
+    monotonic as imMonotonic
+)
+from threading import Thread as imThread
+
+sys.path.insert(0, imPath.dirname(imPath.dirname(imPath.abspath(__file__))))
+import schedulerModule
+
+def measureEventLatency(p_events=200):
+    '''Posts events from another thread the same way the network thread does'''
+    f_scheduler = schedulerModule.SchedulerModule()
+    f_latencies = []
+
+    def poster():
+        for t_index in range(p_events):
+            imDelay(.005)
+            f_scheduler.notifyManifestChanged()
+
+    f_thread = imThread(target = poster)
+    f_thread.start()
+    while len(f_latencies) < p_events:
+        f_scheduler.waitForEvents(1)
+        f_latencies.append(f_scheduler.c_lastWakeLatency)
+    f_thread.join()
+    f_latencies.sort()
+    return f_latencies[len(f_latencies) // 2], f_latencies[int(len(f_latencies) * .99)], f_latencies[-1]
+
+def measureTransitionLatency(p_transitions=20):
+    '''Wakes up on the timeout, as on a schedule boundary'''
+    f_scheduler = schedulerModule.SchedulerModule()
+    for t_index in range(p_transitions): f_scheduler.waitForEvents(.05)
+    return f_scheduler.c_maxWakeLatency
+
+def measureIdleCpu(p_seconds=3):
+    '''CPU seconds used by a loop waiting on an unchanged schedule'''
+    f_scheduler = schedulerModule.SchedulerModule()
+    f_cpuStarted = imProcessTime()
+    f_started = imMonotonic()
+    while imMonotonic() - f_started < p_seconds: f_scheduler.waitForEvents(p_seconds)
+    return imProcessTime() - f_cpuStarted
+
+if __name__ == '__main__':
+    g_median, g_p99, g_max = measureEventLatency()
+    print('Event wake latency: median %.3f ms, p99 %.3f ms, max %.3f ms' % (g_median * 1e3, g_p99 * 1e3, g_max * 1e3))
+    print('Schedule transition wake latency: max %.3f ms' % (measureTransitionLatency() * 1e3))
+    print('Idle CPU over 3 seconds: %.4f s' % measureIdleCpu())